@@ -1,71 +1,313 @@
 # atr_watchlist.py
  
-import yfinance as yf
+import os
 import pandas as pd
+import numpy as np
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from indicators import ATR_PERIOD, ATREngine, latest_atr
+from universe import get_universe
 
-def get_sp500_tickers():
- '''
- Fetches the list of S&P 500 ticker symbols from Wikipedia.
- Input: None
+ATR_HISTORY = "3mo"
+ATR_UPDATE_HISTORY = "1mo"  # Download for an incremental update of the saved ATR state
+ATR_METHOD = "sma"
+ATR_STATE_FILE = os.getenv("BOT_ATR_STATE_FILE", "atr_state.npz")
+MAX_UPDATE_DAYS = 15        # Older saved states are rebuilt from ATR_HISTORY
+PANEL_FIELDS = ["High", "Low", "Close"]
+TZ = "America/New_York"
+
+# ATR computed today: the universe engine plus single tickers outside it, so nothing is downloaded twice a day
+_daily = {"date": None, "engine": None, "extra": {}}
+_daily_lock = threading.Lock()
+
+def get_sp500_tickers(date=None):
+    '''
+ Returns the S&P 500 ticker symbols from the local universe file (re-scraped from Wikipedia only when stale).
+ Input:
+   - date (date-like): Membership as of this date (default: current)
  Output: List of ticker strings formatted for Yahoo Finance (e.g., 'BRK-B' instead of 'BRK.B')
-'''
-    table = pd.read_html("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")
-    tickers = table[0]["Symbol"].tolist()
-    return [ticker.replace(".", "-") for ticker in tickers]  # BRK.B → BRK-B
+    '''
+    return get_universe().members(date)
+
+class RateLimiter:
+    '''
+ Spaces out calls so that at most `calls_per_second` go out, shared across threads.
+ Input:
+   - calls_per_second (float): Maximum request rate (0 or None disables limiting)
+    '''
+    def __init__(self, calls_per_second=1.0):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def download_daily_panel(tickers, period=ATR_HISTORY):
+    '''
+ Downloads daily bars for many tickers in a single Yahoo request.
+ Input:
+   - tickers (list of str): Ticker symbols
+   - period (str): History to download (default is "3mo")
+ Output:
+   - pd.DataFrame: Columns are a (field, ticker) MultiIndex for High/Low/Close, indexed by date
+    '''
+    import yfinance as yf  # Deferred: slow to import, and only needed once something is downloaded
+    df = yf.download(tickers, period=period, interval="1d", progress=False, group_by="column", threads=False)
+    if df.empty:
+        return pd.DataFrame(columns=pd.MultiIndex.from_product([PANEL_FIELDS, tickers]))
+
+    if isinstance(df.columns, pd.MultiIndex):
+        panel = {field: df[field].reindex(columns=tickers) for field in PANEL_FIELDS}
+    else:
+        # Older yfinance versions return flat columns for a single ticker
+        panel = {field: df[[field]].set_axis(tickers, axis=1) for field in PANEL_FIELDS}
+    return pd.concat(panel, axis=1)
+
+def compute_atr_panel(high, low, close, period=ATR_PERIOD, method=ATR_METHOD):
+    '''
+ Vectorized ATR for a whole (ticker x day) panel (see indicators.latest_atr).
+ Missing days (NaN) are skipped per ticker, so each row gives the same result as computing ATR on
+ that ticker's own download.
+ Input:
+   - high, low, close (np.ndarray): 2-D arrays shaped (tickers, days), oldest day first
+   - period (int): Number of periods to use for ATR calculation (default is 14)
+   - method (str): "sma" or "wilder"
+ Output:
+   - np.ndarray: ATR per ticker, NaN where there are fewer than period + 1 valid days
+    '''
+    return latest_atr(high, low, close, period, method)
 
-def compute_atr(ticker, period=14): 
- '''
+def _completed_sessions(panel, today):
+    # Today's bar is still forming during the session; ATR only uses finished days. Before the daily
+    # cache, a download made during the session included that partial bar, so intraday values differ
+    return panel[pd.DatetimeIndex(panel.index).date < today]
+
+def _panel_arrays(panel, tickers):
+    return [panel[field].reindex(columns=tickers).to_numpy(dtype=float).T for field in PANEL_FIELDS]
+
+def _today():
+    return pd.Timestamp.now(tz=TZ).date()
+
+def cached_atr(ticker, today=None):
+    '''
+ ATR of a ticker if it was already computed today (by the universe scan or compute_atr), else None.
+ Never downloads.
+    '''
+    with _daily_lock:
+        if _daily["date"] != (today or _today()):
+            return None
+        if ticker in _daily["extra"]:
+            return _daily["extra"][ticker]
+        engine = _daily["engine"]
+    return engine.get(ticker) if engine is not None else None
+
+def top_n_by_atr(tickers, atr, top_n):
+    '''
+ Picks the N highest ATR values with argpartition and only sorts those N.
+ Input:
+   - tickers (list of str): Ticker symbols aligned with atr
+   - atr (np.ndarray): ATR per ticker (NaN entries are ignored)
+   - top_n (int): Number of tickers to return
+ Output:
+   - List of tuples: (ticker, ATR), sorted by ATR in descending order
+    '''
+    atr = np.asarray(atr, dtype=float)
+    candidates = np.flatnonzero(~np.isnan(atr))
+    if top_n <= 0 or len(candidates) == 0:
+        return []
+    if top_n < len(candidates):
+        candidates = candidates[np.argpartition(-atr[candidates], top_n - 1)[:top_n]]
+    candidates = candidates[np.argsort(-atr[candidates], kind="stable")]
+    return [(tickers[i], float(atr[i])) for i in candidates]
+
+def compute_atr(ticker, period=ATR_PERIOD): 
+    '''
  Calculates the 14-day Average True Range (ATR) for a given stock ticker using historical daily data.
+ Only completed sessions count: today's still-forming daily bar is left out, so the value (and the
+ stop / target levels built on it) stays the same all day and matches the universe scan.
  Input: 
-   - ticker (str): Stock ticker symbol
-   - period (int): Number of periods to use for ATR calculation (default is 14)
+   - ticker (str): Stock ticker symbol
+   - period (int): Number of periods to use for ATR calculation (default is 14)
  Output: 
-   - float: The computed ATR value, or None if data is insufficient or an error occurs
-'''
+   - float: The computed ATR value, or None if data is insufficient or an error occurs
+    '''
+    if period == ATR_PERIOD:
+        cached = cached_atr(ticker)
+        if cached is not None:
+            return cached
     try:
-        df = yf.download(ticker, period="3mo", interval="1d", progress=False)
-        if df.empty or len(df) < period + 1:
-            return None
-        df['H-L'] = df['High'] - df['Low']
-        df['H-PC'] = abs(df['High'] - df['Close'].shift(1))
-        df['L-PC'] = abs(df['Low'] - df['Close'].shift(1))
-        df['TR'] = df[['H-L', 'H-PC', 'L-PC']].max(axis=1)
-        atr = df['TR'].rolling(window=period).mean().iloc[-1]
-        return atr
+        today = _today()
+        panel = _completed_sessions(download_daily_panel([ticker]), today)
+        atr = compute_atr_panel(*(panel[field].to_numpy().T for field in PANEL_FIELDS), period=period)[0]
+        value = None if np.isnan(atr) else float(atr)
+        if period == ATR_PERIOD and value is not None:
+            with _daily_lock:
+                if _daily["date"] != today:
+                    _daily.update(date=today, engine=None, extra={})
+                _daily["extra"][ticker] = value
+        return value
     except Exception as e:
         print(f"Error fetching {ticker}: {e}")
         return None
 
-def get_top_atr_stocks(top_n, batch_size=50):
- '''
+def scan_atr_bulk(tickers, batch_size=50, max_workers=4, calls_per_second=1.0, period=ATR_PERIOD):
+    '''
+ Computes ATR for every ticker: each batch is one multi-ticker download, batches run on a bounded
+ worker pool behind a shared rate limiter, and ATR is computed in one pass over the combined panel.
+ Input:
+   - tickers (list of str): Ticker symbols
+   - batch_size (int): Tickers per download request
+   - max_workers (int): Number of concurrent download requests
+   - calls_per_second (float): Maximum request rate to Yahoo
+   - period (int): ATR period
+ Output:
+   - np.ndarray: ATR per ticker (aligned with tickers), NaN where it could not be computed
+    '''
+    panel = download_universe_panel(tickers, ATR_HISTORY, batch_size, max_workers, calls_per_second)
+    if panel is None:
+        return np.full(len(tickers), np.nan)
+    return compute_atr_panel(*_panel_arrays(panel, tickers), period=period)
+
+def download_universe_panel(tickers, period=ATR_HISTORY, batch_size=50, max_workers=4, calls_per_second=1.0):
+    '''
+ Downloads daily bars for every ticker: each batch is one multi-ticker request, batches run on a bounded
+ worker pool behind a shared rate limiter.
+ Output:
+   - pd.DataFrame: (field, ticker) panel indexed by date, or None if every batch failed
+    '''
+    limiter = RateLimiter(calls_per_second)
+    batches = [tickers[i:i+batch_size] for i in range(0, len(tickers), batch_size)]
+
+    def fetch(batch_no, batch):
+        limiter.wait()
+        print(f"Processing batch {batch_no}...")
+        try:
+            return download_daily_panel(batch, period=period)
+        except Exception as e:
+            print(f"Error fetching batch {batch_no}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        panels = list(pool.map(fetch, range(1, len(batches) + 1), batches))
+
+    panels = [p for p in panels if p is not None and not p.empty]
+    if not panels:
+        return None
+    return pd.concat(panels, axis=1).sort_index()
+
+def universe_atr(tickers, state_file=ATR_STATE_FILE, batch_size=50, max_workers=4, calls_per_second=1.0,
+                 period=ATR_PERIOD, method=ATR_METHOD, today=None):
+    '''
+ ATR of every ticker over completed sessions (today's partial bar is never included), computed at most
+ once per trading day.
+ The ATREngine state is saved to state_file. Later the same day (or after a restart) it is reused as is;
+ on a new day only the sessions since the saved state are downloaded (ATR_UPDATE_HISTORY) and applied
+ incrementally. The full ATR_HISTORY download is only needed for a new universe or a stale state.
+ Input:
+   - tickers (list of str): Universe
+   - state_file (str): Saved engine state (None to keep it in memory only)
+   - today (date): Trading date (default: today in US/Eastern)
+ Output:
+   - np.ndarray: ATR per ticker (aligned with tickers), NaN where it could not be computed
+    '''
+    today = today or _today()
+    tickers = list(tickers)
+
+    def usable(engine):
+        return engine is not None and engine.symbols == tickers and engine.period == period and engine.method == method
+
+    with _daily_lock:
+        engine = _daily["engine"] if _daily["date"] == today else None
+    if usable(engine):
+        return engine.atr.copy()
+
+    engine, computed = None, None
+    if state_file and os.path.exists(state_file):
+        try:
+            engine, meta = ATREngine.load(state_file)
+            computed = meta.get("computed")
+        except Exception as e:
+            print(f"[WARN] Could not read ATR state {state_file}: {e}")
+    if not usable(engine) or engine.as_of is None:
+        engine = None
+
+    if engine is not None and computed != str(today):
+        gap = len(pd.bdate_range(engine.as_of, today)) - 1
+        if gap > MAX_UPDATE_DAYS:
+            engine = None
+        else:
+            panel = download_universe_panel(tickers, ATR_UPDATE_HISTORY, batch_size, max_workers, calls_per_second)
+            if panel is None:
+                engine = None
+            else:
+                panel = _completed_sessions(panel, today)
+                panel = panel[pd.DatetimeIndex(panel.index).date > pd.Timestamp(engine.as_of).date()]
+                high, low, close = _panel_arrays(panel, tickers)
+                for j, date in enumerate(panel.index):
+                    engine.update(high[:, j], low[:, j], close[:, j], as_of=str(pd.Timestamp(date).date()))
+                print(f"[INFO] ATR state updated with {len(panel)} new sessions")
+
+    if engine is None:
+        panel = download_universe_panel(tickers, ATR_HISTORY, batch_size, max_workers, calls_per_second)
+        if panel is None:
+            return np.full(len(tickers), np.nan)
+        panel = _completed_sessions(panel, today)
+        as_of = str(pd.Timestamp(panel.index[-1]).date()) if len(panel) else None
+        engine = ATREngine.from_history(tickers, *_panel_arrays(panel, tickers), period=period, method=method,
+                                        as_of=as_of)
+
+    if state_file and engine.as_of is not None:
+        engine.save(state_file, computed=today)
+    with _daily_lock:
+        if _daily["date"] != today:
+            _daily.update(date=today, extra={})
+        _daily["engine"] = engine
+    return engine.atr.copy()
+
+def get_top_atr_stocks(top_n, batch_size=50, bulk=True, max_workers=4, calls_per_second=1.0):
+    '''
 Processes all S&P 500 tickers in batches, computes their ATRs, and returns the top N stocks with the highest ATR values.
 Input:
-  - top_n (int): Number of top stocks to return based on ATR
-  - batch_size (int): Number of tickers to process per batch (default is 50)
+  - top_n (int): Number of top stocks to return based on ATR
+  - batch_size (int): Number of tickers to process per batch (default is 50)
+  - bulk (bool): If True, downloads each batch in one request on a worker pool; if False, one request per ticker
+  - max_workers (int): Concurrent batch downloads in bulk mode
+  - calls_per_second (float): Request rate limit towards Yahoo
 Output:
-  - List of tuples: Each tuple contains (ticker, ATR), sorted by ATR in descending order
- '''
+  - List of tuples: Each tuple contains (ticker, ATR), sorted by ATR in descending order
+    '''
     tickers = get_sp500_tickers()
-    all_results = []
 
     print(f"Scanning {len(tickers)} tickers in batches of {batch_size}...")
 
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i+batch_size]
-        print(f"Processing batch {i // batch_size + 1}...")
-        for ticker in batch:
-            atr = compute_atr(ticker)
-            if atr is not None:
-                all_results.append((ticker, atr))
-        time.sleep(1)  # Be polite to Yahoo's servers
+    if bulk:
+        atr = universe_atr(tickers, batch_size=batch_size, max_workers=max_workers, calls_per_second=calls_per_second)
+    else:
+        limiter = RateLimiter(calls_per_second)
+        atr = np.full(len(tickers), np.nan)
+        for i in range(0, len(tickers), batch_size):
+            limiter.wait()  # Be polite to Yahoo's servers
+            print(f"Processing batch {i // batch_size + 1}...")
+            for j, ticker in enumerate(tickers[i:i+batch_size], start=i):
+                value = compute_atr(ticker)
+                if value is not None:
+                    atr[j] = value
 
-    sorted_results = sorted(all_results, key=lambda x: x[1], reverse=True)
+    top = top_n_by_atr(tickers, atr, top_n)
     print(f"\nTop {top_n} S&P 500 Stocks by ATR:")
-    for ticker, atr in sorted_results[:top_n]:
-        print(f"{ticker}: ATR = {atr:.2f}")
+    for ticker, value in top:
+        print(f"{ticker}: ATR = {value:.2f}")
 
-    return sorted_results[:top_n]
+    return top
 
 if __name__ == "__main__":
-    get_top_atr_stocks()
+    get_top_atr_stocks(top_n=25)
@@ -4,7 +4,14 @@
 Simulates trades based on signal column
 Assumes trade is entered on the same bar as signal is generated (at close)
 '''
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from bars import Bars, session_starts
+from signal_generator import generate_signal_arrays
 
 def backtest_signals(df: pd.DataFrame):
     '''
@@ -17,76 +24,283 @@ def backtest_signals(df: pd.DataFrame):
     - df (pd.DataFrame): Modified DataFrame with 'trade_pnl' and 'cumulative_pnl' columns
     - trades (list of dicts): List of executed trades with entry/exit details and PnL
     '''
-    df = df.copy()
-    df["trade_pnl"] = 0.0
-    df["cumulative_pnl"] = 0.0
+    signal = df["signal"].to_numpy()
+    close = df["close"].to_numpy()
+    index = df.index
+    entries = np.flatnonzero((signal == 1) | (signal == -1))
+    exits = np.flatnonzero(signal == 0)
 
+    trade_pnl = np.zeros(len(df))
     trades = []
-    position = 0
-    entry_price = 0.0
-    entry_time = None
-    direction = None
-    cumulative_pnl = 0.0
-
-    for i in range(len(df)):
-        row = df.iloc[i]
-        timestamp = df.index[i]
-        signal = row["signal"]
-        price = row["close"]
-
-        if signal == 1 and position == 0:
-            # Enter long
-            position = 1
-            entry_price = price
-            entry_time = timestamp
-            direction = "long"
-            print(f"[{timestamp}] LONG ENTRY at {price}")
-
-        elif signal == -1 and position == 0:
-            # Enter short
-            position = -1
-            entry_price = price
-            entry_time = timestamp
-            direction = "short"
-            print(f"[{timestamp}] SHORT ENTRY at {price}")
-
-        elif signal == 0 and position != 0:
-            # Exit trade
-            exit_price = price
-            exit_time = timestamp
-
-            if position == 1:
-                pnl = exit_price - entry_price
-            else:
-                pnl = entry_price - exit_price
-
-            holding_period = (df.index.get_loc(exit_time) - df.index.get_loc(entry_time))
-
-            trades.append({
-                "entry_time": entry_time,
-                "exit_time": exit_time,
-                "entry_price": entry_price,
-                "exit_price": exit_price,
-                "direction": direction,
-                "pnl": pnl,
-                "holding_period": holding_period
-            })
-
-            df.at[timestamp, "trade_pnl"] = pnl
-            cumulative_pnl += pnl
-            df.at[timestamp, "cumulative_pnl"] = cumulative_pnl
-
-            print(f"[{timestamp}] EXIT {direction.upper()} at {price} | PnL: {pnl}")
-
-            # Reset
-            position = 0
-            entry_price = 0.0
-            entry_time = None
-            direction = None
+    i = 0
+    # Jump from trade to trade: the first entry signal while flat, then the first 0 after it
+    while True:
+        k = np.searchsorted(entries, i)
+        if k == len(entries):
+            break
+        entry = entries[k]
+        j = np.searchsorted(exits, entry, side="right")
+        direction = "long" if signal[entry] == 1 else "short"
+        print(f"[{index[entry]}] {direction.upper()} ENTRY at {close[entry]}")
+        if j == len(exits):
+            break
+        exit_ = exits[j]
 
-        else:
-            # No trade
-            df.at[timestamp, "cumulative_pnl"] = cumulative_pnl
+        pnl = close[exit_] - close[entry] if direction == "long" else close[entry] - close[exit_]
+        trades.append({
+            "entry_time": index[entry],
+            "exit_time": index[exit_],
+            "entry_price": close[entry],
+            "exit_price": close[exit_],
+            "direction": direction,
+            "pnl": pnl,
+            "holding_period": int(exit_ - entry)
+        })
+        trade_pnl[exit_] = pnl
+        print(f"[{index[exit_]}] EXIT {direction.upper()} at {close[exit_]} | PnL: {pnl}")
+        i = exit_ + 1
 
+    # assign adds the two result columns without copying the input's columns
+    df = df.assign(trade_pnl=trade_pnl, cumulative_pnl=np.cumsum(trade_pnl))
     return df, trades
 
+
+
+# === Batch backtesting ===
+'''
+Runs many symbols x many strategy configurations in one go.
+A trade opens on a state-machine entry (signal 1 / -1) that passes the volume filter and closes at the
+first of: the state machine exiting the position, the ATR stop-loss or the ATR take-profit (same
+levels and comparisons as main.py, measured from the entry close). Trades still open at the end of the
+data are dropped, as in backtest_signals.
+Because a trade never outlives the state machine's own position, trades can't overlap and every
+configuration is evaluated with array operations over the trade windows, no per-bar loop.
+'''
+
+DEFAULT_PARAM_GRID = {
+    "sma_window": [20],         # Intraday SMA window (bars)
+    "confirm": ["both"],        # Lines price must cross: "both" (VWAP and SMA), "vwap" or "sma"
+    "stop_mult": [1.5],         # Stop-loss distance in ATRs
+    "target_mult": [2.5],       # Take-profit distance in ATRs
+    "volume_mult": [1.5],       # Entry needs volume >= volume_mult x 20-bar average (0 disables)
+}
+ATR_PERIOD = 14
+VOLUME_AVG_WINDOW = 20
+RESULT_COLUMNS = ["num_trades", "total_pnl", "win_rate", "avg_pnl", "profit_factor",
+                  "max_drawdown", "stop_exits", "target_exits"]
+
+def expand_param_grid(param_grid: dict) -> list:
+    '''
+ Expands a grid of parameter lists into a list of configurations (missing keys use DEFAULT_PARAM_GRID).
+ Input:
+   - param_grid (dict): Parameter name -> list of values
+ Output:
+   - list of dicts: One dict per combination
+    '''
+    grid = {**DEFAULT_PARAM_GRID, **param_grid}
+    names = list(DEFAULT_PARAM_GRID)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def daily_atr_from_intraday(df, period=ATR_PERIOD) -> np.ndarray:
+    '''
+ Builds daily bars from intraday bars and returns, for every intraday bar, the ATR known before that
+ session opened (previous sessions only, like the pre-market watchlist scan).
+ Input:
+   - df (pd.DataFrame or Bars): Intraday bars with 'high', 'low', 'close', indexed by timestamp
+   - period (int): ATR period
+ Output:
+   - np.ndarray: ATR per intraday bar (NaN until enough sessions are available)
+    '''
+    bars = df if isinstance(df, Bars) else Bars.from_frame(df, price_dtype=None)
+    n = len(bars)
+    if n == 0:
+        return np.array([])
+    starts = session_starts(bars.session)
+    high = np.maximum.reduceat(bars.high, starts).astype(float)
+    low = np.minimum.reduceat(bars.low, starts).astype(float)
+    close = bars.close[np.append(starts[1:], n) - 1].astype(float)
+
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    daily_atr = np.full(len(starts), np.nan)
+    if len(starts) > period:
+        # ATR of the `period` sessions before each session
+        daily_atr[period:] = sliding_window_view(true_range, period).mean(axis=1)[:-1]
+    return np.repeat(daily_atr, np.diff(np.append(starts, n)))
+
+def simulate_trades(close, signal, position, atr, entry_ok, stop_mult, target_mult):
+    '''
+ Vectorized trade simulation for one symbol and one configuration.
+ Input:
+   - close (np.ndarray): Close prices
+   - signal, position (np.ndarray): State machine output (see generate_signal_arrays)
+   - atr (np.ndarray): ATR per bar, the value at the entry bar sets the stop/target levels
+   - entry_ok (np.ndarray): Boolean per bar, False blocks an entry on that bar (volume filter)
+   - stop_mult, target_mult (float): Stop-loss / take-profit distances in ATRs
+ Output:
+   - dict of np.ndarray: entry_idx, exit_idx, direction, pnl and reason (0 signal, 1 stop, 2 target)
+    '''
+    n = len(close)
+    entries = np.flatnonzero(signal != 0)
+    entries = entries[entry_ok[entries] & (entries < n - 1)]
+    empty = np.array([], dtype=np.int64)
+    if len(entries) == 0:
+        return {"entry_idx": empty, "exit_idx": empty, "direction": empty,
+                "pnl": np.array([]), "reason": empty}
+
+    # Bar where the state machine goes flat again (n - 1 if it never does)
+    flat = np.flatnonzero(position == 0)
+    k = np.searchsorted(flat, entries)
+    has_signal_exit = k < len(flat)
+    window_end = np.where(has_signal_exit, flat[np.minimum(k, len(flat) - 1)], n - 1)
+
+    direction = signal[entries]
+    entry_price = close[entries]
+    stop_dist = stop_mult * atr[entries]
+    target_dist = target_mult * atr[entries]
+
+    # Flatten all trade windows (entry+1 .. window_end) into one array of bar indices
+    lengths = window_end - entries
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    total = int(lengths.sum())
+    trade_of_bar = np.repeat(np.arange(len(entries)), lengths)
+    bars = entries[trade_of_bar] + 1 + (np.arange(total) - starts[trade_of_bar])
+
+    move = direction[trade_of_bar] * (close[bars] - entry_price[trade_of_bar])
+    stop_hit = move <= -stop_dist[trade_of_bar]
+    target_hit = move >= target_dist[trade_of_bar]
+
+    positions = np.where(stop_hit | target_hit, np.arange(total), total)
+    first_hit = np.minimum.reduceat(positions, starts)
+
+    hit = first_hit < total
+    exit_idx = np.where(hit, bars[np.minimum(first_hit, total - 1)], window_end)
+    reason = np.zeros(len(entries), dtype=np.int64)
+    reason[hit] = np.where(stop_hit[first_hit[hit]], 1, 2)
+
+    closed = hit | has_signal_exit
+    entries, exit_idx, direction, reason = entries[closed], exit_idx[closed], direction[closed], reason[closed]
+    pnl = direction * (close[exit_idx] - close[entries])
+    return {"entry_idx": entries, "exit_idx": exit_idx, "direction": direction, "pnl": pnl, "reason": reason}
+
+def _summarize_trades(trades):
+    pnl = trades["pnl"]
+    if len(pnl) == 0:
+        return dict.fromkeys(RESULT_COLUMNS, 0.0) | {"num_trades": 0, "stop_exits": 0, "target_exits": 0}
+    wins = pnl[pnl > 0].sum()
+    losses = pnl[pnl < 0].sum()
+    equity = np.cumsum(pnl)
+    return {
+        "num_trades": len(pnl),
+        "total_pnl": float(pnl.sum()),
+        "win_rate": float((pnl > 0).mean()),
+        "avg_pnl": float(pnl.mean()),
+        "profit_factor": float(wins / -losses) if losses < 0 else float("inf"),
+        "max_drawdown": float((np.maximum.accumulate(np.maximum(equity, 0)) - equity).max()),
+        "stop_exits": int((trades["reason"] == 1).sum()),
+        "target_exits": int((trades["reason"] == 2).sum()),
+    }
+
+def run_configs(close, volume, atr, avg_volume, vwap, intraday_sma, configs) -> list:
+    '''
+ Simulates every configuration on one symbol's prepared arrays; the state machine only runs once per
+ (sma_window, confirm) pair.
+ Input:
+   - close, volume, atr, avg_volume, vwap (np.ndarray): Per-bar inputs (float)
+   - intraday_sma (callable): window -> intraday SMA array
+   - configs (list of dicts): See expand_param_grid
+ Output:
+   - list of dicts: simulate_trades output, one per configuration
+    '''
+    smas = {}
+    signals = {}
+    results = []
+    for config in configs:
+        window, confirm = config["sma_window"], config["confirm"]
+        if (window, confirm) not in signals:
+            if window not in smas:
+                smas[window] = intraday_sma(window)
+            lines = {"both": (vwap, smas[window]), "vwap": (vwap, vwap), "sma": (smas[window], smas[window])}
+            signals[(window, confirm)] = generate_signal_arrays(close, *lines[confirm])
+        signal, position = signals[(window, confirm)]
+
+        # Same comparison as main.py: only skip when volume is known to be below the threshold
+        entry_ok = ~(volume < config["volume_mult"] * avg_volume)
+        results.append(simulate_trades(close, signal, position, atr, entry_ok,
+                                       config["stop_mult"], config["target_mult"]))
+    return results
+
+def _backtest_symbol(symbol, df, configs, feature_store=None):
+    # Returns the result rows and the (hits, misses) of the feature store lookups made for them
+    before = (feature_store.hits, feature_store.misses) if feature_store is not None else (0, 0)
+    bars = df if isinstance(df, Bars) else Bars.from_frame(df, price_dtype=None)
+    close = bars.close.astype(float, copy=False)
+    volume = bars.volume.astype(float, copy=False)
+    avg_volume = pd.Series(volume).rolling(VOLUME_AVG_WINDOW).mean().to_numpy()
+    if feature_store is not None and isinstance(df, pd.DataFrame):
+        # Sessions already in the store are read back instead of recomputed
+        atr = df["ATR"].to_numpy(dtype=float) if "ATR" in df.columns else \
+            feature_store.get(symbol, df, "daily_atr", period=ATR_PERIOD)
+        vwap = feature_store.get(symbol, df, "vwap")
+        intraday_sma = lambda window: feature_store.get(symbol, df, "intraday_sma", window=window)
+    else:
+        if isinstance(df, pd.DataFrame) and "ATR" in df.columns:
+            atr = df["ATR"].to_numpy(dtype=float)
+        else:
+            atr = daily_atr_from_intraday(bars)
+        vwap, intraday_sma = bars.vwap(), bars.intraday_sma
+    results = run_configs(close, volume, atr, avg_volume, vwap, intraday_sma, configs)
+    lookups = (feature_store.hits - before[0], feature_store.misses - before[1]) if feature_store is not None else (0, 0)
+    return [{"symbol": symbol, **config, **_summarize_trades(trades)} for config, trades in zip(configs, results)], lookups
+
+def backtest_batch(panel: dict, param_grid: dict = None, processes: int = None, feature_store=None) -> pd.DataFrame:
+    '''
+ Backtests every symbol in the panel against every configuration in the parameter grid.
+ Input:
+   - panel (dict): Symbol -> DataFrame (or Bars) of intraday bars with 'high', 'low', 'close', 'volume'
+     (and optionally an 'ATR' column; otherwise the daily ATR is derived from the bars). Bars with
+     float32 prices halve what is shipped to the worker processes.
+   - param_grid (dict): Parameter name -> list of values, see DEFAULT_PARAM_GRID
+   - processes (int): Worker processes (None = one per CPU, 0 or 1 = run in this process)
+   - feature_store (FeatureStore): Optional indicator store for VWAP, intraday SMA and daily ATR
+     (DataFrame inputs only)
+ Output:
+   - pd.DataFrame: One row per (symbol, configuration) with the parameters and trade statistics
+    '''
+    configs = expand_param_grid(param_grid or {})
+    symbols = list(panel)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes <= 1 or len(symbols) <= 1:
+        results = [_backtest_symbol(symbol, panel[symbol], configs, feature_store)[0] for symbol in symbols]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            outputs = list(pool.map(_backtest_symbol, symbols, (panel[s] for s in symbols),
+                                    itertools.repeat(configs), itertools.repeat(feature_store), chunksize=max(1, len(symbols) // (processes * 4))))
+        results = [rows for rows, _ in outputs]
+        if feature_store is not None:
+            # The workers' lookups went to their own copies of the store
+            feature_store.count(sum(hits for _, (hits, _) in outputs), sum(misses for _, (_, misses) in outputs))
+
+    return pd.DataFrame([row for rows in results for row in rows],
+                        columns=["symbol", *DEFAULT_PARAM_GRID, *RESULT_COLUMNS])
+
+def summarize_batch(results: pd.DataFrame) -> pd.DataFrame:
+    '''
+ Aggregates backtest_batch results across symbols, one row per configuration, best total PnL first.
+    '''
+    params = list(DEFAULT_PARAM_GRID)
+    grouped = results.groupby(params, sort=False)
+    summary = grouped.agg(
+        symbols=("symbol", "count"),
+        num_trades=("num_trades", "sum"),
+        total_pnl=("total_pnl", "sum"),
+        stop_exits=("stop_exits", "sum"),
+        target_exits=("target_exits", "sum"),
+    )
+    wins = (results["win_rate"] * results["num_trades"]).groupby([results[p] for p in params], sort=False).sum()
+    summary["win_rate"] = (wins / summary["num_trades"].where(summary["num_trades"] > 0)).fillna(0.0)
+    summary["avg_pnl"] = (summary["total_pnl"] / summary["num_trades"].where(summary["num_trades"] > 0)).fillna(0.0)
+    return summary.sort_values("total_pnl", ascending=False).reset_index()
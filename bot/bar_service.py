@@ -0,0 +1,134 @@
+# bar_service.py
+'''
+Multi-timeframe bars from a single download per symbol.
+The base series (5-minute bars, served by the on-disk bar cache) is fetched once per cycle and every
+coarser timeframe is resampled from it locally, like the 15-minute resampling in
+unused/data_loader.py::get_15min_data. Derived bars are kept per (symbol, timeframe) and updated
+incrementally: when new base bars arrive, only the buckets they fall into are resampled again.
+Hourly bars are aligned at 09:30, as Yahoo's 60m bars are; the last bucket is the still-forming one,
+closing at the latest base bar.
+'''
+import threading
+import pandas as pd
+from data_loader_yf import get_cached_bars, regular_hours
+
+BASE_INTERVAL = "5m"
+BASE_SESSIONS = 10  # Sessions of base bars kept per symbol
+TIMEFRAMES = {
+    # timeframe -> (resample rule, offset of the bucket grid from midnight)
+    "15m": ("15min", None),
+    "30m": ("30min", None),
+    "60m": ("60min", "30min"),
+    "1d": ("1D", None),
+}
+AGGREGATION = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+
+def resample_bars(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    '''
+ Resamples bars to a coarser timeframe (empty buckets are dropped).
+ Input:
+   - df (pd.DataFrame): Bars with lowercase OHLCV columns, indexed by timestamp
+   - timeframe (str): One of TIMEFRAMES
+ Output:
+   - pd.DataFrame: Resampled bars, labelled by bucket start
+    '''
+    rule, offset = TIMEFRAMES[timeframe]
+    agg = {col: how for col, how in AGGREGATION.items() if col in df.columns}
+    bars = df.resample(rule, offset=offset).agg(agg) if offset else df.resample(rule).agg(agg)
+    return bars.dropna(subset=[col for col in ("open", "close") if col in agg])
+
+def bucket_start(timestamp: pd.Timestamp, timeframe: str) -> pd.Timestamp:
+    '''
+ Start of the timeframe bucket a timestamp falls into (same alignment as resample_bars).
+    '''
+    rule, offset = TIMEFRAMES[timeframe]
+    offset = pd.Timedelta(offset or 0)
+    wall = timestamp.tz_localize(None) if timestamp.tzinfo is not None else timestamp
+    start = (wall - offset).floor(rule) + offset
+    return start.tz_localize(timestamp.tz) if timestamp.tzinfo is not None else start
+
+class BarService:
+    '''
+ Keeps the base bars and the derived timeframes of every symbol.
+ Input:
+   - fetch (callable): fetch(symbol, interval, sessions) -> DataFrame of base bars (default: bar cache top-up)
+   - timeframes (tuple): Derived timeframes to maintain (keys of TIMEFRAMES)
+   - sessions (int): Sessions of base bars requested per refresh
+    '''
+    def __init__(self, fetch=get_cached_bars, timeframes=("60m",), sessions=BASE_SESSIONS):
+        self.fetch = fetch
+        self.timeframes = tuple(timeframes)
+        self.sessions = sessions
+        self._base = {}     # symbol -> base bars
+        self._frames = {}   # (symbol, timeframe) -> derived bars
+        self._lock = threading.Lock()
+
+    def refresh(self, symbol: str) -> pd.DataFrame:
+        '''
+ Fetches the latest base bars for a symbol (the only network call) and updates every timeframe.
+ Output:
+   - pd.DataFrame: The base bars
+        '''
+        base = self.fetch(symbol, BASE_INTERVAL, self.sessions)
+        self.update(symbol, base)
+        return base
+
+    def update(self, symbol: str, base: pd.DataFrame):
+        '''
+ Replaces the base bars of a symbol and resamples only the buckets touched by bars that are new
+ or may have been revised (from the last previously known bar onwards).
+        '''
+        if base.empty:
+            return
+        previous = self._base.get(symbol)
+        if previous is None or previous.empty or previous.index[-1] < base.index[0]:
+            changed_from = None
+        else:
+            changed_from = previous.index[-1]
+
+        frames = {}
+        for timeframe in self.timeframes:
+            old = self._frames.get((symbol, timeframe))
+            first_bucket = bucket_start(base.index[0], timeframe)
+            if changed_from is None or old is None:
+                frames[timeframe] = resample_bars(base, timeframe)
+                continue
+            start = bucket_start(changed_from, timeframe)
+            tail = resample_bars(base[base.index >= start], timeframe)
+            kept = old[(old.index >= first_bucket) & (old.index < start)]
+            frames[timeframe] = pd.concat([kept, tail])
+
+        with self._lock:
+            self._base[symbol] = base
+            for timeframe, frame in frames.items():
+                self._frames[(symbol, timeframe)] = frame
+
+    def bars(self, symbol: str, timeframe: str = BASE_INTERVAL, sessions: int = None) -> pd.DataFrame:
+        '''
+ Returns the bars of a symbol in a timeframe.
+ Input:
+   - symbol (str): Ticker symbol
+   - timeframe (str): BASE_INTERVAL or one of the maintained timeframes
+   - sessions (int): If set, only the last N trading dates
+ Output:
+   - pd.DataFrame: Bars with lowercase OHLCV columns (empty if the symbol was never refreshed)
+        '''
+        with self._lock:
+            if timeframe == BASE_INTERVAL:
+                df = self._base.get(symbol)
+            else:
+                df = self._frames.get((symbol, timeframe))
+        if df is None:
+            return pd.DataFrame()
+        if sessions is not None and not df.empty:
+            dates = df.index.normalize()
+            keep = dates.unique()[-sessions:]
+            df = df[dates >= keep[0]]
+        return df
+
+    def regular_bars(self, symbol: str) -> pd.DataFrame:
+        '''
+ Base bars during regular market hours, the same frame get_5min_data returns.
+        '''
+        df = self.bars(symbol)
+        return regular_hours(df) if not df.empty else df
@@ -0,0 +1,189 @@
+# bar_store.py
+'''
+Persistent on-disk bar cache, one file per (symbol, interval).
+Bars are stored as a NumPy structured array (<root>/<interval>/<SYMBOL>.npy) with an int64 UTC
+timestamp in nanoseconds and one field per OHLCV column (float64, volume stays int64), plus a small
+JSON sidecar holding the column names and timezone. Files are read memory-mapped, so reading the last
+cached timestamp or a recent slice does not load the whole history.
+Writes go to a temporary file that is renamed over the old one, so a crash never leaves a half-written series.
+A merge only converts the bars from the first new timestamp onwards; the cached bars before it are copied
+as raw records, and every write drops the sessions beyond the retention limit, so the files stay small.
+'''
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from bars import Bars
+
+MAX_SESSIONS = int(os.getenv("BAR_CACHE_SESSIONS", "60"))  # Trading dates kept per series (Yahoo serves 60 days of 5m bars); 0 keeps everything
+
+class BarStore:
+    def __init__(self, root: str, max_sessions: int = MAX_SESSIONS):
+        self.root = root
+        self.max_sessions = max_sessions
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _paths(self, symbol, interval):
+        folder = os.path.join(self.root, interval)
+        name = symbol.upper()
+        return os.path.join(folder, f"{name}.npy"), os.path.join(folder, f"{name}.json")
+
+    def _lock(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(self, symbol, interval):
+        data_path, meta_path = self._paths(symbol, interval)
+        if not os.path.exists(data_path) or not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return np.load(data_path, mmap_mode="r"), meta
+
+    def read(self, symbol: str, interval: str, start=None, end=None) -> pd.DataFrame:
+        '''
+ Reads cached bars for a symbol straight from disk.
+ Input:
+   - symbol (str): Ticker symbol
+   - interval (str): Bar interval as used by Yahoo (e.g., "5m", "60m")
+   - start, end (timestamp-like): Optional inclusive bounds (naive values are read in the series' timezone)
+ Output:
+   - pd.DataFrame: Cached bars indexed by timestamp (empty if nothing is cached)
+        '''
+        rows, meta = self._slice(symbol, interval, start, end)
+        if rows is None:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="timestamp"))
+
+        index = pd.to_datetime(np.asarray(rows["timestamp"]), utc=True)
+        if meta["tz"]:
+            index = index.tz_convert(meta["tz"])
+        else:
+            index = index.tz_localize(None)
+        index.name = "timestamp"
+        return pd.DataFrame({col: np.asarray(rows[col]) for col in meta["columns"]}, index=index)
+
+    def read_bars(self, symbol: str, interval: str, start=None, end=None) -> Bars:
+        '''
+ Reads cached bars as a compact Bars container (float32 prices) without building a DataFrame.
+ Same bounds as read(); returns None if nothing is cached.
+        '''
+        rows, meta = self._slice(symbol, interval, start, end)
+        if rows is None:
+            return None
+        return Bars.from_records(rows, tz=meta["tz"])
+
+    def _slice(self, symbol, interval, start, end):
+        data, meta = self._load(symbol, interval)
+        if data is None:
+            return None, None
+        timestamps = data["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, _to_utc_ns(start, meta["tz"]), side="left"))
+        hi = len(data) if end is None else int(np.searchsorted(timestamps, _to_utc_ns(end, meta["tz"]), side="right"))
+        return data[lo:hi], meta
+
+    def last_timestamp(self, symbol: str, interval: str):
+        '''
+ Returns the timestamp of the latest cached bar, or None if nothing is cached.
+        '''
+        data, meta = self._load(symbol, interval)
+        if data is None or len(data) == 0:
+            return None
+        ts = pd.Timestamp(int(data["timestamp"][-1]), tz="UTC")
+        return ts.tz_convert(meta["tz"]) if meta["tz"] else ts.tz_localize(None)
+
+    def sessions(self, symbol: str, interval: str) -> int:
+        '''
+ Returns the number of distinct trading dates in the cache.
+        '''
+        data, meta = self._load(symbol, interval)
+        return 0 if data is None else len(_session_starts(data["timestamp"], meta["tz"]))
+
+    def merge(self, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        '''
+ Merges new bars into the cache. Overlapping timestamps are de-duplicated, keeping the new bar
+ (the latest download has the most complete version of a bar that was still forming).
+ Cached bars older than the first new bar are kept as they are on disk; only the overlapping tail is
+ rebuilt. Sessions beyond max_sessions are dropped from the front.
+ Input:
+   - symbol (str): Ticker symbol
+   - interval (str): Bar interval
+   - df (pd.DataFrame): Bars with numeric columns, indexed by timestamp
+ Output:
+   - int: Number of bars in the cache after the merge
+        '''
+        if df.empty:
+            return len(self.read(symbol, interval))
+
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        tz = str(df.index.tz) if df.index.tz is not None else None
+        with self._lock(symbol, interval):
+            data, meta = self._load(symbol, interval)
+            records = _to_records(df)
+            if data is not None and len(data) and data.dtype == records.dtype and meta["tz"] == tz:
+                # Keep the cached bars before the first new one; only a tail that overlaps the new bars is rebuilt
+                split = int(np.searchsorted(data["timestamp"], records["timestamp"][0], side="left"))
+                tail = data[split:]
+                if len(tail):
+                    stale = np.isin(tail["timestamp"], records["timestamp"])
+                    records = np.concatenate([tail[~stale], records])
+                    records = records[np.argsort(records["timestamp"], kind="stable")]
+                records = np.concatenate([data[:split], records])
+            elif data is not None and len(data):
+                # Columns, their types or the timezone changed: rebuild the whole series
+                cached = self.read(symbol, interval)
+                if df.index.tz is not None and cached.index.tz is not None:
+                    cached.index = cached.index.tz_convert(df.index.tz)
+                df = pd.concat([cached, df])
+                records = _to_records(df[~df.index.duplicated(keep="last")].sort_index())
+            if self.max_sessions:
+                starts = _session_starts(records["timestamp"], tz)
+                if len(starts) > self.max_sessions:
+                    records = records[starts[-self.max_sessions]:]
+            self._write(symbol, interval, records, list(df.columns), tz)
+        return len(records)
+
+    def _write(self, symbol, interval, records, columns, tz):
+        data_path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp_data, tmp_meta = data_path + ".tmp", meta_path + ".tmp"
+        with open(tmp_data, "wb") as f:
+            np.save(f, records)
+        with open(tmp_meta, "w") as f:
+            json.dump({"columns": columns, "tz": tz}, f)
+        os.replace(tmp_meta, meta_path)
+        os.replace(tmp_data, data_path)
+
+def _to_records(df):
+    dtype = [("timestamp", "<i8")] + [
+        (col, "<i8" if pd.api.types.is_integer_dtype(df[col]) else "<f8") for col in df.columns
+    ]
+    records = np.empty(len(df), dtype=dtype)
+    records["timestamp"] = _index_to_utc_ns(df.index)
+    for col in df.columns:
+        records[col] = df[col].to_numpy()
+    return records
+
+def _session_starts(timestamps, tz):
+    # Positions where a new trading date starts, in the series' timezone (timestamps are sorted)
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.int64)
+    index = pd.to_datetime(np.asarray(timestamps), utc=True)
+    local = index.tz_convert(tz).tz_localize(None) if tz else index.tz_localize(None)
+    days = local.as_unit("ns").asi8 // 86_400_000_000_000
+    return np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+
+def _index_to_utc_ns(index):
+    if index.tz is not None:
+        index = index.tz_convert("UTC")
+    return index.as_unit("ns").asi8
+
+def _to_utc_ns(value, tz):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None and tz:
+        ts = ts.tz_localize(tz)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC")
+    return ts.as_unit("ns").value
@@ -0,0 +1,226 @@
+# bars.py
+'''
+Compact columnar container for OHLCV bars, and the indicator kernels that run on it.
+A Bars object holds one NumPy array per field: int64 UTC epoch timestamps (ns), float32 prices,
+int64 volume and an int32 session id (the local trading date, as days since 1970-01-01) precomputed
+once per series. Slicing returns views, and the kernels write into caller-supplied output arrays, so
+indicators never copy the bars or attach helper columns to them.
+Built from a DataFrame (with price_dtype=None the DataFrame's columns are used without copying), or
+straight from the memory-mapped BarStore arrays.
+'''
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+DAY_NS = 86_400 * 10**9
+
+def session_ids(index: pd.DatetimeIndex) -> np.ndarray:
+    '''
+ Local trading date of every timestamp, as int32 days since 1970-01-01.
+    '''
+    if index.tz is not None:
+        index = index.tz_localize(None)  # Wall-clock time in the index's own timezone
+    return (index.as_unit("ns").asi8 // DAY_NS).astype(np.int32)
+
+def session_starts(session: np.ndarray) -> np.ndarray:
+    '''
+ Positions where a new session begins (always includes 0 for a non-empty array).
+    '''
+    if len(session) == 0:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], session[1:] != session[:-1])))
+
+def _session_cumsum(values, session):
+    # Same summation as the old groupby("date").cumsum(), so VWAP values stay bit-identical
+    return pd.Series(values, copy=False).groupby(session, sort=False).cumsum().to_numpy()
+
+def vwap_into(high, low, close, volume, session, out=None) -> np.ndarray:
+    '''
+ Session-anchored VWAP of typical price (high + low + close) / 3.
+ Input:
+   - high, low, close, volume (np.ndarray): Bar fields (any float/int dtype, computed in float64)
+   - session (np.ndarray): Session id per bar
+   - out (np.ndarray): Optional float64 output array of the same length
+ Output:
+   - np.ndarray: out, holding the VWAP per bar
+    '''
+    if out is None:
+        out = np.empty(len(close), dtype=np.float64)
+    np.add(high, low, out=out, dtype=np.float64)
+    np.add(out, close, out=out)
+    np.divide(out, 3, out=out)
+    np.multiply(out, volume, out=out)
+    cum_tp_vol = _session_cumsum(out, session)
+    cum_vol = _session_cumsum(volume, session)
+    np.divide(cum_tp_vol, cum_vol, out=out)
+    return out
+
+def intraday_sma_into(close, session, window, out=None) -> np.ndarray:
+    '''
+ Simple moving average of close over the last `window` bars of the same session
+ (NaN until the session has `window` bars).
+ Input:
+   - close (np.ndarray): Close prices
+   - session (np.ndarray): Session id per bar
+   - window (int): Number of bars in the average
+   - out (np.ndarray): Optional float64 output array of the same length
+ Output:
+   - np.ndarray: out, holding the SMA per bar
+    '''
+    n = len(close)
+    if out is None:
+        out = np.empty(n, dtype=np.float64)
+    out[:] = np.nan
+    if n < window:
+        return out
+    tail = out[window - 1:]
+    np.mean(sliding_window_view(close, window), axis=1, dtype=np.float64, out=tail)
+    tail[session[window - 1:] != session[:n - window + 1]] = np.nan  # Window reaches into the previous session
+    return out
+
+def _take(values, key):
+    return None if values is None else values[key]
+
+class Bars:
+    '''
+ Columnar bar series for one symbol (see module docstring).
+ Input:
+   - timestamp (np.ndarray): int64 UTC epoch nanoseconds, ascending
+   - open, high, low, close (np.ndarray): Prices (open may be None when the source has no opens)
+   - volume (np.ndarray): Volume
+   - session (np.ndarray): Optional int32 session ids (derived from timestamp and tz if omitted)
+   - tz (str): Timezone the sessions are counted in (None for naive timestamps)
+    '''
+    __slots__ = ("timestamp", "open", "high", "low", "close", "volume", "session", "tz", "_index")
+
+    def __init__(self, timestamp, open, high, low, close, volume, session=None, tz=None):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.tz = tz
+        self._index = None
+        self.session = session if session is not None else session_ids(self.index)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, price_dtype=np.float32) -> "Bars":
+        '''
+ Builds Bars from a DataFrame with open/high/low/close/volume columns (lowercase or capitalized).
+ Input:
+   - df (pd.DataFrame): Bars indexed by timestamp
+   - price_dtype: Price dtype (default float32); None keeps the DataFrame's arrays as they are (no copy)
+ Output:
+   - Bars
+        '''
+        columns = {col.lower(): col for col in df.columns}
+        index = df.index
+        tz = str(index.tz) if index.tz is not None else None
+        utc = index.tz_convert("UTC") if index.tz is not None else index
+
+        def column(name, dtype):
+            if name not in columns:
+                return None
+            values = df[columns[name]].to_numpy()
+            return values if dtype is None else values.astype(dtype, copy=False)
+
+        volume = df[columns["volume"]].to_numpy()
+        if price_dtype is not None and not np.issubdtype(volume.dtype, np.integer):
+            volume = np.nan_to_num(volume).round().astype(np.int64)
+
+        return cls(
+            utc.as_unit("ns").asi8,
+            *(column(name, price_dtype) for name in PRICE_FIELDS),
+            volume,
+            session=session_ids(index),
+            tz=tz,
+        )
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, tz=None, price_dtype=np.float32) -> "Bars":
+        '''
+ Builds Bars from a structured array with a 'timestamp' field (UTC ns) and OHLCV fields, such as a
+ memory-mapped BarStore file. Timestamps are used as a view; prices are converted once to price_dtype.
+        '''
+        def field(name, dtype):
+            if name not in records.dtype.names:
+                return None
+            values = np.asarray(records[name])
+            return values if dtype is None else values.astype(dtype)
+
+        volume = np.asarray(records["volume"])
+        if not np.issubdtype(volume.dtype, np.integer):
+            volume = np.nan_to_num(volume).round().astype(np.int64)
+        return cls(np.asarray(records["timestamp"]), *(field(name, price_dtype) for name in PRICE_FIELDS),
+                   volume, tz=tz)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, key) -> "Bars":
+        '''
+ Row selection. A slice returns views of the same arrays; an index array or boolean mask copies.
+        '''
+        if not isinstance(key, slice):
+            key = np.asarray(key)
+        sliced = Bars(self.timestamp[key], *(_take(getattr(self, name), key) for name in PRICE_FIELDS),
+                      self.volume[key], session=self.session[key], tz=self.tz)
+        if self._index is not None:
+            sliced._index = self._index[key]
+        return sliced
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        '''
+ Timestamps as a DatetimeIndex in the series' timezone (built on first use).
+        '''
+        if self._index is None:
+            index = pd.DatetimeIndex(self.timestamp.view("datetime64[ns]"))
+            if self.tz:
+                index = index.tz_localize("UTC").tz_convert(self.tz)
+            index.name = "timestamp"
+            self._index = index
+        return self._index
+
+    @property
+    def nbytes(self) -> int:
+        fields = (getattr(self, name) for name in ("timestamp", *PRICE_FIELDS, "volume", "session"))
+        return sum(values.nbytes for values in fields if values is not None)
+
+    def tail(self, n: int) -> "Bars":
+        return self[max(len(self) - n, 0):]
+
+    def session_slice(self, sessions: int) -> "Bars":
+        '''
+ View of the last N sessions.
+        '''
+        starts = session_starts(self.session)
+        if len(starts) <= sessions:
+            return self
+        return self[int(starts[-sessions]):]
+
+    def between_time(self, start: str, end: str) -> "Bars":
+        '''
+ Bars whose local time of day is within [start, end], like DataFrame.between_time.
+        '''
+        index = self.index
+        wall = index.tz_localize(None) if index.tz is not None else index
+        minutes = (wall.as_unit("ns").asi8 % DAY_NS) // (60 * 10**9)
+        lo, hi = (pd.Timestamp(t).hour * 60 + pd.Timestamp(t).minute for t in (start, end))
+        keep = (minutes >= lo) & (minutes <= hi)
+        return self if keep.all() else self[keep]
+
+    def vwap(self, out=None) -> np.ndarray:
+        return vwap_into(self.high, self.low, self.close, self.volume, self.session, out)
+
+    def intraday_sma(self, window: int, out=None) -> np.ndarray:
+        return intraday_sma_into(self.close, self.session, window, out)
+
+    def to_frame(self) -> pd.DataFrame:
+        '''
+ Lowercase OHLCV DataFrame, e.g. for code that still expects pandas.
+        '''
+        columns = {name: getattr(self, name) for name in (*PRICE_FIELDS, "volume")}
+        return pd.DataFrame({name: values for name, values in columns.items() if values is not None}, index=self.index)
@@ -1,15 +1,15 @@
 # broker_alpaca.py
 '''
- Initializes Alpaca TradingClient using API credentials.
- Input: None (reads from environment variables or hardcoded BASE_URL)
+ Provides the Alpaca TradingClient, using API credentials.
+ Input: None (reads APCA_API_KEY_ID / APCA_API_SECRET_KEY from the environment)
  Output: trading_client object for submitting orders and retrieving account data
+ The client (and alpaca-py itself) is only loaded on first use, through the services container, so
+ importing this module needs neither the credentials nor the network.
 '''
 
-import os
 # from dotenv import load_dotenv # Might not be needed depending on Python installation
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import MarketOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
+import metrics
+import services
 
 # load_dotenv()
 '''
@@ -17,19 +17,28 @@ API_KEY = os.getenv("APCA_API_KEY_ID")
 API_SECRET = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL")
 '''
-API_KEY = os.getenv("APCA_API_KEY_ID")
-API_SECRET = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = "https://paper-api.alpaca.markets"
 
-trading_client = TradingClient(API_KEY, API_SECRET, paper=True)
+def get_trading_client():
+    '''
+ Shared TradingClient, created on the first call.
+    '''
+    return services.get("trading_client")
+
+def __getattr__(name):
+    # broker_alpaca.trading_client still works, but builds the client only when it is first accessed
+    if name == "trading_client":
+        return get_trading_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
+@metrics.timed("alpaca_get_account")
 def get_account_info():
     '''
  Retrieves account information such as cash, buying power, portfolio value, and account status.
  Input: None
  Output: Dictionary with account metrics (cash, buying_power, portfolio_value, status)
     '''
-    account = trading_client.get_account()
+    account = get_trading_client().get_account()
     return {
         "cash": float(account.cash),
         "buying_power": float(account.buying_power),
@@ -37,15 +46,17 @@ def get_account_info():
         "status": account.status
     }
 
+@metrics.timed("alpaca_get_all_positions")
 def get_open_positions():
     '''
  Fetches all currently open positions in the Alpaca account.
  Input: None
  Output: Dictionary mapping ticker symbols to position quantities (as floats)
     '''
-    positions = trading_client.get_all_positions()
+    positions = get_trading_client().get_all_positions()
     return {p.symbol: float(p.qty) for p in positions}
 
+@metrics.timed("alpaca_submit_order")
 def submit_market_order(symbol, qty, side = "buy"):
     '''
  Submits a market order to buy or sell a specified quantity of a stock.
@@ -56,11 +67,13 @@ def submit_market_order(symbol, qty, side = "buy"):
  Output:
    - str: Order ID of the submitted market order
     '''
+    from alpaca.trading.requests import MarketOrderRequest
+    from alpaca.trading.enums import OrderSide, TimeInForce
     order = MarketOrderRequest(
         symbol = symbol,
         qty = qty,
         side = OrderSide.BUY if side == "buy" else OrderSide.SELL,
         time_in_force = TimeInForce.DAY
     )
-    result = trading_client.submit_order(order)
+    result = get_trading_client().submit_order(order)
     return result.id
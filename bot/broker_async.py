@@ -0,0 +1,200 @@
+# broker_async.py
+'''
+Asynchronous front-end for the Alpaca trading API.
+All calls go through one shared TradingClient, i.e. one HTTP connection pool, sized to the number of
+requests allowed in flight. Blocking alpaca-py calls run on a bounded thread pool so several requests
+can overlap; failed calls are retried with exponential backoff, and every call records its latency.
+Every order carries a client order ID generated once, so retrying a submission that may have reached the
+broker can't place it twice: the broker rejects the repeat and the order is looked up by that ID instead.
+Input: an optional TradingClient (defaults to the shared client of the services container)
+alpaca-py and requests are imported when the first broker is created, not when this module is imported.
+'''
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import metrics
+import services
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def _is_retryable(error):
+    from requests.exceptions import ConnectionError, Timeout
+    from alpaca.common.exceptions import APIError
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    if isinstance(error, APIError):
+        try:
+            return error.status_code in RETRY_STATUS_CODES
+        except Exception:
+            return False
+    return False
+
+def _is_duplicate_client_id(error):
+    # Alpaca answers 422 "client_order_id must be unique" for an ID it has already seen
+    from alpaca.common.exceptions import APIError
+    return isinstance(error, APIError) and error.status_code == 422 and "client_order_id" in str(error)
+
+def _timed_call(func, args):
+    # Timed on the worker thread, so latency excludes time spent waiting for a free worker
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+class AsyncBroker:
+    def __init__(self, client=None, max_concurrency=8, retries=3, backoff=0.25):
+        from requests.adapters import HTTPAdapter
+        if client is None:
+            client = services.get("trading_client")
+        self.client = client
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="alpaca")
+        self._latencies = {}   # call name -> list of seconds
+        self._errors = {}      # call name -> failed attempts
+
+        # One pool of keep-alive connections, large enough for every request in flight
+        session = getattr(client, "_session", None)
+        if session is not None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+    async def _call(self, name, func, *args):
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                result, elapsed = await loop.run_in_executor(self._executor, _timed_call, func, args)
+                self._latencies.setdefault(name, []).append(elapsed)
+                metrics.observe(f"alpaca_{name}", elapsed)
+                return result
+            except Exception as e:
+                self._errors[name] = self._errors.get(name, 0) + 1
+                metrics.incr(f"alpaca_{name}_errors")
+                if attempt >= self.retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+
+    async def get_account_info(self):
+        '''
+ Same result as broker_alpaca.get_account_info, without blocking the event loop.
+        '''
+        account = await self._call("get_account", self.client.get_account)
+        return {
+            "cash": float(account.cash),
+            "buying_power": float(account.buying_power),
+            "portfolio_value": float(account.portfolio_value),
+            "equity": float(account.equity),
+            "status": account.status
+        }
+
+    async def get_open_positions(self):
+        '''
+ Same result as broker_alpaca.get_open_positions: ticker -> quantity.
+        '''
+        positions = await self._call("get_all_positions", self.client.get_all_positions)
+        return {p.symbol: float(p.qty) for p in positions}
+
+    async def get_position_prices(self):
+        '''
+ Open positions with the broker's latest and average entry price, for stop checks between bar closes
+ and for reconciling the position journal.
+ Output: dict of ticker -> {qty, price, entry_price} (NaN price / None entry_price if not reported)
+        '''
+        positions = await self._call("get_all_positions", self.client.get_all_positions)
+        return {
+            p.symbol: {"qty": float(p.qty), "price": float(p.current_price) if p.current_price else float("nan"),
+                       "entry_price": float(p.avg_entry_price) if p.avg_entry_price else None}
+            for p in positions
+        }
+
+    async def snapshot(self):
+        '''
+ Fetches account and positions concurrently, once per cycle.
+ Output: dict with 'account' (see get_account_info) and 'positions' (ticker -> quantity)
+        '''
+        account, positions = await asyncio.gather(self.get_account_info(), self.get_open_positions())
+        return {"account": account, "positions": positions}
+
+    async def submit_market_order(self, symbol, qty, side="buy"):
+        '''
+ Submits a day market order and returns its order ID.
+ Retries reuse the order's client order ID; if an earlier attempt was placed after all (e.g. the
+ response timed out), the retry is rejected as a duplicate and the placed order is returned.
+        '''
+        from alpaca.trading.requests import MarketOrderRequest
+        from alpaca.trading.enums import OrderSide, TimeInForce
+        client_order_id = str(uuid.uuid4())
+        order = MarketOrderRequest(
+            symbol = symbol,
+            qty = qty,
+            side = OrderSide.BUY if side == "buy" else OrderSide.SELL,
+            time_in_force = TimeInForce.DAY,
+            client_order_id = client_order_id
+        )
+        try:
+            result = await self._call("submit_order", self.client.submit_order, order)
+        except Exception as e:
+            if not _is_duplicate_client_id(e):
+                raise
+            result = await self._call("get_order", self.client.get_order_by_client_id, client_order_id)
+        return result.id
+
+    async def get_order(self, order_id):
+        '''
+ Current state of an order.
+ Output: dict with id, status (e.g. "new", "partially_filled", "filled", "rejected"), filled_qty and
+ filled_avg_price (None until something is filled)
+        '''
+        order = await self._call("get_order", self.client.get_order_by_id, order_id)
+        status = getattr(order.status, "value", order.status)
+        return {
+            "id": str(order.id),
+            "status": str(status),
+            "filled_qty": float(order.filled_qty or 0),
+            "filled_avg_price": float(order.filled_avg_price) if order.filled_avg_price else None,
+        }
+
+    async def submit_orders(self, orders):
+        '''
+ Submits several market orders concurrently.
+ Input:
+   - orders (list of tuples): (symbol, qty, side)
+ Output:
+   - list: Order ID, or the exception raised, for each order in the same order
+        '''
+        return await asyncio.gather(
+            *(self.submit_market_order(symbol, qty, side) for symbol, qty, side in orders),
+            return_exceptions=True
+        )
+
+    def latency_stats(self):
+        '''
+ Per-call latency summary.
+ Output: dict of call name -> {count, errors, mean_ms, p50_ms, p95_ms, max_ms}
+        '''
+        stats = {}
+        for name in set(self._latencies) | set(self._errors):
+            samples = np.array(self._latencies.get(name, [])) * 1000
+            stats[name] = {
+                "count": len(samples),
+                "errors": self._errors.get(name, 0),
+                "mean_ms": float(samples.mean()) if len(samples) else 0.0,
+                "p50_ms": float(np.percentile(samples, 50)) if len(samples) else 0.0,
+                "p95_ms": float(np.percentile(samples, 95)) if len(samples) else 0.0,
+                "max_ms": float(samples.max()) if len(samples) else 0.0,
+            }
+        return stats
+
+    def reset_stats(self):
+        '''
+ Clears the latency samples and error counts (e.g. at the start of each cycle).
+        '''
+        self._latencies = {}
+        self._errors = {}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
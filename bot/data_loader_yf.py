@@ -1,65 +1,164 @@
-import yfinance as yf
+import os
+import re
+import datetime as dt
 import pandas as pd
+import metrics
+from bar_store import BarStore
+from bars import Bars
 
-def get_intraday_data(symbol: str, interval: str = "15m", period: str = "5d") -> pd.DataFrame:
+BAR_CACHE_DIR = os.getenv("BAR_CACHE_DIR", "bar_cache")
+MAX_TOP_UP_GAP = dt.timedelta(days=7)  # Older caches are refreshed with a full download instead of a top-up
+
+_bar_store = None
+
+def get_bar_store() -> BarStore:
+    '''
+ Returns the shared on-disk bar cache (created on first use under BAR_CACHE_DIR).
+    '''
+    global _bar_store
+    if _bar_store is None:
+        _bar_store = BarStore(BAR_CACHE_DIR)
+    return _bar_store
+
+@metrics.timed("yahoo_download")
+def _download(symbol: str, interval: str, **kwargs) -> pd.DataFrame:
+    '''
+ Downloads bars from Yahoo and flattens the columns to lowercase names ('open', 'high', ..., 'volume').
+    '''
+    import yfinance as yf  # Imported on the first download, not at startup
+    df = yf.download(
+        tickers=symbol,
+        interval=interval,
+        progress=False,
+        auto_adjust=False,  # Explicitly set to avoid unexpected column formats
+        **kwargs
+    )
+
+    # Flatten and clean column names
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join(col).strip().lower().replace(f"_{symbol.lower()}", "") for col in df.columns]
+    else:
+        df.columns = [col.lower().replace(f"_{symbol.lower()}", "") for col in df.columns]
+
+    df.index.name = "timestamp"
+    return df
+
+def _last_sessions(df: pd.DataFrame, sessions: int) -> pd.DataFrame:
+    '''
+ Keeps the bars of the last N trading dates, like Yahoo's "Nd" period.
+    '''
+    if df.empty:
+        return df
+    dates = df.index.date
+    keep = sorted(set(dates))[-sessions:]
+    return df[dates >= keep[0]]
+
+def get_cached_bars(symbol: str, interval: str, sessions: int) -> pd.DataFrame:
+    '''
+ Returns the last N sessions of bars for a symbol, downloading only what the local cache is missing.
+ When the cache is recent enough, only the bars from the start of the last cached session onwards are
+ downloaded (so the bar that was still forming gets replaced) and merged into the cache.
+ Input:
+   - symbol (str): Ticker symbol of the stock
+   - interval (str): Yahoo bar interval (e.g., "5m", "60m")
+   - sessions (int): Number of trading days to return
+ Output:
+   - pd.DataFrame: Bars with lowercase OHLCV columns, read from the cache
+    '''
+    store = get_bar_store()
+    last = store.last_timestamp(symbol, interval)
+    now = pd.Timestamp.now(tz=last.tz) if last is not None else None
+
+    if last is None or now - last > MAX_TOP_UP_GAP or store.sessions(symbol, interval) < sessions:
+        metrics.incr("bar_cache_full_download")
+        fresh = _download(symbol, interval, period=f"{sessions}d")
+    else:
+        metrics.incr("bar_cache_top_up")
+        fresh = _download(symbol, interval, start=last.strftime("%Y-%m-%d"))
+
+    store.merge(symbol, interval, fresh.dropna())
+    return _last_sessions(store.read(symbol, interval), sessions)
+
+def load_cached_bars(symbol: str, interval: str = "5m", start=None, end=None) -> pd.DataFrame:
+    '''
+ Reads bars from the local cache only (no network), e.g. for offline backtests.
+ Input:
+   - symbol (str): Ticker symbol of the stock
+   - interval (str): Bar interval (default is "5m")
+   - start, end (timestamp-like): Optional inclusive bounds
+ Output:
+   - pd.DataFrame: Cached bars with lowercase OHLCV columns (empty if nothing is cached)
+    '''
+    return get_bar_store().read(symbol, interval, start=start, end=end)
+
+def load_bars(symbol: str, interval: str = "5m", start=None, end=None, regular_hours: bool = True) -> Bars:
+    '''
+ Reads cached bars from the local cache as a compact Bars container (no network, no DataFrame),
+ e.g. to feed backtest_batch with hundreds of symbols.
+ Input:
+   - symbol (str): Ticker symbol of the stock
+   - interval (str): Bar interval (default is "5m")
+   - start, end (timestamp-like): Optional inclusive bounds
+   - regular_hours (bool): If True, keep only 09:30–15:30 bars, like get_5min_data
+ Output:
+   - Bars: Cached bars, or None if nothing is cached
+    '''
+    bars = get_bar_store().read_bars(symbol, interval, start=start, end=end)
+    if bars is None or not regular_hours:
+        return bars
+    return bars.between_time("09:30", "15:30")
+
+def get_intraday_data(symbol: str, interval: str = "15m", period: str = "5d", use_cache: bool = True) -> pd.DataFrame:
     '''
  Fetches intraday OHLCV data for a given stock symbol using yfinance.
  Input:
    - symbol (str): Ticker symbol of the stock
    - interval (str): Time interval between data points (e.g., "1m", "5m", "15m")
    - period (str): Time span of data to retrieve (e.g., "1d", "5d")
+   - use_cache (bool): If True and period is in days, serve from the local bar cache and only top it up
  Output:
    - pd.DataFrame: DataFrame containing OHLCV data with timestamps as index
     '''
-    df = yf.download(
-        tickers=symbol,
-        interval=interval,
-        period=period,
-        progress=False,
-        auto_adjust=False  # Explicitly set to avoid unexpected column formats
-    )
+    days = re.fullmatch(r"(\d+)d", period)
+    if use_cache and days:
+        df = get_cached_bars(symbol, interval, int(days.group(1)))
+    else:
+        df = _download(symbol, interval, period=period)
 
     if df.empty:
         raise ValueError(f"No data returned for {symbol} with interval={interval} and period={period}")
     
-    df.dropna(inplace=True)
+    df = df.dropna()
     df.index.name = "Timestamp"
-
-    # Handle multi-level columns if present
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = ['_'.join(col).strip().capitalize() for col in df.columns.values]
-    else:
-        df.columns = [col.capitalize() for col in df.columns]
+    df.columns = [col.capitalize() for col in df.columns]
 
     return df
 
-def get_5min_data(symbol: str, days_back: int = 5) -> pd.DataFrame:
+def get_5min_data(symbol: str, days_back: int = 5, use_cache: bool = True) -> pd.DataFrame:
     '''
  Retrieves 5-minute interval intraday data for the past N weekdays, filtered to regular market hours.
  Input:
    - symbol (str): Ticker symbol of the stock
    - days_back (int): Number of past days to retrieve (default is 5)
+   - use_cache (bool): If True, serve from the local bar cache and only download the missing bars
  Output:
    - pd.DataFrame: Cleaned DataFrame with 5-minute OHLCV data during market hours (09:30–15:30)
     '''
 
-    df = yf.download(
-        tickers=symbol,
-        period=f"{days_back}d",
-        interval="5m",
-        progress=False,
-        auto_adjust=False
-    )
+    if use_cache:
+        df = get_cached_bars(symbol, "5m", days_back)
+    else:
+        df = _download(symbol, "5m", period=f"{days_back}d")
+
+    return regular_hours(df)
 
+def regular_hours(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+ Keeps weekday bars between 09:30 and 15:30 and drops incomplete rows (returns a new DataFrame).
+    '''
     df = df[df.index.dayofweek < 5]
     df = df.between_time("09:30", "15:30")
-    df.dropna(inplace=True)
-
-    # Flatten and clean column names
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = ['_'.join(col).strip().lower().replace(f"_{symbol.lower()}", "") for col in df.columns]
-    else:
-        df.columns = [col.lower().replace(f"_{symbol.lower()}", "") for col in df.columns]
+    df = df.dropna()
 
     df.index.name = "timestamp"
 
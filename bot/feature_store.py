@@ -0,0 +1,190 @@
+# feature_store.py
+'''
+On-disk store of computed indicator columns, keyed by symbol, session, indicator and parameters.
+Every session of the input bars gets a content hash (its timestamps and OHLCV values). An indicator
+value of a session is stored under a key made of the indicator, its parameters and the hashes of all
+sessions it depends on: the session itself for session-anchored indicators (VWAP, intraday SMA), plus
+the previous `period` + 1 sessions for the daily ATR (the oldest one for its close), or the visible
+hourly history for the trend SMA.
+A lookup hashes the sessions, serves every session whose key is already stored, and computes only the
+missing ones (on the shortest slice of bars that covers their dependencies). Changed or extended
+history changes the keys, so stale values are never served.
+Values are stored per (interval, symbol, indicator, parameters) in one .npz file under FEATURE_STORE_DIR,
+rewritten atomically when new sessions are added. Hits and misses are counted per session (also as the
+feature_store_hits / feature_store_misses metrics); hit_rate() is the share of sessions not recomputed.
+'''
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+import metrics
+from bars import session_ids, session_starts
+
+FEATURE_STORE_DIR = os.getenv("BOT_FEATURE_STORE_DIR", "feature_store")
+MAX_ENTRIES = 20_000   # Stored sessions per file; the oldest entries are dropped beyond that
+
+def _vwap(df):
+    from indicators import calculate_vwap
+    return calculate_vwap(df).to_numpy()
+
+def _intraday_sma(df, window=20):
+    from indicators import calculate_intraday_sma
+    return calculate_intraday_sma(df, window).to_numpy()
+
+def _daily_atr(df, period=14):
+    from backtester import daily_atr_from_intraday
+    return daily_atr_from_intraday(df, period)
+
+def _trend_sma(df, window=50, sessions=5):
+    from simulator import hourly_trend_sma
+    return hourly_trend_sma(df, window, sessions)
+
+# Indicator -> (function(df, **params) -> per-bar array, earlier sessions a session's values depend on)
+FEATURES = {
+    "vwap": (_vwap, lambda: 0),
+    "intraday_sma": (_intraday_sma, lambda window=20: 0),
+    "daily_atr": (_daily_atr, lambda period=14: period + 1),   # The first true range needs the close before it
+    "trend_sma": (_trend_sma, lambda window=50, sessions=5: sessions - 1),
+}
+
+def session_hashes(df: pd.DataFrame, starts: np.ndarray) -> list:
+    '''
+ 16-byte content hash of every session (timestamps and every numeric column, as float64).
+    '''
+    timestamps = df.index.as_unit("ns").asi8
+    columns = [df[col].to_numpy(dtype=np.float64) for col in sorted(df.columns)
+               if pd.api.types.is_numeric_dtype(df[col])]
+    ends = np.append(starts[1:], len(df))
+    hashes = []
+    for lo, hi in zip(starts, ends):
+        digest = hashlib.blake2b(timestamps[lo:hi].tobytes(), digest_size=16)
+        for values in columns:
+            digest.update(values[lo:hi].tobytes())
+        hashes.append(digest.digest())
+    return hashes
+
+class FeatureStore:
+    '''
+ Persistent indicator cache (see module docstring).
+ Input:
+   - root (str): Folder of the stored features (created on the first write)
+ Usage:
+   store = FeatureStore("feature_store")
+   vwap = store.get("AAPL", df, "vwap")
+   atr = store.get("AAPL", df, "daily_atr", period=14)
+   store.hit_rate()
+    '''
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Picklable for worker processes: each process keeps its own counters, to be reported back with count()
+        return {"root": self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"])
+
+    def _path(self, symbol, interval, feature, params):
+        name = feature + "".join(f"_{key}={params[key]}" for key in sorted(params))
+        return os.path.join(self.root, interval, symbol.upper(), f"{name}.npz")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return {}
+        with np.load(path) as data:
+            keys, offsets, values = data["keys"], data["offsets"], data["values"]
+        return {key.tobytes(): values[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+    def _write(self, path, entries):
+        if len(entries) > MAX_ENTRIES:
+            entries = dict(list(entries.items())[-MAX_ENTRIES:])
+        # Raw bytes, not an "S16" array: that would drop trailing zero bytes of a digest
+        keys = np.frombuffer(b"".join(entries), dtype=np.uint8).reshape(-1, 16)
+        lengths = [len(v) for v in entries.values()]
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        values = np.concatenate(list(entries.values())) if entries else np.array([])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, offsets=offsets, values=values)
+        os.replace(tmp_path, path)
+
+    def get(self, symbol: str, df: pd.DataFrame, feature: str, interval: str = "5m", **params) -> np.ndarray:
+        '''
+ Indicator values for every bar of df, from the store where possible.
+ Input:
+   - symbol (str): Ticker symbol
+   - df (pd.DataFrame): Bars indexed by timestamp (whole sessions)
+   - feature (str): One of FEATURES ("vwap", "intraday_sma", "daily_atr", "trend_sma")
+   - interval (str): Bar interval of df
+   - params: Indicator parameters (window=..., period=..., sessions=...)
+ Output:
+   - np.ndarray: float64 value per bar, same as computing the indicator on df directly
+        '''
+        compute, lookback = FEATURES[feature]
+        depth = lookback(**params)
+        out = np.empty(len(df))
+        if len(df) == 0:
+            return out
+        starts = session_starts(session_ids(df.index))
+        ends = np.append(starts[1:], len(df))
+        hashes = session_hashes(df, starts)
+
+        prefix = repr((feature, sorted(params.items()))).encode()
+        keys = []
+        for k in range(len(starts)):
+            digest = hashlib.blake2b(prefix, digest_size=16)
+            for h in hashes[max(k - depth, 0):k + 1]:
+                digest.update(h)
+            keys.append(digest.digest())
+
+        path = self._path(symbol, interval, feature, params)
+        with self._lock:
+            entries = self._read(path)
+        missing = [k for k, key in enumerate(keys) if key not in entries]
+        for k, key in enumerate(keys):
+            if key in entries:
+                out[starts[k]:ends[k]] = entries[key]
+
+        if missing:
+            # One computation over the bars from the first missing session's dependencies to the last missing session
+            first = max(missing[0] - depth, 0)
+            lo, hi = starts[first], ends[missing[-1]]
+            values = np.asarray(compute(df.iloc[lo:hi], **params), dtype=np.float64)
+            new = {}
+            for k in missing:
+                segment = values[starts[k] - lo:ends[k] - lo]
+                out[starts[k]:ends[k]] = segment
+                new[keys[k]] = segment.copy()
+            with self._lock:
+                entries = self._read(path)
+                entries.update(new)
+                self._write(path, entries)
+
+        self.count(len(keys) - len(missing), len(missing))
+        return out
+
+    def count(self, hits, misses):
+        '''
+ Adds session lookups to the counters and metrics, also those made by a worker process's copy of the
+ store (whose counters start at zero and are lost with the process).
+        '''
+        self.hits += hits
+        self.misses += misses
+        metrics.incr("feature_store_hits", hits)
+        metrics.incr("feature_store_misses", misses)
+
+    def hit_rate(self) -> float:
+        '''
+ Share of looked-up sessions served from the store (NaN before the first lookup).
+        '''
+        total = self.hits + self.misses
+        return self.hits / total if total else float("nan")
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
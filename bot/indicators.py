@@ -2,41 +2,466 @@
 
 # Implements VWAP strategy using 20-bar simple moving average
 
+import os
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import metrics
+from bars import Bars, session_ids, vwap_into, intraday_sma_into
 
-def calculate_vwap(df: pd.DataFrame) -> pd.Series:
+ATR_PERIOD = 14
+ATR_METHODS = ("sma", "wilder")
+
+@metrics.timed()
+def calculate_vwap(df) -> pd.Series:
     '''
  Calculates the Volume Weighted Average Price (VWAP) for each trading day.
  Input:
-   - df (pd.DataFrame): DataFrame with columns 'high', 'low', 'close', and 'volume', indexed by timestamp
+   - df (pd.DataFrame or Bars): Bars with 'high', 'low', 'close' and 'volume', indexed by timestamp
  Output:
    - pd.Series: VWAP values aligned with the original DataFrame index
     '''
-    df = df.copy()
-    df["typical_price"] = (df["high"] + df["low"] + df["close"]) / 3
-    df["tp_x_volume"] = df["typical_price"] * df["volume"]
-    df["date"] = df.index.date
-
-    df["cum_tp_vol"] = df.groupby("date")["tp_x_volume"].cumsum()
-    df["cum_vol"] = df.groupby("date")["volume"].cumsum()
+    if isinstance(df, Bars):
+        return pd.Series(df.vwap(), index=df.index, name="vwap")
 
-    vwap = df["cum_tp_vol"] / df["cum_vol"]
-    vwap.name = "vwap"
-    return vwap
+    vwap = vwap_into(
+        df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy(), df["volume"].to_numpy(),
+        session_ids(df.index)
+    )
+    return pd.Series(vwap, index=df.index, name="vwap")
 
 
-def calculate_intraday_sma(df: pd.DataFrame, window) -> pd.Series:
+@metrics.timed()
+def calculate_intraday_sma(df, window) -> pd.Series:
     '''
  Computes a simple moving average (SMA) of the 'close' price for each trading day using a rolling window.
  Input:
-   - df (pd.DataFrame): DataFrame with a datetime index and a 'close' column
+   - df (pd.DataFrame or Bars): Bars with a datetime index and a 'close' column
    - window (int): Number of bars to include in the moving average calculation
  Output:
    - pd.Series: Intraday SMA values with the same index as the input DataFrame
     '''
+    if isinstance(df, Bars):
+        return pd.Series(df.intraday_sma(window), index=df.index, name=f"sma_{window}")
+
+    sma = intraday_sma_into(df["close"].to_numpy(), session_ids(df.index), window)
+    return pd.Series(sma, index=df.index, name=f"sma_{window}")
+
+
+def _bar_timestamp(bar):
+    '''
+ Returns the timestamp of a single bar: the 'timestamp' key if present, otherwise the row label (bar.name).
+    '''
+    if "timestamp" in bar:
+        return pd.Timestamp(bar["timestamp"])
+    return pd.Timestamp(bar.name)
+
+
+class IncrementalVWAP:
+    '''
+ Streaming VWAP that keeps running cumulative TP*V and volume for the current session and resets at each
+ session (calendar date) boundary. Feeding the bars of a frame in order gives the same values as
+ calculate_vwap on that frame, but each new bar costs O(1) instead of a full recompute.
+ A bar with the same timestamp as the last one replaces it (Yahoo keeps revising the bar that is still forming).
+    '''
+
+    def __init__(self):
+        self.session = None
+        self.cum_tp_vol = 0.0
+        self.cum_vol = 0
+        self._compensation = (0.0, 0.0)  # Kahan compensation terms, same summation as pandas' groupby cumsum
+        self.last_timestamp = None
+        self._prev_state = (None, 0.0, 0, (0.0, 0.0))  # state before the last bar, used to revise it
+        self.timestamps = []
+        self.values = []
+
+    def update(self, bar) -> float:
+        '''
+ Adds one bar and returns its VWAP.
+ Input:
+   - bar (pd.Series or dict): Bar with 'high', 'low', 'close', 'volume' and a timestamp (row label or 'timestamp' key)
+ Output:
+   - float: VWAP at this bar, or None if the bar is older than the last one already processed
+        '''
+        return self._push(_bar_timestamp(bar), bar["high"], bar["low"], bar["close"], bar["volume"])
+
+    @metrics.timed("vwap_update")
+    def update_many(self, bars: pd.DataFrame) -> pd.Series:
+        '''
+ Adds every bar that is newer than (or revises) the last processed bar. Older bars are skipped,
+ so the full history can be passed every cycle and only the new tail is processed.
+ Input:
+   - bars (pd.DataFrame): DataFrame with 'high', 'low', 'close', 'volume', indexed by timestamp
+ Output:
+   - pd.Series: VWAP values for the bars that were processed
+        '''
+        new = bars.iloc[_first_new_bar(bars.index, self.last_timestamp):]
+        values = [
+            self._push(timestamp, high, low, close, volume)
+            for timestamp, high, low, close, volume in zip(
+                new.index, new["high"].tolist(), new["low"].tolist(),
+                new["close"].tolist(), new["volume"].tolist()
+            )
+        ]
+        return pd.Series(values, index=new.index, name="vwap", dtype=float)
+
+    def series(self) -> pd.Series:
+        '''
+ Returns every VWAP value computed so far as a Series indexed by timestamp.
+        '''
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.timestamps), name="vwap", dtype=float)
+
+    def trim(self, before):
+        '''
+ Drops stored history older than the given timestamp. The running session state is kept.
+        '''
+        keep = _first_new_bar(pd.DatetimeIndex(self.timestamps), before)
+        del self.timestamps[:keep]
+        del self.values[:keep]
+
+    def _push(self, timestamp, high, low, close, volume):
+        if self.last_timestamp is not None:
+            if timestamp < self.last_timestamp:
+                return None
+            if timestamp == self.last_timestamp:
+                self.session, self.cum_tp_vol, self.cum_vol, self._compensation = self._prev_state
+                self.timestamps.pop()
+                self.values.pop()
+
+        self._prev_state = (self.session, self.cum_tp_vol, self.cum_vol, self._compensation)
+
+        session = timestamp.date()
+        if session != self.session:
+            self.session = session
+            self.cum_tp_vol = 0.0
+            self.cum_vol = 0
+            self._compensation = (0.0, 0.0)
+
+        typical_price = (high + low + close) / 3
+        tp_comp, vol_comp = self._compensation
+        self.cum_tp_vol, tp_comp = _kahan_add(self.cum_tp_vol, tp_comp, typical_price * volume)
+        self.cum_vol, vol_comp = _kahan_add(self.cum_vol, vol_comp, volume)
+        self._compensation = (tp_comp, vol_comp)
+        vwap = _safe_divide(self.cum_tp_vol, self.cum_vol)
+
+        self.last_timestamp = timestamp
+        self.timestamps.append(timestamp)
+        self.values.append(vwap)
+        return vwap
+
+
+class IncrementalIntradaySMA:
+    '''
+ Streaming intraday SMA of 'close' with a rolling window that resets at each session boundary.
+ Gives the same values as calculate_intraday_sma (NaN until the session has `window` bars).
+ A bar with the same timestamp as the last one replaces it.
+    '''
+
+    def __init__(self, window=20):
+        self.window = window
+        self.session = None
+        self.closes = []  # closes of the current session
+        self.last_timestamp = None
+        self._prev_state = (None, [])
+        self.timestamps = []
+        self.values = []
+
+    def update(self, bar) -> float:
+        '''
+ Adds one bar and returns its SMA.
+ Input:
+   - bar (pd.Series or dict): Bar with a 'close' and a timestamp (row label or 'timestamp' key)
+ Output:
+   - float: SMA at this bar (NaN during the warm-up), or None if the bar is older than the last one processed
+        '''
+        return self._push(_bar_timestamp(bar), bar["close"])
+
+    @metrics.timed("sma_update")
+    def update_many(self, bars: pd.DataFrame) -> pd.Series:
+        '''
+ Adds every bar that is newer than (or revises) the last processed bar; older bars are skipped.
+ Input:
+   - bars (pd.DataFrame): DataFrame with a 'close' column, indexed by timestamp
+ Output:
+   - pd.Series: SMA values for the bars that were processed
+        '''
+        new = bars.iloc[_first_new_bar(bars.index, self.last_timestamp):]
+        values = [
+            self._push(timestamp, close)
+            for timestamp, close in zip(new.index, new["close"].tolist())
+        ]
+        return pd.Series(values, index=new.index, name="sma", dtype=float)
+
+    def series(self) -> pd.Series:
+        '''
+ Returns every SMA value computed so far as a Series indexed by timestamp.
+        '''
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.timestamps), name="sma", dtype=float)
+
+    def trim(self, before):
+        '''
+ Drops stored history older than the given timestamp. The running session window is kept.
+        '''
+        keep = _first_new_bar(pd.DatetimeIndex(self.timestamps), before)
+        del self.timestamps[:keep]
+        del self.values[:keep]
+
+    def _push(self, timestamp, close):
+        if self.last_timestamp is not None:
+            if timestamp < self.last_timestamp:
+                return None
+            if timestamp == self.last_timestamp:
+                self.session, self.closes = self._prev_state
+                self.timestamps.pop()
+                self.values.pop()
+
+        session = timestamp.date()
+        if session != self.session:
+            # Keep the old window around in case this bar gets revised
+            self._prev_state = (self.session, self.closes)
+            self.session = session
+            self.closes = [close]
+        else:
+            self._prev_state = (self.session, self.closes[:])
+            self.closes.append(close)
+            if len(self.closes) > self.window:
+                del self.closes[0]
+
+        if len(self.closes) < self.window:
+            sma = float("nan")
+        else:
+            sma = sum(self.closes) / self.window
+
+        self.last_timestamp = timestamp
+        self.timestamps.append(timestamp)
+        self.values.append(sma)
+        return sma
+
+
+def _first_new_bar(index, last_timestamp):
+    '''
+ Position of the first bar in a sorted index at or after last_timestamp (0 if nothing was processed yet).
+ The bar equal to last_timestamp is included so that a revised bar gets re-processed.
+    '''
+    if last_timestamp is None or len(index) == 0:
+        return 0
+    return int(index.searchsorted(last_timestamp))
+
+
+def _kahan_add(total, compensation, value):
+    '''
+ One step of Kahan summation. Returns the new (total, compensation); exact for integer inputs.
+    '''
+    y = value - compensation
+    t = total + y
+    return t, (t - total) - y
+
+
+def _safe_divide(numerator, denominator):
+    '''
+ Division with the same result as pandas for a zero denominator (NaN for 0/0, +/-inf otherwise).
+    '''
+    if denominator == 0:
+        if numerator == 0 or numerator != numerator:
+            return float("nan")
+        return float("inf") if numerator > 0 else float("-inf")
+    return numerator / denominator
+
+
+def align_valid_right(high, low, close):
+    '''
+ Moves each row's valid bars (no NaN in high, low or close) to the right end, keeping their order, so
+ rows with missing days line up on their latest bar. Missing days are skipped rather than breaking the
+ true range, the same as computing each symbol on its own download.
+ Input:
+   - high, low, close (np.ndarray): 2-D arrays shaped (symbols, bars), oldest bar first
+ Output:
+   - (high, low, close, valid_count): aligned float64 arrays and the number of valid bars per row
+    '''
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    valid = ~(np.isnan(high) | np.isnan(low) | np.isnan(close))
+    count = valid.sum(axis=1)
+    if count.min(initial=high.shape[1]) == high.shape[1]:
+        return high, low, close, count
+    order = np.argsort(valid, axis=1, kind="stable")
+    return (np.take_along_axis(high, order, axis=1), np.take_along_axis(low, order, axis=1),
+            np.take_along_axis(close, order, axis=1), count)
+
+
+def true_range_2d(high, low, close) -> np.ndarray:
+    '''
+ True range per bar of 2-D (symbols x bars) arrays. The first bar of a row (no previous close) falls
+ back to high - low, as DataFrame.max(axis=1) skipping NaN does.
+    '''
+    prev_close = np.empty_like(close)
+    prev_close[:, 0] = np.nan
+    prev_close[:, 1:] = close[:, :-1]
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr_2d(high, low, close, period=ATR_PERIOD, method="sma") -> np.ndarray:
+    '''
+ ATR series for a stacked (symbols x bars) panel in one pass over the arrays.
+ A value needs period + 1 valid bars, so the `period` true ranges behind it all have a previous close.
+ Input:
+   - high, low, close (np.ndarray): 2-D arrays shaped (symbols, bars), oldest bar first; rows must be
+     gap-free (leading NaN is fine), see align_valid_right
+   - period (int): Number of bars in the average
+   - method (str): "sma" (simple average of the last `period` true ranges) or "wilder" (Wilder's
+     smoothing, seeded with the first SMA value)
+ Output:
+   - np.ndarray: ATR per symbol and bar, NaN where it is not defined yet
+    '''
+    if method not in ATR_METHODS:
+        raise ValueError(f"Unknown ATR method: {method}")
+    high, low, close = (np.atleast_2d(np.asarray(a, dtype=float)) for a in (high, low, close))
+    n, m = close.shape
+    out = np.full((n, m), np.nan)
+    if m < period + 1:
+        return out
+    true_range = true_range_2d(high, low, close)
+    # Window means (not differences of a running sum), so no cancellation error builds up over long series
+    sma = np.full((n, m), np.nan)
+    sma[:, period - 1:] = sliding_window_view(true_range, period, axis=1).mean(axis=-1)
+    first_valid = np.argmax(~np.isnan(close), axis=1)
+    first_value = first_valid + period
+    defined = np.arange(m) >= first_value[:, None]
+    if method == "sma":
+        out[defined] = sma[defined]
+        return out
+
+    for t in range(int(first_value.min()), m):
+        smoothed = (out[:, t - 1] * (period - 1) + true_range[:, t]) / period
+        out[:, t] = np.where(first_value == t, sma[:, t], smoothed)
+    return out
+
+
+def latest_atr(high, low, close, period=ATR_PERIOD, method="sma") -> np.ndarray:
+    '''
+ Latest ATR per symbol of a (symbols x days) panel that may have missing days.
+ Output:
+   - np.ndarray: ATR per symbol, NaN where there are fewer than period + 1 valid days
+    '''
+    high, low, close, count = align_valid_right(high, low, close)
+    if high.shape[1] < period + 1:
+        return np.full(high.shape[0], np.nan)
+    if method == "sma":
+        atr = true_range_2d(high, low, close)[:, -period:].mean(axis=1)
+    else:
+        atr = atr_2d(high, low, close, period, method)[:, -1]
+    atr[count < period + 1] = np.nan
+    return atr
+
+
+class ATREngine:
+    '''
+ Incremental ATR for a fixed universe of symbols. The state per symbol is the last `period` true ranges,
+ the previous close and the current ATR, so each new daily bar is one vectorized update over the whole
+ universe instead of a recompute of the history. update() gives the same values as latest_atr on the
+ extended history. The state can be saved and loaded (one small .npz), so it is computed once per
+ trading day.
+ Input:
+   - symbols (list): Universe, in the order of the update arrays
+   - period (int): ATR period
+   - method (str): "sma" or "wilder"
+    '''
+    def __init__(self, symbols, period=ATR_PERIOD, method="sma"):
+        if method not in ATR_METHODS:
+            raise ValueError(f"Unknown ATR method: {method}")
+        self.symbols = list(symbols)
+        self.period = period
+        self.method = method
+        n = len(self.symbols)
+        self.window = np.full((n, period), np.nan)  # Last `period` true ranges, oldest first
+        self.prev_close = np.full(n, np.nan)
+        self.days = np.zeros(n, dtype=np.int64)      # Valid bars seen per symbol
+        self.atr = np.full(n, np.nan)
+        self.as_of = None                              # Date of the last bar applied
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_history(cls, symbols, high, low, close, period=ATR_PERIOD, method="sma", as_of=None) -> "ATREngine":
+        '''
+ Builds the state from a (symbols x days) history panel (missing days are skipped).
+        '''
+        engine = cls(symbols, period, method)
+        high, low, close, count = align_valid_right(high, low, close)
+        m = close.shape[1]
+        if m:
+            true_range = true_range_2d(high, low, close)
+            k = min(period, m)
+            engine.window[:, period - k:] = true_range[:, -k:]
+            engine.prev_close = close[:, -1].copy()
+            engine.days = count.astype(np.int64)
+            engine.atr = latest_atr(high, low, close, period, method)
+        engine.as_of = as_of
+        return engine
+
+    def update(self, high, low, close, as_of=None) -> np.ndarray:
+        '''
+ Applies one new bar per symbol (arrays aligned with symbols; a NaN field means no bar for that symbol).
+ Output:
+   - np.ndarray: Updated ATR per symbol
+        '''
+        high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+        rows = np.flatnonzero(~(np.isnan(high) | np.isnan(low) | np.isnan(close)))
+        h, l, pc = high[rows], low[rows], self.prev_close[rows]
+        true_range = np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))
+
+        window = self.window[rows]
+        window[:, :-1] = window[:, 1:]
+        window[:, -1] = true_range
+        self.window[rows] = window
+        self.prev_close[rows] = close[rows]
+        days = self.days[rows] + 1
+        self.days[rows] = days
+
+        sma = window.mean(axis=1)
+        if self.method == "sma":
+            atr = np.where(days >= self.period + 1, sma, np.nan)
+        else:
+            smoothed = (self.atr[rows] * (self.period - 1) + true_range) / self.period
+            atr = np.where(days == self.period + 1, sma, np.where(days > self.period + 1, smoothed, np.nan))
+        self.atr[rows] = atr
+        if as_of is not None:
+            self.as_of = as_of
+        return self.atr
+
+    def get(self, symbol):
+        '''
+ ATR of one symbol, or None if it is not in the universe or not defined yet.
+        '''
+        i = self._index.get(symbol)
+        if i is None or np.isnan(self.atr[i]):
+            return None
+        return float(self.atr[i])
+
+    def save(self, path: str, **meta):
+        '''
+ Writes the state (plus optional scalar metadata, e.g. the date it was computed on) atomically.
+        '''
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, symbols=np.array(self.symbols), window=self.window, prev_close=self.prev_close,
+                 days=self.days, atr=self.atr, period=self.period, method=self.method,
+                 as_of=str(self.as_of) if self.as_of is not None else "",
+                 **{f"meta_{key}": str(value) for key, value in meta.items()})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        '''
+ Reads a state written by save().
+ Output: (ATREngine, dict of the metadata)
+        '''
+        with np.load(path) as data:
+            engine = cls(data["symbols"].tolist(), int(data["period"]), str(data["method"]))
+            engine.window = data["window"].copy()
+            engine.prev_close = data["prev_close"].copy()
+            engine.days = data["days"].copy()
+            engine.atr = data["atr"].copy()
+            engine.as_of = str(data["as_of"]) or None
+            meta = {key[5:]: str(data[key]) for key in data.files if key.startswith("meta_")}
+        return engine, meta
 
-    df = df.copy()
-    df["Date"] = df.index.date
-    sma = df.groupby("Date")["close"].rolling(window=window).mean()
-    sma.index = sma.index.droplevel(0)
-    return sma
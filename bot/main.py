@@ -1,47 +1,55 @@
 import time
+import math
 import datetime as dt
 import pytz
-import math
 import os
-import csv
-from alpaca.trading.client import TradingClient
-from broker_alpaca import submit_market_order, get_open_positions
-from data_loader_yf import get_5min_data, get_intraday_data
-from indicators import calculate_vwap, calculate_intraday_sma
-from signal_generator import generate_signal
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import metrics
+import services
+from bar_service import BarService
+from stream import StreamBars, BarAggregator, TcpFeed, AlpacaFeed
+from indicators import IncrementalVWAP, IncrementalIntradaySMA
+from scheduler import Scheduler
+from risk_monitor import RiskMonitor
+from position_journal import PositionJournal
+from trade_log import TradeLog
+from order_manager import OrderManager
+from strategy import (compute_snapshot, decide, RISK_PER_TRADE_PCT, HOURLY_PERIOD_DAYS,
+                      TRADE_START, TRADE_END)
 from atr_watchlist import get_top_atr_stocks, compute_atr
 
 # Configuration
-RISK_PER_TRADE_PCT = 0.01  # Lower per trade due to smarter sizing
 MAX_POSITIONS = 25
 DATA_DAYS = 10
 MARKET_START = dt.time(9, 30)
 MARKET_END = dt.time(15, 30)
 WATCHLIST_REFRESH_HOUR = 8
-TRADE_START = dt.time(10, 0)
-TRADE_END = dt.time(15, 15)
 ET = pytz.timezone("US/Eastern")
-
-API_KEY = os.getenv("APCA_API_KEY_ID")
-API_SECRET = os.getenv("APCA_API_SECRET_KEY")
-client = TradingClient(API_KEY, API_SECRET, paper=True)
+STOP_CHECK_SECONDS = 30  # Fast stop-loss / take-profit checks between bar closes
+HEARTBEAT_SECONDS = 60
+FETCH_WORKERS = 8     # Threads for the download stage
+COMPUTE_WORKERS = 0   # Processes for the compute stage (0 = compute in the main process)
+DATA_MODE = os.getenv("BOT_DATA_MODE", "poll")   # "poll": Yahoo via the bar cache; "stream": push feed, cache only for history
+STREAM_REPLAY = os.getenv("BOT_STREAM_REPLAY")     # host:port of a stream.ReplayServer to use instead of Alpaca's feed
 
 position_tracker = {}  # symbol -> {entry_price, direction}
+indicator_state = {}  # symbol -> (IncrementalVWAP, IncrementalIntradaySMA), fed only the new bars each cycle
+bar_service = BarService(timeframes=("60m",), sessions=DATA_DAYS)  # One 5m fetch per symbol, hourly bars resampled locally
+stream_bars = StreamBars(sessions=DATA_DAYS)  # 5m bars closed by the stream (DATA_MODE == "stream")
+stream_feed = None            # Market-data feed started by start_stream
+risk_monitor = RiskMonitor()  # ATR stop / target levels of the tracked positions, checked on every price update
+journal = PositionJournal()   # Durable copy of position_tracker, restored at startup
 
-LOG_FILE = "trade_log.csv"
-if not os.path.exists(LOG_FILE):
-    with open(LOG_FILE, mode="w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "symbol", "side", "qty", "price", "type", "ATR"])
+trade_log = TradeLog()        # Fills, written by a background thread into daily partitions
+order_managers = {}           # broker -> OrderManager (one queue and rate limit per account)
+order_managers_lock = threading.Lock()
 
 def write_heartbeat():
     with open("heartbeat.txt", "w") as f:
         f.write(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-def is_market_open():
-    now = dt.datetime.now(ET).time()
-    return MARKET_START <= now <= MARKET_END
-
 def is_trade_time():
     now = dt.datetime.now(ET).time()
     return TRADE_START <= now <= TRADE_END
@@ -52,142 +60,368 @@ def refresh_watchlist():
     print(f"[INFO] Watchlist updated with top {len(top_atr_stocks)} ATR stocks.")
     return top_atr_stocks
 
-def get_account_equity():
-    account = client.get_account()
-    return float(account.equity)
-
-def log_trade(symbol, side, qty, price, trade_type, atr):
-    with open(LOG_FILE, mode="a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([dt.datetime.now(ET), symbol, side, qty, price, trade_type, atr])
+def log_trade(symbol, side, qty, price, trade_type, atr, order_id=""):
+    trade_log.log(symbol, side, qty, price, trade_type, atr, order_id=order_id)
+
+def update_indicators(symbol, df):
+    if symbol not in indicator_state:
+        indicator_state[symbol] = (IncrementalVWAP(), IncrementalIntradaySMA(window=20))
+    vwap, sma = indicator_state[symbol]
+
+    vwap.update_many(df)
+    sma.update_many(df)
+    vwap.trim(df.index[0])
+    sma.trim(df.index[0])
+
+    df["vwap"] = vwap.series().reindex(df.index)
+    df["sma_20"] = sma.series().reindex(df.index)
+
+def fetch_symbol(symbol):
+    # Streamed history only for symbols the feed carries; any other symbol (e.g. a held one outside the
+    # watchlist, until it is subscribed) is downloaded every cycle so its bars don't go stale
+    streamed = stream_feed is not None and stream_feed.streams(symbol)
+    if DATA_MODE == "stream" and streamed and stream_bars.is_seeded(symbol):
+        bar_service.update(symbol, stream_bars.bars(symbol))  # No download: history plus streamed bars
+    else:
+        base = bar_service.refresh(symbol)
+        if DATA_MODE == "stream":
+            stream_bars.seed(symbol, base)
+    df = bar_service.regular_bars(symbol)
+    if df.empty:
+        raise ValueError(f"No 5m data for {symbol}")
+    # Same lookback the separate 60m download had, so the trend filter sees the same bars
+    hourly_df = bar_service.bars(symbol, "60m", sessions=HOURLY_PERIOD_DAYS)
+    return df, hourly_df
+
+def execute_decision(snapshot, equity, open_positions):
+    symbol = snapshot["symbol"]
+    action = decide(
+        snapshot,
+        open_positions.get(symbol, 0.0),
+        position_tracker.get(symbol),
+        equity,
+        is_trade_time(),
+        RISK_PER_TRADE_PCT,
+    )
+    if action is None:
+        return None
+
+    previous = position_tracker.get(symbol)
+    if action["track"] is not None:
+        position_tracker[symbol] = action["track"]
+    else:
+        position_tracker.pop(symbol, None)
+    return symbol, action, snapshot["atr"], previous
+
+def get_order_manager(broker):
+    '''
+ OrderManager in front of the broker, created on first use.
+    '''
+    with order_managers_lock:
+        if broker not in order_managers:
+            order_managers[broker] = OrderManager(broker)
+        return order_managers[broker]
+
+def submit_orders(broker, pending):
+    '''
+ Sends all orders decided in this cycle through the order manager (throttled, exits first, duplicates
+ of orders still in flight dropped, opposing orders for a symbol netted). Accepted and netted orders are
+ logged and journaled (one commit per batch), at the fill price once it is known: orders still open are
+ logged by log_fill when the order manager sees their fill. For a failed order, or a dropped entry, the
+ position_tracker change made by execute_decision is undone; a dropped exit leaves the symbol untracked,
+ as the exit already in flight closes it. Runs on order_pool (or the only thread changing position_tracker).
+    '''
+    orders = get_order_manager(broker)
+    intents = [{"symbol": symbol, "side": action["side"], "qty": action["qty"], "type": action["type"], "atr": atr,
+                "track": action["track"], "previous": previous}
+               for symbol, action, atr, previous in pending]
+    results = asyncio.run(orders.process(intents))
+    for (symbol, action, atr, previous), result in zip(pending, results):
+        exit_order = action["track"] is None
+        if result["status"] == "duplicate" and exit_order:
+            print(f"[WARN] {symbol}: {action['type']} skipped, an exit is already in flight")
+            risk_monitor.remove(symbol)
+            continue
+        if result["status"] in ("failed", "duplicate"):
+            if result["status"] == "failed":
+                print(f"[ERROR] {symbol}: order failed: {result['error']}")
+            else:
+                print(f"[WARN] {symbol}: {action['side']} order skipped, one is already in flight")
+            if previous is None:
+                position_tracker.pop(symbol, None)
+            else:
+                position_tracker[symbol] = previous
+            if exit_order:
+                risk_monitor.resolve(symbol)   # The next sync monitors the position again
+            continue
+        # A netted order offset an opposing one in the same batch: both count as done at the decision price
+        order_id = str(result["order_id"]) if result["order_id"] is not None else result["status"]
+        if result["status"] != "submitted" or orders.on_fill is None:
+            price = result["fill_price"] if result["fill_price"] is not None else action["price"]
+            log_trade(symbol, action["side"], action["qty"], price, action["type"], atr, order_id)
+            journal.record_fill(symbol, action["side"], action["qty"], price, order_id=order_id)
+        track = action["track"]
+        if track is not None:
+            qty = track["direction"] * action["qty"]
+            journal.record_entry(symbol, track["entry_price"], track["direction"], qty, order_id=order_id)
+            risk_monitor.add(symbol, track["entry_price"], track["direction"], atr, qty)
+        else:
+            journal.record_exit(symbol, action["price"], action["type"], order_id=order_id)
+            risk_monitor.remove(symbol)
+    journal.flush()  # One commit for the whole batch
+
+def log_fill(intent, result):
+    '''
+ Logs and journals an order at its fill price once the order manager has seen it filled (its on_fill
+ callback, run through order_pool). An order that failed after it was accepted (canceled, expired,
+ rejected) is undone instead: a failed entry is no longer tracked, a failed exit is tracked and
+ monitored again as it was before, and the journal records the correction.
+    '''
+    symbol, order_id = intent["symbol"], str(result["order_id"])
+    if result["status"] != "filled":
+        print(f"[ERROR] {symbol}: order {order_id} failed after submission: {result['error']}")
+        previous = intent["previous"]
+        if intent["track"] is not None or previous is None:
+            position_tracker.pop(symbol, None)
+            journal.record_exit(symbol, reason="failed", order_id=order_id)
+            risk_monitor.remove(symbol)
+        else:
+            position_tracker[symbol] = previous
+            qty = previous["direction"] * intent["qty"]
+            journal.record_entry(symbol, previous["entry_price"], previous["direction"], qty, order_id=order_id)
+            risk_monitor.add(symbol, previous["entry_price"], previous["direction"], intent["atr"], qty)
+        journal.flush()
+        return
+    log_trade(symbol, intent["side"], intent["qty"], result["fill_price"], intent["type"], intent["atr"], order_id)
+    journal.record_fill(symbol, intent["side"], intent["qty"], result["fill_price"], order_id=order_id)
+    journal.flush()
+
+def exit_position(broker, symbol, action, atr, tracked):
+    '''
+ Submits an exit fired by the risk monitor.
+    '''
+    position_tracker.pop(symbol, None)
+    submit_orders(broker, [(symbol, action, atr, tracked)])
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run_cycle(watchlist, equity, open_positions, fetch_pool, compute_pool, order_pool, broker):
+    '''
+ Runs one pass over the watchlist as a pipeline: downloads run concurrently on fetch_pool, each
+ symbol moves to the compute stage as soon as its data arrives, and order decisions go through
+ order_pool, a single worker, so position_tracker is only ever changed from one thread. The orders
+ decided in the cycle then go to the broker through the order manager, submitted from order_pool too.
+ Output: dict of busy time per stage plus the cycle's wall time (seconds)
+    '''
+    timings = {"fetch": 0.0, "indicators": 0.0, "compute": 0.0, "orders": 0.0, "submit": 0.0}
+    pending = []
+    cycle_start = time.perf_counter()
+
+    fetches = {}
+    for symbol, atr in watchlist:
+        if atr is None:
+            print(f"[WARN] Couldn't compute ATR for {symbol}, skipping.")
+            continue
+        fetches[fetch_pool.submit(_timed, fetch_symbol, symbol)] = (symbol, atr)
+
+    computes = {}
+    for future in as_completed(fetches):
+        symbol, atr = fetches[future]
+        try:
+            (df, hourly_df), elapsed = future.result()
+            timings["fetch"] += elapsed
+
+            df["ATR"] = atr
+            _, elapsed = _timed(update_indicators, symbol, df)
+            timings["indicators"] += elapsed
+
+            if compute_pool is None:
+                snapshot, elapsed = _timed(compute_snapshot, symbol, df, hourly_df, atr)
+                timings["compute"] += elapsed
+                computes[order_pool.submit(_timed, execute_decision, snapshot, equity, open_positions)] = symbol
+            else:
+                computes[compute_pool.submit(_timed, compute_snapshot, symbol, df, hourly_df, atr)] = symbol
+        except Exception as e:
+            print(f"[ERROR] {symbol}: {e}")
+
+    orders = {}
+    for future, symbol in computes.items():
+        try:
+            result, elapsed = future.result()
+            if compute_pool is None:
+                timings["orders"] += elapsed
+                if result is not None:
+                    pending.append(result)
+            else:
+                timings["compute"] += elapsed
+                orders[order_pool.submit(_timed, execute_decision, result, equity, open_positions)] = symbol
+        except Exception as e:
+            print(f"[ERROR] {symbol}: {e}")
+
+    for future, symbol in orders.items():
+        try:
+            result, elapsed = future.result()
+            timings["orders"] += elapsed
+            if result is not None:
+                pending.append(result)
+        except Exception as e:
+            print(f"[ERROR] {symbol}: {e}")
+
+    if pending:
+        _, timings["submit"] = order_pool.submit(_timed, submit_orders, broker, pending).result()
+
+    timings["wall"] = time.perf_counter() - cycle_start
+    return timings
+
+def trading_pass(watchlist, fetch_pool, compute_pool, order_pool, broker):
+    '''
+ One full evaluation at bar close: account snapshot, ATR for held symbols missing from the watchlist,
+ then run_cycle over the watchlist. Returns the watchlist extended with the held symbols.
+    '''
+    account = asyncio.run(broker.snapshot())
+    equity = account["account"]["equity"]
+
+    print(f"[INFO] Market open. Equity: ${equity:.2f}")
+
+    open_positions = account["positions"]
+    held_symbols = list(open_positions.keys())
+    watchlist_symbols = [s for s, _ in watchlist]
+    full_symbols = set(watchlist_symbols) | set(held_symbols)
+    symbol_to_atr = dict(watchlist)
+    watchlist = [(s, symbol_to_atr.get(s) or compute_atr(s)) for s in full_symbols]
+
+    timings = run_cycle(watchlist, equity, open_positions, fetch_pool, compute_pool, order_pool, broker)
+    print(
+        f"[TIMING] fetch {timings['fetch']:.2f}s | indicators {timings['indicators']:.2f}s | "
+        f"compute {timings['compute']:.2f}s | orders {timings['orders']:.2f}s | "
+        f"submit {timings['submit']:.2f}s | cycle {timings['wall']:.2f}s wall ({len(watchlist)} symbols)"
+    )
+    for name, stats in broker.latency_stats().items():
+        print(f"[BROKER] {name}: {stats['count']} calls, {stats['errors']} errors, "
+              f"p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms")
+    broker.reset_stats()
+    orders = get_order_manager(broker)
+    stats = orders.stats()
+    if stats["submit"]["count"] or stats["deduplicated"] or stats["netted"]:
+        print(f"[ORDERS] {stats['submitted']} submitted, {stats['filled']} filled, {stats['failed']} failed, "
+              f"{stats['deduplicated']} duplicates, {stats['netted']} netted | queue max {stats['max_queue_depth']} | "
+              f"submit p95 {stats['submit']['p95_ms']:.0f} ms, fill p95 {stats['fill']['p95_ms']:.0f} ms")
+    orders.reset_stats()
+
+    for stage, seconds in timings.items():
+        metrics.observe(f"cycle_{stage}", seconds)
+    metrics.incr("cycles")
+    metrics.flush()
+    return watchlist
+
+def check_stops(broker, atr_by_symbol):
+    '''
+ Periodic stop-loss / take-profit check at the broker's latest position prices. Also re-syncs the risk
+ monitor with position_tracker and the broker's quantities, so positions it missed are covered.
+ Exits go to risk_monitor.on_exit if main() set it, and are submitted here otherwise.
+    '''
+    if not position_tracker:
+        return
+    positions = asyncio.run(broker.get_position_prices())
+    risk_monitor.sync(dict(position_tracker), atr_by_symbol, {s: held["qty"] for s, held in positions.items()})
+    fired = risk_monitor.on_prices({s: held["price"] for s, held in positions.items() if not math.isnan(held["price"])})
+    if fired and risk_monitor.on_exit is None:
+        for symbol, _, _, _ in fired:
+            position_tracker.pop(symbol, None)
+        submit_orders(broker, fired)
+
+def recover_positions(broker):
+    '''
+ Restores position_tracker from the journal and reconciles it with the broker's open positions
+ (one API call). Held positions the journal does not know are tracked at their average entry price.
+    '''
+    start = time.perf_counter()
+    tracker = journal.load()
+    positions = asyncio.run(broker.get_position_prices())
+    tracker, report = journal.reconcile(tracker, positions)
+    position_tracker.clear()
+    position_tracker.update(tracker)
+    print(f"[INFO] Recovered {len(tracker)} tracked positions in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({', '.join(f'{len(symbols)} {name}' for name, symbols in report.items())})")
+
+def start_stream():
+    '''
+ Starts the market-data feed on a background thread: a ReplayServer if BOT_STREAM_REPLAY is set,
+ otherwise Alpaca's live data stream. Closed 5-minute bars go to stream_bars.
+ Output: (aggregator, feed)
+    '''
+    global stream_feed
+    aggregator = BarAggregator(stream_bars.on_bar, on_price=risk_monitor.on_price)
+    if STREAM_REPLAY:
+        host, port = STREAM_REPLAY.rsplit(":", 1)
+        feed = TcpFeed(aggregator, host, int(port))
+        target = lambda: asyncio.run(feed.run())
+    else:
+        feed = AlpacaFeed(aggregator, [], on_price=risk_monitor.on_price)
+        target = feed.run
+    threading.Thread(target=target, name="market-data", daemon=True).start()
+    print(f"[INFO] Streaming market data from {STREAM_REPLAY or 'Alpaca'}")
+    stream_feed = feed
+    return aggregator, feed
 
 def main():
-    watchlist = refresh_watchlist()
-    last_refresh_date = dt.datetime.now(ET).date()
-
-    while True:
-        write_heartbeat()
-        now_et = dt.datetime.now(ET)
-        current_date = now_et.date()
-
-        if current_date > last_refresh_date and now_et.time() >= dt.time(WATCHLIST_REFRESH_HOUR, 0):
-            watchlist = refresh_watchlist()
-            last_refresh_date = current_date
-
-        if is_market_open():
-            equity = get_account_equity()
-
-            print(f"[INFO] Market open. Equity: ${equity:.2f}")
-
-            open_positions = get_open_positions()
-            held_symbols = list(open_positions.keys())
-            watchlist_symbols = [s for s, _ in watchlist]
-            full_symbols = set(watchlist_symbols) | set(held_symbols)
-            symbol_to_atr = dict(watchlist)
-            watchlist = [(s, symbol_to_atr.get(s) or compute_atr(s)) for s in full_symbols]
-
-            for symbol, atr in watchlist:
-                try:
-                    if atr is None:
-                        print(f"[WARN] Couldn't compute ATR for {symbol}, skipping.")
-                        continue
-
-                    df = get_5min_data(symbol, days_back=DATA_DAYS)
-                    df["ATR"] = atr
-                    df["vwap"] = calculate_vwap(df)
-                    df["sma_20"] = calculate_intraday_sma(df, window=20)
-                    df["signal"] = generate_signal(df)
-
-                    latest = df.iloc[-1]
-                    latest_signal = latest["signal"]
-                    latest_close = latest["close"]
-                    current_volume = latest["volume"]
-                    avg_volume = df["volume"].rolling(20).mean().iloc[-1]
-                    current_position = open_positions.get(symbol, 0.0)
-
-                    # 1-hour SMA filter
-                    hourly_df = get_intraday_data(symbol, interval="60m", period="5d")
-                    sma_50 = hourly_df["Close"].rolling(window=50).mean().iloc[-1]
-
-                    if math.isnan(sma_50):
-                        continue
-
-                    # Apply trend rule
-                    is_uptrend = latest_close > sma_50
-                    is_downtrend = latest_close < sma_50
-
-                    # Stop-loss / Take-profit
-                    if symbol in position_tracker:
-                        entry_price = position_tracker[symbol]["entry_price"]
-                        direction = position_tracker[symbol]["direction"]
-
-                        if direction == 1:
-                            if latest_close <= entry_price - 1.5 * atr:
-                                submit_market_order(symbol, current_position, "sell")
-                                log_trade(symbol, "sell", current_position, latest_close, "stop_loss", atr)
-                                del position_tracker[symbol]
-                                continue
-                            elif latest_close >= entry_price + 2.5 * atr:
-                                submit_market_order(symbol, current_position, "sell")
-                                log_trade(symbol, "sell", current_position, latest_close, "take_profit", atr)
-                                del position_tracker[symbol]
-                                continue
-
-                        elif direction == -1:
-                            if latest_close >= entry_price + 1.5 * atr:
-                                submit_market_order(symbol, abs(current_position), "buy")
-                                log_trade(symbol, "buy", abs(current_position), latest_close, "stop_loss", atr)
-                                del position_tracker[symbol]
-                                continue
-                            elif latest_close <= entry_price - 2.5 * atr:
-                                submit_market_order(symbol, abs(current_position), "buy")
-                                log_trade(symbol, "buy", abs(current_position), latest_close, "take_profit", atr)
-                                del position_tracker[symbol]
-                                continue
-
-                    # Entry logic
-                    if not is_trade_time():
-                        continue
-                    if current_volume < 1.5 * avg_volume:
-                        continue
-
-                    dollar_risk = equity * RISK_PER_TRADE_PCT
-                    qty = dollar_risk / (1.5 * atr)
-                    if latest_signal == 1 and is_uptrend:
-                        if current_position > 0:
-                            continue
-                        submit_market_order(symbol, qty, "buy")
-                        log_trade(symbol, "buy", qty, latest_close, "entry", atr)
-                        position_tracker[symbol] = {"entry_price": latest_close, "direction": 1}
-
-                    elif latest_signal == -1 and is_downtrend:
-                        if current_position < 0:
-                            continue
-                        if qty < 1:
-                            continue
-                        qty = math.floor(qty)
-                        submit_market_order(symbol, qty, "sell")
-                        log_trade(symbol, "sell", qty, latest_close, "entry", atr)
-                        position_tracker[symbol] = {"entry_price": latest_close, "direction": -1}
-
-                    elif latest_signal == 0:
-                        if current_position > 0:
-                            submit_market_order(symbol, current_position, "sell")
-                            log_trade(symbol, "sell", current_position, latest_close, "exit", atr)
-                            position_tracker.pop(symbol, None)
-                        elif current_position < 0:
-                            submit_market_order(symbol, abs(current_position), "buy")
-                            log_trade(symbol, "buy", abs(current_position), latest_close, "exit", atr)
-                            position_tracker.pop(symbol, None)
-
-                except Exception as e:
-                    print(f"[ERROR] {symbol}: {e}")
-
-            time.sleep(300)
-
-        else:
-            print("[INFO] Market is closed. Sleeping for 5 minutes...")
-            time.sleep(300)
+    fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+    compute_pool = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS) if COMPUTE_WORKERS > 0 else None
+    order_pool = ThreadPoolExecutor(max_workers=1)
+    broker = services.get("async_broker")
+
+    metrics.install_signal_toggle()
+    recover_positions(broker)
+    if os.getenv("BOT_PROFILE", "0") == "1":
+        metrics.start_profiler()
+
+    # The watchlist (ATR scan) is only built on trading days: by the morning job, or by the first
+    # cycle of the day if the bot was started after it
+    state = {"watchlist": [], "date": None}
+    # Exits fired by the risk monitor (from the stream thread or the stop checks) go through order_pool,
+    # the only thread that changes position_tracker
+    risk_monitor.on_exit = lambda *exit: order_pool.submit(exit_position, broker, *exit)
+    # Orders are tracked to their fill in the background, so a cycle doesn't wait for fills; the fills
+    # are logged from order_pool as well
+    get_order_manager(broker).on_fill = lambda *fill: order_pool.submit(log_fill, *fill)
+    aggregator, feed = start_stream() if DATA_MODE == "stream" else (None, None)
+
+    def refresh(now):
+        state["watchlist"] = refresh_watchlist()
+        state["date"] = now.date()
+        # ATR of held symbols outside the watchlist is cached for the day too, so the bar-close passes
+        # never download it mid-session
+        for symbol in asyncio.run(broker.get_open_positions()):
+            compute_atr(symbol)
+        if isinstance(feed, AlpacaFeed):
+            feed.subscribe([s for s, _ in state["watchlist"]])
+
+    def bar_close(now):
+        if state["date"] != now.date():
+            refresh(now)
+        if aggregator is not None:
+            aggregator.flush(now)  # Close bars of symbols that had no update since the boundary
+        state["watchlist"] = trading_pass(state["watchlist"], fetch_pool, compute_pool, order_pool, broker)
+        if isinstance(feed, AlpacaFeed):
+            feed.subscribe([s for s, _ in state["watchlist"]])  # Includes held symbols outside the watchlist
+            feed.subscribe_trades(risk_monitor.symbols())  # Tick-level stop checks for the open positions
+
+    def stop_check(now):
+        check_stops(broker, dict(state["watchlist"]))
+
+    scheduler = Scheduler()
+    scheduler.every(HEARTBEAT_SECONDS, lambda now: write_heartbeat(), market_hours=False, name="heartbeat")
+    scheduler.daily(dt.time(WATCHLIST_REFRESH_HOUR, 0), refresh, name="watchlist")
+    scheduler.at_bar_close(bar_close, start=MARKET_START, end=MARKET_END)
+    scheduler.every(STOP_CHECK_SECONDS, stop_check, start=MARKET_START, end=MARKET_END)
+
+    write_heartbeat()
+    for job in scheduler.jobs:
+        print(f"[INFO] {job.name}: next run {job.next_time}")
+    scheduler.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,332 @@
+# metrics.py
+'''
+Lightweight instrumentation for the trading loop: timers, counters, gauges and latency histograms, plus an
+optional sampling profiler.
+Collection is off unless BOT_METRICS=1 (or enable() is called); while off, every timer and counter
+returns after a single flag check. Each cycle, flush() writes the metrics to METRICS_FILE in the
+Prometheus text format, so a node_exporter textfile collector (or a plain `cat`) can read them. The
+exported histogram buckets, counts and sums are cumulative, as Prometheus expects (rate() and
+histogram_quantile() work on them); the per-cycle summary flush() returns, and the exported
+<name>_max_seconds gauges, cover only the observations since the previous flush.
+The sampling profiler can be started and stopped at runtime (start_profiler / stop_profiler, or
+SIGUSR1 once install_signal_toggle() was called); it writes collapsed stacks for flame graphs.
+'''
+
+import os
+import sys
+import time
+import signal
+import threading
+import functools
+from collections import Counter
+
+METRICS_ENABLED = os.getenv("BOT_METRICS", "0") == "1"
+METRICS_FILE = os.getenv("BOT_METRICS_FILE", "metrics.prom")
+PROFILE_FILE = os.getenv("BOT_PROFILE_FILE", "profile.folded")
+PROFILE_INTERVAL = 0.005  # Seconds between profiler samples
+METRIC_PREFIX = "bot_"
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = METRICS_ENABLED
+_lock = threading.Lock()
+_counters = {}     # name -> value, cumulative
+_histograms = {}   # name -> _Histogram, reset by every flush
+_exported = {}     # name -> _Histogram, cumulative, for the metrics file
+_gauges = {}       # name -> last value
+_profiler = None
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def copy(self):
+        other = _Histogram()
+        other.buckets = list(self.buckets)
+        other.count, other.total, other.max = self.count, self.total, self.max
+        return other
+
+def enable(flag: bool = True):
+    '''
+ Turns metric collection on or off at runtime.
+    '''
+    global _enabled
+    _enabled = flag
+
+def is_enabled() -> bool:
+    return _enabled
+
+def incr(name: str, value=1):
+    '''
+ Adds value to a counter.
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def gauge(name: str, value: float):
+    '''
+ Sets a gauge to its current value (e.g. a queue depth).
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+def observe(name: str, seconds: float):
+    '''
+ Records one duration (seconds) in the histogram called name.
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        for histograms in (_histograms, _exported):
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = _Histogram()
+            histogram.add(seconds)
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            incr(f"{self.name}_errors")
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name: str):
+    '''
+ Context manager that times its block into the histogram called name (exceptions also count into
+ name_errors). Returns a shared no-op object while metrics are disabled.
+ Usage:
+   with metrics.timer("yahoo_download"):
+       ...
+    '''
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+def timed(name: str = None):
+    '''
+ Decorator form of timer(); the histogram defaults to the function's name.
+    '''
+    def decorator(func):
+        metric = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Timer(metric):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> dict:
+    '''
+ Current values without resetting anything.
+ Output:
+   - dict: 'counters' and 'gauges' (name -> value) and 'histograms' (name -> {count, sum, mean, max})
+    '''
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {
+                name: {"count": h.count, "sum": h.total, "mean": h.total / h.count if h.count else 0.0, "max": h.max}
+                for name, h in _histograms.items()
+            },
+        }
+
+def reset():
+    '''
+ Clears all counters, gauges and histograms.
+    '''
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _exported.clear()
+
+def render_prometheus(counters: dict, histograms: dict, gauges: dict = None) -> str:
+    '''
+ Formats counters, gauges and histograms in the Prometheus text exposition format. The histograms
+ have to be cumulative (never reset while the process runs).
+    '''
+    lines = []
+    for name, value in sorted(counters.items()):
+        metric = f"{METRIC_PREFIX}{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, value in sorted((gauges or {}).items()):
+        metric = f"{METRIC_PREFIX}{name}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    for name, h in sorted(histograms.items()):
+        metric = f"{METRIC_PREFIX}{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, h.buckets):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {h.count}')
+        lines.append(f"{metric}_sum {h.total:.6f}")
+        lines.append(f"{metric}_count {h.count}")
+    return "\n".join(lines) + "\n"
+
+def flush(path: str = None) -> dict:
+    '''
+ Writes the cumulative counters and histograms, the gauges and the largest duration per histogram since
+ the last flush (as <name>_max_seconds gauges) to the metrics file, then starts a new per-cycle summary.
+ Meant to be called once per cycle.
+ Input:
+   - path (str): Output file (default is METRICS_FILE)
+ Output:
+   - dict: The flushed values, in the snapshot() format (empty while metrics are disabled)
+    '''
+    if not _enabled:
+        return {}
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = dict(_histograms)
+        _histograms.clear()
+        exported = {name: h.copy() for name, h in _exported.items()}
+
+    maxima = {f"{name}_max_seconds": round(h.max, 6) for name, h in histograms.items()}
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus(counters, exported, {**gauges, **maxima}))
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+
+    return {
+        "counters": counters,
+        "gauges": gauges,
+        "histograms": {
+            name: {"count": h.count, "sum": h.total, "mean": h.total / h.count if h.count else 0.0, "max": h.max}
+            for name, h in histograms.items()
+        },
+    }
+
+class SamplingProfiler:
+    '''
+ Samples the stacks of all other threads every interval seconds from a daemon thread and counts
+ them as collapsed stacks ("module:function;module:function ..."), the input format of flamegraph tools.
+    '''
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, n=10) -> list:
+        '''
+ Functions that appear at the top of the most samples (self time).
+ Output: list of (function, samples)
+        '''
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+def start_profiler(interval=PROFILE_INTERVAL) -> SamplingProfiler:
+    '''
+ Starts the sampling profiler (no-op if it is already running).
+    '''
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(interval)
+        _profiler.start()
+        print(f"[INFO] Sampling profiler started ({interval * 1000:.0f} ms interval)")
+    return _profiler
+
+def stop_profiler(path: str = None):
+    '''
+ Stops the sampling profiler and writes its collapsed stacks to path (default is PROFILE_FILE).
+ Output: the stopped SamplingProfiler, or None if it was not running
+    '''
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    profiler.stop()
+    profiler.write(path or PROFILE_FILE)
+    print(f"[INFO] Sampling profiler stopped after {profiler.samples} samples, written to {path or PROFILE_FILE}")
+    return profiler
+
+def toggle_profiler():
+    if _profiler is None:
+        start_profiler()
+    else:
+        stop_profiler()
+
+def install_signal_toggle():
+    '''
+ Lets `kill -USR1 <pid>` start and stop the sampling profiler of a running bot (POSIX only).
+    '''
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: toggle_profiler())
@@ -1,17 +1,10 @@
 import os
 import time
 from datetime import datetime
-from alpaca.trading.client import TradingClient
-from alpaca.trading.enums import OrderStatus
+from broker_alpaca import get_trading_client
 
 HEARTBEAT_FILE = "heartbeat.txt"
 
-API_KEY = os.getenv("APCA_API_KEY_ID")
-API_SECRET = os.getenv("APCA_API_SECRET_KEY")
-BASE_URL = os.getenv("APCA_API_BASE_URL", "https://paper-api.alpaca.markets")
-
-client = TradingClient(API_KEY, API_SECRET, paper=True)
-
 def check_heartbeat():
     '''
  Checks the freshness of the heartbeat file to ensure the trading bot is still running.
@@ -44,6 +37,7 @@ def check_account_status():
  Input: None
  Output: Printed account summary to console
     '''
+    client = get_trading_client()
     account = client.get_account()
     positions = client.get_all_positions()
     print(
@@ -57,7 +51,8 @@ def check_open_orders():
  Input: None
  Output: Printed list of open orders or confirmation that none exist
     '''
-    all_orders = client.get_orders()
+    from alpaca.trading.enums import OrderStatus
+    all_orders = get_trading_client().get_orders()
     open_orders = [order for order in all_orders if order.status == OrderStatus.OPEN]
     if open_orders:
         print(f"[INFO] Open orders count: {len(open_orders)}")
@@ -0,0 +1,381 @@
+# order_manager.py
+'''
+Sits between the trading loop's order decisions and the broker (AsyncBroker or anything with the same
+submit_market_order / get_order coroutines).
+Each batch of intents (the orders decided in one cycle, or exits fired by the risk monitor) is cleaned
+up before anything is sent:
+  - deduplication: one order per symbol and side. A repeat within the batch is dropped, and so is an
+    intent for a side that already has an order in flight (queued, submitted or not yet filled), so a
+    signal exit can't follow a stop-loss exit that is still on its way.
+  - netting: opposing intents for the same symbol in one batch become one order for the difference,
+    or no order at all if they cancel out.
+The orders then wait in one priority queue shared by all batches and threads: exits (stop_loss,
+take_profit, exit) go before entries, and fill lookups come last. A few concurrent workers take
+the next item whenever the token bucket allows a request, which keeps bursts (e.g. the open) under
+Alpaca's rate limit (RATE_PER_SECOND on average, up to BURST at once).
+Submitted orders are polled until they are filled or rejected, for up to FILL_TIMEOUT seconds per
+batch; orders still open after that are polled again with the next batch. With an on_fill callback,
+a batch returns as soon as its orders are accepted instead, and their fills are tracked on a background
+thread until each one is filled or has failed.
+Metrics: order_submit (queued -> accepted by the broker) and order_fill (queued -> filled) latency,
+the order_queue_depth gauge, and the orders_submitted / orders_filled / orders_failed /
+orders_deduplicated / orders_netted counters.
+'''
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import metrics
+
+RATE_PER_SECOND = float(os.getenv("BOT_ORDER_RATE", 200 / 60))   # Alpaca: 200 requests per minute
+BURST = 10
+MAX_CONCURRENCY = 8
+FILL_TIMEOUT = 2.0          # Seconds a batch waits for its fills
+FILL_POLL_SECONDS = 0.25    # First fill lookup after this long, then doubling
+FILL_POLL_MAX = 5.0         # Longest wait between lookups of an order tracked in the background
+EXIT_TYPES = {"stop_loss", "take_profit", "exit"}
+PRIORITY = {"exit": 0, "entry": 1, "poll": 2}
+FILLED = "filled"
+FAILED_STATUSES = {"canceled", "expired", "rejected", "suspended"}
+
+class TokenBucket:
+    '''
+ Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+ Usage:
+   await asyncio.sleep(bucket.reserve())   # then send the request
+    '''
+    def __init__(self, rate=RATE_PER_SECOND, capacity=BURST, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        '''
+ Takes one token and returns the seconds to wait until it is actually available.
+        '''
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+def _category(intent):
+    return "exit" if intent.get("type") in EXIT_TYPES else "entry"
+
+def _result(status, qty=0.0, order_id=None, error=None):
+    return {"status": status, "order_id": order_id, "qty_sent": qty, "fill_price": None, "error": error}
+
+class OrderManager:
+    '''
+ Throttled, deduplicated and netted order submission with fill tracking (see module docstring).
+ Input:
+   - broker: AsyncBroker (or an object with async submit_market_order(symbol, qty, side) -> order ID
+     and, for fill tracking, async get_order(order_id) -> {status, filled_avg_price, ...})
+   - rate, burst (float): Token bucket for all broker requests
+   - max_concurrency (int): Requests in flight at once
+   - fill_timeout (float): Seconds process() waits for fills (0 returns right after submission)
+   - on_fill (callable): on_fill(intent, result), called from the background thread with the final
+     result ("filled" with its fill_price, or "failed") of every order submitted; process() then
+     returns right after submission
+ Usage:
+   manager = OrderManager(broker)
+   results = asyncio.run(manager.process([{"symbol": "AAPL", "side": "buy", "qty": 10, "type": "entry"}]))
+ Every result is a dict with status ("filled", "submitted", "netted", "duplicate" or "failed"),
+ order_id, qty_sent, fill_price and error.
+    '''
+    def __init__(self, broker, rate=RATE_PER_SECOND, burst=BURST, max_concurrency=MAX_CONCURRENCY,
+                 fill_timeout=FILL_TIMEOUT, poll_seconds=FILL_POLL_SECONDS, on_fill=None):
+        self.broker = broker
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.fill_timeout = fill_timeout
+        self.poll_seconds = poll_seconds
+        self.on_fill = on_fill
+        self.track_fills = hasattr(broker, "get_order")
+        self._lock = threading.Lock()
+        self._queue = []            # (priority, seq, kind, payload, Future)
+        self._seq = itertools.count()
+        self._workers = 0
+        self._loop_tasks = {}       # event loop -> worker tasks running on it
+        self._fill_loop = None      # Event loop of the background fill tracking thread, started on first use
+        self._in_flight = {}        # (symbol, side) -> order ID (None while queued)
+        self._open = {}             # order ID -> [symbol, side, queued time, being tracked] of orders not filled yet
+        self._latencies = {"submit": [], "fill": []}
+        self._counts = dict.fromkeys(("submitted", "filled", "failed", "deduplicated", "netted"), 0)
+        self._max_depth = 0
+
+    # --- Queue and workers ---
+
+    def _count(self, name, value=1):
+        if not value:
+            return
+        with self._lock:
+            self._counts[name] += value
+        metrics.incr(f"orders_{name}", value)
+
+    def _enqueue(self, priority, kind, payload) -> Future:
+        # Futures from concurrent.futures, so a worker of another thread's event loop can resolve them
+        future = Future()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._seq), kind, payload, future))
+            depth = len(self._queue)
+            self._max_depth = max(self._max_depth, depth)
+            start_worker = self._workers < self.max_concurrency
+            if start_worker:
+                self._workers += 1
+                tasks = self._loop_tasks.setdefault(loop, set())
+                task = loop.create_task(self._worker())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        metrics.gauge("order_queue_depth", depth)
+        return future
+
+    async def _worker(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._workers -= 1
+                    return
+            # Wait for a token first, then take whatever is most urgent by then
+            await asyncio.sleep(self.bucket.reserve())
+            with self._lock:
+                if not self._queue:
+                    self._workers -= 1
+                    self.bucket.refund()
+                    return
+                _, _, kind, payload, future = heapq.heappop(self._queue)
+                depth = len(self._queue)
+            metrics.gauge("order_queue_depth", depth)
+            try:
+                if kind == "submit":
+                    symbol, qty, side = payload
+                    result = await self.broker.submit_market_order(symbol, qty, side)
+                else:
+                    result = await self.broker.get_order(payload)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+    # --- Batches ---
+
+    def _plan(self, intents):
+        '''
+ Deduplicates and nets a batch. Returns the result of every intent that won't be sent and the
+ orders to send as (intent index, symbol, side, qty).
+        '''
+        results = [None] * len(intents)
+        orders = []
+        by_symbol = {}
+        for i, intent in enumerate(intents):
+            by_symbol.setdefault(intent["symbol"], []).append(i)
+
+        with self._lock:
+            for symbol, indices in by_symbol.items():
+                chosen = {}   # side -> intent index, the most urgent intent of each side
+                for i in sorted(indices, key=lambda i: PRIORITY[_category(intents[i])]):
+                    side = intents[i]["side"]
+                    if side in chosen or (symbol, side) in self._in_flight:
+                        results[i] = _result("duplicate")
+                    else:
+                        chosen[side] = i
+                qty = {side: float(intents[i]["qty"]) for side, i in chosen.items()}
+
+                if len(chosen) == 2:
+                    net = qty["buy"] - qty["sell"]
+                    kept = "buy" if net > 0 else "sell" if net < 0 else None
+                    for side in ("buy", "sell"):
+                        if side != kept:
+                            results[chosen.pop(side)] = _result("netted")
+                    if kept:
+                        qty[kept] = abs(net)
+                for side, i in chosen.items():
+                    orders.append((i, symbol, side, qty[side]))
+                    self._in_flight[(symbol, side)] = None
+
+        self._count("deduplicated", sum(r is not None and r["status"] == "duplicate" for r in results))
+        self._count("netted", sum(r is not None and r["status"] == "netted" for r in results))
+        return results, orders
+
+    def _release(self, symbol, side):
+        with self._lock:
+            self._in_flight.pop((symbol, side), None)
+
+    async def _submit(self, intent, symbol, side, qty, result):
+        queued = time.perf_counter()
+        try:
+            order_id = await asyncio.wrap_future(self._enqueue(PRIORITY[_category(intent)], "submit",
+                                                               (symbol, qty, side)))
+        except Exception as e:
+            self._count("failed")
+            self._release(symbol, side)
+            result.update(status="failed", error=e)
+            return
+        elapsed = time.perf_counter() - queued
+        self._latencies["submit"].append(elapsed)
+        metrics.observe("order_submit", elapsed)
+        self._count("submitted")
+        result.update(status="submitted", order_id=order_id)
+        if not self.track_fills:
+            self._release(symbol, side)
+            return
+        with self._lock:
+            self._in_flight[(symbol, side)] = order_id
+            self._open[order_id] = [symbol, side, queued, True]
+        if self.on_fill is not None:
+            asyncio.run_coroutine_threadsafe(self._follow(order_id, intent, dict(result)), self._background())
+            return
+        await self._track(order_id, result, time.monotonic() + self.fill_timeout)
+
+    async def _lookup(self, order_id):
+        try:
+            return await asyncio.wrap_future(self._enqueue(PRIORITY["poll"], "poll", order_id))
+        except Exception as e:
+            print(f"[WARN] Fill lookup for order {order_id} failed: {e}")
+            return {"status": None}
+
+    async def _track(self, order_id, result, deadline):
+        delay = self.poll_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+            if self._settle(order_id, await self._lookup(order_id), result):
+                return
+            delay *= 2
+        # Still open: looked up again with the next batch
+        with self._lock:
+            if order_id in self._open:
+                self._open[order_id][3] = False
+
+    def _background(self):
+        with self._lock:
+            if self._fill_loop is None:
+                self._fill_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._fill_loop.run_forever, name="order-fills", daemon=True).start()
+            return self._fill_loop
+
+    async def _follow(self, order_id, intent, result):
+        # Runs on the background loop: polls until the order is done, then hands its result to on_fill
+        delay = self.poll_seconds
+        while True:
+            await asyncio.sleep(delay)
+            if self._settle(order_id, await self._lookup(order_id), result):
+                break
+            delay = min(2 * delay, FILL_POLL_MAX)
+        if self.on_fill is None:
+            return
+        try:
+            self.on_fill(intent, result)
+        except Exception as e:
+            print(f"[ERROR] {intent['symbol']}: handling the fill of order {order_id} failed: {e}")
+
+    def _settle(self, order_id, order, result=None) -> bool:
+        # Records a final order state; returns False while the order is still open
+        status = order["status"]
+        if status != FILLED and status not in FAILED_STATUSES:
+            return False
+        with self._lock:
+            symbol, side, queued, _ = self._open.pop(order_id, (None, None, None, False))
+            self._in_flight.pop((symbol, side), None)
+        if status == FILLED:
+            self._count("filled")
+            if queued is not None:
+                elapsed = time.perf_counter() - queued
+                self._latencies["fill"].append(elapsed)
+                metrics.observe("order_fill", elapsed)
+            if result is not None:
+                result.update(status="filled", fill_price=order.get("filled_avg_price"))
+        else:
+            self._count("failed")
+            if result is not None:
+                result.update(status="failed", error=RuntimeError(f"order {order_id} {status}"))
+            else:
+                print(f"[WARN] Order {order_id} ({symbol} {side}) {status}")
+        return True
+
+    async def _recheck(self, order_id):
+        if not self._settle(order_id, await self._lookup(order_id)):
+            with self._lock:
+                if order_id in self._open:
+                    self._open[order_id][3] = False
+
+    async def process(self, intents: list) -> list:
+        '''
+ Deduplicates, nets and submits one batch of orders, then waits up to fill_timeout for their fills
+ (with on_fill, they are tracked in the background instead). Orders left open by earlier batches are
+ looked up again along the way.
+ Input:
+   - intents (list of dicts): symbol, side ("buy" / "sell"), qty and type ("stop_loss", "take_profit",
+     "exit" or "entry"; exits are sent first). Other keys are handed back to on_fill as they are.
+ Output:
+   - list of dicts: One result per intent, in the same order (see the class docstring). A netted intent
+     was offset by an opposing one; for the one that was sent, qty_sent is the net quantity.
+        '''
+        results, orders = self._plan(intents)
+        jobs = []
+        for i, symbol, side, qty in orders:
+            results[i] = _result("queued", qty)
+            jobs.append(self._submit(intents[i], symbol, side, qty, results[i]))
+        if self.track_fills:
+            with self._lock:
+                stale = [order_id for order_id, entry in self._open.items() if not entry[3]]
+                for order_id in stale:
+                    self._open[order_id][3] = True
+            jobs += [self._recheck(order_id) for order_id in stale]
+
+        await asyncio.gather(*jobs)
+        # Workers on this loop may still be running items of other batches (other threads); the loop
+        # has to stay up until they are done
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                tasks = [task for task in self._loop_tasks.get(loop, ()) if not task.done()]
+                if not tasks:
+                    self._loop_tasks.pop(loop, None)
+                    break
+            await asyncio.wait(tasks)
+        return results
+
+    # --- Stats ---
+
+    def open_orders(self) -> dict:
+        '''
+ Submitted orders whose fill hasn't been seen yet: order ID -> (symbol, side).
+        '''
+        with self._lock:
+            return {order_id: (entry[0], entry[1]) for order_id, entry in self._open.items()}
+
+    def stats(self) -> dict:
+        '''
+ Order counts, the largest queue depth and the submit / fill latency (queued -> accepted / filled).
+ Output: dict with the counts, max_queue_depth, and submit / fill -> {count, mean_ms, p50_ms, p95_ms, max_ms}
+        '''
+        with self._lock:
+            stats = dict(self._counts, max_queue_depth=self._max_depth)
+        for name, samples in self._latencies.items():
+            samples = np.array(samples) * 1000
+            stats[name] = {
+                "count": len(samples),
+                "mean_ms": float(samples.mean()) if len(samples) else 0.0,
+                "p50_ms": float(np.percentile(samples, 50)) if len(samples) else 0.0,
+                "p95_ms": float(np.percentile(samples, 95)) if len(samples) else 0.0,
+                "max_ms": float(samples.max()) if len(samples) else 0.0,
+            }
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._latencies = {"submit": [], "fill": []}
+            self._counts = dict.fromkeys(self._counts, 0)
+            self._max_depth = 0
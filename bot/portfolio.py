@@ -6,93 +6,260 @@ Computes portfolio stats
 import pandas as pd
 import numpy as np
 
-def analyze_trades(df: pd.DataFrame, verbose: bool = False) -> dict:
+PERIODS_PER_YEAR = 252 * 78  # 5-minute bars in a year of regular sessions
+
+def trades_from_signals(signal, close) -> dict:
+    '''
+ Rebuilds trades from a signal column without looping over bars: a 1 / -1 opens (or replaces) the
+ pending entry and the next 0 closes it.
+ Input:
+   - signal (np.ndarray): Signal per bar (1, -1, 0; anything else is ignored)
+   - close (np.ndarray): Close price per bar
+ Output:
+   - dict of np.ndarray: entry_idx, exit_idx, direction, entry_price, exit_price, pnl
+    '''
+    signal = np.asarray(signal, dtype=float)
+    close = np.asarray(close, dtype=float)
+    entries = np.flatnonzero((signal == 1) | (signal == -1))
+    zeros = np.flatnonzero(signal == 0)
+
+    k = np.searchsorted(zeros, entries)
+    has_exit = k < len(zeros)
+    exits = zeros[np.minimum(k, max(len(zeros) - 1, 0))] if len(zeros) else np.zeros(len(entries), dtype=np.int64)
+    # An entry only becomes a trade if no later entry replaces it before the exit
+    next_entry = np.append(entries[1:], len(signal))
+    valid = has_exit & (next_entry > exits)
+
+    entries, exits = entries[valid], exits[valid]
+    direction = signal[entries]
+    return {
+        "entry_idx": entries,
+        "exit_idx": exits,
+        "direction": direction,
+        "entry_price": close[entries],
+        "exit_price": close[exits],
+        "pnl": (close[exits] - close[entries]) * direction,
+    }
+
+def trades_to_arrays(trades: list) -> dict:
+    '''
+ Converts a trade list from backtest_signals (or any list of dicts with entry/exit time and price,
+ direction and pnl, or a dict of such arrays like trade_log.round_trips) to arrays, so the stats can
+ reuse the recorded trades instead of re-deriving them.
+ Output:
+   - dict of np.ndarray: entry_time, exit_time, direction (+1 / -1), entry_price, exit_price, pnl,
+     and symbol when the trades carry one
+    '''
+    frame = pd.DataFrame(trades)
+    if frame.empty:
+        return {"pnl": np.array([])}
+    direction = frame["direction"].replace({"long": 1, "short": -1}).to_numpy(dtype=float)
+    arrays = {
+        "entry_time": pd.DatetimeIndex(frame["entry_time"]),
+        "exit_time": pd.DatetimeIndex(frame["exit_time"]),
+        "direction": direction,
+        "entry_price": frame["entry_price"].to_numpy(dtype=float),
+        "exit_price": frame["exit_price"].to_numpy(dtype=float),
+        "pnl": frame["pnl"].to_numpy(dtype=float),
+    }
+    if "symbol" in frame.columns:
+        arrays["symbol"] = frame["symbol"].to_numpy()
+    return arrays
+
+def trade_stats(pnl: np.ndarray) -> dict:
+    '''
+ Trade-level statistics from an array of per-trade PnL, in one pass over the array.
+ Output:
+   - dict: total_pnl, num_trades, win_rate, avg_pnl_per_trade, std_pnl, profit_factor, max_drawdown
+     (max drawdown of the cumulative trade PnL, starting from 0)
+    '''
+    pnl = np.asarray(pnl, dtype=float)
+    num_trades = len(pnl)
+    gains = pnl[pnl > 0].sum()
+    losses = pnl[pnl < 0].sum()
+    equity = np.cumsum(pnl)
+    return {
+        "total_pnl": pnl.sum(),
+        "num_trades": num_trades,
+        "win_rate": (pnl > 0).sum() / num_trades if num_trades else 0,
+        "avg_pnl_per_trade": pnl.mean() if num_trades else 0.0,
+        "std_pnl": pnl.std() if num_trades > 1 else 0,
+        "profit_factor": gains / abs(losses) if losses < 0 else float("inf"),
+        "max_drawdown": (np.maximum.accumulate(np.maximum(equity, 0)) - equity).max() if num_trades else 0.0,
+    }
+
+def return_stats(returns: np.ndarray, periods_per_year=PERIODS_PER_YEAR) -> dict:
+    '''
+ Risk-adjusted return statistics from a per-period PnL series (0 risk-free rate).
+ Output:
+   - dict: sharpe_ratio (per period), sharpe_annualized, sortino_ratio (per period), sortino_annualized
+    '''
+    returns = np.asarray(returns, dtype=float)
+    returns = returns[~np.isnan(returns)]
+    if len(returns) < 2:
+        return {"sharpe_ratio": 0.0, "sharpe_annualized": 0.0, "sortino_ratio": 0.0, "sortino_annualized": 0.0}
+    mean = returns.mean()
+    std = returns.std(ddof=1)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+    sharpe = mean / std if std != 0 else 0.0
+    sortino = mean / downside if downside != 0 else 0.0
+    scale = np.sqrt(periods_per_year)
+    return {
+        "sharpe_ratio": sharpe,
+        "sharpe_annualized": sharpe * scale,
+        "sortino_ratio": sortino,
+        "sortino_annualized": sortino * scale,
+    }
+
+def rolling_sharpe(returns, window: int, periods_per_year=PERIODS_PER_YEAR) -> np.ndarray:
+    '''
+ Annualized Sharpe ratio over a rolling window of per-period returns, using running sums.
+ Output:
+   - np.ndarray: Same length as returns, NaN for the first window - 1 periods
+    '''
+    returns = np.asarray(returns, dtype=float)
+    out = np.full(len(returns), np.nan)
+    if len(returns) < window or window < 2:
+        return out
+    s1 = np.concatenate(([0.0], np.cumsum(returns)))
+    s2 = np.concatenate(([0.0], np.cumsum(returns ** 2)))
+    total = s1[window:] - s1[:-window]
+    squares = s2[window:] - s2[:-window]
+    mean = total / window
+    var = np.maximum(squares - total * mean, 0) / (window - 1)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[window - 1:] = np.where(std > 0, mean / std * np.sqrt(periods_per_year), 0.0)
+    return out
+
+def per_symbol_stats(symbols, pnl) -> pd.DataFrame:
+    '''
+ Per-symbol breakdown of trade PnL, grouped with bincount (no per-symbol loop).
+ Output:
+   - pd.DataFrame: num_trades, total_pnl, win_rate, avg_pnl per symbol, best total PnL first
+    '''
+    names, group = np.unique(np.asarray(symbols), return_inverse=True)
+    pnl = np.asarray(pnl, dtype=float)
+    counts = np.bincount(group, minlength=len(names))
+    totals = np.bincount(group, weights=pnl, minlength=len(names))
+    wins = np.bincount(group, weights=(pnl > 0).astype(float), minlength=len(names))
+    table = pd.DataFrame({
+        "num_trades": counts,
+        "total_pnl": totals,
+        "win_rate": wins / counts,
+        "avg_pnl": totals / counts,
+    }, index=pd.Index(names, name="symbol"))
+    return table.sort_values("total_pnl", ascending=False)
+
+def batch_trade_stats(pnl_runs: list) -> pd.DataFrame:
+    '''
+ Trade statistics for many backtest runs at once. The runs' PnL arrays are packed into one
+ NaN-padded (run x trade) matrix and every statistic is a single reduction along the trade axis.
+ Input:
+   - pnl_runs (list of np.ndarray): Per-trade PnL of each run
+ Output:
+   - pd.DataFrame: One row per run with total_pnl, num_trades, win_rate, avg_pnl_per_trade,
+     std_pnl, profit_factor and max_drawdown
+    '''
+    lengths = np.array([len(p) for p in pnl_runs])
+    width = max(lengths.max(initial=0), 1)
+    matrix = np.full((len(pnl_runs), width), np.nan)
+    mask = np.arange(width) < lengths[:, None]
+    if len(pnl_runs):
+        matrix[mask] = np.concatenate([np.asarray(p, dtype=float) for p in pnl_runs])
+
+    filled = np.nan_to_num(matrix)
+    totals = filled.sum(axis=1)
+    gains = np.where(filled > 0, filled, 0).sum(axis=1)
+    losses = np.where(filled < 0, filled, 0).sum(axis=1)
+    equity = np.cumsum(filled, axis=1)
+    drawdown = (np.maximum.accumulate(np.maximum(equity, 0), axis=1) - equity).max(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.where(lengths > 0, totals / lengths, 0.0)
+        std = np.sqrt(np.where(mask, (filled - avg[:, None]) ** 2, 0).sum(axis=1) / lengths)
+        return pd.DataFrame({
+            "total_pnl": totals,
+            "num_trades": lengths,
+            "win_rate": np.where(lengths > 0, (filled > 0).sum(axis=1) / lengths, 0.0),
+            "avg_pnl_per_trade": avg,
+            "std_pnl": np.where(lengths > 1, std, 0.0),
+            "profit_factor": np.where(losses < 0, gains / -losses, np.inf),
+            "max_drawdown": drawdown,
+        })
+
+def analyze_trades(df: pd.DataFrame = None, verbose: bool = False, trades: list = None,
+                   periods_per_year=PERIODS_PER_YEAR) -> dict:
     '''
  Analyzes trade signals and computes portfolio performance metrics.
  Simulates trades based on signal column and calculates statistics like PnL, win rate, Sharpe ratio, and drawdown.
  Input:
    - df (pd.DataFrame): DataFrame with at least 'signal', 'close', 'trade_pnl', and 'cumulative_pnl' columns
    - verbose (bool): If True, prints each trade's details during processing
+   - trades (list of dicts): Optional trade list from backtest_signals; used as-is instead of rebuilding
+     trades from the signal column. Without df, Sharpe/Sortino/drawdown come from the trade PnL sequence.
+   - periods_per_year (float): Periods of df (or trades, without df) per year, for the annualized ratios
  Output:
    - dict: Summary statistics including total PnL, number of trades, win rate, average PnL, Sharpe ratio, drawdown, etc.
+     plus annualized Sharpe, Sortino, exposure and, for trades with a 'symbol', a per-symbol breakdown
     '''
-    trades = []
-    entry_price = None
-    entry_time = None
-    direction = None
-
-    equity_curve = []
-    equity = 0
-
-    for i in range(len(df)):
-        row = df.iloc[i]
-        signal = row.get("signal", 0)
-        price = row["close"]
-        time = row.name
-
-        if signal == 1 or signal == -1:
-            entry_price = price
-            entry_time = time
-            direction = signal
-        elif signal == 0 and entry_price is not None:
-            pnl = (price - entry_price) * direction
-            holding_period = (time - entry_time).seconds / 60  # in minutes
-
-            trades.append({
-                "entry_time": entry_time,
-                "exit_time": time,
-                "entry_price": entry_price,
-                "exit_price": price,
-                "direction": direction,
-                "pnl": pnl,
-                "holding_period": holding_period
-            })
-
-            equity += pnl
-            equity_curve.append(equity)
-
-            if verbose:
-                print(f"TRADE: {entry_time} -> {time} | Dir: {direction} | Entry: {entry_price} | Exit: {price} | PnL: {pnl}")
-
-            entry_price = None
-            entry_time = None
-            direction = None
-
-    if not trades:
-        return {}
-
-    trade_df = pd.DataFrame(trades)
-    total_pnl = trade_df["pnl"].sum()
-    num_trades = len(trade_df)
-    wins = trade_df[trade_df["pnl"] > 0]
-    losses = trade_df[trade_df["pnl"] < 0]
-    win_rate = len(wins) / num_trades if num_trades else 0
-    avg_pnl = trade_df["pnl"].mean()
-    std_pnl = trade_df["pnl"].std(ddof=0) if num_trades > 1 else 0
-    avg_holding_period = trade_df["holding_period"].mean()
-    profit_factor = wins["pnl"].sum() / abs(losses["pnl"].sum()) if not losses.empty else float("inf")
-
-    # Sharpe ratio (assumes 0 risk-free rate and 1 trade = 1 period)
-    returns = df["trade_pnl"]
-    mean_return = returns.mean()
-    std_return = returns.std(ddof=1)
-    sharpe_ratio = mean_return / std_return if std_return != 0 else 0.0
-
-
-    # Max Drawdown
-    cum_pnl = df['cumulative_pnl']
-    running_max = cum_pnl.cummax()
-    drawdowns = running_max - cum_pnl
-    max_drawdown = drawdowns.max()
+    if trades is not None:
+        arrays = trades_to_arrays(trades)
+        if len(arrays["pnl"]) == 0:
+            return {}
+        entry_time, exit_time = arrays["entry_time"], arrays["exit_time"]
+        if df is not None:
+            entry_idx = df.index.get_indexer(entry_time)
+            exit_idx = df.index.get_indexer(exit_time)
+    else:
+        signal = df["signal"].to_numpy() if "signal" in df.columns else np.zeros(len(df))
+        arrays = trades_from_signals(signal, df["close"].to_numpy())
+        if len(arrays["pnl"]) == 0:
+            return {}
+        entry_idx, exit_idx = arrays["entry_idx"], arrays["exit_idx"]
+        entry_time, exit_time = df.index[entry_idx], df.index[exit_idx]
 
-    return {
-        "total_pnl": round(total_pnl, 2),
-        "num_trades": num_trades,
-        "win_rate": round(win_rate, 2),
-        "avg_pnl_per_trade": round(avg_pnl, 2),
-        "std_pnl": round(std_pnl, 2),
+    pnl = arrays["pnl"]
+    holding_period = (exit_time - entry_time).total_seconds().to_numpy() / 60  # in minutes
+
+    if verbose:
+        print("\n".join(
+            f"TRADE: {entry_time[i]} -> {exit_time[i]} | Dir: {arrays['direction'][i]} | "
+            f"Entry: {arrays['entry_price'][i]} | Exit: {arrays['exit_price'][i]} | PnL: {pnl[i]}"
+            for i in range(len(pnl))
+        ))
+
+    stats = trade_stats(pnl)
+
+    if df is not None:
+        # Sharpe ratio (assumes 0 risk-free rate and 1 bar = 1 period)
+        ratios = return_stats(df["trade_pnl"].to_numpy(), periods_per_year)
+
+        # Max Drawdown
+        cum_pnl = df["cumulative_pnl"].to_numpy(dtype=float)
+        max_drawdown = np.nanmax(np.fmax.accumulate(cum_pnl) - cum_pnl)
+
+        exposure = (exit_idx - entry_idx).sum() / len(df)
+    else:
+        ratios = return_stats(pnl, periods_per_year)
+        max_drawdown = stats["max_drawdown"]
+        exposure = float("nan")
+
+    metrics = {
+        "total_pnl": round(stats["total_pnl"], 2),
+        "num_trades": stats["num_trades"],
+        "win_rate": round(stats["win_rate"], 2),
+        "avg_pnl_per_trade": round(stats["avg_pnl_per_trade"], 2),
+        "std_pnl": round(stats["std_pnl"], 2),
         "max_drawdown": round(max_drawdown, 2),
-        "sharpe_ratio": round(sharpe_ratio, 2),
-        "avg_holding_period_min": round(avg_holding_period, 2),
-        "profit_factor": round(profit_factor, 2)
+        "sharpe_ratio": round(ratios["sharpe_ratio"], 2),
+        "avg_holding_period_min": round(holding_period.mean(), 2),
+        "profit_factor": round(stats["profit_factor"], 2),
+        "sharpe_annualized": round(ratios["sharpe_annualized"], 2),
+        "sortino_ratio": round(ratios["sortino_ratio"], 2),
+        "sortino_annualized": round(ratios["sortino_annualized"], 2),
+        "exposure": round(exposure, 4),
     }
+    if "symbol" in arrays:
+        metrics["per_symbol"] = per_symbol_stats(arrays["symbol"], pnl)
+    return metrics
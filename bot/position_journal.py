@@ -0,0 +1,221 @@
+# position_journal.py
+'''
+Crash-safe journal of the position_tracker state.
+Every entry, exit and fill is appended to an SQLite database in WAL mode. In the same transaction the
+current state (one row per tracked symbol) is upserted, so recovery is a single read of that table
+instead of a replay of the log; the events table stays as an append-only audit trail.
+Writes are batched: events are queued in memory and committed together (one WAL fsync per batch) when
+flush() is called, e.g. once per submitted order batch, or when BATCH_SIZE events or FLUSH_SECONDS
+have accumulated. On restart, load() restores the tracker and reconcile() checks it against the
+broker's open positions from one get_all_positions call.
+The database is opened on first use, so importing the module or creating a journal touches no files.
+'''
+import os
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILE = os.getenv("BOT_JOURNAL_FILE", "positions.db")
+BATCH_SIZE = 64       # Queued events that force a commit
+FLUSH_SECONDS = 1.0   # Age of the oldest queued event that forces a commit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    symbol TEXT NOT NULL,
+    kind TEXT NOT NULL,           -- 'entry', 'exit' or 'fill'
+    side TEXT,
+    qty REAL,
+    price REAL,
+    entry_price REAL,
+    direction INTEGER,
+    reason TEXT,
+    order_id TEXT
+);
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY,
+    entry_price REAL NOT NULL,
+    direction INTEGER NOT NULL,
+    qty REAL,
+    updated REAL NOT NULL
+);
+"""
+
+class PositionJournal:
+    '''
+ Durable position_tracker state (see module docstring).
+ Input:
+   - path (str): SQLite database file (":memory:" for a throwaway journal)
+   - batch_size (int): Queued events that trigger a commit
+   - flush_seconds (float): Maximum age of a queued event before the next record commits
+ Usage:
+   journal = PositionJournal("positions.db")
+   journal.record_entry("AAPL", 190.5, 1, qty=10)
+   journal.flush()
+   tracker = journal.load()
+    '''
+    def __init__(self, path=JOURNAL_FILE, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.commits = 0
+        self._conn = None
+        self._queue = []
+        self._first_queued = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Caller holds the lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # fsync the WAL on every commit, i.e. once per batch
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _record(self, event):
+        with self._lock:
+            if not self._queue:
+                self._first_queued = time.monotonic()
+            self._queue.append(event)
+            due = len(self._queue) >= self.batch_size or time.monotonic() - self._first_queued >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def record_entry(self, symbol, entry_price, direction, qty=None, order_id=None):
+        '''
+ Journals a new tracked position (replaces any previous state of the symbol).
+        '''
+        self._record({"ts": time.time(), "symbol": symbol, "kind": "entry", "qty": qty, "entry_price": entry_price,
+                      "direction": direction, "order_id": order_id})
+
+    def record_exit(self, symbol, price=None, reason=None, order_id=None):
+        '''
+ Journals that a symbol is no longer tracked (e.g. reason 'stop_loss', 'take_profit', 'reconcile').
+        '''
+        self._record({"ts": time.time(), "symbol": symbol, "kind": "exit", "price": price, "reason": reason,
+                      "order_id": order_id})
+
+    def record_fill(self, symbol, side, qty, price, order_id=None):
+        '''
+ Journals an order fill (audit trail only; the tracked state changes through entries and exits).
+        '''
+        self._record({"ts": time.time(), "symbol": symbol, "kind": "fill", "side": side, "qty": qty,
+                      "price": price, "order_id": order_id})
+
+    def flush(self) -> int:
+        '''
+ Commits the queued events and their state changes in one transaction.
+ Output: number of events committed
+        '''
+        with self._lock:
+            if not self._queue:
+                return 0
+            events, self._queue = self._queue, []
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT INTO events (ts, symbol, kind, side, qty, price, entry_price, direction, reason, order_id) "
+                    "VALUES (:ts, :symbol, :kind, :side, :qty, :price, :entry_price, :direction, :reason, :order_id)",
+                    [{"side": None, "qty": None, "price": None, "entry_price": None, "direction": None,
+                      "reason": None, "order_id": None, **event} for event in events]
+                )
+                for event in events:
+                    if event["kind"] == "entry":
+                        conn.execute(
+                            "INSERT OR REPLACE INTO positions (symbol, entry_price, direction, qty, updated) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (event["symbol"], event["entry_price"], event["direction"], event["qty"], event["ts"])
+                        )
+                    elif event["kind"] == "exit":
+                        conn.execute("DELETE FROM positions WHERE symbol = ?", (event["symbol"],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self._queue = events + self._queue  # Keep them for the next flush
+                raise
+            self.commits += 1
+        return len(events)
+
+    def load(self) -> dict:
+        '''
+ Reads the committed state.
+ Output: dict of symbol -> {entry_price, direction}, the position_tracker format
+        '''
+        with self._lock:
+            rows = self._connection().execute("SELECT symbol, entry_price, direction FROM positions").fetchall()
+        return {symbol: {"entry_price": entry_price, "direction": direction} for symbol, entry_price, direction in rows}
+
+    def quantities(self) -> dict:
+        '''
+ Quantity journaled with each tracked entry (symbol -> shares, negative for shorts; None if unknown).
+        '''
+        with self._lock:
+            return dict(self._connection().execute("SELECT symbol, qty FROM positions").fetchall())
+
+    def events(self, symbol=None) -> list:
+        '''
+ The audit trail, oldest first, optionally for one symbol.
+ Output: list of dicts with the events table's columns
+        '''
+        query = "SELECT * FROM events" + (" WHERE symbol = ?" if symbol else "") + " ORDER BY seq"
+        with self._lock:
+            cursor = self._connection().execute(query, (symbol,) if symbol else ())
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def reconcile(self, tracker: dict, positions: dict, adopt_untracked=True):
+        '''
+ Checks a recovered tracker against the broker's open positions and journals the corrections.
+ Input:
+   - tracker (dict): symbol -> {entry_price, direction}, e.g. from load()
+   - positions (dict): symbol -> {qty, entry_price} from one broker call (get_position_prices)
+   - adopt_untracked (bool): Track held positions the journal does not know, at the broker's average entry price
+ Output:
+   - (dict, dict): reconciled tracker, and a report {kept, dropped, replaced, adopted} of symbol lists
+        '''
+        report = {"kept": [], "dropped": [], "replaced": [], "adopted": []}
+        reconciled = {}
+        for symbol, tracked in tracker.items():
+            held = positions.get(symbol)
+            if held is None or not held["qty"]:
+                self.record_exit(symbol, reason="reconcile")
+                report["dropped"].append(symbol)
+            elif (held["qty"] > 0) == (tracked["direction"] > 0):
+                reconciled[symbol] = tracked
+                report["kept"].append(symbol)
+            elif held.get("entry_price") is not None:
+                # Position was flipped while the bot was down: its entry is the broker's average price
+                reconciled[symbol] = {"entry_price": held["entry_price"], "direction": 1 if held["qty"] > 0 else -1}
+                self.record_entry(symbol, reconciled[symbol]["entry_price"], reconciled[symbol]["direction"],
+                                  held["qty"])
+                report["replaced"].append(symbol)
+            else:
+                self.record_exit(symbol, reason="reconcile")
+                report["dropped"].append(symbol)
+
+        if adopt_untracked:
+            for symbol, held in positions.items():
+                if symbol in tracker or not held["qty"] or held.get("entry_price") is None:
+                    continue
+                reconciled[symbol] = {"entry_price": held["entry_price"], "direction": 1 if held["qty"] > 0 else -1}
+                self.record_entry(symbol, held["entry_price"], reconciled[symbol]["direction"], held["qty"])
+                report["adopted"].append(symbol)
+        self.flush()
+        return reconciled, report
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
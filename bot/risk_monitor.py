@@ -0,0 +1,242 @@
+# risk_monitor.py
+'''
+Intrabar stop-loss / take-profit monitor, decoupled from the signal cycle.
+Every tracked position occupies one slot of a set of parallel arrays (entry price, direction, quantity,
+stop and target level, last price). Stop and target levels are computed once when the position is
+added (the same ATR multiples stop_or_target uses), so checking a batch of prices is a single vectorized
+comparison over all slots:
+  stop hit:   direction * (price - stop)   <= 0
+  target hit: direction * (price - target) >= 0
+with the stop taking precedence, as in stop_or_target. A triggered slot is released before its exit is
+handed to on_exit, so a position can only be exited once, whatever thread the prices come from. Its
+symbol then stays pending until the exit is resolved (add / remove after the order, or resolve if it was
+never sent), and sync doesn't re-add it in the meantime, so a stale tracker can't fire a second exit.
+Prices can come from the stream (every 1-minute bar or trade) or from periodic broker quotes.
+The time from receiving a price to firing the exit is recorded as the 'risk_reaction' metric.
+'''
+import threading
+import time
+import numpy as np
+import metrics
+from strategy import STOP_ATR_MULT, TARGET_ATR_MULT
+
+INITIAL_SLOTS = 32
+
+class RiskMonitor:
+    '''
+ Holds the ATR exit levels of all open positions and checks prices against them.
+ Input:
+   - on_exit (callable): on_exit(symbol, action, atr, tracked), with action in decide's order format
+     ({side, qty, type, price, track}) and tracked the {entry_price, direction} the position was added with
+   - stop_mult, target_mult (float): ATR multiples of the stop-loss and take-profit distance
+    '''
+    def __init__(self, on_exit=None, stop_mult=STOP_ATR_MULT, target_mult=TARGET_ATR_MULT):
+        self.on_exit = on_exit
+        self.stop_mult = stop_mult
+        self.target_mult = target_mult
+        self.exits = 0
+        self._lock = threading.Lock()
+        self._slots = {}    # symbol -> slot
+        self._symbols = []  # slot -> symbol (None when free)
+        self._free = []
+        self._exiting = set()   # Symbols whose exit fired and hasn't been resolved yet
+        self._allocate(INITIAL_SLOTS)
+
+    def _allocate(self, size):
+        old = len(self._symbols)
+
+        def grow(values, fill, dtype):
+            grown = np.full(size, fill, dtype=dtype)
+            if old:
+                grown[:old] = values
+            return grown
+
+        self.entry = grow(getattr(self, "entry", None), np.nan, np.float64)
+        self.direction = grow(getattr(self, "direction", None), 0, np.int8)
+        self.qty = grow(getattr(self, "qty", None), 0.0, np.float64)
+        self.atr = grow(getattr(self, "atr", None), np.nan, np.float64)
+        self.stop = grow(getattr(self, "stop", None), np.nan, np.float64)
+        self.target = grow(getattr(self, "target", None), np.nan, np.float64)
+        self.last_price = grow(getattr(self, "last_price", None), np.nan, np.float64)
+        self.armed = grow(getattr(self, "armed", None), False, bool)
+        self._symbols += [None] * (size - old)
+        self._free += range(size - 1, old - 1, -1)
+
+    def add(self, symbol, entry_price, direction, atr, qty):
+        '''
+ Starts monitoring a position (replacing the levels if the symbol is already monitored).
+ Input:
+   - entry_price (float): Fill price the levels are measured from
+   - direction (int): 1 for long, -1 for short
+   - atr (float): Daily ATR for the symbol
+   - qty (float): Shares held (negative for a short)
+ Resolves a pending exit of the symbol.
+        '''
+        self._set(symbol, entry_price, direction, atr, qty, resolve=True)
+
+    def _set(self, symbol, entry_price, direction, atr, qty, resolve):
+        if direction not in (1, -1) or not atr > 0:
+            self._drop(symbol, resolve)
+            return
+        with self._lock:
+            if resolve:
+                self._exiting.discard(symbol)
+            elif symbol in self._exiting:
+                return
+            slot = self._slots.get(symbol)
+            if slot is None:
+                if not self._free:
+                    self._allocate(2 * len(self._symbols))
+                slot = self._free.pop()
+                self._slots[symbol] = slot
+                self._symbols[slot] = symbol
+            self.entry[slot] = entry_price
+            self.direction[slot] = direction
+            self.qty[slot] = qty
+            self.atr[slot] = atr
+            self.stop[slot] = entry_price - direction * self.stop_mult * atr
+            self.target[slot] = entry_price + direction * self.target_mult * atr
+            self.last_price[slot] = np.nan
+            self.armed[slot] = True
+
+    def remove(self, symbol):
+        '''
+ Stops monitoring a symbol (no-op if it is not monitored) and resolves a pending exit of it.
+        '''
+        self._drop(symbol, resolve=True)
+
+    def resolve(self, symbol):
+        '''
+ Ends a pending exit that didn't go through without re-arming the levels; the next sync adds the
+ position back if it is still tracked.
+        '''
+        with self._lock:
+            self._exiting.discard(symbol)
+
+    def _drop(self, symbol, resolve):
+        with self._lock:
+            if resolve:
+                self._exiting.discard(symbol)
+            slot = self._slots.get(symbol)
+            if slot is not None:
+                self._release(slot)
+
+    def _release(self, slot):
+        # Caller holds the lock
+        del self._slots[self._symbols[slot]]
+        self._symbols[slot] = None
+        self.armed[slot] = False
+        self.direction[slot] = 0
+        self._free.append(slot)
+
+    def sync(self, tracker: dict, atr_by_symbol: dict, positions: dict):
+        '''
+ Makes the monitored set match a position tracker: symbols no longer tracked are removed and tracked
+ ones are (re)added with their current quantity. Untracked or flat positions are not monitored, and
+ neither are symbols with a pending exit.
+ Input:
+   - tracker (dict): symbol -> {entry_price, direction}, a copy if another thread may change it
+   - atr_by_symbol (dict): symbol -> ATR
+   - positions (dict): symbol -> shares held
+        '''
+        for symbol in self.symbols():
+            if symbol not in tracker:
+                self._drop(symbol, resolve=False)
+        for symbol, tracked in tracker.items():
+            qty, atr = positions.get(symbol, 0.0), atr_by_symbol.get(symbol)
+            if not qty or atr is None:
+                self._drop(symbol, resolve=False)
+            else:
+                self._set(symbol, tracked["entry_price"], tracked["direction"], atr, qty, resolve=False)
+
+    def symbols(self) -> list:
+        with self._lock:
+            return list(self._slots)
+
+    def pending(self) -> set:
+        '''
+ Symbols whose exit fired and hasn't been resolved yet.
+        '''
+        with self._lock:
+            return set(self._exiting)
+
+    def __contains__(self, symbol):
+        return symbol in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def on_price(self, symbol, price, received=None) -> list:
+        '''
+ Checks one price update (a trade, a quote or a bar close). Symbols that are not monitored are ignored.
+ Input:
+   - received (float): time.perf_counter() when the update arrived (default: now)
+ Output: list of (symbol, action, atr, tracked) exits fired
+        '''
+        return self.on_prices({symbol: price}, received)
+
+    def on_prices(self, prices: dict, received=None) -> list:
+        '''
+ Stores a batch of latest prices (symbol -> price) and checks every monitored position in one pass.
+ Output: list of (symbol, action, atr, tracked) exits fired
+        '''
+        received = time.perf_counter() if received is None else received
+        with self._lock:
+            for symbol, price in prices.items():
+                slot = self._slots.get(symbol)
+                if slot is not None:
+                    self.last_price[slot] = price
+            fired = self._check()
+        return self._fire(fired, received)
+
+    def check(self, received=None) -> list:
+        '''
+ Checks every monitored position against its last stored price.
+ Output: list of (symbol, action, atr, tracked) exits fired
+        '''
+        received = time.perf_counter() if received is None else received
+        with self._lock:
+            fired = self._check()
+        return self._fire(fired, received)
+
+    def _check(self):
+        # Caller holds the lock. NaN prices compare False, so slots without a price never fire.
+        price = self.last_price
+        with np.errstate(invalid="ignore"):
+            stop_hit = self.armed & (self.direction * (price - self.stop) <= 0)
+            target_hit = self.armed & ~stop_hit & (self.direction * (price - self.target) >= 0)
+        slots = np.flatnonzero(stop_hit | target_hit)
+        if len(slots) == 0:
+            return []
+        fired = []
+        for slot in slots.tolist():
+            symbol = self._symbols[slot]
+            direction = int(self.direction[slot])
+            qty = float(self.qty[slot])
+            action = {
+                "side": "sell" if direction == 1 else "buy",
+                "qty": qty if direction == 1 else abs(qty),
+                "type": "stop_loss" if stop_hit[slot] else "take_profit",
+                "price": float(price[slot]),
+                "track": None,
+            }
+            tracked = {"entry_price": float(self.entry[slot]), "direction": direction}
+            fired.append((symbol, action, float(self.atr[slot]), tracked))
+            self._release(slot)  # Before the lock is released, so an exit fires only once
+            self._exiting.add(symbol)
+        return fired
+
+    def _fire(self, fired, received):
+        for symbol, action, atr, tracked in fired:
+            self.exits += 1
+            metrics.incr(f"risk_{action['type']}")
+            metrics.observe("risk_reaction", time.perf_counter() - received)
+            print(f"[INFO] {symbol}: {action['type']} at {action['price']:.2f} "
+                  f"(entry {tracked['entry_price']:.2f}, ATR {atr:.2f})")
+            if self.on_exit is not None:
+                try:
+                    self.on_exit(symbol, action, atr, tracked)
+                except Exception as e:
+                    print(f"[ERROR] {symbol}: exit failed: {e}")
+                    self.resolve(symbol)
+        return fired
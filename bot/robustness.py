@@ -0,0 +1,177 @@
+# robustness.py
+'''
+Monte Carlo robustness checks on a backtest's trade list.
+backtest_signals / analyze_trades give one number per statistic for the one order in which the trades
+happened. Here the trade PnLs are resampled into many alternative trade sequences:
+  - "bootstrap": each path draws num_trades trades with replacement (varies the PnL, drawdown and Sharpe)
+  - "shuffle": each path is a random permutation of the trades (same total PnL and Sharpe, only the
+    order, and so the drawdown and the risk of ruin, changes)
+and the statistics are computed for every path, giving confidence intervals instead of point estimates.
+Risk of ruin is measured at the live sizing (strategy.decide risks risk_pct of equity per trade, with the
+stop STOP_ATR_MULT ATRs away): every trade's PnL is converted to a multiple of its risk (R), a path
+compounds equity by (1 + risk_pct * R) per trade, and it is ruined once equity has fallen RUIN_DRAWDOWN
+below its peak.
+Paths are generated as (path x trade) NumPy matrices, CHUNK_ELEMENTS values at a time, so memory
+stays bounded for any number of paths and there is no per-path Python loop.
+'''
+import numpy as np
+import pandas as pd
+from strategy import RISK_PER_TRADE_PCT, STOP_ATR_MULT
+
+N_PATHS = 10_000
+METHODS = ("bootstrap", "shuffle")
+CONFIDENCE = 0.95
+RUIN_DRAWDOWN = 0.5           # Peak-to-trough equity loss that counts as ruin
+CHUNK_ELEMENTS = 2_000_000    # Path x trade values generated at once (~16 MB per float64 matrix)
+STAT_COLUMNS = ["total_pnl", "max_drawdown", "sharpe_ratio", "sharpe_annualized",
+                "return_pct", "max_drawdown_pct"]
+
+def trade_risk(trades: list, risk=None) -> tuple:
+    '''
+ Per-trade PnL and the risk (1R, in the same units) it was taken with.
+ Input:
+   - trades (list of dicts or dict of arrays): Needs 'pnl'; 'risk' (stop distance) or 'atr' (at entry)
+     give the risk of each trade
+   - risk (float or np.ndarray): Risk per trade, overrides what the trades carry
+ Output:
+   - tuple of np.ndarray: pnl, risk. Without any risk information, 1R is the average losing trade.
+    '''
+    frame = pd.DataFrame(trades)
+    pnl = frame["pnl"].to_numpy(dtype=float) if len(frame) else np.array([])
+    if risk is None:
+        if "risk" in frame.columns:
+            risk = frame["risk"].to_numpy(dtype=float)
+        elif "atr" in frame.columns:
+            risk = STOP_ATR_MULT * frame["atr"].to_numpy(dtype=float)
+        else:
+            losses = pnl[pnl < 0]
+            risk = -losses.mean() if len(losses) else np.abs(pnl).mean() if len(pnl) else 1.0
+    risk = np.broadcast_to(np.asarray(risk, dtype=float), pnl.shape)
+    if not np.all(risk > 0):
+        raise ValueError("risk per trade must be positive")
+    return pnl, risk
+
+def trades_per_year(trades: list) -> float:
+    '''
+ Trading frequency from the entry / exit times of the trades (NaN if the trades carry no times).
+    '''
+    frame = pd.DataFrame(trades)
+    if len(frame) < 2 or "entry_time" not in frame.columns or "exit_time" not in frame.columns:
+        return float("nan")
+    span = (pd.DatetimeIndex(frame["exit_time"]).max() - pd.DatetimeIndex(frame["entry_time"]).min())
+    days = span.total_seconds() / 86_400
+    return len(frame) / days * 365.25 if days > 0 else float("nan")
+
+def resample_indices(rng, num_trades: int, num_paths: int, method: str = "bootstrap") -> np.ndarray:
+    '''
+ (path x trade) matrix of trade numbers for num_paths resampled sequences.
+    '''
+    if method == "bootstrap":
+        return rng.integers(0, num_trades, size=(num_paths, num_trades))
+    if method == "shuffle":
+        return rng.permuted(np.broadcast_to(np.arange(num_trades), (num_paths, num_trades)), axis=1)
+    raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+
+def path_stats(pnl_paths: np.ndarray, r_paths: np.ndarray, risk_pct=RISK_PER_TRADE_PCT,
+               periods_per_year=float("nan")) -> dict:
+    '''
+ Statistics of every path of a (path x trade) matrix, each one reduction along the trade axis.
+ Input:
+   - pnl_paths (np.ndarray): Trade PnL per path
+   - r_paths (np.ndarray): The same trades as multiples of their risk
+   - risk_pct (float): Fraction of equity risked per trade
+   - periods_per_year (float): Trades per year, for the annualized Sharpe ratio
+ Output:
+   - dict of np.ndarray: STAT_COLUMNS, one value per path. total_pnl, max_drawdown (from 0, as in
+     portfolio.trade_stats) and sharpe_ratio (per trade) are in PnL units; return_pct and max_drawdown_pct
+     are for equity compounded at risk_pct
+    '''
+    num_trades = pnl_paths.shape[1]
+    equity = np.cumsum(pnl_paths, axis=1)
+    drawdown = (np.maximum.accumulate(np.maximum(equity, 0), axis=1) - equity).max(axis=1)
+    mean = equity[:, -1] / num_trades
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = pnl_paths.std(axis=1, ddof=1) if num_trades > 1 else np.zeros(len(pnl_paths))
+        sharpe = np.where(std > 0, mean / std, 0.0)
+
+        # Compounded equity in logs: log(E_t / E_0); a trade losing the whole account gives -inf
+        log_equity = np.cumsum(np.log1p(np.maximum(risk_pct * r_paths, -1.0)), axis=1)
+    log_peak = np.maximum.accumulate(np.maximum(log_equity, 0), axis=1)
+    drawdown_pct = 1 - np.exp((log_equity - log_peak).min(axis=1))
+    return {
+        "total_pnl": equity[:, -1],
+        "max_drawdown": drawdown,
+        "sharpe_ratio": sharpe,
+        "sharpe_annualized": sharpe * np.sqrt(periods_per_year),
+        "return_pct": np.expm1(log_equity[:, -1]),
+        "max_drawdown_pct": drawdown_pct,
+    }
+
+def monte_carlo(trades: list, num_paths: int = N_PATHS, method: str = "bootstrap", risk_pct=RISK_PER_TRADE_PCT,
+                risk=None, ruin_drawdown=RUIN_DRAWDOWN, confidence=CONFIDENCE, seed=None,
+                periods_per_year=None, chunk_elements=CHUNK_ELEMENTS) -> dict:
+    '''
+ Resamples a trade list and reports confidence intervals and the risk of ruin.
+ Input:
+   - trades (list of dicts or dict of arrays): backtest_signals / walk_forward / trade_log.round_trips
+     trades, in the order they happened (see trade_risk for how 1R is determined)
+   - num_paths (int): Resampled trade sequences
+   - method (str): "bootstrap" or "shuffle" (see module docstring)
+   - risk_pct (float): Fraction of equity risked per trade (main.py's RISK_PER_TRADE_PCT)
+   - risk (float or np.ndarray): Risk per trade in PnL units, see trade_risk
+   - ruin_drawdown (float): Drawdown from the equity peak that counts as ruin
+   - confidence (float): Width of the reported intervals
+   - seed (int): Random seed, for repeatable results
+   - periods_per_year (float): Trades per year for the annualized Sharpe (default: from the trade times)
+   - chunk_elements (int): Path x trade values generated per chunk
+ Output:
+   - dict: num_trades, num_paths, method, observed (statistics of the actual order),
+     intervals (pd.DataFrame: mean, lower, median, upper per statistic), risk_of_ruin and prob_loss
+     (share of paths ruined / losing money), paths (pd.DataFrame of the statistics of every path)
+    '''
+    pnl, risk = trade_risk(trades, risk)
+    num_trades = len(pnl)
+    if num_trades == 0:
+        return {}
+    if periods_per_year is None:
+        periods_per_year = trades_per_year(trades)
+    r = pnl / risk
+    rng = np.random.default_rng(seed)
+
+    rows = max(1, chunk_elements // num_trades)
+    columns = {name: np.empty(num_paths) for name in STAT_COLUMNS}
+    for lo in range(0, num_paths, rows):
+        hi = min(lo + rows, num_paths)
+        idx = resample_indices(rng, num_trades, hi - lo, method)
+        stats = path_stats(pnl[idx], r[idx], risk_pct, periods_per_year)
+        for name in STAT_COLUMNS:
+            columns[name][lo:hi] = stats[name]
+    paths = pd.DataFrame(columns)
+
+    observed = path_stats(pnl[None, :], r[None, :], risk_pct, periods_per_year)
+    tail = (1 - confidence) / 2 * 100
+    lower, median, upper = np.percentile(paths.to_numpy(), [tail, 50, 100 - tail], axis=0)
+    intervals = pd.DataFrame({"mean": paths.mean().to_numpy(), "lower": lower, "median": median, "upper": upper},
+                             index=STAT_COLUMNS)
+    return {
+        "num_trades": num_trades,
+        "num_paths": num_paths,
+        "method": method,
+        "observed": {name: float(values[0]) for name, values in observed.items()},
+        "intervals": intervals,
+        "risk_of_ruin": float((paths["max_drawdown_pct"] >= ruin_drawdown).mean()),
+        "prob_loss": float((paths["total_pnl"] < 0).mean()),
+        "paths": paths,
+    }
+
+def print_report(result: dict):
+    '''
+ Prints a monte_carlo result.
+    '''
+    if not result:
+        print("[INFO] No trades to resample")
+        return
+    print(f"[INFO] {result['method']}: {result['num_paths']} paths of {result['num_trades']} trades")
+    table = result["intervals"].assign(observed=pd.Series(result["observed"]))
+    print(table.round(4).to_string())
+    print(f"[INFO] Risk of ruin: {result['risk_of_ruin']:.2%} | Probability of a loss: {result['prob_loss']:.2%}")
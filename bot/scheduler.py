@@ -0,0 +1,301 @@
+# scheduler.py
+'''
+Clock-driven job scheduler for the trading loop.
+Jobs are aligned to the wall clock in US/Eastern instead of sleeping a fixed time after each pass:
+  - at_bar_close: runs just after every bar boundary inside the trading window (e.g. 09:35:05, 09:40:05, ...)
+  - every: runs every N seconds inside the trading window (e.g. fast stop-loss checks)
+  - daily: runs once per trading day at a fixed time (e.g. the watchlist refresh)
+Market-hours jobs only fire on NYSE trading days (weekends, holidays and early closes are handled by
+MarketCalendar), so outside the session the scheduler just sleeps until the next job is due.
+A job that overruns does not queue up its missed runs; it resumes at its next boundary.
+The clock and sleep functions are injectable, which makes every schedule testable without waiting.
+'''
+import abc
+import datetime as dt
+import math
+import time
+import pytz
+import metrics
+
+ET = pytz.timezone("US/Eastern")
+MARKET_OPEN = dt.time(9, 30)
+MARKET_CLOSE = dt.time(16, 0)
+EARLY_CLOSE = dt.time(13, 0)
+BAR_SECONDS = 300
+BAR_CLOSE_DELAY = 5   # Seconds after the boundary, so the data source has published the bar
+LOOKAHEAD_DAYS = 14   # How far ahead to search for the next trading day
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return dt.date(year, month, day)
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th (1-based) weekday of a month; n = -1 for the last one
+    if n > 0:
+        first = dt.date(year, month, 1)
+        return first + dt.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = dt.date(year + month // 12, month % 12 + 1, 1) - dt.timedelta(days=1)
+    return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    if day.weekday() == 5:
+        return day - dt.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + dt.timedelta(days=1)
+    return day
+
+def nyse_holidays(year: int) -> set:
+    '''
+ Full-day NYSE holidays of a year, with the Saturday -> Friday / Sunday -> Monday observance rules.
+    '''
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),      # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),      # Washington's Birthday
+        _easter(year) - dt.timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),     # Memorial Day
+        _observed(dt.date(year, 7, 4)),   # Independence Day
+        _nth_weekday(year, 9, 0, 1),      # Labor Day
+        _nth_weekday(year, 11, 3, 4),     # Thanksgiving
+        _observed(dt.date(year, 12, 25)), # Christmas
+    }
+    new_year = dt.date(year, 1, 1)
+    if new_year.weekday() != 5:  # Not observed on the previous Friday
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(dt.date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+def nyse_early_closes(year: int) -> set:
+    '''
+ 13:00 closes: the day before Independence Day, the day after Thanksgiving and Christmas Eve
+ (when they are regular weekdays).
+    '''
+    holidays = nyse_holidays(year)
+    candidates = [
+        dt.date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + dt.timedelta(days=1),
+        dt.date(year, 12, 24),
+    ]
+    return {day for day in candidates if day.weekday() < 5 and day not in holidays}
+
+class MarketCalendar:
+    '''
+ Trading days and session hours.
+ Input:
+   - holidays (iterable of dates): Extra closed days on top of the NYSE rules
+   - early_closes (iterable of dates): Extra 13:00 closes
+    '''
+    def __init__(self, holidays=(), early_closes=()):
+        self.extra_holidays = set(holidays)
+        self.extra_early_closes = set(early_closes)
+        self._years = {}
+
+    def _year(self, year):
+        if year not in self._years:
+            self._years[year] = (nyse_holidays(year), nyse_early_closes(year))
+        return self._years[year]
+
+    def is_trading_day(self, day: dt.date) -> bool:
+        return day.weekday() < 5 and day not in self._year(day.year)[0] and day not in self.extra_holidays
+
+    def session(self, day: dt.date):
+        '''
+ Open and close of a trading day as ET datetimes, or None if the market is closed that day.
+        '''
+        if not self.is_trading_day(day):
+            return None
+        early = day in self._year(day.year)[1] or day in self.extra_early_closes
+        return (ET.localize(dt.datetime.combine(day, MARKET_OPEN)),
+                ET.localize(dt.datetime.combine(day, EARLY_CLOSE if early else MARKET_CLOSE)))
+
+    def is_open(self, now: dt.datetime) -> bool:
+        now = now.astimezone(ET)
+        session = self.session(now.date())
+        return session is not None and session[0] <= now < session[1]
+
+    def trading_days(self, start: dt.date, days=LOOKAHEAD_DAYS):
+        for offset in range(days + 1):
+            day = start + dt.timedelta(days=offset)
+            if self.is_trading_day(day):
+                yield day
+
+class _Job(abc.ABC):
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.next_time = None
+        self.runs = 0
+        self.skipped = 0
+
+    @abc.abstractmethod
+    def next_after(self, calendar, after):
+        '''
+ First run time strictly after `after`.
+        '''
+
+class _GridJob(_Job):
+    '''
+ Runs on a grid of `step` seconds inside the trading window [start, end] of each trading day
+ (boundaries after the window start, up to and including its end), `delay` seconds late.
+ With market_hours=False the window is the whole day, every day.
+    '''
+    def __init__(self, name, func, step, delay, start, end, market_hours=True):
+        super().__init__(name, func)
+        self.market_hours = market_hours
+        self.step = dt.timedelta(seconds=step)
+        self.delay = dt.timedelta(seconds=delay)
+        self.start = start
+        self.end = end
+
+    def window(self, calendar, day):
+        if self.market_hours:
+            session = calendar.session(day)
+            if session is None:
+                return None
+        else:
+            session = (ET.localize(dt.datetime.combine(day, dt.time(0))),
+                       ET.localize(dt.datetime.combine(day + dt.timedelta(days=1), dt.time(0))))
+        start, end = session
+        if self.start is not None:
+            start = max(start, ET.localize(dt.datetime.combine(day, self.start)))
+        if self.end is not None:
+            end = min(end, ET.localize(dt.datetime.combine(day, self.end)))
+        return start, end
+
+    def next_after(self, calendar, after):
+        after = after.astimezone(ET)
+        target = after - self.delay
+        days = (target.date() + dt.timedelta(days=offset) for offset in range(LOOKAHEAD_DAYS + 1))
+        for day in days:
+            window = self.window(calendar, day)
+            if window is None:
+                continue
+            start, end = window
+            k = max(math.floor((target - start) / self.step) + 1, 1)
+            boundary = start + k * self.step
+            if boundary <= end:
+                return boundary + self.delay
+        return None
+
+class _DailyJob(_Job):
+    def __init__(self, name, func, at, trading_days_only):
+        super().__init__(name, func)
+        self.at = at
+        self.trading_days_only = trading_days_only
+
+    def next_after(self, calendar, after):
+        after = after.astimezone(ET)
+        for offset in range(LOOKAHEAD_DAYS + 1):
+            day = after.date() + dt.timedelta(days=offset)
+            if self.trading_days_only and not calendar.is_trading_day(day):
+                continue
+            run_at = ET.localize(dt.datetime.combine(day, self.at))
+            if run_at > after:
+                return run_at
+        return None
+
+class Scheduler:
+    '''
+ Runs registered jobs at their scheduled times.
+ Input:
+   - clock (callable): Returns the current time as an aware datetime (default: now in US/Eastern)
+   - sleep (callable): sleep(seconds) (default: time.sleep)
+   - calendar (MarketCalendar): Trading days and hours (default: NYSE rules)
+    '''
+    def __init__(self, clock=None, sleep=None, calendar=None):
+        self.clock = clock or (lambda: dt.datetime.now(ET))
+        self.sleep = sleep or time.sleep
+        self.calendar = calendar or MarketCalendar()
+        self.jobs = []
+        self._stopped = False
+
+    def _add(self, job):
+        job.next_time = job.next_after(self.calendar, self.clock())
+        self.jobs.append(job)
+        return job
+
+    def at_bar_close(self, func, bar_seconds=BAR_SECONDS, delay=BAR_CLOSE_DELAY, start=None, end=None, name=None):
+        '''
+ Runs func(scheduled_time) after every bar boundary in the trading window.
+ Input:
+   - bar_seconds (int): Bar length
+   - delay (float): Seconds to wait after the boundary
+   - start, end (dt.time): Trading window within the session (default: the whole session)
+        '''
+        return self._add(_GridJob(name or func.__name__, func, bar_seconds, delay, start, end))
+
+    def every(self, seconds, func, start=None, end=None, market_hours=True, name=None):
+        '''
+ Runs func(scheduled_time) every `seconds` in the trading window, or around the clock with
+ market_hours=False (e.g. the heartbeat).
+        '''
+        return self._add(_GridJob(name or func.__name__, func, seconds, 0, start, end, market_hours))
+
+    def daily(self, at: dt.time, func, trading_days_only=True, name=None):
+        '''
+ Runs func(scheduled_time) once a day at `at` (ET), by default on trading days only.
+        '''
+        return self._add(_DailyJob(name or func.__name__, func, at, trading_days_only))
+
+    def stop(self):
+        self._stopped = True
+
+    def run_pending(self) -> list:
+        '''
+ Runs every job that is due, then schedules each one's next run after the current time.
+ Output: list of names of the jobs that ran
+        '''
+        ran = []
+        for job in sorted((j for j in self.jobs if j.next_time is not None), key=lambda j: j.next_time):
+            now = self.clock()
+            if job.next_time > now:
+                continue
+            scheduled = job.next_time
+            metrics.observe("scheduler_lateness", (now - scheduled).total_seconds())
+            try:
+                job.func(scheduled)
+            except Exception as e:
+                print(f"[ERROR] Job {job.name} failed: {e}")
+                metrics.incr(f"job_{job.name}_errors")
+            job.runs += 1
+            ran.append(job.name)
+
+            finished = self.clock()
+            job.next_time = job.next_after(self.calendar, scheduled)
+            # Drop the boundaries that passed while the job was running
+            if job.next_time is not None and job.next_time <= finished:
+                following = job.next_after(self.calendar, finished)
+                job.skipped += 1
+                print(f"[WARN] Job {job.name} overran, resuming at {following}")
+                job.next_time = following
+        return ran
+
+    def run(self, max_runs: int = None):
+        '''
+ Sleeps until the next job is due and runs it, until stop() is called (or max_runs job runs).
+        '''
+        self._stopped = False
+        total = 0
+        while not self._stopped:
+            pending = [job.next_time for job in self.jobs if job.next_time is not None]
+            if not pending:
+                print("[WARN] No scheduled jobs left")
+                return
+            wait = (min(pending) - self.clock()).total_seconds()
+            if wait > 0:
+                self.sleep(wait)
+                continue
+            total += len(self.run_pending())
+            if max_runs is not None and total >= max_runs:
+                return
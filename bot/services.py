@@ -0,0 +1,86 @@
+# services.py
+'''
+Small service container: shared clients are built on first use instead of at import time.
+Importing a bot module therefore never reads credentials, opens connections or loads the heavy
+client libraries (alpaca-py, yfinance); that cost is paid once, by the first call that needs it.
+Each service is a named factory; get() builds the instance once (thread-safe) and returns the same
+object afterwards. Tests swap in their own objects with provide() and drop them again with reset().
+Usage:
+   client = services.get("trading_client")
+   services.provide("trading_client", TradingClient("key", "secret", url_override=server.url))
+'''
+import os
+import threading
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+def register(name, factory):
+    '''
+ Registers (or replaces) the factory of a service; an instance already built is dropped.
+ Input:
+   - name (str): Service name
+   - factory (callable): Called without arguments on first use
+    '''
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+def get(name):
+    '''
+ Returns the service, building it on first use.
+    '''
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"Unknown service: {name}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+def provide(name, instance):
+    '''
+ Uses an existing object for a service (e.g. a client pointed at a fake server in tests).
+    '''
+    with _lock:
+        _instances[name] = instance
+
+def is_built(name) -> bool:
+    return name in _instances
+
+def reset(name=None):
+    '''
+ Forgets one built service (or all of them); the next get() builds it again.
+    '''
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+def alpaca_credentials():
+    '''
+ Alpaca API key and secret from APCA_API_KEY_ID / APCA_API_SECRET_KEY.
+ Raises RuntimeError when either is missing, so the error points at the environment rather than
+ surfacing later as an authentication failure inside alpaca-py.
+    '''
+    key, secret = os.getenv("APCA_API_KEY_ID"), os.getenv("APCA_API_SECRET_KEY")
+    if not key or not secret:
+        raise RuntimeError("Alpaca credentials missing: set APCA_API_KEY_ID and APCA_API_SECRET_KEY")
+    return key, secret
+
+def _trading_client():
+    key, secret = alpaca_credentials()
+    from alpaca.trading.client import TradingClient
+    return TradingClient(key, secret, paper=True)
+
+def _async_broker():
+    from broker_async import AsyncBroker
+    return AsyncBroker(get("trading_client"))
+
+register("trading_client", _trading_client)
+register("async_broker", _async_broker)
@@ -12,9 +12,146 @@ Input:
 Output:
   - pd.Series: Series of trading signals (1 for long, -1 for short, 0 for exit/hold)
 '''
+import numpy as np
 import pandas as pd
+import metrics
+
+SIGNAL_COLUMNS = ["close", "vwap", "sma_20"]
+
+def _next_index(indices, start):
+    '''
+ Returns the first value in a sorted index array that is >= start, or None if there is none.
+    '''
+    k = np.searchsorted(indices, start)
+    return int(indices[k]) if k < len(indices) else None
+
+def generate_signal_arrays(close, vwap, sma):
+    '''
+ Runs the long/short/exit state machine directly on NumPy arrays.
+ All entry/exit conditions are evaluated for every bar in one vectorized pass; the state machine
+ then jumps from one transition to the next instead of visiting every bar.
+ Input:
+   - close, vwap, sma (np.ndarray): Aligned price, VWAP and SMA arrays of equal length
+ Output:
+   - tuple(np.ndarray, np.ndarray): (signal, position) int64 arrays, identical to the bar-by-bar loop
+    '''
+    close = np.asarray(close)
+    vwap = np.asarray(vwap)
+    sma = np.asarray(sma)
+
+    n = len(close)
+    signal = np.zeros(n, dtype=np.int64)
+    position = np.zeros(n, dtype=np.int64)
+    if n < 2:
+        return signal, position
+
+    cur_close, cur_vwap, cur_sma = close[1:], vwap[1:], sma[1:]
+    prev_close, prev_vwap, prev_sma = close[:-1], vwap[:-1], sma[:-1]
+
+    above = (cur_close > cur_vwap) & (cur_close > cur_sma)
+    below = (cur_close < cur_vwap) & (cur_close < cur_sma)
+
+    # Bar indices (in frame coordinates) where each transition is allowed
+    long_entries = np.flatnonzero(((prev_close <= prev_vwap) | (prev_close <= prev_sma)) & above) + 1
+    short_entries = np.flatnonzero(((prev_close >= prev_vwap) | (prev_close >= prev_sma)) & below) + 1
+    long_exits = np.flatnonzero((cur_close < cur_vwap) | (cur_close < cur_sma)) + 1
+    short_exits = np.flatnonzero((cur_close > cur_vwap) | (cur_close > cur_sma)) + 1
+
+    i = 1
+    while True:
+        # === FLAT: wait for the next long or short entry ===
+        next_long = _next_index(long_entries, i)
+        next_short = _next_index(short_entries, i)
+        if next_long is None and next_short is None:
+            break
+        if next_short is None or (next_long is not None and next_long <= next_short):
+            entry, state, exits = next_long, 1, long_exits
+        else:
+            entry, state, exits = next_short, -1, short_exits
+        signal[entry] = state
+
+        # === IN POSITION: hold until the matching exit ===
+        exit_bar = _next_index(exits, entry + 1)
+        if exit_bar is None:
+            position[entry:] = state
+            break
+        position[entry:exit_bar] = state
+        i = exit_bar + 1
+
+    return signal, position
+
+def signal_events(index, signal, position):
+    '''
+ Builds the event log (entries and exits) from signal/position arrays without touching every bar.
+ Input:
+   - index (pd.Index): Timestamps aligned with the arrays
+   - signal, position (np.ndarray): Output of generate_signal_arrays
+ Output:
+   - list of tuples: (timestamp, event) in chronological order, event is one of
+     "LONG ENTRY", "SHORT ENTRY", "EXIT LONG", "EXIT SHORT"
+    '''
+    prev_position = np.concatenate(([0], position[:-1]))
+    exits = (position == 0) & (prev_position != 0)
+    event_bars = np.flatnonzero((signal != 0) | exits)
+
+    events = []
+    for i in event_bars:
+        if signal[i] == 1:
+            label = "LONG ENTRY"
+        elif signal[i] == -1:
+            label = "SHORT ENTRY"
+        else:
+            label = "EXIT LONG" if prev_position[i] == 1 else "EXIT SHORT"
+        events.append((index[i], label))
+    return events
+
+def _run_state_machine(df: pd.DataFrame):
+    for col in SIGNAL_COLUMNS:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column: {col}")
 
-def generate_signal(df: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
+    return generate_signal_arrays(
+        df["close"].to_numpy(), df["vwap"].to_numpy(), df["sma_20"].to_numpy()
+    )
+
+@metrics.timed()
+def generate_signal(df: pd.DataFrame, verbose: bool = False, events: list = None) -> pd.Series:
+    '''
+ Array-backed version of the signal state machine. Produces the same 'signal' output as generate_signal_loop.
+ Input:
+   - df (pd.DataFrame): DataFrame with 'close', 'vwap', and 'sma_20' columns
+   - verbose (bool): If True, prints the event log once after the signals are computed
+   - events (list): Optional list that receives (timestamp, event) tuples
+ Output:
+   - pd.Series: Series of trading signals named 'signal'
+    '''
+    signal, position = _run_state_machine(df)
+
+    if verbose or events is not None:
+        log = signal_events(df.index, signal, position)
+        if events is not None:
+            events.extend(log)
+        if verbose and log:
+            print("\n".join(f"[{timestamp}] {label}" for timestamp, label in log))
+
+    return pd.Series(signal, index=df.index, name="signal")
+
+def generate_signal_positions(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+ Returns both the 'signal' and 'position' columns produced by the state machine.
+ Input:
+   - df (pd.DataFrame): DataFrame with 'close', 'vwap', and 'sma_20' columns
+ Output:
+   - pd.DataFrame: DataFrame with 'signal' and 'position' columns, same index as the input
+    '''
+    signal, position = _run_state_machine(df)
+    return pd.DataFrame({"signal": signal, "position": position}, index=df.index)
+
+def generate_signal_loop(df: pd.DataFrame, verbose: bool = False, return_position: bool = False):
+    '''
+ Reference bar-by-bar implementation of the state machine, kept for equivalence tests and benchmarks.
+ Set return_position=True to get both the 'signal' and 'position' columns.
+    '''
     df = df.copy()
 
     for col in ["close", "vwap", "sma_20"]:
@@ -73,6 +210,8 @@ def generate_signal(df: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
         # Set position column regardless
         df.at[timestamp, "position"] = current_position
 
+    if return_position:
+        return df[["signal", "position"]]
     return df["signal"]
 
 
@@ -0,0 +1,212 @@
+# simulator.py
+'''
+Event-driven replay of the live trading loop.
+Historical 5-minute bars for the whole watchlist are replayed bar by bar through the same
+strategy.decide function main.py uses, with SimulatedBroker standing in for broker_alpaca.
+All per-bar inputs (signal, volume average, hourly trend SMA, ATR) are computed up front into
+preallocated (bar x symbol) arrays, so the replay loop only reads numbers and never touches a DataFrame.
+Differences from live trading:
+  - the signal state machine runs over the full history instead of each cycle's 10-day window
+  - orders fill at the close of the bar that triggered them
+'''
+import functools
+import itertools
+import numpy as np
+import pandas as pd
+from backtester import daily_atr_from_intraday, ATR_PERIOD
+from indicators import calculate_vwap, calculate_intraday_sma
+from signal_generator import generate_signal_arrays
+from strategy import (decide, RISK_PER_TRADE_PCT, VOLUME_AVG_WINDOW, TREND_SMA_WINDOW,
+                      HOURLY_PERIOD_DAYS, TRADE_START, TRADE_END)
+
+class SimulatedBroker:
+    '''
+ Drop-in for the broker_alpaca functions: market orders fill immediately at the current price.
+ Input:
+   - cash (float): Starting cash
+    '''
+    def __init__(self, cash=100_000.0):
+        self.cash = float(cash)
+        self.positions = {}   # symbol -> signed quantity
+        self.prices = {}      # symbol -> last price
+        self.fills = []
+        self._order_ids = itertools.count(1)
+        self.now = None
+
+    def get_account_info(self):
+        equity = self.equity()
+        return {"cash": self.cash, "buying_power": self.cash, "portfolio_value": equity, "status": "ACTIVE"}
+
+    def get_open_positions(self):
+        return dict(self.positions)
+
+    def submit_market_order(self, symbol, qty, side="buy"):
+        price = self.prices[symbol]
+        signed = qty if side == "buy" else -qty
+        self.cash -= signed * price
+        held = self.positions.get(symbol, 0.0) + signed
+        if abs(held) < 1e-9:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = held
+        order_id = next(self._order_ids)
+        self.fills.append((self.now, symbol, side, qty, price, order_id))
+        return order_id
+
+    def equity(self):
+        return self.cash + sum(qty * self.prices[symbol] for symbol, qty in self.positions.items())
+
+def hourly_trend_sma(df: pd.DataFrame, window=TREND_SMA_WINDOW, sessions=HOURLY_PERIOD_DAYS) -> np.ndarray:
+    '''
+ For every 5-minute bar, the hourly SMA main.py would see at that moment: hourly bars aligned at
+ 09:30 (as Yahoo's 60m bars are), the still-forming hour closing at the current price, and only the
+ last `sessions` trading days of hourly bars available (Yahoo's "Nd" period).
+ Input:
+   - df (pd.DataFrame): 5-minute bars with a 'close' column, indexed by timestamp
+   - window (int): Number of hourly bars in the SMA
+   - sessions (int): Days of hourly history visible to the live loop
+ Output:
+   - np.ndarray: SMA per 5-minute bar (NaN when fewer than `window` hourly bars are visible)
+    '''
+    close = df["close"].to_numpy(dtype=float)
+    index = df.index
+    dates = index.normalize()
+    minutes = (index - dates) // pd.Timedelta(minutes=1)
+    hour_of_session = (np.asarray(minutes) - (9 * 60 + 30)) // 60
+
+    session_no = np.unique(dates.asi8, return_inverse=True)[1]
+    bucket_key = session_no * 100 + hour_of_session
+    new_bucket = np.concatenate(([True], bucket_key[1:] != bucket_key[:-1]))
+    bucket = np.cumsum(new_bucket) - 1   # global hourly bucket number per bar
+
+    # Close of each completed hourly bucket, and a running sum over buckets
+    bucket_close = close[np.flatnonzero(np.concatenate((new_bucket[1:], [True])))]
+    cum = np.concatenate(([0.0], np.cumsum(bucket_close)))
+
+    # First bucket still visible: start of the session `sessions - 1` days back
+    first_bucket_of_session = bucket[np.flatnonzero(np.concatenate(([True], session_no[1:] != session_no[:-1])))]
+    oldest_session = np.maximum(session_no - (sessions - 1), 0)
+    visible = bucket - first_bucket_of_session[oldest_session] + 1
+
+    # window - 1 completed buckets plus the forming one at the current close
+    lo = np.maximum(bucket - (window - 1), 0)
+    sma = (cum[bucket] - cum[lo] + close) / window
+    sma[visible < window] = np.nan
+    return sma
+
+def _prepare(panel, atr, timeline, hourly_sessions, feature_store=None):
+    symbols = list(panel)
+    shape = (len(timeline), len(symbols))
+    arrays = {name: np.full(shape, np.nan) for name in ("close", "volume", "avg_volume", "sma_50", "atr")}
+    arrays["signal"] = np.zeros(shape, dtype=np.int64)
+
+    for j, symbol in enumerate(symbols):
+        df = panel[symbol]
+        rows = timeline.get_indexer(df.index)
+        if feature_store is not None:
+            vwap = feature_store.get(symbol, df, "vwap")
+            sma_20 = feature_store.get(symbol, df, "intraday_sma", window=20)
+        else:
+            vwap = calculate_vwap(df).to_numpy()
+            sma_20 = calculate_intraday_sma(df, window=20).reindex(df.index).to_numpy()
+        signal, _ = generate_signal_arrays(df["close"].to_numpy(), vwap, sma_20)
+
+        arrays["close"][rows, j] = df["close"].to_numpy(dtype=float)
+        arrays["volume"][rows, j] = df["volume"].to_numpy(dtype=float)
+        arrays["avg_volume"][rows, j] = df["volume"].rolling(VOLUME_AVG_WINDOW).mean().to_numpy()
+        if feature_store is not None:
+            arrays["sma_50"][rows, j] = feature_store.get(symbol, df, "trend_sma", window=TREND_SMA_WINDOW,
+                                                          sessions=hourly_sessions)
+        else:
+            arrays["sma_50"][rows, j] = hourly_trend_sma(df, sessions=hourly_sessions)
+        arrays["signal"][rows, j] = signal
+        if atr is not None and symbol in atr:
+            arrays["atr"][rows, j] = atr[symbol]
+        elif feature_store is not None:
+            arrays["atr"][rows, j] = feature_store.get(symbol, df, "daily_atr", period=ATR_PERIOD)
+        else:
+            arrays["atr"][rows, j] = daily_atr_from_intraday(df)
+    return symbols, arrays
+
+def replay(panel: dict, atr: dict = None, starting_cash=100_000.0, risk_pct=RISK_PER_TRADE_PCT,
+           hourly_sessions=HOURLY_PERIOD_DAYS, feature_store=None) -> dict:
+    '''
+ Replays historical bars through the live decision logic.
+ Input:
+   - panel (dict): Symbol -> DataFrame of 5-minute bars ('high', 'low', 'close', 'volume'), the watchlist
+   - atr (dict): Optional symbol -> fixed daily ATR; otherwise the daily ATR is derived from the bars
+   - starting_cash (float): Starting account equity
+   - risk_pct (float): Fraction of equity risked per trade
+   - hourly_sessions (int): Days of hourly bars the trend SMA can see (live: HOURLY_PERIOD_DAYS)
+   - feature_store (FeatureStore): Optional indicator store, so repeated replays of the same history
+     read VWAP, SMAs and ATR from disk
+ Output:
+   - dict: 'fills' (DataFrame of executed orders, like the live trade log), 'equity' (Series per bar),
+     'broker' (the SimulatedBroker) and 'position_tracker' (final tracker state)
+    '''
+    timeline = functools.reduce(pd.DatetimeIndex.union, (df.index for df in panel.values()))
+    symbols, arrays = _prepare(panel, atr, timeline, hourly_sessions, feature_store)
+    close, volume, avg_volume = arrays["close"], arrays["volume"], arrays["avg_volume"]
+    sma_50, atr_arr, signal = arrays["sma_50"], arrays["atr"], arrays["signal"]
+
+    seconds = np.asarray((timeline - timeline.normalize()).total_seconds())
+    trade_time = ((seconds >= TRADE_START.hour * 3600 + TRADE_START.minute * 60)
+                  & (seconds <= TRADE_END.hour * 3600 + TRADE_END.minute * 60))
+    column = {symbol: j for j, symbol in enumerate(symbols)}
+
+    broker = SimulatedBroker(starting_cash)
+    position_tracker = {}
+    equity_curve = np.empty(len(timeline))
+    log = []
+
+    # Last known price per symbol, for fills and marking positions to market between a symbol's bars
+    marks = pd.DataFrame(close).ffill().to_numpy()
+
+    for t in range(len(timeline)):
+        row = close[t]
+        priced = np.flatnonzero(~np.isnan(row))
+        broker.prices = dict(zip(symbols, marks[t].tolist()))
+
+        # Same cycle snapshot as main.py: equity and positions are read once before any order
+        equity = broker.equity()
+        open_positions = broker.get_open_positions()
+
+        candidates = set(priced[signal[t, priced] != 0])
+        candidates.update(column[s] for s in open_positions if not np.isnan(row[column[s]]))
+        candidates.update(column[s] for s in position_tracker if not np.isnan(row[column[s]]))
+
+        for j in sorted(candidates):
+            symbol = symbols[j]
+            if np.isnan(atr_arr[t, j]):
+                continue
+            snapshot = {
+                "symbol": symbol,
+                "atr": atr_arr[t, j],
+                "signal": signal[t, j],
+                "close": row[j],
+                "volume": volume[t, j],
+                "avg_volume": avg_volume[t, j],
+                "sma_50": sma_50[t, j],
+            }
+            action = decide(snapshot, open_positions.get(symbol, 0.0), position_tracker.get(symbol),
+                            equity, trade_time[t], risk_pct)
+            if action is None:
+                continue
+            broker.now = timeline[t]
+            broker.submit_market_order(symbol, action["qty"], action["side"])
+            log.append((timeline[t], symbol, action["side"], action["qty"], action["price"],
+                        action["type"], snapshot["atr"]))
+            if action["track"] is not None:
+                position_tracker[symbol] = action["track"]
+            else:
+                position_tracker.pop(symbol, None)
+
+        equity_curve[t] = broker.equity()
+
+    fills = pd.DataFrame(log, columns=["timestamp", "symbol", "side", "qty", "price", "type", "ATR"])
+    return {
+        "fills": fills,
+        "equity": pd.Series(equity_curve, index=timeline, name="equity"),
+        "broker": broker,
+        "position_tracker": position_tracker,
+    }
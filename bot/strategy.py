@@ -0,0 +1,142 @@
+# strategy.py
+'''
+Strategy rules of the live trading loop.
+compute_snapshot turns one symbol's downloaded bars into the values the order logic needs (latest
+signal, close, volume filter, hourly trend SMA); decide applies the order rules to a snapshot.
+Has no broker or network imports, so it can run in a worker process or inside the simulator.
+'''
+import datetime as dt
+import math
+from signal_generator import generate_signal
+
+RISK_PER_TRADE_PCT = 0.01  # Lower per trade due to smarter sizing
+STOP_ATR_MULT = 1.5        # Stop-loss distance (and sizing risk) in ATRs
+TARGET_ATR_MULT = 2.5      # Take-profit distance in ATRs
+VOLUME_MULT = 1.5          # Entries need volume >= VOLUME_MULT x average volume
+VOLUME_AVG_WINDOW = 20
+TREND_SMA_WINDOW = 50      # Hourly bars in the trend SMA
+HOURLY_PERIOD_DAYS = 5     # Days of hourly bars downloaded for the trend SMA
+TRADE_START = dt.time(10, 0)
+TRADE_END = dt.time(15, 15)
+
+def compute_snapshot(symbol, df, hourly_df, atr):
+    '''
+ Computes the latest signal and filter values for one symbol.
+ Input:
+   - symbol (str): Ticker symbol
+   - df (pd.DataFrame): 5-minute bars with 'close', 'volume', 'vwap' and 'sma_20' columns
+   - hourly_df (pd.DataFrame): Hourly bars with a 'close' column
+   - atr (float): Daily ATR for the symbol
+ Output:
+   - dict: symbol, atr, signal, close, volume, avg_volume and sma_50 (NaN if not enough hourly bars)
+    '''
+    signal = generate_signal(df)
+    avg_volume = df["volume"].rolling(VOLUME_AVG_WINDOW).mean().iloc[-1]
+    sma_50 = hourly_df["close"].rolling(window=TREND_SMA_WINDOW).mean().iloc[-1]
+
+    return {
+        "symbol": symbol,
+        "atr": atr,
+        "signal": int(signal.iloc[-1]),
+        "close": float(df["close"].iloc[-1]),
+        "volume": float(df["volume"].iloc[-1]),
+        "avg_volume": float(avg_volume),
+        "sma_50": float(sma_50) if not math.isnan(sma_50) else math.nan,
+    }
+
+def stop_or_target(tracked, price, atr, current_position):
+    '''
+ ATR stop-loss / take-profit check for one tracked position, the first rule decide applies.
+ Also used on its own by the fast stop checks between bar closes.
+ Input:
+   - tracked (dict): position_tracker entry {entry_price, direction}, or None
+   - price (float): Latest price
+   - atr (float): Daily ATR for the symbol
+   - current_position (float): Shares held (negative for a short)
+ Output:
+   - dict or None: Closing order (same format as decide), or None if neither level is hit
+    '''
+    if tracked is None:
+        return None
+
+    def order(side, qty, order_type):
+        return {"side": side, "qty": qty, "type": order_type, "price": price, "track": None}
+
+    entry_price = tracked["entry_price"]
+    direction = tracked["direction"]
+
+    if direction == 1:
+        if price <= entry_price - STOP_ATR_MULT * atr:
+            return order("sell", current_position, "stop_loss")
+        elif price >= entry_price + TARGET_ATR_MULT * atr:
+            return order("sell", current_position, "take_profit")
+
+    elif direction == -1:
+        if price >= entry_price + STOP_ATR_MULT * atr:
+            return order("buy", abs(current_position), "stop_loss")
+        elif price <= entry_price - TARGET_ATR_MULT * atr:
+            return order("buy", abs(current_position), "take_profit")
+
+    return None
+
+def decide(snapshot, current_position, tracked, equity, trade_time, risk_pct=RISK_PER_TRADE_PCT):
+    '''
+ Live decision rules for one symbol: ATR stop-loss / take-profit on tracked positions, then
+ trend-, volume- and risk-filtered entries and signal exits. Shared by main.py and the simulator.
+ Input:
+   - snapshot (dict): Output of compute_snapshot
+   - current_position (float): Shares held (negative for a short), 0 if flat
+   - tracked (dict): position_tracker entry {entry_price, direction} for the symbol, or None
+   - equity (float): Account equity used for risk-based sizing
+   - trade_time (bool): True if new entries are allowed right now
+   - risk_pct (float): Fraction of equity risked per trade
+ Output:
+   - dict or None: Order to place: side, qty, type ("stop_loss", "take_profit", "entry", "exit"),
+     price, and track (new position_tracker entry, or None to remove the symbol from the tracker)
+    '''
+    atr = snapshot["atr"]
+    latest_signal = snapshot["signal"]
+    latest_close = snapshot["close"]
+
+    if math.isnan(snapshot["sma_50"]):
+        return None
+
+    # Apply trend rule
+    is_uptrend = latest_close > snapshot["sma_50"]
+    is_downtrend = latest_close < snapshot["sma_50"]
+
+    def order(side, qty, order_type, track=None):
+        return {"side": side, "qty": qty, "type": order_type, "price": latest_close, "track": track}
+
+    # Stop-loss / Take-profit
+    exit_order = stop_or_target(tracked, latest_close, atr, current_position)
+    if exit_order is not None:
+        return exit_order
+
+    # Entry logic
+    if not trade_time:
+        return None
+    if snapshot["volume"] < VOLUME_MULT * snapshot["avg_volume"]:
+        return None
+
+    dollar_risk = equity * risk_pct
+    qty = dollar_risk / (STOP_ATR_MULT * atr)
+    if latest_signal == 1 and is_uptrend:
+        if current_position > 0:
+            return None
+        return order("buy", qty, "entry", {"entry_price": latest_close, "direction": 1})
+
+    elif latest_signal == -1 and is_downtrend:
+        if current_position < 0:
+            return None
+        if qty < 1:
+            return None
+        return order("sell", math.floor(qty), "entry", {"entry_price": latest_close, "direction": -1})
+
+    elif latest_signal == 0:
+        if current_position > 0:
+            return order("sell", current_position, "exit")
+        elif current_position < 0:
+            return order("buy", abs(current_position), "exit")
+
+    return None
@@ -0,0 +1,423 @@
+# stream.py
+'''
+Streaming market-data ingestion.
+Bar and trade updates from a push feed are aggregated into 5-minute bars in memory (BarAggregator).
+Every closed bar goes to StreamBars, which appends it to the symbol's history and, for an on_close
+callback, updates VWAP and the 20-bar SMA incrementally and evaluates generate_signal, so the signal is
+ready as soon as the bar closes.
+Every price update can also go straight to a price hook (the risk monitor) without waiting for the bar.
+Feeds:
+  - AlpacaFeed: Alpaca's websocket data stream (1-minute bars), needs alpaca-py and API keys
+  - TcpFeed: newline-delimited JSON messages over TCP, as sent by ReplayServer
+ReplayServer streams recorded bars (an NDJSON file, the bar cache or DataFrames) at a configurable
+speed, so the whole path can be run and load-tested offline. Messages use Alpaca's wire format:
+  {"T": "b", "S": symbol, "t": ISO time, "o", "h", "l", "c", "v"} for a bar starting at t
+  {"T": "t", "S": symbol, "t": ISO time, "p": price, "s": size} for a trade
+'''
+import asyncio
+import json
+import os
+import threading
+import time
+import pandas as pd
+import metrics
+from indicators import IncrementalVWAP, IncrementalIntradaySMA
+from signal_generator import generate_signal
+
+BAR_SECONDS = 300
+SOURCE_BAR_SECONDS = 60   # Length of the bars the feeds deliver
+STREAM_SESSIONS = 10      # Sessions of 5-minute bars kept per symbol
+REGULAR_OPEN = pd.Timedelta(hours=9, minutes=30)
+REGULAR_CLOSE = pd.Timedelta(hours=16)
+TZ = "America/New_York"
+
+class BarAggregator:
+    '''
+ Builds bars of `bar_seconds` from trade and smaller-bar updates, per symbol.
+ A bar is closed (and passed to on_bar(symbol, bar)) as soon as an update covers its last second, when
+ an update for a later bucket arrives, or when flush() is called after its end.
+ Input:
+   - on_bar (callable): on_bar(symbol, bar) with bar = {timestamp, open, high, low, close, volume}
+   - bar_seconds (int): Length of the aggregated bars
+   - regular_hours (bool): Drop updates outside 09:30-16:00 ET
+   - on_price (callable): Optional on_price(symbol, price, received) per accepted update, e.g. the risk monitor
+    '''
+    def __init__(self, on_bar, bar_seconds=BAR_SECONDS, regular_hours=True, on_price=None):
+        self.on_bar = on_bar
+        self.on_price = on_price
+        self.bar = pd.Timedelta(seconds=bar_seconds)
+        self.regular_hours = regular_hours
+        self._open = {}   # symbol -> bar being built
+        self._closed = {}  # symbol -> start of the last closed bar
+        self._lock = threading.Lock()
+
+    def _in_session(self, local):
+        since_midnight = local - local.normalize()
+        return local.dayofweek < 5 and REGULAR_OPEN <= since_midnight < REGULAR_CLOSE
+
+    def update_bar(self, symbol, timestamp, open, high, low, close, volume, seconds=SOURCE_BAR_SECONDS):
+        '''
+ Adds a bar of `seconds` length that starts at timestamp.
+        '''
+        received = time.perf_counter()
+        timestamp = pd.Timestamp(timestamp).tz_convert(TZ)
+        if self.regular_hours and not self._in_session(timestamp):
+            return
+        closed = self._add(symbol, timestamp, open, high, low, close, volume,
+                           complete=timestamp + pd.Timedelta(seconds=seconds))
+        if self.on_price is not None:
+            self.on_price(symbol, close, received)
+        self._emit(closed)
+
+    def update_trade(self, symbol, timestamp, price, size):
+        '''
+ Adds a single trade.
+        '''
+        received = time.perf_counter()
+        timestamp = pd.Timestamp(timestamp).tz_convert(TZ)
+        if self.regular_hours and not self._in_session(timestamp):
+            return
+        closed = self._add(symbol, timestamp, price, price, price, price, size, complete=timestamp)
+        if self.on_price is not None:
+            self.on_price(symbol, price, received)
+        self._emit(closed)
+
+    def _add(self, symbol, timestamp, open, high, low, close, volume, complete):
+        closed = []
+        bucket = timestamp.floor(self.bar)
+        with self._lock:
+            current = self._open.get(symbol)
+            if current is not None and current["timestamp"] < bucket:
+                closed.append((symbol, self._open.pop(symbol)))
+                current = None
+            if current is None:
+                if bucket <= self._closed.get(symbol, bucket - self.bar):
+                    return closed   # Late update for a bar that was already closed
+                current = self._open[symbol] = {"timestamp": bucket, "open": open, "high": high,
+                                                "low": low, "close": close, "volume": 0}
+            elif current["timestamp"] > bucket:
+                return closed
+            current["high"] = max(current["high"], high)
+            current["low"] = min(current["low"], low)
+            current["close"] = close
+            current["volume"] += int(volume)
+            if complete >= bucket + self.bar:
+                closed.append((symbol, self._open.pop(symbol)))
+            for symbol_, bar in closed:
+                self._closed[symbol_] = bar["timestamp"]
+        return closed
+
+    def flush(self, now=None) -> int:
+        '''
+ Closes every bar whose bucket has ended by `now` (all open bars if now is None).
+ Output: number of bars closed
+        '''
+        now = pd.Timestamp(now) if now is not None else None
+        with self._lock:
+            done = [symbol for symbol, bar in self._open.items()
+                    if now is None or bar["timestamp"] + self.bar <= now]
+            closed = [(symbol, self._open.pop(symbol)) for symbol in done]
+            for symbol, bar in closed:
+                self._closed[symbol] = bar["timestamp"]
+        self._emit(closed)
+        return len(closed)
+
+    def _emit(self, closed):
+        for symbol, bar in closed:
+            self.on_bar(symbol, bar)
+
+class StreamBars:
+    '''
+ In-memory 5-minute history per symbol, extended with every bar the aggregator closes.
+ Closed bars are buffered as plain rows and only turned into a DataFrame when the history is read. With
+ on_close set, the incremental VWAP / SMA are updated per bar, generate_signal is evaluated on every closed
+ bar and on_close(symbol, df) gets the bars with their 'vwap', 'sma_20' and 'signal' columns.
+ Input:
+   - on_close (callable): Optional callback per closed bar
+   - sessions (int): Sessions of bars to keep per symbol
+    '''
+    def __init__(self, on_close=None, sessions=STREAM_SESSIONS):
+        self.on_close = on_close
+        self.sessions = sessions
+        self._frames = {}
+        self._pending = {}  # symbol -> closed bars not yet appended to the frame
+        self._indicators = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+        self.bars_closed = 0
+
+    def seed(self, symbol, df: pd.DataFrame):
+        '''
+ Starts a symbol's history from downloaded or cached bars (lowercase OHLCV columns).
+        '''
+        with self._lock:
+            self._frames[symbol] = df[["open", "high", "low", "close", "volume"]]
+            self._pending.pop(symbol, None)
+            self._indicators.pop(symbol, None)
+            self._seeded.add(symbol)
+
+    def is_seeded(self, symbol) -> bool:
+        with self._lock:
+            return symbol in self._seeded
+
+    def on_bar(self, symbol, bar):
+        start = time.perf_counter()
+        with self._lock:
+            self._pending.setdefault(symbol, []).append(bar)
+            self.bars_closed += 1
+            # Without a callback nobody reads the indicators, so they are not kept up to date
+            if self.on_close is not None:
+                indicators = self._indicators.get(symbol)
+                if indicators is None:
+                    indicators = self._indicators[symbol] = (IncrementalVWAP(), IncrementalIntradaySMA(window=20))
+                    frame = self._frames.get(symbol)
+                    for indicator in indicators:
+                        if frame is not None and not frame.empty:
+                            indicator.update_many(frame)
+                        for row in self._pending[symbol]:
+                            indicator.update(row)
+                else:
+                    for indicator in indicators:
+                        indicator.update(bar)
+
+        if self.on_close is not None:
+            frame = self.bars(symbol)
+            with self._lock:
+                vwap, sma = indicators
+                df = frame.assign(vwap=vwap.series().reindex(frame.index), sma_20=sma.series().reindex(frame.index))
+            df["signal"] = generate_signal(df)
+            self.on_close(symbol, df)
+        metrics.observe("stream_bar_close", time.perf_counter() - start)
+
+    def bars(self, symbol) -> pd.DataFrame:
+        '''
+ Current history of a symbol, trimmed to the last `sessions` sessions (empty DataFrame if nothing
+ was seeded or streamed yet).
+        '''
+        with self._lock:
+            frame = self._frames.get(symbol)
+            pending = self._pending.pop(symbol, None)
+            if not pending:
+                return frame if frame is not None else pd.DataFrame()
+            rows = pd.DataFrame(pending).set_index("timestamp")
+            if frame is not None and not frame.empty:
+                if frame.index.tz is not None:
+                    rows.index = rows.index.tz_convert(frame.index.tz)
+                frame = pd.concat([frame[frame.index < rows.index[0]], rows])
+            else:
+                frame = rows
+            frame.index.name = "timestamp"
+            dates = frame.index.normalize()
+            frame = frame[dates >= dates.unique()[-self.sessions:][0]]
+            self._frames[symbol] = frame
+            for indicator in self._indicators.get(symbol, ()):
+                indicator.trim(frame.index[0])
+        return frame
+
+    def symbols(self) -> list:
+        with self._lock:
+            return list(self._frames.keys() | self._pending.keys())
+
+def dispatch(message: dict, aggregator: BarAggregator):
+    '''
+ Passes one feed message (Alpaca wire format) to the aggregator. Unknown message types are ignored.
+    '''
+    kind = message.get("T")
+    if kind == "b":
+        aggregator.update_bar(message["S"], message["t"], message["o"], message["h"], message["l"],
+                              message["c"], message["v"], message.get("len", SOURCE_BAR_SECONDS))
+    elif kind == "t":
+        aggregator.update_trade(message["S"], message["t"], message["p"], message["s"])
+
+def frames_to_messages(frames: dict, seconds=BAR_SECONDS) -> list:
+    '''
+ Turns recorded bars into bar messages ordered by time across symbols.
+ Input:
+   - frames (dict): Symbol -> DataFrame of bars with lowercase OHLCV columns
+   - seconds (int): Length of the recorded bars (sent as "len", which Alpaca's messages do not have)
+ Output:
+   - list of dicts: Messages in Alpaca's wire format
+    '''
+    messages = []
+    for symbol, df in frames.items():
+        index = df.index.tz_convert("UTC") if df.index.tz is not None else df.index.tz_localize(TZ).tz_convert("UTC")
+        times = index.strftime("%Y-%m-%dT%H:%M:%SZ")
+        for t, o, h, l, c, v in zip(times, df["open"].tolist(), df["high"].tolist(), df["low"].tolist(),
+                                    df["close"].tolist(), df["volume"].tolist()):
+            messages.append({"T": "b", "S": symbol, "t": t, "o": o, "h": h, "l": l, "c": c, "v": int(v), "len": seconds})
+    messages.sort(key=lambda m: m["t"])
+    return messages
+
+def write_recording(path: str, messages: list):
+    '''
+ Saves messages as newline-delimited JSON (the format ReplayServer.from_file reads).
+    '''
+    with open(path, "w") as f:
+        for message in messages:
+            f.write(json.dumps(message) + "\n")
+
+class ReplayServer:
+    '''
+ Local TCP server that streams recorded messages to every client that connects, one JSON object per line.
+ Input:
+   - messages (list of dicts): Messages ordered by "t"
+   - speed (float): Market seconds replayed per wall-clock second (0 = as fast as possible)
+   - host, port (str, int): Address to listen on (port 0 picks a free port)
+ Usage:
+   with ReplayServer.from_file("session.ndjson", speed=60) as server:
+       ... connect a TcpFeed to server.host, server.port
+    '''
+    def __init__(self, messages, speed=0.0, host="127.0.0.1", port=0):
+        self.messages = messages
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.sent = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="replay-server", daemon=True)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls([json.loads(line) for line in f if line.strip()], **kwargs)
+
+    @classmethod
+    def from_bar_store(cls, store, symbols, interval="5m", start=None, end=None, **kwargs):
+        frames = {symbol: store.read(symbol, interval, start=start, end=end) for symbol in symbols}
+        seconds = int(pd.Timedelta(interval.replace("m", "min")).total_seconds())
+        return cls(frames_to_messages({s: df for s, df in frames.items() if not df.empty}, seconds), **kwargs)
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._stream, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _stream(self, reader, writer):
+        first_time = None
+        started = time.perf_counter()
+        try:
+            for message in self.messages:
+                if self.speed > 0:
+                    market = pd.Timestamp(message["t"])
+                    first_time = first_time or market
+                    wait = (market - first_time).total_seconds() / self.speed - (time.perf_counter() - started)
+                    if wait > 0:
+                        await writer.drain()
+                        await asyncio.sleep(wait)
+                writer.write((json.dumps(message) + "\n").encode())
+                self.sent += 1
+                if self.sent % 1000 == 0:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+class TcpFeed:
+    '''
+ Reads newline-delimited JSON messages from a TCP server (e.g. ReplayServer) into an aggregator.
+    '''
+    def __init__(self, aggregator, host="127.0.0.1", port=0):
+        self.aggregator = aggregator
+        self.host = host
+        self.port = port
+        self.received = 0
+
+    def streams(self, symbol) -> bool:
+        # A replay carries every symbol that was recorded
+        return True
+
+    async def run(self):
+        '''
+ Consumes messages until the server closes the connection, then closes the bars still open.
+        '''
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            async for line in reader:
+                if line.strip():
+                    dispatch(json.loads(line), self.aggregator)
+                    self.received += 1
+        finally:
+            writer.close()
+        self.aggregator.flush()
+
+class AlpacaFeed:
+    '''
+ Alpaca's live market-data websocket (1-minute bars) feeding an aggregator.
+ Input:
+   - aggregator (BarAggregator): Receives the bars
+   - symbols (list): Symbols to subscribe to
+   - api_key, secret_key (str): Alpaca credentials (default: APCA_API_KEY_ID / APCA_API_SECRET_KEY)
+   - on_price (callable): on_price(symbol, price, received) for the trades of subscribe_trades symbols
+    '''
+    def __init__(self, aggregator, symbols, api_key=None, secret_key=None, on_price=None):
+        from alpaca.data.live import StockDataStream  # Optional dependency, only needed for live streaming
+        self.aggregator = aggregator
+        self.on_price = on_price
+        self._trade_symbols = set()
+        self._bar_symbols = set(symbols)
+        self.stream = StockDataStream(api_key or os.getenv("APCA_API_KEY_ID"),
+                                      secret_key or os.getenv("APCA_API_SECRET_KEY"))
+        if symbols:
+            self.stream.subscribe_bars(self._on_bar, *symbols)
+
+    async def _on_bar(self, bar):
+        self.aggregator.update_bar(bar.symbol, bar.timestamp, bar.open, bar.high, bar.low, bar.close, bar.volume)
+
+    async def _on_trade(self, trade):
+        self.on_price(trade.symbol, trade.price, time.perf_counter())
+
+    def subscribe(self, symbols):
+        '''
+ Adds symbols to the subscription (also while the stream is running); symbols already subscribed are skipped.
+        '''
+        new = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._bar_symbols]
+        if new:
+            self.stream.subscribe_bars(self._on_bar, *new)
+            self._bar_symbols.update(new)
+
+    def streams(self, symbol) -> bool:
+        '''
+ Whether the symbol's bars come from this feed.
+        '''
+        return symbol in self._bar_symbols
+
+    def subscribe_trades(self, symbols):
+        '''
+ Streams every trade of the given symbols to on_price (not into the bars, which come from the bar feed),
+ and drops the trade subscriptions of symbols no longer listed.
+        '''
+        symbols = set(symbols)
+        if self.on_price is None or symbols == self._trade_symbols:
+            return
+        if self._trade_symbols - symbols:
+            self.stream.unsubscribe_trades(*(self._trade_symbols - symbols))
+        if symbols - self._trade_symbols:
+            self.stream.subscribe_trades(self._on_trade, *(symbols - self._trade_symbols))
+        self._trade_symbols = symbols
+
+    def run(self):
+        '''
+ Blocks while streaming; call from a background thread.
+        '''
+        self.stream.run()
+
+    def stop(self):
+        self.stream.stop()
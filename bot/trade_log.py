@@ -0,0 +1,291 @@
+# trade_log.py
+'''
+Structured trade log: buffered writes, daily columnar partitions and a small query API.
+Trades are queued in memory and written by a background thread (every FLUSH_SECONDS, or as soon as
+BATCH_SIZE trades are waiting), so logging a fill never blocks the trading loop on file I/O.
+Each US/Eastern trading date is one partition, <root>/<YYYY-MM-DD>.npy, holding a NumPy structured
+array with an int64 UTC timestamp (ns) and one fixed-width field per column, the same layout as the bar
+cache. Partitions are rewritten through a temporary file, so a crash never leaves a half-written day.
+Queries only open the partitions inside the requested date range (memory-mapped), so months of live
+trades load in milliseconds, and round_trips() pairs them into completed trades that
+portfolio.analyze_trades accepts directly.
+'''
+import atexit
+import csv
+import glob
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+TRADE_LOG_DIR = os.getenv("BOT_TRADE_LOG_DIR", "trade_log")
+FLUSH_SECONDS = 1.0
+BATCH_SIZE = 256
+TZ = "America/New_York"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),   # UTC epoch nanoseconds
+    ("symbol", "<U12"),
+    ("side", "i1"),         # +1 buy, -1 sell
+    ("qty", "<f8"),
+    ("price", "<f8"),
+    ("type", "<U16"),       # entry, exit, stop_loss, take_profit, ...
+    ("atr", "<f8"),
+    ("order_id", "<U40"),
+])
+COLUMNS = ("symbol", "side", "qty", "price", "type", "atr", "order_id")
+
+class TradeLog:
+    '''
+ Buffered, partitioned trade log (see module docstring).
+ Input:
+   - root (str): Folder of the daily partitions (created on the first write)
+   - flush_seconds (float): Interval of the background writer
+   - batch_size (int): Queued trades that wake the writer early
+ Usage:
+   log = TradeLog("trade_log")
+   log.log("AAPL", "buy", 10, 190.5, "entry", 2.3)
+   fills = log.fills(symbol="AAPL", start="2025-03-01")
+    '''
+    def __init__(self, root=TRADE_LOG_DIR, flush_seconds=FLUSH_SECONDS, batch_size=BATCH_SIZE):
+        self.root = root
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.written = 0
+        self._queue = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, symbol, side, qty, price, trade_type, atr=float("nan"), timestamp=None, order_id=""):
+        '''
+ Queues one trade; it is written by the background writer.
+ Input:
+   - side (str): "buy" or "sell"
+   - timestamp (timestamp-like): Fill time (default: now)
+        '''
+        ts = pd.Timestamp.now(tz="UTC") if timestamp is None else pd.Timestamp(timestamp)
+        if ts.tzinfo is None:
+            ts = ts.tz_localize(TZ)
+        row = (ts.tz_convert("UTC").as_unit("ns").value, symbol, 1 if side == "buy" else -1, qty, price,
+               trade_type, np.nan if atr is None else atr, "" if order_id is None else str(order_id))
+        with self._lock:
+            self._queue.append(row)
+            full = len(self._queue) >= self.batch_size
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        # Caller holds the lock
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trade-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[ERROR] Trade log write failed: {e}")
+
+    def flush(self) -> int:
+        '''
+ Writes every queued trade to its daily partition now.
+ Output: number of trades written
+        '''
+        with self._lock:
+            rows, self._queue = self._queue, []
+        if not rows:
+            return 0
+        records = np.array(rows, dtype=RECORD_DTYPE)
+        dates = _local_dates(records["timestamp"])
+        with self._write_lock:
+            os.makedirs(self.root, exist_ok=True)
+            for date in np.unique(dates):
+                self._append(str(date), records[dates == date])
+            self.written += len(records)
+        return len(records)
+
+    def _append(self, date, records):
+        path = self._path(date)
+        if os.path.exists(path):
+            records = np.concatenate([np.load(path), records])
+        records = records[np.argsort(records["timestamp"], kind="stable")]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        '''
+ Stops the background writer and writes what is still queued.
+        '''
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+        self.flush()
+
+    def _path(self, date):
+        return os.path.join(self.root, f"{date}.npy")
+
+    def dates(self) -> list:
+        '''
+ Trading dates that have a partition, oldest first.
+        '''
+        return sorted(os.path.basename(p)[:-4] for p in glob.glob(os.path.join(self.root, "*-*-*.npy")))
+
+    def records(self, start=None, end=None) -> np.ndarray:
+        '''
+ Raw structured records of the partitions from start to end (inclusive dates), oldest first.
+        '''
+        first = pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None
+        last = pd.Timestamp(end).strftime("%Y-%m-%d") if end is not None else None
+        parts = [np.load(self._path(date), mmap_mode="r") for date in self.dates()
+                 if (first is None or date >= first) and (last is None or date <= last)]
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(parts)
+
+    def fills(self, symbol=None, start=None, end=None) -> pd.DataFrame:
+        '''
+ Logged trades, optionally for one symbol and a date range.
+ Input:
+   - symbol (str): Only this symbol (default: all)
+   - start, end (date-like): Inclusive trading dates (default: everything)
+ Output:
+   - pd.DataFrame: symbol, side ("buy" / "sell"), qty, price, type, atr, order_id, indexed by ET timestamp
+        '''
+        return _to_frame(self._symbol_records(symbol, start, end))
+
+    def round_trips(self, symbol=None, start=None, end=None) -> dict:
+        '''
+ Pairs the fills into completed trades: a trade opens when a symbol's position leaves zero and closes
+ when it returns to zero or flips sign. Trades still open at `end` are left out. Scale-ins and
+ partial exits are priced at average cost.
+ Output:
+   - dict of arrays: symbol, entry_time, exit_time, direction, qty (total opened), entry_price and
+     exit_price (quantity-weighted) and pnl (realized, in dollars); can be passed as-is to
+     portfolio.analyze_trades(trades=...)
+        '''
+        return round_trip_arrays(self._symbol_records(symbol, start, end))
+
+    def daily_pnl(self, start=None, end=None, symbol=None) -> pd.Series:
+        '''
+ Realized PnL of the trades closed on each trading date.
+ Output:
+   - pd.Series indexed by date
+        '''
+        trades = self.round_trips(symbol, start, end)
+        if len(trades["pnl"]) == 0:
+            return pd.Series(dtype=float, name="pnl")
+        dates = trades["exit_time"].normalize().tz_localize(None)
+        return pd.Series(trades["pnl"], index=dates, name="pnl").groupby(level=0).sum()
+
+    def _symbol_records(self, symbol, start, end):
+        records = self.records(start, end)
+        return records if symbol is None else records[records["symbol"] == symbol]
+
+    def import_csv(self, path: str) -> int:
+        '''
+ Imports a trade_log.csv written by the old per-trade CSV logger
+ (timestamp, symbol, side, qty, price, type, ATR).
+ Output: number of trades imported
+        '''
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            self.log(row["symbol"], row["side"], float(row["qty"]), float(row["price"]), row["type"],
+                     float(row["ATR"]) if row["ATR"] else float("nan"), timestamp=row["timestamp"])
+        self.flush()
+        return len(rows)
+
+def _local_dates(timestamps):
+    index = pd.to_datetime(timestamps, utc=True).tz_convert(TZ)
+    return np.asarray(index.strftime("%Y-%m-%d"))
+
+def _to_frame(records) -> pd.DataFrame:
+    index = pd.to_datetime(np.asarray(records["timestamp"]), utc=True).tz_convert(TZ)
+    index.name = "timestamp"
+    frame = pd.DataFrame({col: np.asarray(records[col]) for col in COLUMNS}, index=index)
+    frame["side"] = np.where(frame["side"].to_numpy() > 0, "buy", "sell")
+    return frame
+
+def round_trip_arrays(records: np.ndarray) -> dict:
+    '''
+ Round-trip pairing of fill records with average-cost accounting (see TradeLog.round_trips).
+ Fills that add to a position move its average cost; every fill that reduces it realizes
+ (price - average cost) on the quantity it closes, so scale-ins and partial exits are priced correctly.
+ Output:
+   - dict of arrays: symbol, entry_time, exit_time, direction, qty (total quantity opened),
+     entry_price / exit_price (quantity-weighted over the opening / closing fills) and realized pnl
+    '''
+    empty = {"symbol": np.array([], dtype="<U12"), "entry_time": pd.DatetimeIndex([], tz=TZ),
+             "exit_time": pd.DatetimeIndex([], tz=TZ), "direction": np.array([]), "qty": np.array([]),
+             "entry_price": np.array([]), "exit_price": np.array([]), "pnl": np.array([])}
+    if len(records) == 0:
+        return empty
+    order = np.lexsort((records["timestamp"], records["symbol"]))
+    rec = records[order]
+    symbols = rec["symbol"]
+    signed = rec["side"] * rec["qty"]
+
+    # Position after each fill, restarting from zero for every symbol
+    new_symbol = np.concatenate(([True], symbols[1:] != symbols[:-1]))
+    starts = np.flatnonzero(new_symbol)
+    cumulative = np.cumsum(signed)
+    offset = np.repeat(cumulative[starts] - signed[starts], np.diff(np.append(starts, len(rec))))
+    position = np.round(cumulative - offset, 9)
+    previous = np.where(new_symbol, 0.0, np.concatenate(([0.0], position[:-1])))
+    flipped = np.sign(position) * np.sign(previous) < 0
+
+    # Cost basis has to be carried from fill to fill, so this part walks the fills once
+    columns = {name: [] for name in ("entry", "exit", "direction", "qty", "entry_price", "exit_price", "pnl")}
+    entry = 0
+    cost = opened = opened_value = closed = closed_value = pnl = 0.0
+    for i, (prev, pos, price, flip) in enumerate(zip(previous.tolist(), position.tolist(), rec["price"].tolist(),
+                                                     flipped.tolist())):
+        ends = prev != 0 and (pos == 0 or flip)
+        if prev != 0:
+            reduced = abs(prev) if ends else max(abs(prev) - abs(pos), 0.0)
+            if reduced:
+                direction = 1.0 if prev > 0 else -1.0
+                pnl += (price - cost) * direction * reduced
+                closed += reduced
+                closed_value += reduced * price
+            if ends:
+                for name, value in (("entry", entry), ("exit", i), ("direction", direction), ("qty", opened),
+                                    ("entry_price", opened_value / opened), ("exit_price", closed_value / closed),
+                                    ("pnl", pnl)):
+                    columns[name].append(value)
+        if pos != 0 and (prev == 0 or flip):
+            entry, cost, opened, opened_value = i, price, abs(pos), abs(pos) * price
+            closed = closed_value = pnl = 0.0
+        elif abs(pos) > abs(prev):
+            added = abs(pos) - abs(prev)
+            cost = (abs(prev) * cost + added * price) / abs(pos)
+            opened += added
+            opened_value += added * price
+
+    if not columns["exit"]:
+        return empty
+    entries, closes = np.array(columns["entry"]), np.array(columns["exit"])
+    times = pd.to_datetime(rec["timestamp"], utc=True).tz_convert(TZ)
+    return {
+        "symbol": symbols[closes],
+        "entry_time": times[entries],
+        "exit_time": times[closes],
+        "direction": np.array(columns["direction"]),
+        "qty": np.array(columns["qty"]),
+        "entry_price": np.array(columns["entry_price"]),
+        "exit_price": np.array(columns["exit_price"]),
+        "pnl": np.array(columns["pnl"]),
+    }
@@ -0,0 +1,293 @@
+# universe.py
+'''
+S&P 500 membership kept in a local, versioned constituents file with its change history.
+The file (UNIVERSE_FILE, JSON) holds the current members, every known addition / removal with its
+effective date, and a version number that goes up whenever the membership or history changes. It is
+refreshed from Wikipedia only when it is older than MAX_AGE_DAYS: the scraped list is diffed against
+the stored one and the difference is recorded as a change, so the history keeps growing even after
+Wikipedia's own change table drops old rows. If the refresh fails (offline, layout change) the stored
+file keeps being used.
+Point-in-time membership is answered from memory: going backwards from the current members, the
+membership after every recorded change is precomputed once per load, and a lookup is a binary search
+over the change dates. Backtests can so select the symbols that were actually in the index on each
+date, without survivorship bias and without re-scraping.
+Tickers use Yahoo's format (BRK-B instead of BRK.B).
+'''
+import bisect
+import datetime as dt
+import json
+import os
+import threading
+
+UNIVERSE_FILE = os.getenv("BOT_UNIVERSE_FILE", "sp500_universe.json")
+MAX_AGE_DAYS = 7          # Older files are refreshed from Wikipedia on the next lookup
+RETRY_SECONDS = 3600      # Wait after a failed refresh before trying again (the stale file is used meanwhile)
+WIKIPEDIA_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+SCHEMA_VERSION = 1
+
+def normalize_ticker(ticker: str) -> str:
+    return str(ticker).strip().upper().replace(".", "-")
+
+def _date_key(date) -> str:
+    # "YYYY-MM-DD" for str, date, datetime, pd.Timestamp and np.datetime64, without importing pandas
+    if date is None:
+        return dt.date.today().isoformat()
+    return str(date)[:10]
+
+def fetch_wikipedia(url=WIKIPEDIA_URL):
+    '''
+ Scrapes the current constituents and the "selected changes" table.
+ Output:
+   - (list of str, list of dicts): members, and changes as {date, added, removed} (lists of tickers)
+    '''
+    import pandas as pd   # read_html pulls in lxml; only paid when the file actually needs a refresh
+    tables = pd.read_html(url)
+    members = sorted({normalize_ticker(t) for t in tables[0]["Symbol"].dropna()})
+
+    changes = []
+    table = tables[1]
+    columns = {col: "_".join(str(part) for part in col) if isinstance(col, tuple) else str(col) for col in table.columns}
+    table = table.rename(columns=columns)
+    date_col = next(c for c in table.columns if "date" in c.lower())
+    added_col = next(c for c in table.columns if c.lower().startswith("added") and "ticker" in c.lower())
+    removed_col = next(c for c in table.columns if c.lower().startswith("removed") and "ticker" in c.lower())
+    dates = pd.to_datetime(table[date_col], errors="coerce", format="mixed")
+    for date, added, removed in zip(dates, table[added_col], table[removed_col]):
+        if pd.isna(date):
+            continue
+        change = {"date": date.strftime("%Y-%m-%d"),
+                  "added": [normalize_ticker(added)] if isinstance(added, str) and added.strip() else [],
+                  "removed": [normalize_ticker(removed)] if isinstance(removed, str) and removed.strip() else []}
+        if change["added"] or change["removed"]:
+            changes.append(change)
+    return members, changes
+
+def merge_changes(*histories) -> list:
+    '''
+ Combines change lists: one entry per date with the union of its additions and removals (a ticker
+ both added and removed on the same date keeps both), sorted by date.
+    '''
+    by_date = {}
+    for history in histories:
+        for change in history:
+            entry = by_date.setdefault(change["date"], {"date": change["date"], "added": set(), "removed": set()})
+            entry["added"].update(change.get("added", ()))
+            entry["removed"].update(change.get("removed", ()))
+    return [{"date": d, "added": sorted(by_date[d]["added"]), "removed": sorted(by_date[d]["removed"])}
+            for d in sorted(by_date)]
+
+class Universe:
+    '''
+ Versioned S&P 500 membership with point-in-time lookups (see module docstring).
+ Input:
+   - path (str): Constituents file
+   - max_age_days (float): Age after which a lookup refreshes the file
+   - fetch (callable): Returns (members, changes) like fetch_wikipedia (replaceable for tests / other sources)
+ Usage:
+   universe = Universe()
+   tickers = universe.members()                 # current, refreshed if stale
+   tickers = universe.members("2020-03-02")     # as of that date
+   universe.is_member("TSLA", "2020-12-01")
+    '''
+    def __init__(self, path=UNIVERSE_FILE, max_age_days=MAX_AGE_DAYS, fetch=fetch_wikipedia):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.fetch = fetch
+        self.data = None
+        self._dates = []        # Change dates, ascending
+        self._snapshots = []    # Membership (frozenset) after each change; [-1] is the current one
+        self._initial = frozenset()   # Membership before the first recorded change
+        self._current = frozenset()
+        self._current_sorted = ()
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    # --- Loading and refreshing ---
+    def _load(self):
+        if self.data is None and os.path.exists(self.path):
+            with open(self.path) as f:
+                self._index(json.load(f))
+        return self.data
+
+    def _index(self, data):
+        history = data["history"]
+        members = frozenset(data["members"])
+        snapshots = [members] * len(history)
+        current = members
+        for k in range(len(history) - 1, -1, -1):   # Walk back from today, undoing each change
+            snapshots[k] = current
+            current = (current - set(history[k]["added"])) | set(history[k]["removed"])
+        self._dates = [change["date"] for change in history]
+        self._snapshots = snapshots
+        self._initial = current
+        self._current = members
+        self._current_sorted = tuple(sorted(members))
+        self.data = data
+
+    def _save(self, data):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self, now=None) -> bool:
+        data = self._load()
+        if data is None:
+            return True
+        now = now or dt.datetime.now(dt.timezone.utc)
+        checked = dt.datetime.fromisoformat(data["checked"])
+        return (now - checked).total_seconds() > self.max_age_days * 86400
+
+    def refresh(self, force=False, now=None) -> dict:
+        '''
+ Re-scrapes the constituents if the file is stale (or force is set) and records what changed.
+ Output:
+   - dict: {"version", "added", "removed"} of this refresh (empty lists when nothing changed or
+     the refresh was skipped / failed)
+        '''
+        with self._lock:
+            if not force and not self.is_stale(now):
+                return {"version": self.data["version"], "added": [], "removed": []}
+            now = now or dt.datetime.now(dt.timezone.utc)
+            try:
+                members, changes = self.fetch()
+            except Exception as e:
+                if self._load() is None:
+                    raise RuntimeError(f"No S&P 500 constituents file at {self.path} and the refresh failed: {e}")
+                self._failed_at = now
+                print(f"[WARN] Universe refresh failed, using the file from {self.data['checked']}: {e}")
+                return {"version": self.data["version"], "added": [], "removed": []}
+            self._failed_at = None
+            # Announced changes that are not effective yet would break the walk back from today's members
+            today = now.astimezone(dt.timezone.utc).date().isoformat()
+            changes = [c for c in changes if c["date"] <= today]
+            return self._apply(sorted({normalize_ticker(t) for t in members}), changes, now)
+
+    def _apply(self, members, changes, now):
+        old = self._load()
+        today = now.astimezone(dt.timezone.utc).date().isoformat()
+        if old is None:
+            data = {"schema": SCHEMA_VERSION, "version": 1, "source": WIKIPEDIA_URL, "members": members,
+                    "history": merge_changes(changes), "updated": now.isoformat(), "checked": now.isoformat()}
+            self._save(data)
+            self._index(data)
+            print(f"[INFO] Universe created: {len(members)} members, {len(data['history'])} recorded changes")
+            return {"version": 1, "added": members, "removed": []}
+
+        added = sorted(set(members) - self._current)
+        removed = sorted(self._current - set(members))
+        history = merge_changes(old["history"], changes)
+        # The scraped change table may lag (or skip) a reconstitution; record anything it doesn't explain
+        explained = [c for c in history if c["date"] > old["checked"][:10]]
+        explained_added = {t for c in explained for t in c["added"]}
+        explained_removed = {t for c in explained for t in c["removed"]}
+        unexplained = {"date": today, "added": [t for t in added if t not in explained_added],
+                       "removed": [t for t in removed if t not in explained_removed]}
+        if unexplained["added"] or unexplained["removed"]:
+            history = merge_changes(history, [unexplained])
+
+        data = dict(old, members=members, checked=now.isoformat())
+        if history != old["history"] or members != old["members"]:
+            data.update(history=history, version=old["version"] + 1, updated=now.isoformat())
+            print(f"[INFO] Universe updated to version {data['version']}: +{len(added)} -{len(removed)}")
+        self._save(data)
+        self._index(data)
+        return {"version": data["version"], "added": added, "removed": removed}
+
+    def _ready(self):
+        if self.data is None or self.is_stale():
+            retry = self._failed_at is not None and \
+                (dt.datetime.now(dt.timezone.utc) - self._failed_at).total_seconds() < RETRY_SECONDS
+            if self._load() is None or not retry:
+                self.refresh()
+        return self.data
+
+    # --- Lookups ---
+    def members_set(self, date=None) -> frozenset:
+        '''
+ Members on a date (default: today) as a frozenset. Dates before the oldest recorded change return
+ the oldest membership that can be reconstructed.
+        '''
+        if self.data is None:
+            self._ready()
+        if date is None:
+            return self._current
+        k = bisect.bisect_right(self._dates, _date_key(date)) - 1
+        return self._snapshots[k] if k >= 0 else self._initial
+
+    def members(self, date=None) -> list:
+        '''
+ Sorted member tickers on a date (default: the current list, refreshed first if the file is stale).
+        '''
+        if date is None:
+            self._ready()
+            return list(self._current_sorted)
+        return sorted(self.members_set(date))
+
+    def is_member(self, ticker, date=None) -> bool:
+        return normalize_ticker(ticker) in self.members_set(date)
+
+    def history(self, ticker=None) -> list:
+        '''
+ Recorded changes, oldest first, optionally only those involving one ticker.
+        '''
+        if self.data is None:
+            self._ready()
+        history = self.data["history"]
+        if ticker is None:
+            return list(history)
+        ticker = normalize_ticker(ticker)
+        return [c for c in history if ticker in c["added"] or ticker in c["removed"]]
+
+    def ever_members(self, start=None, end=None) -> list:
+        '''
+ Every ticker that was a member at some point between start and end, i.e. the symbols a
+ survivorship-free backtest over that range needs data for.
+        '''
+        if self.data is None:
+            self._ready()
+        first = bisect.bisect_right(self._dates, _date_key(start)) - 1 if start is not None else -1
+        last = bisect.bisect_right(self._dates, _date_key(end)) if end is not None else len(self._dates)
+        tickers = set(self._snapshots[first] if first >= 0 else self._initial)
+        for snapshot in self._snapshots[max(first, 0):last]:
+            tickers |= snapshot
+        return sorted(tickers)
+
+    def membership_mask(self, tickers, dates):
+        '''
+ Point-in-time membership of many tickers over many dates, for masking backtest signals.
+ Input:
+   - tickers (list of str), dates (list of date-like, e.g. a DatetimeIndex)
+ Output:
+   - np.ndarray: bool array of shape (len(dates), len(tickers))
+        '''
+        import numpy as np
+        if self.data is None:
+            self._ready()
+        tickers = [normalize_ticker(t) for t in tickers]
+        keys = [_date_key(d) for d in dates]
+        mask = np.zeros((len(keys), len(tickers)), dtype=bool)
+        rows = {}
+        for i, key in enumerate(keys):
+            k = bisect.bisect_right(self._dates, key) - 1
+            if k not in rows:
+                members = self._snapshots[k] if k >= 0 else self._initial
+                rows[k] = np.array([t in members for t in tickers], dtype=bool)
+            mask[i] = rows[k]
+        return mask
+
+    @property
+    def version(self) -> int:
+        data = self._load()
+        return 0 if data is None else data["version"]
+
+_universe = None
+
+def get_universe() -> Universe:
+    '''
+ Returns the shared universe backed by UNIVERSE_FILE (created on first use).
+    '''
+    global _universe
+    if _universe is None:
+        _universe = Universe()
+    return _universe
@@ -0,0 +1,402 @@
+# walk_forward.py
+'''
+Walk-forward optimization of the strategy parameters (intraday SMA window, ATR stop / target multiples,
+confirmation lines, volume filter; see backtester.DEFAULT_PARAM_GRID).
+History is split into rolling windows of train_sessions followed by test_sessions (the next window
+starts step_sessions later). On every train window each configuration of the grid is backtested on
+every symbol, the best one by `objective` is picked, and only that one is traded on the following
+test window. The test-window trades of all windows together are the out-of-sample result, reported
+through portfolio.analyze_trades.
+The bar arrays of all symbols live in shared memory: the parent copies them once into one
+SharedMemory block per field, and the worker processes map the same blocks, so no DataFrame is
+pickled per task; a task only carries symbol numbers and a session range. Everything that only looks
+back (VWAP, daily ATR, average volume) is computed once on the full history, so a window sees the
+same values as a live run would. Train tasks for all windows are in flight together; a window's test
+tasks start as soon as its train results are in, and each finished window is written to the
+checkpoint folder, so an interrupted run resumes with the windows still missing.
+'''
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from bars import Bars, intraday_sma_into
+from backtester import (expand_param_grid, daily_atr_from_intraday, run_configs, DEFAULT_PARAM_GRID,
+                        VOLUME_AVG_WINDOW, ATR_PERIOD)
+from portfolio import analyze_trades
+
+TRAIN_SESSIONS = 60
+TEST_SESSIONS = 20
+OBJECTIVES = ("total_pnl", "avg_pnl", "profit_factor", "win_rate")
+TASKS_PER_PROCESS = 4   # Train tasks per window and process (smaller tasks balance better, larger ones cost less overhead)
+TZ = "America/New_York"
+
+FIELDS = {   # Shared per-bar arrays, all symbols concatenated
+    "timestamp": np.int64,
+    "session": np.int32,
+    "close": np.float64,
+    "volume": np.float64,
+    "vwap": np.float64,
+    "atr": np.float64,
+    "avg_volume": np.float64,
+}
+TRAIN_COLUMNS = ("num_trades", "total_pnl", "gross_profit", "gross_loss", "wins", "stop_exits", "target_exits")
+
+# --- Shared bar arrays ---
+
+def _prepare_symbol(symbol, df, feature_store=None):
+    bars = df if isinstance(df, Bars) else Bars.from_frame(df, price_dtype=None)
+    volume = bars.volume.astype(float)
+    stored = feature_store is not None and isinstance(df, pd.DataFrame)
+    if isinstance(df, pd.DataFrame) and "ATR" in df.columns:
+        atr = df["ATR"].to_numpy(dtype=float)
+    elif stored:
+        atr = feature_store.get(symbol, df, "daily_atr", period=ATR_PERIOD)
+    else:
+        atr = daily_atr_from_intraday(bars)
+    return {
+        "timestamp": bars.timestamp,
+        "session": bars.session,
+        "close": bars.close.astype(float),
+        "volume": volume,
+        "vwap": feature_store.get(symbol, df, "vwap") if stored else bars.vwap(),
+        "atr": atr,
+        "avg_volume": pd.Series(volume).rolling(VOLUME_AVG_WINDOW).mean().to_numpy(),
+    }
+
+class SharedBars:
+    '''
+ Per-bar arrays of many symbols in shared memory (one block per field, symbols back to back).
+ Created by the parent with SharedBars.create(panel); workers attach with SharedBars.attach(spec).
+    '''
+    def __init__(self, blocks, spec, owner):
+        self._blocks = blocks
+        self.spec = spec
+        self.owner = owner
+        self.arrays = {name: np.ndarray((spec["length"],), dtype=np.dtype(FIELDS[name]), buffer=block.buf)
+                       for name, block in blocks.items()}
+        self.offsets = np.asarray(spec["offsets"])
+        self.symbols = spec["symbols"]
+
+    @classmethod
+    def create(cls, panel: dict, feature_store=None) -> "SharedBars":
+        symbols = list(panel)
+        prepared = [_prepare_symbol(s, panel[s], feature_store) for s in symbols]
+        lengths = [len(p["close"]) for p in prepared]
+        offsets = np.concatenate(([0], np.cumsum(lengths))).tolist()
+        length = max(offsets[-1], 1)
+        blocks = {}
+        try:
+            for name, dtype in FIELDS.items():
+                block = shared_memory.SharedMemory(create=True, size=length * np.dtype(dtype).itemsize)
+                blocks[name] = block
+                target = np.ndarray((length,), dtype=dtype, buffer=block.buf)
+                for p, start in zip(prepared, offsets):
+                    target[start:start + len(p[name])] = p[name]
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        spec = {"names": {name: block.name for name, block in blocks.items()}, "length": length,
+                "offsets": offsets, "symbols": symbols}
+        return cls(blocks, spec, owner=True)
+
+    @classmethod
+    def attach(cls, spec) -> "SharedBars":
+        blocks = {name: shared_memory.SharedMemory(name=block) for name, block in spec["names"].items()}
+        return cls(blocks, spec, owner=False)
+
+    def symbol(self, i, first_session=None, end_session=None) -> dict:
+        '''
+ Views of symbol i's arrays, optionally only the sessions in [first_session, end_session).
+        '''
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        session = self.arrays["session"][start:stop]
+        lo = 0 if first_session is None else np.searchsorted(session, first_session, side="left")
+        hi = len(session) if end_session is None else np.searchsorted(session, end_session, side="left")
+        return {name: array[start + lo:start + hi] for name, array in self.arrays.items()}
+
+    def sessions(self) -> np.ndarray:
+        return np.unique(self.arrays["session"][:self.offsets[-1]])
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256(json.dumps(self.symbols).encode())
+        for name in ("timestamp", "close", "volume"):
+            digest.update(self.arrays[name][:self.offsets[-1]].tobytes())
+        return digest.hexdigest()[:16]
+
+    def close(self):
+        for block in self._blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self._blocks = {}
+
+# --- Worker side ---
+
+_shared = None   # SharedBars of this worker process
+
+def _init_worker(spec):
+    global _shared
+    _shared = SharedBars.attach(spec)
+
+def _run_symbol(data, configs):
+    close = data["close"]
+    if len(close) == 0:
+        return [None] * len(configs)
+    return run_configs(close, data["volume"], data["atr"], data["avg_volume"], data["vwap"],
+                       lambda window: intraday_sma_into(close, data["session"], window), configs)
+
+def _train_task(symbols, first_session, end_session, configs):
+    # Sum of the per-symbol trade statistics of every configuration: array (configs, TRAIN_COLUMNS)
+    totals = np.zeros((len(configs), len(TRAIN_COLUMNS)))
+    for i in symbols:
+        for k, trades in enumerate(_run_symbol(_shared.symbol(i, first_session, end_session), configs)):
+            if trades is None or len(trades["pnl"]) == 0:
+                continue
+            pnl = trades["pnl"]
+            totals[k] += (len(pnl), pnl.sum(), pnl[pnl > 0].sum(), -pnl[pnl < 0].sum(), (pnl > 0).sum(),
+                          (trades["reason"] == 1).sum(), (trades["reason"] == 2).sum())
+    return totals
+
+def _test_task(symbols, first_session, end_session, config):
+    # Out-of-sample trades of one configuration, as plain arrays
+    rows = []
+    for i in symbols:
+        data = _shared.symbol(i, first_session, end_session)
+        trades = _run_symbol(data, [config])[0]
+        if trades is None or len(trades["pnl"]) == 0:
+            continue
+        entry, exit_ = trades["entry_idx"], trades["exit_idx"]
+        rows.append({"symbol": np.full(len(entry), i), "entry_time": data["timestamp"][entry],
+                     "exit_time": data["timestamp"][exit_], "direction": trades["direction"].astype(float),
+                     "entry_price": data["close"][entry], "exit_price": data["close"][exit_],
+                     "pnl": trades["pnl"], "reason": trades["reason"]})
+    if not rows:
+        return None
+    return {key: np.concatenate([r[key] for r in rows]) for key in rows[0]}
+
+# --- Windows, selection and checkpoints ---
+
+def make_windows(sessions, train_sessions=TRAIN_SESSIONS, test_sessions=TEST_SESSIONS, step_sessions=None,
+                 anchored=False) -> list:
+    '''
+ Rolling (or anchored, i.e. expanding) train / test windows over a session calendar.
+ Input:
+   - sessions (array): Sorted session ids (days since 1970-01-01, see bars.session_ids)
+   - step_sessions (int): Sessions between window starts (default: test_sessions, so test windows tile)
+ Output:
+   - list of dicts: train_start, test_start, test_end as session ids (test_end exclusive)
+    '''
+    sessions = np.asarray(sessions)
+    step = step_sessions or test_sessions
+    windows = []
+    start = 0
+    while start + train_sessions + test_sessions <= len(sessions):
+        test_start = start + train_sessions
+        test_end = test_start + test_sessions
+        windows.append({
+            "train_start": int(sessions[0 if anchored else start]),
+            "test_start": int(sessions[test_start]),
+            "test_end": int(sessions[test_end]) if test_end < len(sessions) else int(sessions[-1]) + 1,
+        })
+        start += step
+    return windows
+
+def _score(totals, objective, min_trades):
+    num, pnl, profit, loss, wins = (totals[:, TRAIN_COLUMNS.index(c)]
+                                    for c in ("num_trades", "total_pnl", "gross_profit", "gross_loss", "wins"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = {
+            "total_pnl": pnl,
+            "avg_pnl": pnl / num,
+            "profit_factor": np.where(loss > 0, profit / loss, np.where(profit > 0, np.inf, 0.0)),
+            "win_rate": wins / num,
+        }[objective]
+    return np.where(num >= max(min_trades, 1), score, -np.inf)
+
+def _session_date(session_id) -> str:
+    return str(np.datetime64(int(session_id), "D"))
+
+def _checkpoint_path(folder, k):
+    return os.path.join(folder, f"window_{k:04d}.json")
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _open_checkpoint(folder, run_key):
+    os.makedirs(folder, exist_ok=True)
+    run_file = os.path.join(folder, "run.json")
+    if os.path.exists(run_file):
+        with open(run_file) as f:
+            saved = json.load(f)
+        if saved["key"] != run_key:
+            raise ValueError(f"Checkpoint folder {folder} belongs to a different run (data, grid or windows changed)")
+    else:
+        _write_json(run_file, {"key": run_key})
+
+def _window_record(k, window, configs, totals, best, trades, symbols):
+    record = {
+        "window": k,
+        "train_start": _session_date(window["train_start"]),
+        "test_start": _session_date(window["test_start"]),
+        "test_end": _session_date(window["test_end"] - 1),
+        "best": best,
+        "params": configs[best] if best is not None else None,
+        "train": totals.tolist(),
+        "trades": None,
+    }
+    if trades is not None:
+        record["trades"] = {key: (np.asarray(symbols)[values].tolist() if key == "symbol" else values.tolist())
+                            for key, values in trades.items()}
+    return record
+
+# --- Runner ---
+
+def walk_forward(panel: dict, param_grid: dict = None, train_sessions=TRAIN_SESSIONS, test_sessions=TEST_SESSIONS,
+                 step_sessions=None, anchored=False, objective="total_pnl", min_trades=1, processes=None,
+                 checkpoint_dir=None, feature_store=None) -> dict:
+    '''
+ Walk-forward optimization over many symbols (see module docstring).
+ Input:
+   - panel (dict): Symbol -> DataFrame (or Bars) of intraday bars with 'high', 'low', 'close', 'volume'
+     (optionally 'ATR'; otherwise the daily ATR is derived from the bars)
+   - param_grid (dict): Parameter name -> list of values, see backtester.DEFAULT_PARAM_GRID
+   - train_sessions, test_sessions, step_sessions (int): Window sizes in trading sessions
+   - anchored (bool): Train from the first session every time (expanding window) instead of rolling
+   - objective (str): Train statistic to maximize, one of OBJECTIVES (summed over all symbols)
+   - min_trades (int): Configurations with fewer train trades are never picked
+   - processes (int): Worker processes (None = one per CPU, 0 or 1 = run in this process)
+   - checkpoint_dir (str): Folder for per-window results; finished windows are not recomputed
+   - feature_store (FeatureStore): Optional indicator store for the VWAP and daily ATR of the panel
+ Output:
+   - dict:
+       windows: pd.DataFrame, one row per window with its dates, chosen parameters, train objective and
+                out-of-sample trades / PnL
+       trades: list of dicts, every out-of-sample trade (symbol, entry/exit time and price, direction, pnl)
+       stats: portfolio.analyze_trades of those trades
+       computed: number of windows computed by this call (the rest came from the checkpoint)
+    '''
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective} (expected one of {OBJECTIVES})")
+    configs = expand_param_grid(param_grid or {})
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    shared = SharedBars.create(panel, feature_store)
+    try:
+        windows = make_windows(shared.sessions(), train_sessions, test_sessions, step_sessions, anchored)
+        records = {}
+        if checkpoint_dir is not None:
+            run_key = hashlib.sha256(json.dumps([shared.fingerprint(), configs, windows]).encode()).hexdigest()[:16]
+            _open_checkpoint(checkpoint_dir, run_key)
+            for k in range(len(windows)):
+                if os.path.exists(_checkpoint_path(checkpoint_dir, k)):
+                    with open(_checkpoint_path(checkpoint_dir, k)) as f:
+                        records[k] = json.load(f)
+        pending = [k for k in range(len(windows)) if k not in records]
+
+        def finish(k, totals, best, trades):
+            record = _window_record(k, windows[k], configs, totals, best, trades, shared.symbols)
+            if checkpoint_dir is not None:
+                _write_json(_checkpoint_path(checkpoint_dir, k), record)
+            records[k] = record
+
+        n_symbols = len(shared.symbols)
+        chunks = np.array_split(np.arange(n_symbols), min(n_symbols, max(1, processes * TASKS_PER_PROCESS)))
+        chunks = [chunk.tolist() for chunk in chunks if len(chunk)]
+
+        def choose(totals):
+            scores = _score(totals, objective, min_trades)
+            return int(np.argmax(scores)) if np.isfinite(scores).any() else None
+
+        if processes <= 1:
+            _init_worker_local(shared)
+            for k in pending:
+                w = windows[k]
+                totals = sum(_train_task(chunk, w["train_start"], w["test_start"], configs) for chunk in chunks)
+                best = choose(totals)
+                parts = [] if best is None else [_test_task(chunk, w["test_start"], w["test_end"], configs[best])
+                                                 for chunk in chunks]
+                finish(k, totals, best, _merge_trades(parts))
+        elif pending:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+                train = {k: [pool.submit(_train_task, chunk, windows[k]["train_start"], windows[k]["test_start"], configs)
+                             for chunk in chunks] for k in pending}
+                test, chosen = {}, {}
+                futures = {f: ("train", k) for k, fs in train.items() for f in fs}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, k = futures.pop(future)
+                        future.result()   # Raise worker errors here
+                        if stage == "train" and all(f.done() for f in train[k]):
+                            totals = sum(f.result() for f in train[k])
+                            best = choose(totals)
+                            chosen[k] = (totals, best)
+                            if best is None:
+                                finish(k, totals, None, None)
+                                continue
+                            w = windows[k]
+                            test[k] = [pool.submit(_test_task, chunk, w["test_start"], w["test_end"], configs[best])
+                                       for chunk in chunks]
+                            futures.update({f: ("test", k) for f in test[k]})
+                        elif stage == "test" and all(f.done() for f in test[k]):
+                            finish(k, *chosen[k], _merge_trades([f.result() for f in test[k]]))
+    finally:
+        _release_worker_local()
+        shared.close()
+
+    return _report(records, windows, configs, objective, min_trades, computed=len(pending))
+
+def _init_worker_local(shared):
+    global _shared
+    _shared = shared
+
+def _release_worker_local():
+    global _shared
+    _shared = None
+
+def _merge_trades(parts):
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+def _report(records, windows, configs, objective, min_trades, computed):
+    rows, trades = [], []
+    for k in range(len(windows)):
+        record = records[k]
+        totals = np.asarray(record["train"]).reshape(len(configs), len(TRAIN_COLUMNS))
+        best = record["best"]
+        oos = record["trades"] or {"pnl": []}
+        row = {"window": k, "train_start": record["train_start"], "test_start": record["test_start"],
+               "test_end": record["test_end"]}
+        row.update({name: (record["params"] or {}).get(name) for name in DEFAULT_PARAM_GRID})
+        row["train_objective"] = float(_score(totals, objective, min_trades)[best]) if best is not None else float("nan")
+        row["train_trades"] = int(totals[best, 0]) if best is not None else 0
+        row["test_trades"] = len(oos["pnl"])
+        row["test_pnl"] = float(np.sum(oos["pnl"]))
+        rows.append(row)
+        if record["trades"]:
+            t = record["trades"]
+            entry_time = pd.to_datetime(np.asarray(t["entry_time"], dtype=np.int64), utc=True).tz_convert(TZ)
+            exit_time = pd.to_datetime(np.asarray(t["exit_time"], dtype=np.int64), utc=True).tz_convert(TZ)
+            for i in range(len(t["pnl"])):
+                trades.append({"window": k, "symbol": t["symbol"][i], "entry_time": entry_time[i],
+                               "exit_time": exit_time[i], "direction": t["direction"][i],
+                               "entry_price": t["entry_price"][i], "exit_price": t["exit_price"][i],
+                               "pnl": t["pnl"][i], "reason": t["reason"][i]})
+    trades.sort(key=lambda t: (t["exit_time"], t["symbol"]))
+    return {
+        "windows": pd.DataFrame(rows),
+        "trades": trades,
+        "stats": analyze_trades(trades=trades) if trades else {},
+        "computed": computed,
+    }
@@ -0,0 +1,94 @@
+# bench_atr_scan.py
+
+# Benchmarks the ATR universe scan without touching Yahoo: yf.download is replaced by a
+# function that serves daily bars from a local fixture and sleeps to mimic request latency.
+#
+#   python bench_atr_scan.py            # use the fixture (synthesized on first run)
+#   python bench_atr_scan.py --record   # record a real fixture from Yahoo first
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import atr_watchlist
+from atr_watchlist import (compute_atr_panel, download_daily_panel, scan_atr_bulk,
+                           top_n_by_atr, get_sp500_tickers, PANEL_FIELDS)
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sp500_daily_3mo.pkl")
+REQUEST_LATENCY = 0.05  # seconds per simulated Yahoo request
+TICKERS = 500
+
+def record_fixture():
+    tickers = get_sp500_tickers()
+    panel = pd.concat([download_daily_panel(tickers[i:i+50]) for i in range(0, len(tickers), 50)], axis=1)
+    panel.to_pickle(FIXTURE)
+    return panel
+
+def synthetic_fixture(n_tickers=TICKERS, n_days=63, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    dates = pd.bdate_range(end="2025-06-10", periods=n_days)
+    close = 50 + np.cumsum(rng.normal(0, 1, (n_days, n_tickers)), axis=0) + rng.uniform(0, 300, n_tickers)
+    spread = rng.uniform(0.5, 3, (n_days, n_tickers))
+    fields = {"High": close + spread, "Low": close - spread, "Close": close}
+    # A few tickers with missing days, as in a real multi-ticker download
+    fields["Close"][rng.integers(0, n_days, 20), rng.integers(0, n_tickers, 20)] = np.nan
+    panel = pd.concat({name: pd.DataFrame(values, index=dates, columns=tickers)
+                       for name, values in fields.items()}, axis=1)
+    panel.to_pickle(FIXTURE)
+    return panel
+
+def fake_download(panel):
+    def download(tickers, **kwargs):
+        time.sleep(REQUEST_LATENCY)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        return pd.concat({field: panel[field].reindex(columns=tickers) for field in PANEL_FIELDS}, axis=1)
+    return download
+
+def sequential_atr(panel, ticker, period=14):
+    # Per-ticker pandas version of the original compute_atr, for checking the panel result
+    df = pd.DataFrame({field: panel[field][ticker] for field in PANEL_FIELDS}).dropna()
+    if len(df) < period + 1:
+        return np.nan
+    df['H-L'] = df['High'] - df['Low']
+    df['H-PC'] = abs(df['High'] - df['Close'].shift(1))
+    df['L-PC'] = abs(df['Low'] - df['Close'].shift(1))
+    df['TR'] = df[['H-L', 'H-PC', 'L-PC']].max(axis=1)
+    return df['TR'].rolling(window=period).mean().iloc[-1]
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(FIXTURE), exist_ok=True)
+    if "--record" in sys.argv:
+        panel = record_fixture()
+    elif os.path.exists(FIXTURE):
+        panel = pd.read_pickle(FIXTURE)
+    else:
+        panel = synthetic_fixture()
+
+    tickers = list(panel["Close"].columns)
+    yf.download = fake_download(panel)
+
+    start = time.perf_counter()
+    sequential = np.array([atr_watchlist.compute_atr(t) or np.nan for t in tickers])
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk = scan_atr_bulk(tickers, batch_size=50, max_workers=4, calls_per_second=None)
+    bulk_time = time.perf_counter() - start
+
+    expected = np.array([sequential_atr(panel, t) for t in tickers])
+    assert np.allclose(bulk, expected, equal_nan=True)
+    assert np.allclose(sequential, expected, equal_nan=True)
+    assert top_n_by_atr(tickers, bulk, 25) == top_n_by_atr(tickers, expected, 25)
+
+    start = time.perf_counter()
+    arrays = [panel[field].to_numpy().T for field in PANEL_FIELDS]
+    compute_atr_panel(*arrays)
+    compute_time = time.perf_counter() - start
+
+    print(f"{len(tickers)} tickers, {REQUEST_LATENCY * 1000:.0f} ms simulated latency per request")
+    print(f"per-ticker scan:     {sequential_time:8.2f} s")
+    print(f"bulk scan:           {bulk_time:8.2f} s")
+    print(f"panel ATR only:      {compute_time * 1000:8.2f} ms")
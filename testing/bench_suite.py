@@ -0,0 +1,237 @@
+# bench_suite.py
+
+# Benchmark suite for the data-heavy parts of the bot, on deterministic synthetic bars (synthetic_market.py)
+# so it runs offline and every run sees the same data:
+#   calculate_vwap, calculate_intraday_sma, generate_signal, backtest_signals, analyze_trades, ATR scan
+# Each benchmark runs for every (symbols x sessions) size and records min / median / mean wall time and
+# bars per second. Results are written as JSON (with the git commit) so runs can be compared over time.
+#
+#   python bench_suite.py                          # "default" sizes, writes bench_results/<time>-<commit>.json
+#   python bench_suite.py --sizes quick            # presets: quick, default, full (up to 500 x 2 years)
+#   python bench_suite.py --sizes 1x1,500x20       # custom symbols x sessions
+#   python bench_suite.py --only vwap,atr_scan     # subset of the benchmarks
+#   python bench_suite.py --compare bench_results/old.json   # exit code 1 on a regression
+
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from synthetic_market import make_bars, make_daily_panel, BARS_PER_SESSION
+from indicators import calculate_vwap, calculate_intraday_sma
+from signal_generator import generate_signal
+from backtester import backtest_signals
+from portfolio import analyze_trades
+from atr_watchlist import compute_atr_panel, scan_atr_bulk, PANEL_FIELDS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+SIZE_PRESETS = {
+    "quick": [(1, 1), (25, 10), (100, 20)],
+    "default": [(1, 1), (25, 10), (100, 20), (500, 10), (25, 252)],
+    "full": [(1, 1), (25, 10), (100, 20), (500, 10), (25, 252), (100, 252), (500, 504)],
+}
+ATR_HISTORY_SESSIONS = 63   # The scan downloads 3 months of daily bars
+REGRESSION_THRESHOLD = 1.2  # A median this many times slower than the baseline is a regression
+
+def prepare(symbols, sessions, seed=0):
+    '''
+ Synthetic inputs for every benchmark at one size; each stage's input is the previous stage's output,
+ as in the trading loop.
+    '''
+    frames = make_bars(symbols, sessions, seed=seed)
+    for df in frames.values():
+        df["vwap"] = calculate_vwap(df)
+        df["sma_20"] = calculate_intraday_sma(df, 20)
+        df["signal"] = generate_signal(df)
+    backtests = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for symbol, df in frames.items():
+            backtests[symbol] = backtest_signals(df)
+    trades = [{**trade, "symbol": symbol} for symbol, (_, symbol_trades) in backtests.items() for trade in symbol_trades]
+    panel = make_daily_panel(symbols, max(sessions, ATR_HISTORY_SESSIONS), seed=seed, missing=symbols // 10)
+    return {"frames": frames, "backtests": backtests, "trades": trades, "panel": panel}
+
+def bench_vwap(data):
+    for df in data["frames"].values():
+        calculate_vwap(df)
+
+def bench_intraday_sma(data):
+    for df in data["frames"].values():
+        calculate_intraday_sma(df, 20)
+
+def bench_generate_signal(data):
+    for df in data["frames"].values():
+        generate_signal(df)
+
+def bench_backtest_signals(data):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for df in data["frames"].values():
+            backtest_signals(df)
+
+def bench_analyze_trades(data):
+    # Per-symbol stats on each backtest, then the whole book from the combined trade list
+    for df, trades in data["backtests"].values():
+        analyze_trades(df, trades=trades)
+    analyze_trades(trades=data["trades"])
+
+def bench_atr_panel(data):
+    panel = data["panel"]
+    compute_atr_panel(*(panel[field].to_numpy().T for field in PANEL_FIELDS))
+
+def bench_atr_scan(data):
+    # Full scan with a local yf.download: batching, thread pool, panel merge and ATR
+    panel = data["panel"]
+    tickers = list(panel["Close"].columns)
+
+    def download(batch, **kwargs):
+        batch = [batch] if isinstance(batch, str) else list(batch)
+        return pd.concat({field: panel[field].reindex(columns=batch) for field in PANEL_FIELDS}, axis=1)
+
+    real_download, yf.download = yf.download, download
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            scan_atr_bulk(tickers, batch_size=50, max_workers=4, calls_per_second=None)
+    finally:
+        yf.download = real_download
+
+BENCHMARKS = {
+    "vwap": bench_vwap,
+    "intraday_sma": bench_intraday_sma,
+    "generate_signal": bench_generate_signal,
+    "backtest_signals": bench_backtest_signals,
+    "analyze_trades": bench_analyze_trades,
+    "atr_panel": bench_atr_panel,
+    "atr_scan": bench_atr_scan,
+}
+
+def time_call(func, data, repeats):
+    func(data)   # Warm-up (imports, caches, first-call allocations)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(data)
+        samples.append(time.perf_counter() - start)
+    return np.array(samples)
+
+def run(sizes, names, repeats=5, seed=0) -> list:
+    '''
+ Runs the named benchmarks at every size.
+ Output:
+   - list of dicts: benchmark, symbols, sessions, bars, repeats, min_s, median_s, mean_s, bars_per_s
+    '''
+    results = []
+    for symbols, sessions in sizes:
+        data = prepare(symbols, sessions, seed)
+        bars = symbols * sessions * BARS_PER_SESSION
+        for name in names:
+            samples = time_call(BENCHMARKS[name], data, repeats)
+            median = float(np.median(samples))
+            # Daily benchmarks process one row per session, the others every intraday bar
+            rows = data["panel"].size // len(PANEL_FIELDS) if name.startswith("atr") else bars
+            results.append({
+                "benchmark": name,
+                "symbols": symbols,
+                "sessions": sessions,
+                "bars": rows,
+                "repeats": repeats,
+                "min_s": float(samples.min()),
+                "median_s": median,
+                "mean_s": float(samples.mean()),
+                "bars_per_s": rows / median if median > 0 else float("inf"),
+            })
+            print(f"{name:18s} {symbols:4d} x {sessions:4d}  {median * 1000:10.2f} ms  {rows / median:14,.0f} bars/s")
+        del data
+    return results
+
+def git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def save(results, path=None, seed=0) -> str:
+    '''
+ Writes a run to JSON (default: bench_results/<YYYYmmdd-HHMMSS>-<commit>.json).
+ Output: the file path
+    '''
+    commit = git_commit()
+    now = dt.datetime.now(dt.timezone.utc)
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{now:%Y%m%d-%H%M%S}-{commit}.json")
+    run_info = {"commit": commit, "timestamp": now.isoformat(timespec="seconds"), "seed": seed,
+                "bars_per_session": BARS_PER_SESSION, "environment": environment(), "results": results}
+    with open(path, "w") as f:
+        json.dump(run_info, f, indent=2)
+    return path
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD) -> list:
+    '''
+ Prints the median time of every benchmark against a saved run.
+ Output:
+   - list of (benchmark, symbols, sessions, ratio) slower than threshold x the baseline
+    '''
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["benchmark"], r["symbols"], r["sessions"]): r["median_s"] for r in baseline["results"]}
+    print(f"\nAgainst {baseline.get('commit', '?')} ({baseline.get('timestamp', '?')}):")
+    regressions = []
+    for r in results:
+        key = (r["benchmark"], r["symbols"], r["sessions"])
+        if key not in old:
+            continue
+        ratio = r["median_s"] / old[key] if old[key] > 0 else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{key[0]:18s} {key[1]:4d} x {key[2]:4d}  {old[key] * 1000:10.2f} -> {r['median_s'] * 1000:10.2f} ms"
+              f"  x{ratio:5.2f}{flag}")
+        if ratio > threshold:
+            regressions.append((*key, ratio))
+    return regressions
+
+def parse_sizes(text):
+    if text in SIZE_PRESETS:
+        return SIZE_PRESETS[text]
+    return [tuple(int(n) for n in size.lower().split("x")) for size in text.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite on synthetic market data")
+    parser.add_argument("--sizes", default="default", help="Preset (quick, default, full) or e.g. 1x1,500x504")
+    parser.add_argument("--only", help="Comma-separated benchmarks (default: all): " + ", ".join(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write (default: bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Saved JSON run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run(parse_sizes(args.sizes), names, args.repeats, args.seed)
+    print(f"[INFO] Results written to {save(results, args.output, args.seed)}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
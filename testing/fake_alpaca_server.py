@@ -0,0 +1,173 @@
+# fake_alpaca_server.py
+
+# Minimal local stand-in for the Alpaca trading REST API (account, positions, orders), for
+# tests and load tests. Point a TradingClient at it with url_override=server.url.
+# Every market order fills at `price` (default 100), immediately or, with `fill_delay`, once it is
+# looked up (GET /v2/orders/{id}) at least fill_delay seconds after it was placed; until then it is "new".
+# `latency` adds a delay to every request, and `fail_next` makes the next N requests return `fail_status`.
+# `lose_next` places the next N orders but answers them with `fail_status`, like a response lost on the
+# way back, and `reject_next` accepts the next N orders and reports them rejected once they are looked up.
+# An order's client_order_id must be unique (422 otherwise), and orders can be looked up by it.
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class FakeAlpacaServer:
+    def __init__(self, cash=100_000.0, price=100.0, latency=0.0, fill_delay=0.0):
+        self.cash = cash
+        self.price = price
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.positions = {}
+        self.orders = []
+        self.by_id = {}
+        self.by_client_id = {}
+        self.placed = {}   # order ID -> time placed, for orders not filled yet
+        self.requests = 0
+        self.fail_next = 0
+        self.lose_next = 0
+        self.reject_next = 0
+        self.rejecting = set()   # Accepted order IDs to report as rejected
+        self.fail_status = 503
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def account(self):
+        equity = self.cash + sum(qty * self.price for qty in self.positions.values())
+        return {
+            "id": str(uuid.uuid4()), "account_number": "FAKE0001", "status": "ACTIVE",
+            "currency": "USD", "cash": str(self.cash), "buying_power": str(self.cash * 2),
+            "portfolio_value": str(equity), "equity": str(equity),
+        }
+
+    def position(self, symbol, qty):
+        return {
+            "asset_id": str(uuid.uuid4()), "symbol": symbol, "exchange": "NASDAQ", "asset_class": "us_equity",
+            "avg_entry_price": str(self.price), "qty": str(qty), "side": "long" if qty > 0 else "short",
+            "cost_basis": str(qty * self.price), "market_value": str(qty * self.price),
+            "current_price": str(self.price),
+        }
+
+    def place(self, body):
+        now = datetime.now(timezone.utc).isoformat()
+        order = {
+            "id": str(uuid.uuid4()), "client_order_id": body.get("client_order_id") or str(uuid.uuid4()),
+            "created_at": now,
+            "updated_at": now, "submitted_at": now, "filled_at": None, "symbol": body["symbol"],
+            "qty": body["qty"], "filled_qty": "0", "filled_avg_price": None,
+            "side": body["side"], "type": "market", "order_type": "market", "order_class": "simple",
+            "time_in_force": body["time_in_force"], "status": "new", "extended_hours": False,
+        }
+        self.orders.append(order)
+        self.by_id[order["id"]] = order
+        self.by_client_id[order["client_order_id"]] = order
+        if self.reject_next > 0:
+            self.reject_next -= 1
+            self.rejecting.add(order["id"])
+            return order
+        if self.fill_delay:
+            self.placed[order["id"]] = time.monotonic()
+            return order
+        return self.fill(order)
+
+    def fill(self, order):
+        qty = float(order["qty"])
+        signed = qty if order["side"] == "buy" else -qty
+        order.update({"filled_at": datetime.now(timezone.utc).isoformat(), "filled_qty": order["qty"],
+                      "filled_avg_price": str(self.price), "status": "filled"})
+        self.cash -= signed * self.price
+        held = self.positions.get(order["symbol"], 0.0) + signed
+        if held:
+            self.positions[order["symbol"]] = held
+        else:
+            self.positions.pop(order["symbol"], None)
+        return order
+
+    def lookup(self, order_id):
+        order = self.by_id.get(order_id)
+        if order_id in self.rejecting:
+            self.rejecting.discard(order_id)
+            order["status"] = "rejected"
+            return order
+        placed = self.placed.get(order_id)
+        if placed is not None and time.monotonic() - placed >= self.fill_delay:
+            del self.placed[order_id]
+            self.fill(order)
+        return order
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                if fake.latency:
+                    threading.Event().wait(fake.latency)
+                with fake.lock:
+                    fake.requests += 1
+                    if fake.fail_next > 0:
+                        fake.fail_next -= 1
+                        return self._reply(fake.fail_status, {"code": fake.fail_status, "message": "injected failure"})
+                    path = self.path.split("?")[0]
+                    if method == "GET" and path == "/v2/account":
+                        return self._reply(200, fake.account())
+                    if method == "GET" and path == "/v2/positions":
+                        return self._reply(200, [fake.position(s, q) for s, q in fake.positions.items()])
+                    if method == "GET" and path == "/v2/orders":
+                        return self._reply(200, fake.orders)
+                    if method == "GET" and path == "/v2/orders:by_client_order_id":
+                        client_id = parse_qs(urlsplit(self.path).query).get("client_order_id", [""])[0]
+                        order = fake.by_client_id.get(client_id)
+                        if order is not None:
+                            return self._reply(200, fake.lookup(order["id"]))
+                    if method == "GET" and path.startswith("/v2/orders/"):
+                        order = fake.lookup(path.rsplit("/", 1)[1])
+                        if order is not None:
+                            return self._reply(200, order)
+                    if method == "POST" and path == "/v2/orders":
+                        if body.get("client_order_id") in fake.by_client_id:
+                            return self._reply(422, {"code": 40010001, "message": "client_order_id must be unique"})
+                        order = fake.place(body)
+                        if fake.lose_next > 0:
+                            fake.lose_next -= 1
+                            return self._reply(fake.fail_status, {"code": fake.fail_status, "message": "injected failure"})
+                        return self._reply(200, order)
+                return self._reply(404, {"code": 404, "message": "not found"})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
@@ -0,0 +1,99 @@
+# synthetic_market.py
+
+# Deterministic synthetic market data for tests and benchmarks: random-walk intraday OHLCV bars for any
+# number of symbols and sessions, and the daily High/Low/Close panel the ATR scan downloads.
+# The same (symbols, sessions, seed) always gives the same bars, so benchmark runs are comparable.
+#
+#   from synthetic_market import make_bars, make_daily_panel
+#   frames = make_bars(symbols=25, sessions=10)          # dict of symbol -> DataFrame
+#   df = make_bars(["TEST"], 15, seed=1)["TEST"]         # one symbol
+#   panel = make_daily_panel(symbols=500, sessions=63)   # yf.download-style MultiIndex columns
+
+import numpy as np
+import pandas as pd
+
+TZ = "America/New_York"
+SESSION_OPEN = "09:30"
+BARS_PER_SESSION = 78   # 09:30 - 15:55 in 5-minute bars
+INTERVAL = "5min"
+LAST_SESSION = "2025-06-10"
+
+def symbol_names(n: int) -> list:
+    return [f"S{i:03d}" for i in range(n)]
+
+def session_dates(sessions: int, end=LAST_SESSION) -> pd.DatetimeIndex:
+    return pd.bdate_range(end=end, periods=sessions)
+
+def bar_index(sessions: int, bars_per_session=BARS_PER_SESSION, interval=INTERVAL, end=LAST_SESSION) -> pd.DatetimeIndex:
+    '''
+ Timestamps of `sessions` regular trading days, `bars_per_session` bars each, in US/Eastern.
+    '''
+    days = session_dates(sessions, end).as_unit("ns").asi8
+    offsets = pd.Timedelta(SESSION_OPEN + ":00").value + pd.Timedelta(interval).value * np.arange(bars_per_session)
+    local = (days[:, None] + offsets).ravel()
+    return pd.DatetimeIndex(local, dtype="datetime64[ns]").tz_localize(TZ)
+
+def random_walk_ohlcv(n_symbols: int, n_bars: int, bars_per_session=BARS_PER_SESSION, seed=0,
+                      volatility=0.002, gap_volatility=0.01) -> dict:
+    '''
+ Random-walk OHLCV arrays of shape (symbols, bars).
+ Log returns are normal with per-symbol volatility around `volatility` per bar, plus an overnight gap
+ on the first bar of each session; volume follows the usual intraday U shape with lognormal noise.
+ Output: dict of open, high, low, close (float64) and volume (int64) arrays
+    '''
+    rng = np.random.default_rng(seed)
+    sigma = volatility * rng.uniform(0.5, 2.0, (n_symbols, 1))
+    returns = rng.normal(0.0, 1.0, (n_symbols, n_bars)) * sigma
+    first_bars = np.arange(0, n_bars, bars_per_session)
+    returns[:, first_bars] += rng.normal(0.0, gap_volatility, (n_symbols, len(first_bars)))
+    start = rng.uniform(20, 500, (n_symbols, 1))
+    close = start * np.exp(np.cumsum(returns, axis=1))
+
+    open_ = np.empty_like(close)
+    open_[:, 0] = start[:, 0]
+    open_[:, 1:] = close[:, :-1]
+    body_high, body_low = np.maximum(open_, close), np.minimum(open_, close)
+    wick = np.abs(rng.normal(0.0, 0.5, (2, n_symbols, n_bars))) * sigma * close
+    position = np.arange(n_bars) % bars_per_session / max(bars_per_session - 1, 1)
+    shape = 1.0 + 2.0 * (2.0 * position - 1.0) ** 2   # Busy open and close, quiet midday
+    base = rng.uniform(2_000, 50_000, (n_symbols, 1))
+    volume = (base * shape * rng.lognormal(0.0, 0.5, (n_symbols, n_bars))).astype(np.int64) + 1
+    return {"open": open_, "high": body_high + wick[0], "low": body_low - wick[1], "close": close, "volume": volume}
+
+def make_bars(symbols=1, sessions=1, bars_per_session=BARS_PER_SESSION, interval=INTERVAL, seed=0,
+              end=LAST_SESSION, tick=None) -> dict:
+    '''
+ Intraday bars in the layout the data loader returns (lowercase OHLCV columns, ET timestamp index).
+ Input:
+   - symbols (int or list): Number of symbols (named S000, S001, ...) or the names to use
+   - sessions (int): Trading days per symbol, ending at `end`
+   - bars_per_session, interval: e.g. 390 and "1min" for 1-minute bars
+   - tick (float): Price increment the open / high / low / close are rounded to (default: not rounded)
+ Output:
+   - dict of symbol -> pd.DataFrame
+    '''
+    names = symbol_names(symbols) if isinstance(symbols, int) else list(symbols)
+    index = bar_index(sessions, bars_per_session, interval, end)
+    index.name = "timestamp"
+    fields = random_walk_ohlcv(len(names), len(index), bars_per_session, seed)
+    if tick:
+        for field in ("open", "high", "low", "close"):
+            fields[field] = np.round(fields[field] / tick) * tick
+    return {name: pd.DataFrame({field: values[i] for field, values in fields.items()}, index=index)
+            for i, name in enumerate(names)}
+
+def make_daily_panel(symbols=500, sessions=63, seed=0, missing=0, end=LAST_SESSION) -> pd.DataFrame:
+    '''
+ Daily bars shaped like a multi-ticker yf.download: (field, ticker) columns High, Low, Close.
+ Input:
+   - missing (int): Number of random (day, ticker) closes set to NaN, like gaps in a real download
+    '''
+    names = symbol_names(symbols) if isinstance(symbols, int) else list(symbols)
+    fields = random_walk_ohlcv(len(names), sessions, bars_per_session=1, seed=seed, volatility=0.015,
+                               gap_volatility=0.0)
+    dates = session_dates(sessions, end)
+    if missing:
+        rng = np.random.default_rng(seed + 1)
+        fields["close"][rng.integers(0, len(names), missing), rng.integers(0, sessions, missing)] = np.nan
+    return pd.concat({name.capitalize(): pd.DataFrame(fields[name].T, index=dates, columns=names)
+                      for name in ("high", "low", "close")}, axis=1)
@@ -0,0 +1,130 @@
+# test_atr_engine.py
+
+# Checks the 2-D ATR engine against per-symbol reference loops (SMA and Wilder smoothing, with missing
+# days), that incremental daily updates match a full recompute, and that the universe ATR is downloaded
+# at most once per trading day (later calls and compute_atr use the cache, a new day only downloads
+# the recent sessions).
+
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import atr_watchlist
+from atr_watchlist import PANEL_FIELDS, universe_atr, compute_atr, cached_atr
+from indicators import ATREngine, atr_2d, latest_atr, align_valid_right
+
+def make_panel(n_tickers, n_days, seed=0, gaps=40):
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    dates = pd.bdate_range(end="2025-06-10", periods=n_days)
+    close = 50 + np.cumsum(rng.normal(0, 1, (n_days, n_tickers)), axis=0) + rng.uniform(0, 300, n_tickers)
+    spread = rng.uniform(0.5, 3, (n_days, n_tickers))
+    fields = {"High": close + spread, "Low": close - spread, "Close": close.copy()}
+    fields["Close"][rng.integers(0, n_days, gaps), rng.integers(0, n_tickers, gaps)] = np.nan
+    return pd.concat({name: pd.DataFrame(values, index=dates, columns=tickers)
+                      for name, values in fields.items()}, axis=1)
+
+def reference_atr(high, low, close, period, method):
+    # Per-symbol loop over the valid days only
+    valid = ~(np.isnan(high) | np.isnan(low) | np.isnan(close))
+    high, low, close = high[valid], low[valid], close[valid]
+    if len(close) < period + 1:
+        return np.nan
+    tr = [high[0] - low[0]] + [max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+                               for i in range(1, len(close))]
+    if method == "sma":
+        return np.mean(tr[-period:])
+    atr = np.mean(tr[1:period + 1])
+    for value in tr[period + 1:]:
+        atr = (atr * (period - 1) + value) / period
+    return atr
+
+panel = make_panel(60, 80)
+tickers = list(panel["Close"].columns)
+high, low, close = (panel[field].to_numpy().T for field in PANEL_FIELDS)
+
+# Batch ATR matches the per-symbol loops, for both smoothing methods
+for method in ("sma", "wilder"):
+    got = latest_atr(high, low, close, period=14, method=method)
+    want = np.array([reference_atr(high[i], low[i], close[i], 14, method) for i in range(len(tickers))])
+    assert np.allclose(got, want, rtol=1e-12, equal_nan=True), method
+    series = atr_2d(*align_valid_right(high, low, close)[:3], period=14, method=method)
+    assert np.array_equal(series[:, -1], got, equal_nan=True)
+    assert np.isnan(series[:, :14]).all()
+
+# Incremental updates give exactly the recomputed values
+for method in ("sma", "wilder"):
+    engine = ATREngine.from_history(tickers, high[:, :10], low[:, :10], close[:, :10], method=method)
+    for t in range(10, high.shape[1]):
+        engine.update(high[:, t], low[:, t], close[:, t], as_of=str(panel.index[t].date()))
+        expected = latest_atr(high[:, :t + 1], low[:, :t + 1], close[:, :t + 1], method=method)
+        assert np.allclose(engine.atr, expected, rtol=1e-12, equal_nan=True), (method, t)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "atr.npz")
+        engine.save(path, computed="2025-06-11")
+        loaded, meta = ATREngine.load(path)
+        assert meta == {"computed": "2025-06-11"} and loaded.as_of == "2025-06-10"
+        assert np.array_equal(loaded.atr, engine.atr, equal_nan=True) and loaded.method == method
+
+# Long series stay accurate (window means, no running-sum drift)
+long = 1e6 + np.cumsum(np.random.default_rng(1).normal(0, 1, (1, 20_000)), axis=1)
+series = atr_2d(long + 0.5, long - 0.5, long, period=14)
+direct = np.array([np.mean(np.fmax(1.0, np.abs(np.diff(long[0, t - 14:t + 1])) + 0.5)) for t in (15_000, 19_999)])
+assert np.allclose(series[0, [15_000, 19_999]], direct, rtol=1e-13, atol=0)
+
+# Universe speed
+big = make_panel(500, 63, seed=2)
+arrays = [big[field].to_numpy().T for field in PANEL_FIELDS]
+start = time.perf_counter()
+latest_atr(*arrays)
+batch_time = time.perf_counter() - start
+engine = ATREngine.from_history(list(big["Close"].columns), *arrays)
+start = time.perf_counter()
+engine.update(*(a[:, -1] for a in arrays))
+update_time = time.perf_counter() - start
+print(f"[INFO] 500 symbols x 63 days: {batch_time * 1000:.2f} ms full ATR, {update_time * 1000:.3f} ms per daily update")
+
+# Daily caching: one full download, then nothing until the next day, which only fetches recent sessions
+downloads = []
+served = {"panel": panel}
+
+def fake_download(tickers, period=None, **kwargs):
+    downloads.append(period)
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    return pd.concat({field: served["panel"][field].reindex(columns=tickers) for field in PANEL_FIELDS}, axis=1)
+
+yf.download = fake_download
+tmp = tempfile.mkdtemp()
+state = os.path.join(tmp, "atr_state.npz")
+day1 = pd.Timestamp("2025-06-10").date()   # The 06-10 bar is still forming and must be left out
+served["panel"] = panel
+atr = universe_atr(tickers, state_file=state, today=day1, calls_per_second=None)
+assert downloads == ["3mo", "3mo"]   # Two batches of 50
+assert np.allclose(atr, latest_atr(high[:, :-1], low[:, :-1], close[:, :-1]), equal_nan=True)
+
+downloads.clear()
+assert np.array_equal(universe_atr(tickers, state_file=state, today=day1), atr, equal_nan=True)
+atr_watchlist._daily.update(date=None, engine=None, extra={})   # Restart: the saved state is reused
+assert np.array_equal(universe_atr(tickers, state_file=state, today=day1), atr, equal_nan=True)
+assert cached_atr("T005", today=day1) == (None if np.isnan(atr[5]) else atr[5])
+assert downloads == []
+
+day2 = pd.Timestamp("2025-06-11").date()
+next_day = panel.index[-1] + pd.offsets.BDay()
+served["panel"] = pd.concat([panel, panel.iloc[[-1]].set_axis([next_day])])   # 06-11 partial bar
+atr2 = universe_atr(tickers, state_file=state, today=day2, calls_per_second=None)
+assert downloads == ["1mo", "1mo"]
+assert np.allclose(atr2, latest_atr(high, low, close), rtol=1e-12, equal_nan=True)
+
+# compute_atr reuses the day's values: no download for universe members, one per day for others
+atr_watchlist._today = lambda: day2
+downloads.clear()
+assert compute_atr("T007") == cached_atr("T007")
+assert downloads == []
+served["panel"] = pd.concat({field: panel[field].rename(columns={"T000": "XTRA"})[["XTRA"]] for field in PANEL_FIELDS}, axis=1)
+first = compute_atr("XTRA")
+assert compute_atr("XTRA") == first and downloads == ["3mo"]
+
+print("[INFO] ATR engine tests passed")
@@ -0,0 +1,60 @@
+# test_backtest_batch.py
+
+# Checks the vectorized batch backtester against a plain bar-by-bar loop and times a parameter sweep.
+
+import time
+import numpy as np
+from backtester import backtest_batch, summarize_batch, simulate_trades, expand_param_grid
+from signal_generator import generate_signal_arrays
+from synthetic_market import make_bars
+
+def loop_trades(close, signal, position, atr, entry_ok, stop_mult, target_mult):
+    trades = []
+    i, n = 0, len(close)
+    while i < n:
+        if signal[i] != 0 and entry_ok[i]:
+            d, entry = signal[i], close[i]
+            for j in range(i + 1, n):
+                move = d * (close[j] - entry)
+                if move <= -stop_mult * atr[i] or move >= target_mult * atr[i] or position[j] != d:
+                    trades.append((i, j, d * (close[j] - entry)))
+                    break
+            else:
+                break
+            i = j
+        i += 1
+    return trades
+
+rng = np.random.default_rng(1)
+for seed in range(30):
+    n = 2000
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    vwap = close + rng.normal(0, 0.3, n)
+    sma = close + rng.normal(0, 0.3, n)
+    atr = rng.uniform(0.2, 2.0, n)
+    entry_ok = rng.random(n) > 0.3
+    signal, position = generate_signal_arrays(close, vwap, sma)
+    for stop_mult, target_mult in [(1.5, 2.5), (0.5, 0.5), (10, 10)]:
+        got = simulate_trades(close, signal, position, atr, entry_ok, stop_mult, target_mult)
+        expected = loop_trades(close, signal, position, atr, entry_ok, stop_mult, target_mult)
+        assert list(got["entry_idx"]) == [t[0] for t in expected]
+        assert list(got["exit_idx"]) == [t[1] for t in expected]
+        assert np.allclose(got["pnl"], [t[2] for t in expected])
+print("[OK] simulate_trades matches the bar-by-bar loop")
+
+# Parameter sweep over a small panel
+panel = make_bars(20, 60)
+grid = {
+    "sma_window": [10, 20, 30],
+    "confirm": ["both", "vwap", "sma"],
+    "stop_mult": [1.0, 1.5, 2.0],
+    "target_mult": [2.0, 2.5, 3.0],
+    "volume_mult": [0, 1.5],
+}
+start = time.perf_counter()
+results = backtest_batch(panel, grid, processes=0)
+elapsed = time.perf_counter() - start
+configs = len(expand_param_grid(grid))
+assert len(results) == configs * len(panel)
+print(f"[OK] {configs} configs x {len(panel)} symbols x {len(panel['S000'])} bars in {elapsed:.2f} s")
+print(summarize_batch(results).head())
@@ -0,0 +1,77 @@
+# test_bar_service.py
+
+# Checks that incrementally maintained timeframes match a full resample, that the hourly trend SMA built
+# from them matches the simulator's, and that main.py makes one download per symbol (per cycle for
+# symbols the stream doesn't carry).
+
+import numpy as np
+import pandas as pd
+from bar_service import BarService, resample_bars
+from simulator import hourly_trend_sma
+from synthetic_market import make_bars
+
+full = make_bars(["TEST"], 15, seed=1)["TEST"]
+calls = []
+
+def fake_fetch(symbol, interval, sessions):
+    calls.append((symbol, interval))
+    window = full.iloc[:cursor].copy()
+    window.iloc[-1, window.columns.get_loc("close")] += 0.05  # Last bar still forming
+    dates = window.index.normalize()
+    return window[dates >= dates.unique()[-sessions:][0]]
+
+service = BarService(fetch=fake_fetch, timeframes=("15m", "60m", "1d"), sessions=10)
+for cursor in [200, 201, 205, 240, 241, 400, 700, 701, len(full)]:
+    base = service.refresh("TEST")
+    for timeframe in service.timeframes:
+        expected = resample_bars(base, timeframe)
+        pd.testing.assert_frame_equal(service.bars("TEST", timeframe), expected, check_freq=False)
+assert len(calls) == 9 and all(interval == "5m" for _, interval in calls)
+
+# Hourly bars are aligned at 09:30 and include the forming bucket
+hourly = service.bars("TEST", "60m")
+assert (hourly.index.minute == 30).all()
+assert hourly["close"].iloc[-1] == base["close"].iloc[-1]
+assert len(service.bars("TEST", "60m", sessions=5).index.normalize().unique()) == 5
+
+# Trend SMA from the service matches the simulator's reconstruction at every cycle
+window, sessions = 20, 4
+expected_sma = hourly_trend_sma(full, window=window, sessions=sessions)
+service = BarService(fetch=fake_fetch, timeframes=("60m",), sessions=sessions)
+for cursor in range(300, len(full), 37):
+    service.refresh("TEST")
+    hourly = service.bars("TEST", "60m", sessions=sessions)
+    window_bars = full.iloc[:cursor].copy()
+    window_bars.iloc[-1, window_bars.columns.get_loc("close")] += 0.05
+    got = hourly["close"].rolling(window).mean().iloc[-1]
+    want = hourly_trend_sma(window_bars, window=window, sessions=sessions)[-1]
+    assert np.isclose(got, want, equal_nan=True), (cursor, got, want)
+
+# main.py downloads once per symbol and still hands the strategy 5m and hourly frames
+import main
+calls.clear()
+cursor = len(full)
+main.bar_service.fetch = fake_fetch
+df, hourly_df = main.fetch_symbol("TEST")
+assert len(calls) == 1
+assert df.index.max().time() <= pd.Timestamp("15:30").time()
+assert len(hourly_df.index.normalize().unique()) == main.HOURLY_PERIOD_DAYS
+assert "close" in hourly_df.columns
+
+# In stream mode a held symbol the feed doesn't carry (outside the watchlist) is downloaded every cycle
+# instead of being read from frozen stream history, until the feed subscribes it
+from stream import AlpacaFeed
+main.DATA_MODE = "stream"
+main.stream_feed = AlpacaFeed(None, ["TEST"], "key", "secret")
+calls.clear()
+for _ in range(2):
+    main.fetch_symbol("TEST")
+    main.fetch_symbol("HELD")
+assert calls == [("TEST", "5m"), ("HELD", "5m"), ("HELD", "5m")], calls
+main.stream_feed.subscribe(["TEST", "HELD"])
+assert main.stream_feed.streams("HELD")
+main.fetch_symbol("HELD")
+assert len(calls) == 3
+main.DATA_MODE, main.stream_feed = "poll", None
+
+print("[INFO] bar service tests passed")
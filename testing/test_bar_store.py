@@ -0,0 +1,83 @@
+# test_bar_store.py
+
+# Exercises the on-disk bar cache behind data_loader_yf with yf.download replaced by a
+# local fake, so no network is needed.
+
+import tempfile
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import data_loader_yf
+from bar_store import BarStore
+
+sessions = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=12)
+index = pd.DatetimeIndex(np.concatenate([
+    pd.date_range(f"{d.date()} 09:30", f"{d.date()} 15:55", freq="5min", tz="America/New_York")
+    for d in sessions
+]))
+close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.2, len(index)))
+yahoo = pd.DataFrame({
+    "Adj Close": close, "Close": close, "High": close + 0.1, "Low": close - 0.1, "Open": close,
+    "Volume": np.arange(len(index)) * 10,
+}, index=index)
+yahoo.columns = pd.MultiIndex.from_product([yahoo.columns, ["AAPL"]], names=["Price", "Ticker"])
+
+calls = []
+def fake_download(tickers, interval, progress, auto_adjust, period=None, start=None):
+    calls.append(period or start)
+    if period:
+        first = sorted(set(yahoo.index.date))[-int(period[:-1])]
+        return yahoo[yahoo.index.date >= first].copy()
+    return yahoo[yahoo.index >= pd.Timestamp(start, tz="America/New_York")].copy()
+
+yf.download = fake_download
+data_loader_yf._bar_store = BarStore(tempfile.mkdtemp())
+
+first = data_loader_yf.get_5min_data("AAPL", days_back=10)
+second = data_loader_yf.get_5min_data("AAPL", days_back=10)
+direct = data_loader_yf.get_5min_data("AAPL", days_back=10, use_cache=False)
+
+assert calls[0] == "10d" and calls[1] == str(sessions[-1].date()), calls
+assert first.equals(second) and first.equals(direct)
+print(f"[OK] cached read matches direct download ({len(first)} bars); top-up fetched from {calls[1]}")
+
+# Overlapping bars are replaced by the newer download, not duplicated
+store = data_loader_yf.get_bar_store()
+before = store.read("AAPL", "5m")
+revised = before.iloc[-3:].copy()
+revised["close"] += 1
+store.merge("AAPL", "5m", revised)
+cached = store.read("AAPL", "5m")
+assert cached.index.is_unique and len(cached) == len(before)
+assert np.array_equal(cached["close"].to_numpy()[-3:], revised["close"].to_numpy())
+print("[OK] overlap de-duplicated")
+
+# New bars are appended after the cached ones, a backfill inside the cache is merged, and sessions
+# beyond the retention limit are dropped on write
+frame = yahoo.xs("AAPL", axis=1, level="Ticker")[["Open", "High", "Low", "Close", "Volume"]]
+frame.columns = frame.columns.str.lower()
+limited = BarStore(tempfile.mkdtemp(), max_sessions=5)
+dates = frame.index.date
+assert limited.merge("AAPL", "5m", frame[dates <= sessions[2].date()]) == 3 * 78
+assert limited.merge("AAPL", "5m", frame[dates == sessions[3].date()]) == 4 * 78
+gappy = pd.concat([frame[dates == sessions[3].date()].iloc[::2], frame[dates == sessions[4].date()]])
+gappy["close"] += 1
+assert limited.merge("AAPL", "5m", gappy) == 5 * 78
+cached = limited.read("AAPL", "5m")
+assert cached.index.equals(frame.index[dates <= sessions[4].date()])
+assert np.array_equal(cached.loc[gappy.index, "close"], gappy["close"])
+assert np.array_equal(cached["close"].iloc[:3 * 78], frame["close"].iloc[:3 * 78])
+assert limited.merge("AAPL", "5m", frame[dates > sessions[4].date()]) == 5 * 78
+assert limited.sessions("AAPL", "5m") == 5
+assert limited.read("AAPL", "5m").index.equals(frame.index[dates >= sessions[-5].date()])
+print("[OK] appended, backfilled and trimmed to 5 sessions")
+
+# Offline read for backtests
+offline = data_loader_yf.load_cached_bars("AAPL", start=sessions[-2], end=sessions[-1] + pd.Timedelta(hours=23))
+assert offline.index.min() >= sessions[-2].tz_localize("America/New_York")
+assert len(offline) == 2 * 78
+print(f"[OK] offline read: {len(offline)} bars")
+
+hourly = data_loader_yf.get_intraday_data("AAPL", interval="5m", period="5d")
+assert "Close" in hourly.columns
+print("[OK] get_intraday_data columns:", list(hourly.columns))
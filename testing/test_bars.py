@@ -0,0 +1,122 @@
+# test_bars.py
+
+# Checks the Bars container and its kernels against the pandas implementations they replace,
+# and compares the memory needed to compute VWAP and SMA both ways.
+
+import contextlib
+import io
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from bars import Bars, session_ids
+from bar_store import BarStore
+from backtester import backtest_signals, backtest_batch, daily_atr_from_intraday
+from indicators import calculate_vwap, calculate_intraday_sma
+from synthetic_market import make_bars
+
+def pandas_vwap(df):
+    df = df.copy()
+    df["typical_price"] = (df["high"] + df["low"] + df["close"]) / 3
+    df["tp_x_volume"] = df["typical_price"] * df["volume"]
+    df["date"] = df.index.date
+    df["cum_tp_vol"] = df.groupby("date")["tp_x_volume"].cumsum()
+    df["cum_vol"] = df.groupby("date")["volume"].cumsum()
+    return df["cum_tp_vol"] / df["cum_vol"]
+
+def pandas_sma(df, window):
+    df = df.copy()
+    df["Date"] = df.index.date
+    sma = df.groupby("Date")["close"].rolling(window=window).mean()
+    sma.index = sma.index.droplevel(0)
+    return sma
+
+def pandas_daily_atr(df, period=14):
+    dates = df.index.date
+    daily = df.groupby(dates).agg(high=("high", "max"), low=("low", "min"), close=("close", "last"))
+    prev_close = daily["close"].shift(1)
+    true_range = pd.concat([daily["high"] - daily["low"], (daily["high"] - prev_close).abs(),
+                            (daily["low"] - prev_close).abs()], axis=1).max(axis=1)
+    return true_range.rolling(period).mean().shift(1).reindex(dates).to_numpy()
+
+df = make_bars(["TEST"], 40, seed=3)["TEST"]
+
+# --- Container ---
+bars = Bars.from_frame(df)
+assert bars.close.dtype == np.float32 and bars.volume.dtype == np.int64
+assert np.array_equal(bars.session, session_ids(df.index))
+assert bars.index.equals(df.index)
+view = bars[100:200]
+assert np.shares_memory(view.close, bars.close) and len(view) == 100
+assert len(np.unique(bars.session_slice(5).session)) == 5
+zero_copy = Bars.from_frame(df, price_dtype=None)
+assert np.shares_memory(zero_copy.close, df["close"].to_numpy())
+assert bars.to_frame()["volume"].equals(df["volume"])
+
+# --- Kernels match the pandas versions ---
+assert np.array_equal(calculate_vwap(df).to_numpy(), pandas_vwap(df).to_numpy())
+for window in (5, 20):
+    assert np.allclose(calculate_intraday_sma(df, window).to_numpy(), pandas_sma(df, window).to_numpy(),
+                       equal_nan=True, rtol=0, atol=1e-9)
+out = np.empty(len(bars))
+assert bars.vwap(out=out) is out
+assert np.allclose(out, pandas_vwap(df).to_numpy(), rtol=1e-6)
+assert np.allclose(daily_atr_from_intraday(df), pandas_daily_atr(df), equal_nan=True)
+
+# --- backtest_signals: same trades as before, without copying the input ---
+df["vwap"] = calculate_vwap(df)
+df["sma_20"] = calculate_intraday_sma(df, 20)
+from signal_generator import generate_signal
+df["signal"] = generate_signal(df)
+with contextlib.redirect_stdout(io.StringIO()):
+    result, trades = backtest_signals(df)
+pos, expected = 0, []
+for i, (s, price) in enumerate(zip(df["signal"], df["close"])):
+    if s in (1, -1) and pos == 0:
+        pos, entry, entry_i = s, price, i
+    elif s == 0 and pos != 0:
+        expected.append((entry_i, i, (price - entry) * pos))
+        pos = 0
+assert [(df.index.get_loc(t["entry_time"]), df.index.get_loc(t["exit_time"]), t["pnl"]) for t in trades] == expected
+assert np.isclose(result["cumulative_pnl"].iloc[-1], sum(p for _, _, p in expected))
+assert "trade_pnl" not in df.columns
+
+# --- backtest_batch gives the same results from Bars (prices on a float32-exact tick grid) ---
+panel = make_bars(3, 30, tick=1 / 64)
+grid = {"sma_window": [10, 20], "stop_mult": [1.5]}
+from_frames = backtest_batch(panel, grid, processes=1)
+from_bars = backtest_batch({s: Bars.from_frame(d) for s, d in panel.items()}, grid, processes=1)
+pd.testing.assert_frame_equal(from_frames, from_bars)
+
+# --- BarStore reads straight into Bars ---
+with tempfile.TemporaryDirectory() as tmp:
+    store = BarStore(tmp)
+    raw = make_bars(["TEST"], 10, seed=9)["TEST"]
+    store.merge("TEST", "5m", raw)
+    cached = store.read_bars("TEST", "5m", start="2025-06-05", end="2025-06-06 23:59")
+    frame = store.read("TEST", "5m", start="2025-06-05", end="2025-06-06 23:59")
+    assert cached.index.equals(frame.index)
+    assert np.array_equal(cached.close, frame["close"].to_numpy(dtype=np.float32))
+    assert store.read_bars("NONE", "5m") is None
+
+# --- Memory: 250 sessions of 5-minute bars ---
+big = make_bars(["BIG"], 250, seed=5)["BIG"]
+tracemalloc.start()
+pandas_vwap(big), pandas_sma(big, 20)
+old_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+
+big_bars = Bars.from_frame(big)
+vwap_out, sma_out = np.empty(len(big_bars)), np.empty(len(big_bars))
+tracemalloc.start()
+big_bars.vwap(out=vwap_out), big_bars.intraday_sma(20, out=sma_out)
+new_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+
+frame_bytes = big.memory_usage(deep=True).sum()
+print(f"[INFO] {len(big)} bars: DataFrame {frame_bytes / 1e6:.2f} MB, Bars {big_bars.nbytes / 1e6:.2f} MB")
+print(f"[INFO] VWAP + SMA peak allocations: pandas {old_peak / 1e6:.2f} MB, kernels {new_peak / 1e6:.2f} MB")
+assert big_bars.nbytes < frame_bytes
+assert new_peak < old_peak
+
+print("[INFO] bars tests passed")
@@ -0,0 +1,54 @@
+# test_broker_async.py
+
+# Runs AsyncBroker against the local fake Alpaca server: concurrent snapshot, concurrent
+# order submission, retry on injected server errors, no duplicate order when a submission's response
+# is lost, and latency metrics.
+
+import asyncio
+import time
+from alpaca.trading.client import TradingClient
+from broker_async import AsyncBroker
+from fake_alpaca_server import FakeAlpacaServer
+
+async def run(server):
+    client = TradingClient("key", "secret", paper=True, url_override=server.url)
+    broker = AsyncBroker(client, max_concurrency=8, retries=3, backoff=0.01)
+
+    snapshot = await broker.snapshot()
+    assert snapshot["account"]["cash"] == 100_000.0 and snapshot["positions"] == {}
+
+    # 16 orders with 50 ms server latency: concurrent submission should take ~2 round trips, not 16
+    orders = [(f"SYM{i}", 1, "buy") for i in range(16)]
+    start = time.perf_counter()
+    ids = await broker.submit_orders(orders)
+    elapsed = time.perf_counter() - start
+    assert not any(isinstance(i, Exception) for i in ids)
+    assert elapsed < 16 * server.latency / 2, elapsed
+    print(f"[OK] 16 orders in {elapsed * 1000:.0f} ms with {server.latency * 1000:.0f} ms latency per request")
+
+    positions = await broker.get_open_positions()
+    assert positions == {f"SYM{i}": 1.0 for i in range(16)}
+
+    # Server errors are retried with backoff
+    server.fail_next = 2
+    info = await broker.get_account_info()
+    assert info["status"] == "ACTIVE"
+    print("[OK] retried through 2 injected 503s")
+
+    # An order placed but answered with a 503: the retry is rejected as a duplicate, the order looked up
+    server.lose_next = 1
+    order_id = await broker.submit_market_order("DUP", 2, "sell")
+    placed = [o for o in server.orders if o["symbol"] == "DUP"]
+    assert len(placed) == 1 and str(order_id) == placed[0]["id"]
+    assert (await broker.get_open_positions())["DUP"] == -2.0
+    print("[OK] lost response resolved by client order ID, one order placed")
+
+    stats = broker.latency_stats()
+    for name, s in stats.items():
+        print(f"  {name}: {s}")
+    assert stats["submit_order"]["count"] == 16 and stats["submit_order"]["errors"] == 2
+    assert stats["get_account"]["errors"] == 2
+    broker.close()
+
+with FakeAlpacaServer(latency=0.05) as server:
+    asyncio.run(run(server))
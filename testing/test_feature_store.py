@@ -0,0 +1,126 @@
+# test_feature_store.py
+
+# Checks the indicator feature store: values match a direct computation, unchanged sessions are served
+# from disk and only new or edited sessions (and those depending on them) are recomputed, backtests and
+# replays give the same results with the store, a repeated run is served from the store, and lookups made
+# in worker processes are counted by the parent store.
+
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import metrics
+from synthetic_market import make_bars
+from feature_store import FeatureStore, FEATURES
+from indicators import calculate_vwap, calculate_intraday_sma
+from backtester import backtest_batch, daily_atr_from_intraday
+from simulator import hourly_trend_sma, replay
+
+CASES = [("vwap", {}), ("intraday_sma", {"window": 20}), ("daily_atr", {"period": 14}),
+         ("trend_sma", {"window": 50, "sessions": 5})]
+
+def direct(df, feature, params):
+    if feature == "vwap":
+        return calculate_vwap(df).to_numpy()
+    if feature == "intraday_sma":
+        return calculate_intraday_sma(df, params["window"]).to_numpy()
+    if feature == "daily_atr":
+        return daily_atr_from_intraday(df, params["period"])
+    return hourly_trend_sma(df, params["window"], params["sessions"])
+
+def first_sessions(df, n):
+    dates = df.index.normalize()
+    return df[dates <= dates.unique()[n - 1]]
+
+metrics.enable()
+metrics.reset()
+full = make_bars(["AAA"], 45, seed=4)["AAA"]
+old = first_sessions(full, 40)
+store = FeatureStore(tempfile.mkdtemp())
+assert set(FEATURES) == {feature for feature, _ in CASES}
+
+for feature, params in CASES:
+    # First pass computes everything, the second reads everything back
+    store.reset_stats()
+    values = store.get("AAA", old, feature, **params)
+    assert np.allclose(values, direct(old, feature, params), equal_nan=True, rtol=1e-12), feature
+    assert (store.hits, store.misses) == (0, 40)
+    again = store.get("AAA", old, feature, **params)
+    assert np.array_equal(again, values, equal_nan=True) and (store.hits, store.misses) == (40, 40), (store.hits, store.misses)
+
+    # Five new sessions: only those are computed
+    store.reset_stats()
+    extended = store.get("AAA", full, feature, **params)
+    assert np.allclose(extended, direct(full, feature, params), equal_nan=True, rtol=1e-12), feature
+    assert (store.hits, store.misses) == (40, 5), (feature, store.hits, store.misses)
+
+    # An edited bar invalidates its session and the sessions that look back at it
+    edited = full.copy()
+    edited.iloc[20 * 78 + 10, edited.columns.get_loc("close")] += 1.0
+    store.reset_stats()
+    values = store.get("AAA", edited, feature, **params)
+    assert np.allclose(values, direct(edited, feature, params), equal_nan=True, rtol=1e-12), feature
+    depends = {"vwap": 0, "intraday_sma": 0, "daily_atr": 15, "trend_sma": 4}[feature]
+    assert store.misses == 1 + depends, (feature, store.misses)
+
+counters = metrics.snapshot()["counters"]
+assert counters["feature_store_hits"] > 0 and counters["feature_store_misses"] > 0
+metrics.enable(False)
+
+# Gapped session opens: the first true range of an ATR window needs the close of the session before it
+gapped = full.copy()
+gaps = np.exp(np.random.default_rng(9).normal(0, 0.2, 45)).repeat(78)
+for col in ("open", "high", "low", "close"):
+    gapped[col] *= gaps
+store.reset_stats()
+store.get("AAA", first_sessions(gapped, 30), "daily_atr", period=14)
+values = store.get("AAA", gapped, "daily_atr", period=14)
+assert np.allclose(values, daily_atr_from_intraday(gapped, 14), equal_nan=True, rtol=1e-12)
+assert (store.hits, store.misses) == (30, 45)
+
+# Other parameters are stored separately
+store.reset_stats()
+store.get("AAA", old, "intraday_sma", window=10)
+assert store.misses == 40
+
+# Research backtests: same results with the store, and the repeat is served from it
+panel = {symbol: first_sessions(df, 30) for symbol, df in make_bars(12, 30, seed=6).items()}
+grid = {"sma_window": [10, 20], "stop_mult": [1.0, 2.0]}
+store = FeatureStore(tempfile.mkdtemp())
+plain = backtest_batch(panel, grid, processes=1)
+start = time.perf_counter()
+cold = backtest_batch(panel, grid, processes=1, feature_store=store)
+cold_time = time.perf_counter() - start
+store.reset_stats()
+start = time.perf_counter()
+warm = backtest_batch(panel, grid, processes=1, feature_store=store)
+warm_time = time.perf_counter() - start
+pd.testing.assert_frame_equal(cold, plain)
+pd.testing.assert_frame_equal(warm, plain)
+assert store.hit_rate() == 1.0
+warm_hits = store.hits
+
+# In worker processes the lookups are made on copies of the store; their counts come back to it
+metrics.enable()
+metrics.reset()
+store.reset_stats()
+pooled = backtest_batch(panel, grid, processes=2, feature_store=store)
+pd.testing.assert_frame_equal(pooled, plain)
+assert store.hit_rate() == 1.0 and store.hits == warm_hits
+counters = metrics.snapshot()["counters"]
+assert counters["feature_store_hits"] == store.hits and counters.get("feature_store_misses", 0) == 0
+metrics.enable(False)
+print(f"[INFO] backtest_batch, 12 symbols x 30 sessions: {cold_time * 1000:.0f} ms filling the store, "
+      f"{warm_time * 1000:.0f} ms from it (hit rate {store.hit_rate():.0%})")
+
+sim_panel = {s: panel[s] for s in list(panel)[:4]}
+expected = replay(sim_panel)
+store.reset_stats()
+replay(sim_panel, feature_store=store)
+store.reset_stats()
+stored = replay(sim_panel, feature_store=store)
+pd.testing.assert_frame_equal(stored["fills"], expected["fills"])
+assert np.allclose(stored["equity"].to_numpy(), expected["equity"].to_numpy())
+assert store.hit_rate() == 1.0
+
+print("[INFO] feature store tests passed")
@@ -0,0 +1,54 @@
+# test_incremental_indicators.py
+
+# Feeds synthetic 5-minute bars to the incremental VWAP / SMA objects and checks
+# them against the batch functions in indicators.py.
+
+import numpy as np
+from indicators import (calculate_vwap, calculate_intraday_sma,
+                        IncrementalVWAP, IncrementalIntradaySMA)
+from synthetic_market import make_bars
+
+df = make_bars(["TEST"], 10)["TEST"]
+expected_vwap = calculate_vwap(df)
+expected_sma = calculate_intraday_sma(df, window=20)
+
+# One bar at a time
+vwap, sma = IncrementalVWAP(), IncrementalIntradaySMA(window=20)
+for timestamp, bar in df.iterrows():
+    vwap.update(bar)
+    sma.update(bar)
+assert np.array_equal(vwap.series().to_numpy(), expected_vwap.to_numpy())
+assert np.allclose(sma.series().to_numpy(), expected_sma.to_numpy(), equal_nan=True, rtol=0, atol=1e-9)
+print("[OK] update() matches batch functions")
+
+# Live-cycle pattern: the full history is passed every cycle, only new bars are processed
+vwap, sma = IncrementalVWAP(), IncrementalIntradaySMA(window=20)
+processed = 0
+for end in range(1, len(df) + 1, 7):
+    window = df.iloc[:end]
+    processed += len(vwap.update_many(window))
+    sma.update_many(window)
+vwap.update_many(df)
+sma.update_many(df)
+assert np.array_equal(vwap.series().to_numpy(), expected_vwap.to_numpy())
+assert np.allclose(sma.series().to_numpy(), expected_sma.to_numpy(), equal_nan=True, rtol=0, atol=1e-9)
+print(f"[OK] update_many() matches batch functions ({processed} bars processed for {len(df)} bars)")
+
+# A revised last bar replaces the previous version of it
+vwap, sma = IncrementalVWAP(), IncrementalIntradaySMA(window=20)
+partial = df.copy()
+partial.iloc[-1, partial.columns.get_loc("close")] += 1.0
+partial.iloc[-1, partial.columns.get_loc("volume")] //= 3
+vwap.update_many(partial)
+sma.update_many(partial)
+vwap.update_many(df)
+sma.update_many(df)
+assert len(vwap.values) == len(df)
+assert np.array_equal(vwap.series().to_numpy(), expected_vwap.to_numpy())
+assert np.allclose(sma.series().to_numpy(), expected_sma.to_numpy(), equal_nan=True, rtol=0, atol=1e-9)
+print("[OK] revised bar handled")
+
+# Trimming history keeps the running state
+vwap.trim(df.index[-100])
+assert len(vwap.values) == 100
+print("[OK] trim")
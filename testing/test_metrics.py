@@ -0,0 +1,95 @@
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+import metrics
+from signal_generator import generate_signal
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+@metrics.timed("noop")
+def noop():
+    return None
+
+# --- Disabled: nothing is recorded and the overhead is a flag check ---
+metrics.enable(False)
+metrics.reset()
+n = 200_000
+start = time.perf_counter()
+for _ in range(n):
+    noop()
+    with metrics.timer("block"):
+        pass
+disabled = (time.perf_counter() - start) / n
+print(f"[INFO] disabled overhead: {disabled * 1e9:.0f} ns per decorated call + timer block")
+assert metrics.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+assert metrics.flush() == {}
+
+# --- Enabled: timers, counters and histograms ---
+metrics.enable(True)
+for _ in range(5):
+    noop()
+with metrics.timer("sleep"):
+    time.sleep(0.02)
+try:
+    with metrics.timer("failing"):
+        raise RuntimeError("boom")
+except RuntimeError:
+    pass
+metrics.incr("cycles")
+metrics.gauge("queue_depth", 3)
+
+index = pd.date_range("2025-06-02 09:30", periods=200, freq="5min")
+close = 100 + np.random.default_rng(0).normal(0, 0.3, 200).cumsum()
+generate_signal(pd.DataFrame({"close": close, "vwap": close.mean(), "sma_20": close.mean()}, index=index))
+
+stats = metrics.snapshot()
+assert stats["histograms"]["noop"]["count"] == 5
+assert stats["histograms"]["sleep"]["sum"] >= 0.02
+assert stats["histograms"]["generate_signal"]["count"] == 1
+assert stats["counters"] == {"failing_errors": 1, "cycles": 1}
+assert stats["gauges"] == {"queue_depth": 3}
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "metrics.prom")
+    flushed = metrics.flush(path)
+    text = open(path).read()
+    print(text)
+    assert flushed["histograms"]["noop"]["count"] == 5
+    assert 'bot_noop_seconds_bucket{le="+Inf"} 5' in text
+    assert "bot_cycles_total 1" in text
+    assert "# TYPE bot_queue_depth gauge\nbot_queue_depth 3" in text
+    # Histograms are per cycle, counters are cumulative
+    assert metrics.snapshot()["histograms"] == {}
+    assert metrics.snapshot()["counters"]["cycles"] == 1
+    assert "# TYPE bot_sleep_max_seconds gauge" in text
+
+    # The exported histograms stay cumulative across flushes (Prometheus treats a drop as a reset);
+    # the per-cycle summary and the max gauges only cover the latest cycle
+    noop()
+    noop()
+    flushed = metrics.flush(path)
+    text = open(path).read()
+    assert list(flushed["histograms"]) == ["noop"] and flushed["histograms"]["noop"]["count"] == 2
+    assert 'bot_noop_seconds_bucket{le="+Inf"} 7' in text and "bot_noop_seconds_count 7" in text
+    assert 'bot_sleep_seconds_bucket{le="+Inf"} 1' in text and "bot_sleep_max_seconds" not in text
+
+    # --- Sampling profiler, started and stopped at runtime ---
+    metrics.start_profiler(interval=0.002)
+    busy_loop(0.3)
+    profiler = metrics.stop_profiler(os.path.join(tmp, "profile.folded"))
+    top = profiler.top(3)
+    print(f"[INFO] {profiler.samples} samples, top: {top}")
+    assert profiler.samples > 10
+    assert any("busy_loop" in func for func, _ in top)
+    assert "busy_loop" in open(os.path.join(tmp, "profile.folded")).read()
+    assert metrics.stop_profiler() is None
+
+metrics.enable(False)
+print("[INFO] metrics tests passed")
@@ -0,0 +1,191 @@
+# test_order_manager.py
+
+# Checks the order manager: token bucket refills, duplicate and in-flight deduplication, netting of
+# opposing intents, exits sent before entries, fill tracking across batches or in the background,
+# failures, batches from several threads sharing one queue and rate limit, and a load test of a few
+# hundred orders per second against the local fake Alpaca server.
+
+import asyncio
+import threading
+import time
+import metrics
+from alpaca.trading.client import TradingClient
+from broker_async import AsyncBroker
+from fake_alpaca_server import FakeAlpacaServer
+from order_manager import OrderManager, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeBroker:
+    # Accepts every order (except for symbol BAD); orders report `status` until it is changed
+    def __init__(self, status="filled"):
+        self.calls = []
+        self.lookups = 0
+        self.status = {}
+        self.default = status
+
+    async def submit_market_order(self, symbol, qty, side):
+        self.calls.append((time.monotonic(), symbol, qty, side))
+        await asyncio.sleep(0.001)
+        if symbol == "BAD":
+            raise RuntimeError("insufficient buying power")
+        order_id = f"order-{len(self.calls)}"
+        self.status[order_id] = self.default
+        return order_id
+
+    async def get_order(self, order_id):
+        self.lookups += 1
+        return {"id": order_id, "status": self.status[order_id], "filled_qty": 1.0, "filled_avg_price": 10.0}
+
+def intent(symbol, side, qty, type_="entry"):
+    return {"symbol": symbol, "side": side, "qty": qty, "type": type_}
+
+def statuses(results):
+    return [r["status"] for r in results]
+
+# Token bucket
+clock = FakeClock()
+bucket = TokenBucket(rate=10, capacity=3, clock=clock)
+assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+assert abs(bucket.reserve() - 0.1) < 1e-9 and abs(bucket.reserve() - 0.2) < 1e-9
+clock.now = 1.0
+assert bucket.reserve() == 0.0   # Refilled, but never beyond capacity
+assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0] and bucket.reserve() > 0
+
+# Duplicates within a batch: one order per symbol and side, the exit wins
+broker = FakeBroker()
+manager = OrderManager(broker, rate=1000, burst=100, poll_seconds=0.01)
+results = asyncio.run(manager.process([intent("AAA", "sell", 10, "stop_loss"), intent("AAA", "sell", 10, "exit"),
+                                       intent("BBB", "buy", 5), intent("BBB", "buy", 7)]))
+assert statuses(results) == ["filled", "duplicate", "filled", "duplicate"]
+assert sorted((c[1], c[2], c[3]) for c in broker.calls) == [("AAA", 10.0, "sell"), ("BBB", 5.0, "buy")]
+assert results[0]["fill_price"] == 10.0 and results[0]["order_id"] is not None
+
+# Netting: opposing intents become one order for the difference, or none
+broker = FakeBroker()
+manager = OrderManager(broker, rate=1000, burst=100, poll_seconds=0.01)
+results = asyncio.run(manager.process([intent("AAA", "buy", 10), intent("AAA", "sell", 4, "exit"),
+                                       intent("BBB", "sell", 5, "take_profit"), intent("BBB", "buy", 5),
+                                       intent("CCC", "buy", 2), intent("CCC", "sell", 6, "exit")]))
+assert statuses(results) == ["filled", "netted", "netted", "netted", "netted", "filled"]
+assert (results[0]["qty_sent"], results[5]["qty_sent"]) == (6.0, 4.0)
+assert sorted((c[1], c[2], c[3]) for c in broker.calls) == [("AAA", 6.0, "buy"), ("CCC", 4.0, "sell")]
+assert manager.stats()["netted"] == 4
+
+# Exits go first when the rate limit makes orders wait
+broker = FakeBroker()
+manager = OrderManager(broker, rate=200, burst=1, max_concurrency=1, poll_seconds=0.01)
+batch = [intent(f"E{i}", "buy", 1) for i in range(8)] + [intent(f"X{i}", "sell", 1, "stop_loss") for i in range(3)]
+asyncio.run(manager.process(batch))
+assert [c[1] for c in broker.calls[:3]] == ["X0", "X1", "X2"] and len(broker.calls) == 11
+
+# In flight until filled: a repeat is dropped, the opposite side is not; filled orders are picked up
+# by the next batch, after which the symbol can trade again
+broker = FakeBroker(status="new")
+manager = OrderManager(broker, rate=1000, burst=100, fill_timeout=0.05, poll_seconds=0.01)
+first = asyncio.run(manager.process([intent("AAA", "buy", 3)]))
+assert statuses(first) == ["submitted"] and list(manager.open_orders().values()) == [("AAA", "buy")]
+second = asyncio.run(manager.process([intent("AAA", "buy", 3), intent("BBB", "sell", 1, "exit")]))
+assert statuses(second) == ["duplicate", "submitted"] and len(broker.calls) == 2
+for order_id in broker.status:
+    broker.status[order_id] = "filled"
+third = asyncio.run(manager.process([]))
+assert third == [] and manager.open_orders() == {}
+assert statuses(asyncio.run(manager.process([intent("AAA", "buy", 3)]))) == ["submitted"]
+assert manager.stats()["filled"] == 2 and manager.stats()["deduplicated"] == 1
+
+# With on_fill, a batch returns once its orders are accepted and the fills are tracked in the background
+broker = FakeBroker(status="new")
+fills = []
+done = threading.Event()
+manager = OrderManager(broker, rate=1000, burst=100, poll_seconds=0.01,
+                       on_fill=lambda intent, result: (fills.append((intent, result)), done.set()))
+start = time.monotonic()
+results = asyncio.run(manager.process([dict(intent("AAA", "buy", 3), atr=1.5)]))
+assert statuses(results) == ["submitted"] and time.monotonic() - start < manager.fill_timeout
+assert statuses(asyncio.run(manager.process([intent("AAA", "buy", 3)]))) == ["duplicate"]   # Still in flight
+broker.status[results[0]["order_id"]] = "filled"
+assert done.wait(5) and manager.open_orders() == {}
+(got, result), = fills
+assert got["atr"] == 1.5 and result["status"] == "filled" and result["fill_price"] == 10.0
+assert result["order_id"] == results[0]["order_id"] and results[0]["status"] == "submitted"
+
+# Failures: a rejected submission or a rejected order frees the symbol again
+broker = FakeBroker()
+manager = OrderManager(broker, rate=1000, burst=100, poll_seconds=0.01)
+results = asyncio.run(manager.process([intent("BAD", "buy", 1), intent("AAA", "buy", 1)]))
+assert statuses(results) == ["failed", "filled"] and "buying power" in str(results[0]["error"])
+broker.default = "rejected"
+results = asyncio.run(manager.process([intent("BAD", "buy", 1), intent("CCC", "sell", 1, "exit")]))
+assert statuses(results) == ["failed", "failed"] and "rejected" in str(results[1]["error"])
+assert manager.stats()["failed"] == 3 and not manager._in_flight
+
+# Batches from several threads share one queue and one rate limit
+broker = FakeBroker()
+manager = OrderManager(broker, rate=100, burst=5, poll_seconds=0.01)
+outcomes = {}
+
+def run_batch(name, count):
+    outcomes[name] = asyncio.run(manager.process([intent(f"{name}{i}", "buy", 1) for i in range(count)]))
+
+start = time.monotonic()
+threads = [threading.Thread(target=run_batch, args=(name, 20)) for name in "ABC"]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+elapsed = time.monotonic() - start
+assert all(statuses(outcomes[name]) == ["filled"] * 20 for name in "ABC")
+# 60 orders plus at least 60 fill lookups at 100 requests per second after a burst of 5
+requests = len(broker.calls) + broker.lookups
+assert len(broker.calls) == 60 and elapsed >= (requests - 5) / 100 * 0.95, (elapsed, requests)
+print(f"[INFO] 3 threads x 20 orders, {requests} requests at 100/s: {elapsed:.2f} s")
+
+# Throttle: no more than burst + rate * window requests in any window
+broker = FakeBroker()
+manager = OrderManager(broker, rate=50, burst=5, fill_timeout=0)
+start = time.monotonic()
+asyncio.run(manager.process([intent(f"S{i}", "buy", 1) for i in range(60)]))
+elapsed = time.monotonic() - start
+times = [c[0] for c in broker.calls]
+assert elapsed >= (60 - 5) / 50 * 0.95, elapsed
+for i, t in enumerate(times):
+    in_window = sum(t <= u < t + 0.5 for u in times)
+    assert in_window <= 5 + 50 * 0.5 + 1, (i, in_window)
+print(f"[INFO] 60 orders at 50/s (burst 5): {elapsed:.2f} s")
+
+# Load test against the fake Alpaca server: a few hundred orders per second with fill tracking
+metrics.enable()
+metrics.reset()
+with FakeAlpacaServer(fill_delay=0.05) as server:
+    client = TradingClient("key", "secret", paper=True, url_override=server.url)
+    broker = AsyncBroker(client, max_concurrency=16, retries=3, backoff=0.01)
+    manager = OrderManager(broker, rate=2000, burst=50, max_concurrency=16, fill_timeout=10, poll_seconds=0.05)
+    batch = [intent(f"L{i:03d}", "buy" if i % 2 else "sell", 1 + i % 5, "exit" if i % 7 == 0 else "entry")
+             for i in range(300)]
+    start = time.perf_counter()
+    results = asyncio.run(manager.process(batch))
+    elapsed = time.perf_counter() - start
+    assert statuses(results) == ["filled"] * 300, set(statuses(results))
+    assert server.positions == {t["symbol"]: (1 if t["side"] == "buy" else -1) * t["qty"] for t in batch}
+    stats = manager.stats()
+    requests = server.requests
+    broker.close()
+snapshot = metrics.snapshot()
+metrics.enable(False)
+rate = 300 / elapsed
+print(f"[INFO] 300 orders through the fake server in {elapsed:.2f} s: {rate:.0f} orders/s "
+      f"({requests / elapsed:.0f} requests/s with the fill lookups), "
+      f"submit p50 {stats['submit']['p50_ms']:.0f} ms / p95 {stats['submit']['p95_ms']:.0f} ms, "
+      f"fill p95 {stats['fill']['p95_ms']:.0f} ms, queue max {stats['max_queue_depth']}")
+assert requests / elapsed > 100
+assert stats["max_queue_depth"] >= 250 and stats["submitted"] == stats["filled"] == 300
+assert snapshot["counters"]["orders_submitted"] == 300 and snapshot["histograms"]["order_submit"]["count"] == 300
+assert "order_queue_depth" in snapshot["gauges"]
+
+print("[INFO] order manager tests passed")
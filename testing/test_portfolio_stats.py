@@ -0,0 +1,79 @@
+import time
+import numpy as np
+import pandas as pd
+from portfolio import analyze_trades, batch_trade_stats, trade_stats, rolling_sharpe, trades_from_signals
+
+def legacy_trades(df):
+    # Bar-by-bar reconstruction the vectorized path replaces
+    trades = []
+    entry = None
+    for i in range(len(df)):
+        signal = df["signal"].iloc[i]
+        price = df["close"].iloc[i]
+        if signal == 1 or signal == -1:
+            entry = (i, price, signal)
+        elif signal == 0 and entry is not None:
+            trades.append((entry[0], i, (price - entry[1]) * entry[2]))
+            entry = None
+    return trades
+
+rng = np.random.default_rng(7)
+n = 20_000
+index = pd.date_range("2025-06-02 09:30", periods=n, freq="5min")
+signal = rng.choice([0, 1, -1, np.nan], size=n, p=[0.5, 0.2, 0.2, 0.1])
+close = 100 + rng.normal(0, 0.2, n).cumsum()
+trade_pnl = rng.normal(0, 1, n)
+df = pd.DataFrame({"signal": signal, "close": close, "trade_pnl": trade_pnl,
+                   "cumulative_pnl": trade_pnl.cumsum()}, index=index)
+
+# --- Vectorized reconstruction matches the loop ---
+start = time.perf_counter()
+expected = legacy_trades(df)
+loop_time = time.perf_counter() - start
+start = time.perf_counter()
+arrays = trades_from_signals(df["signal"].to_numpy(), df["close"].to_numpy())
+vector_time = time.perf_counter() - start
+assert len(expected) == len(arrays["pnl"])
+assert [t[0] for t in expected] == arrays["entry_idx"].tolist()
+assert [t[1] for t in expected] == arrays["exit_idx"].tolist()
+assert np.allclose([t[2] for t in expected], arrays["pnl"])
+print(f"[INFO] {len(expected)} trades | loop {loop_time:.3f}s | vectorized {vector_time:.4f}s")
+
+metrics = analyze_trades(df)
+pnl = np.array([t[2] for t in expected])
+assert metrics["num_trades"] == len(pnl)
+assert metrics["total_pnl"] == round(pnl.sum(), 2)
+assert metrics["win_rate"] == round((pnl > 0).mean(), 2)
+assert metrics["std_pnl"] == round(pnl.std(), 2)
+assert metrics["sharpe_ratio"] == round(trade_pnl.mean() / trade_pnl.std(ddof=1), 2)
+assert 0 < metrics["exposure"] < 1
+
+# --- Reusing a trade list skips reconstruction ---
+trade_list = [{"entry_time": index[e], "exit_time": index[x], "entry_price": close[e], "exit_price": close[x],
+               "direction": "long" if signal[e] == 1 else "short", "pnl": p, "symbol": ["AAA", "BBB"][e % 2]}
+              for e, x, p in expected]
+from_list = analyze_trades(df, trades=trade_list)
+for key in ("total_pnl", "num_trades", "win_rate", "max_drawdown", "sharpe_ratio", "avg_holding_period_min", "exposure"):
+    assert from_list[key] == metrics[key], key
+per_symbol = from_list["per_symbol"]
+assert per_symbol["num_trades"].sum() == len(pnl)
+assert np.isclose(per_symbol["total_pnl"].sum(), pnl.sum())
+print(per_symbol)
+
+# --- Batch stats agree with the single-run engine ---
+runs = [rng.normal(0.1, 1, size) for size in rng.integers(0, 300, 2_000)]
+start = time.perf_counter()
+batch = batch_trade_stats(runs)
+print(f"[INFO] batch stats for {len(runs)} runs in {time.perf_counter() - start:.3f}s")
+for i in rng.choice(len(runs), 50, replace=False):
+    single = trade_stats(runs[i])
+    for key, val in single.items():
+        assert np.isclose(batch[key].iloc[i], val), (i, key)
+
+# --- Rolling Sharpe matches pandas ---
+window = 78
+rolled = rolling_sharpe(trade_pnl, window, periods_per_year=1)
+roll = pd.Series(trade_pnl).rolling(window)
+assert np.allclose(rolled[window - 1:], (roll.mean() / roll.std()).to_numpy()[window - 1:])
+
+print("[INFO] portfolio stats tests passed")
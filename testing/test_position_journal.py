@@ -0,0 +1,155 @@
+# test_position_journal.py
+
+# Checks that the position journal survives a crash (hard exit without close), that events are committed
+# in batches, how long recovery takes, and that reconcile() / main.recover_positions fix up a stale journal.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from position_journal import PositionJournal
+
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, "positions.db")
+
+# A process that journals positions and dies without closing the database
+script = f"""
+import os
+from position_journal import PositionJournal
+journal = PositionJournal({path!r}, batch_size=1000, flush_seconds=3600)
+for i in range(500):
+    journal.record_entry(f"S{{i:03d}}", 100.0 + i, 1 if i % 2 else -1, qty=10 if i % 2 else -10)
+    journal.record_fill(f"S{{i:03d}}", "buy" if i % 2 else "sell", 10, 100.0 + i, order_id=str(i))
+for i in range(0, 500, 5):
+    journal.record_exit(f"S{{i:03d}}", 99.0, "stop_loss")
+journal.flush()
+journal.record_entry("LOST", 1.0, 1)   # Never flushed
+os._exit(1)
+"""
+env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+assert subprocess.run([sys.executable, "-c", script], env=env).returncode == 1
+
+start = time.perf_counter()
+journal = PositionJournal(path)
+tracker = journal.load()
+elapsed = time.perf_counter() - start
+expected = {f"S{i:03d}": {"entry_price": 100.0 + i, "direction": 1 if i % 2 else -1} for i in range(500) if i % 5}
+assert tracker == expected
+assert journal.quantities()["S001"] == 10 and journal.quantities()["S002"] == -10
+assert [e["kind"] for e in journal.events("S005")] == ["entry", "fill", "exit"]
+print(f"[INFO] Recovered {len(tracker)} positions in {elapsed * 1000:.1f} ms")
+
+# Events are committed in batches
+journal = PositionJournal(os.path.join(tmp, "batched.db"), batch_size=50, flush_seconds=3600)
+for i in range(120):
+    journal.record_fill("AAA", "buy", 1, 10.0)
+assert journal.commits == 2
+assert journal.flush() == 20 and journal.commits == 3
+assert journal.flush() == 0
+journal.close()
+
+# Batched commits against one commit per event
+def journal_time(batch_size, n=300):
+    journal = PositionJournal(os.path.join(tmp, f"speed_{batch_size}.db"), batch_size=batch_size)
+    start = time.perf_counter()
+    for i in range(n):
+        journal.record_entry(f"S{i}", 10.0, 1, qty=1)
+    journal.close()
+    return time.perf_counter() - start
+
+single, batched = journal_time(1), journal_time(100)
+print(f"[INFO] 300 entries: {single * 1000:.0f} ms committing each, {batched * 1000:.0f} ms in batches of 100")
+
+# Reconcile against the broker's positions
+journal = PositionJournal(":memory:")
+for symbol, entry, direction in [("KEEP", 10.0, 1), ("GONE", 20.0, 1), ("FLIP", 30.0, 1)]:
+    journal.record_entry(symbol, entry, direction)
+journal.flush()
+positions = {"KEEP": {"qty": 5.0, "entry_price": 11.0},
+             "FLIP": {"qty": -3.0, "entry_price": 31.0},
+             "NEW": {"qty": 2.0, "entry_price": 40.0}}
+tracker, report = journal.reconcile(journal.load(), positions)
+assert tracker == {"KEEP": {"entry_price": 10.0, "direction": 1}, "FLIP": {"entry_price": 31.0, "direction": -1},
+                   "NEW": {"entry_price": 40.0, "direction": 1}}
+assert report == {"kept": ["KEEP"], "dropped": ["GONE"], "replaced": ["FLIP"], "adopted": ["NEW"]}
+assert journal.load() == tracker
+
+# main.py journals filled orders and recovers them at startup
+from alpaca.trading.client import TradingClient
+from broker_async import AsyncBroker
+from fake_alpaca_server import FakeAlpacaServer
+import threading
+import main
+
+main.log_trade = lambda *args: None
+main.journal = PositionJournal(os.path.join(tmp, "main.db"))
+with FakeAlpacaServer(price=50.0) as server:
+    broker = AsyncBroker(TradingClient("key", "secret", paper=True, url_override=server.url))
+    track = {"entry_price": 50.0, "direction": 1}
+    main.position_tracker["AAA"] = track
+    main.submit_orders(broker, [("AAA", {"side": "buy", "qty": 4, "type": "entry", "price": 50.0, "track": track},
+                                 1.0, None)])
+    assert main.journal.load() == {"AAA": track}
+
+    main.position_tracker.clear()   # Restart
+    main.journal = PositionJournal(os.path.join(tmp, "main.db"))
+    server.positions["BBB"] = -7.0
+    main.recover_positions(broker)
+    assert main.position_tracker == {"AAA": track, "BBB": {"entry_price": 50.0, "direction": -1}}
+
+    # Orders are logged at their fill price: right away if the fill was seen, by log_fill (on_fill) if not
+    logged = []
+    main.log_trade = lambda *args: logged.append(args)
+    server.price = 51.0
+    cc = {"entry_price": 50.0, "direction": 1}
+    main.position_tracker["CCC"] = cc
+    main.submit_orders(broker, [("CCC", {"side": "buy", "qty": 2, "type": "entry", "price": 50.0, "track": cc}, 1.0, None)])
+    assert logged[-1][3] == 51.0
+    orders = main.get_order_manager(broker)
+    filled = threading.Event()
+    orders.on_fill = lambda *fill: (main.log_fill(*fill), filled.set())
+    server.fill_delay = 0.2
+    main.position_tracker["DDD"] = cc
+    main.submit_orders(broker, [("DDD", {"side": "buy", "qty": 3, "type": "entry", "price": 50.0, "track": cc}, 1.0, None)])
+    assert logged[-1][0] == "CCC" and filled.wait(10)
+    assert logged[-1][0] == "DDD" and logged[-1][3] == 51.0
+    assert [e["price"] for e in main.journal.events("DDD") if e["kind"] == "fill"] == [51.0]
+
+    # An exit dropped because another one is in flight leaves the symbol untracked
+    exit_ = {"side": "sell", "qty": 2, "type": "stop_loss", "price": 49.0, "track": None}
+    server.fill_delay = 60
+    main.position_tracker.pop("CCC")
+    main.submit_orders(broker, [("CCC", exit_, 1.0, cc)])
+    main.submit_orders(broker, [("CCC", dict(exit_, type="exit"), 1.0, cc)])
+    assert "CCC" not in main.position_tracker and "CCC" not in main.risk_monitor.pending()
+
+    # Orders the broker rejects after accepting them are undone: a rejected stop-loss exit is tracked
+    # and monitored again, a rejected entry is no longer tracked
+    settled = []
+    orders.on_fill = lambda intent, result: (main.log_fill(intent, result), settled.append(intent["symbol"]))
+    server.fill_delay = 0
+    ee = {"entry_price": 50.0, "direction": 1}
+    server.positions["EEE"] = 5.0
+    main.position_tracker["EEE"] = ee
+    main.journal.record_entry("EEE", 50.0, 1, 5.0)
+    main.risk_monitor.add("EEE", 50.0, 1, 1.0, 5.0)
+    assert main.risk_monitor.on_price("EEE", 48.0)[0][1]["type"] == "stop_loss"   # on_exit not set: nothing sent
+    main.position_tracker.pop("EEE")
+    server.reject_next = 2
+    main.submit_orders(broker, [("EEE", {"side": "sell", "qty": 5, "type": "stop_loss", "price": 48.0, "track": None},
+                                 1.0, ee)])
+    main.position_tracker["FFF"] = ee
+    main.submit_orders(broker, [("FFF", {"side": "buy", "qty": 3, "type": "entry", "price": 50.0, "track": ee},
+                                 1.0, None)])
+    deadline = time.monotonic() + 10
+    while not {"EEE", "FFF"} <= set(settled) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.position_tracker["EEE"] == ee and main.journal.load()["EEE"] == ee
+    assert "EEE" in main.risk_monitor and main.risk_monitor.on_price("EEE", 48.0)   # The stop is armed again
+    assert "FFF" not in main.position_tracker and "FFF" not in main.journal.load() and "FFF" not in main.risk_monitor
+    assert server.positions["EEE"] == 5.0 and "FFF" not in server.positions
+    orders.on_fill = None
+main.position_tracker.clear()
+
+print("[INFO] position journal tests passed")
@@ -0,0 +1,107 @@
+# test_risk_monitor.py
+
+# Checks that the vectorized risk monitor fires exactly the exits strategy.stop_or_target would, that every
+# exit fires once, and measures the reaction latency from a streamed price update to the exit.
+
+import time
+import numpy as np
+import pandas as pd
+import metrics
+from risk_monitor import RiskMonitor
+from strategy import stop_or_target
+from stream import BarAggregator
+
+rng = np.random.default_rng(7)
+
+# Same decisions as stop_or_target, including prices exactly on a level
+n = 2_000
+entry = rng.uniform(20, 500, n).round(2)
+direction = rng.choice([1, -1], n)
+atr = rng.uniform(0.2, 10, n).round(2)
+qty = rng.integers(1, 200, n) * direction
+price = entry + rng.normal(0, 3, n) * atr
+price[::50] = entry[::50] - direction[::50] * 1.5 * atr[::50]   # Exactly on the stop (STOP_ATR_MULT = 1.5)
+
+exits = []
+monitor = RiskMonitor(on_exit=lambda symbol, action, atr, tracked: exits.append((symbol, action)))
+symbols = [f"S{i:04d}" for i in range(n)]
+for i, symbol in enumerate(symbols):
+    monitor.add(symbol, entry[i], int(direction[i]), atr[i], float(qty[i]))
+assert len(monitor) == n   # Grew past INITIAL_SLOTS
+
+# Cost of a pass in which nothing triggers (the common case), against a loop over stop_or_target
+quiet = dict(zip(symbols, entry.tolist()))
+start = time.perf_counter()
+assert monitor.on_prices(quiet) == []
+vector_time = time.perf_counter() - start
+start = time.perf_counter()
+for i, symbol in enumerate(symbols):
+    stop_or_target({"entry_price": entry[i], "direction": int(direction[i])}, entry[i], atr[i], float(qty[i]))
+loop_time = time.perf_counter() - start
+print(f"[INFO] Checking {n} positions: {vector_time * 1000:.2f} ms vectorized, "
+      f"{loop_time * 1000:.2f} ms with stop_or_target per position")
+
+fired = monitor.on_prices(dict(zip(symbols, price.tolist())))
+expected = {}
+for i, symbol in enumerate(symbols):
+    action = stop_or_target({"entry_price": entry[i], "direction": int(direction[i])}, price[i], atr[i], float(qty[i]))
+    if action is not None:
+        expected[symbol] = action
+assert {symbol: action for symbol, action, _, _ in fired} == expected
+assert dict(exits) == expected
+assert len(monitor) == n - len(expected)
+
+# An exit fires once, and a removed or re-added symbol uses its new levels
+assert monitor.on_prices(dict(zip(symbols, price.tolist()))) == []
+monitor = RiskMonitor()
+monitor.add("AAA", 100.0, 1, 2.0, 10)
+assert monitor.on_price("AAA", 98.0) == []
+assert monitor.on_price("BBB", 1.0) == []
+monitor.add("AAA", 90.0, 1, 2.0, 10)
+assert monitor.on_price("AAA", 98.0)[0][1]["type"] == "take_profit"   # 98 >= 90 + 3 * 2
+assert "AAA" not in monitor
+monitor.add("CCC", 50.0, -1, 1.0, -30)
+symbol, action, _, tracked = monitor.on_price("CCC", 51.5)[0]
+assert (action["side"], action["qty"], action["type"]) == ("buy", 30, "stop_loss")
+assert tracked == {"entry_price": 50.0, "direction": -1}
+monitor.add("DDD", 50.0, 1, 1.0, 5)
+monitor.sync({}, {}, {})
+assert len(monitor) == 0
+
+# A fired exit stays pending: a sync from a tracker that still holds the symbol doesn't re-arm it
+# until the exit is resolved by add / remove (order sent) or resolve (order not sent)
+stale = {"EEE": {"entry_price": 50.0, "direction": 1}}
+monitor.sync(stale, {"EEE": 1.0}, {"EEE": 5})
+assert monitor.on_price("EEE", 48.0)[0][1]["type"] == "stop_loss" and "EEE" in monitor.pending()
+monitor.sync(stale, {"EEE": 1.0}, {"EEE": 5})
+assert "EEE" not in monitor and monitor.on_price("EEE", 48.0) == []
+monitor.resolve("EEE")
+monitor.sync(stale, {"EEE": 1.0}, {"EEE": 5})
+assert "EEE" in monitor and "EEE" not in monitor.pending()
+monitor.on_price("EEE", 48.0)
+monitor.remove("EEE")
+monitor.sync(stale, {"EEE": 1.0}, {"EEE": 5})
+assert "EEE" in monitor
+
+# Reaction latency: streamed price updates reach the monitor before the bar closes
+metrics.enable()
+metrics.reset()
+exits = []
+monitor = RiskMonitor(on_exit=lambda symbol, action, atr, tracked: exits.append((time.perf_counter(), symbol)))
+bars_closed = []
+aggregator = BarAggregator(lambda symbol, bar: bars_closed.append(symbol), on_price=monitor.on_price)
+t0 = pd.Timestamp("2025-03-03 10:00", tz="America/New_York")
+for i in range(200):
+    monitor.add(f"P{i}", 100.0, 1, 2.0, 10)
+for minute in range(3):
+    for i in range(200):
+        move = -4.0 if (i % 4 == 0 and minute == 2) else 0.5
+        aggregator.update_bar(f"P{i}", t0 + pd.Timedelta(minutes=minute), 100, 101, 99, 100 + move, 1000)
+assert [symbol for _, symbol in exits] == [f"P{i}" for i in range(0, 200, 4)]
+assert bars_closed == []   # Exits fired mid-bar, without waiting for the 5-minute close
+reaction = metrics.snapshot()["histograms"]["risk_reaction"]
+assert reaction["count"] == 50
+print(f"[INFO] Reaction latency: mean {reaction['mean'] * 1e6:.0f} us, max {reaction['max'] * 1e6:.0f} us")
+metrics.enable(False)
+
+print("[INFO] risk monitor tests passed")
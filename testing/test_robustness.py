@@ -0,0 +1,108 @@
+# test_robustness.py
+
+# Checks the Monte Carlo engine: the vectorized path statistics match portfolio.trade_stats and a
+# per-trade equity loop, shuffled paths keep the total PnL, bootstrap intervals agree with the normal
+# approximation, chunking doesn't change the distribution, risk of ruin has the right limits and matches a
+# plain simulation, and 100k paths finish in seconds.
+
+import time
+import numpy as np
+import pandas as pd
+from portfolio import trade_stats, return_stats
+from robustness import (monte_carlo, path_stats, resample_indices, trade_risk, print_report,
+                        STAT_COLUMNS, RUIN_DRAWDOWN)
+from strategy import RISK_PER_TRADE_PCT, STOP_ATR_MULT
+
+rng = np.random.default_rng(11)
+num_trades = 200
+atr = rng.uniform(0.5, 2.0, num_trades)
+r_true = np.where(rng.random(num_trades) < 0.45, rng.uniform(0.8, 2.5, num_trades), -1.0)
+entry = pd.date_range("2025-01-02 10:00", periods=num_trades, freq="8h", tz="America/New_York")
+trades = [{"entry_time": entry[i], "exit_time": entry[i] + pd.Timedelta(minutes=45), "direction": "long",
+           "entry_price": 100.0, "exit_price": 100.0 + r_true[i] * STOP_ATR_MULT * atr[i],
+           "pnl": r_true[i] * STOP_ATR_MULT * atr[i], "atr": atr[i]} for i in range(num_trades)]
+pnl = np.array([t["pnl"] for t in trades])
+
+# Risk per trade from the ATR at entry, as strategy.decide sizes positions
+_, risk = trade_risk(trades)
+assert np.allclose(pnl / risk, r_true)
+assert np.allclose(trade_risk([{"pnl": 2.0}, {"pnl": -1.0}, {"pnl": -3.0}])[1], 2.0)   # Average loser
+assert np.allclose(trade_risk(trades, risk=4.0)[1], 4.0)
+
+# Path statistics against the scalar implementations, path by path
+idx = resample_indices(np.random.default_rng(1), num_trades, 50)
+stats = path_stats(pnl[idx], r_true[idx], RISK_PER_TRADE_PCT, 252)
+for k in range(50):
+    path = pnl[idx[k]]
+    expected = trade_stats(path)
+    assert np.isclose(stats["total_pnl"][k], expected["total_pnl"])
+    assert np.isclose(stats["max_drawdown"][k], expected["max_drawdown"])
+    assert np.isclose(stats["sharpe_ratio"][k], return_stats(path)["sharpe_ratio"])
+    equity = np.cumprod(1 + RISK_PER_TRADE_PCT * r_true[idx[k]])
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+    assert np.isclose(stats["return_pct"][k], equity[-1] - 1)
+    assert np.isclose(stats["max_drawdown_pct"][k], (1 - equity / peak).max())
+assert np.allclose(stats["sharpe_annualized"], stats["sharpe_ratio"] * np.sqrt(252))
+
+# Shuffle: every path is a permutation, so total PnL and Sharpe never change
+shuffled = monte_carlo(trades, 2_000, method="shuffle", seed=3)
+assert np.allclose(shuffled["paths"]["total_pnl"], pnl.sum())
+assert np.allclose(shuffled["paths"]["sharpe_ratio"], shuffled["observed"]["sharpe_ratio"])
+assert shuffled["paths"]["max_drawdown"].std() > 0
+assert (np.sort(resample_indices(np.random.default_rng(2), 30, 5, "shuffle"), axis=1) == np.arange(30)).all()
+
+# Bootstrap: the total PnL interval matches the normal approximation
+boot = monte_carlo(trades, 20_000, seed=4)
+intervals = boot["intervals"]
+assert list(intervals.index) == STAT_COLUMNS and list(intervals.columns) == ["mean", "lower", "median", "upper"]
+sd = pnl.std() * np.sqrt(num_trades)
+assert abs(intervals.loc["total_pnl", "mean"] - pnl.sum()) < 0.05 * sd
+assert abs(intervals.loc["total_pnl", "upper"] - (pnl.sum() + 1.96 * sd)) < 0.1 * sd
+assert abs(intervals.loc["total_pnl", "lower"] - (pnl.sum() - 1.96 * sd)) < 0.1 * sd
+assert np.isclose(boot["observed"]["total_pnl"], pnl.sum())
+days = (trades[-1]["exit_time"] - trades[0]["entry_time"]).total_seconds() / 86_400
+assert np.isclose(boot["observed"]["sharpe_annualized"],
+                  boot["observed"]["sharpe_ratio"] * np.sqrt(num_trades / days * 365.25))
+
+# Chunk size bounds memory without changing the distribution; a seed repeats a run exactly
+small_chunks = monte_carlo(trades, 20_000, seed=5, chunk_elements=num_trades * 7)
+assert abs(small_chunks["intervals"].loc["total_pnl", "mean"] - intervals.loc["total_pnl", "mean"]) < 0.05 * sd
+assert abs(small_chunks["risk_of_ruin"] - boot["risk_of_ruin"]) < 0.02
+pd.testing.assert_frame_equal(monte_carlo(trades, 500, seed=6)["paths"], monte_carlo(trades, 500, seed=6)["paths"])
+
+# Risk of ruin: limits, and against a plain Python simulation at a risk level where ruin is common
+losers = [{"pnl": -1.0, "risk": 1.0}] * 100
+assert monte_carlo(losers, 100, seed=0, risk_pct=0.01)["risk_of_ruin"] == 1.0       # 0.99 ** 100 = 0.37
+assert monte_carlo(losers, 100, seed=0, risk_pct=0.001)["risk_of_ruin"] == 0.0      # 0.999 ** 100 = 0.90
+assert monte_carlo([{"pnl": 1.0}] * 50, 100, seed=0)["risk_of_ruin"] == 0.0
+assert monte_carlo(losers[:1], 10, risk_pct=1.0)["risk_of_ruin"] == 1.0              # Whole account lost
+risky = monte_carlo(trades, 20_000, seed=7, risk_pct=0.08)
+sim_rng = np.random.default_rng(8)
+ruined = 0
+for _ in range(4_000):
+    equity = peak = 1.0
+    for i in sim_rng.integers(0, num_trades, num_trades):
+        equity *= 1 + 0.08 * r_true[i]
+        peak = max(peak, equity)
+        if equity <= peak * (1 - RUIN_DRAWDOWN):
+            ruined += 1
+            break
+assert 0.05 < risky["risk_of_ruin"] < 0.95
+assert abs(risky["risk_of_ruin"] - ruined / 4_000) < 0.03, (risky["risk_of_ruin"], ruined / 4_000)
+assert risky["risk_of_ruin"] > boot["risk_of_ruin"]
+
+# Trades without any risk information (trade_log round trips, backtest_signals)
+dollars = {"pnl": pnl * 100, "entry_time": entry, "exit_time": entry + pd.Timedelta(minutes=45)}
+plain = monte_carlo(dollars, 1_000, seed=9)
+assert np.isclose(plain["observed"]["total_pnl"], pnl.sum() * 100)
+assert monte_carlo([], 10) == {}
+print_report(plain)
+
+# Speed: 100k bootstrap paths of 200 trades
+start = time.perf_counter()
+result = monte_carlo(trades, 100_000, seed=10)
+elapsed = time.perf_counter() - start
+print(f"[INFO] 100k paths x {num_trades} trades: {elapsed:.2f} s")
+assert len(result["paths"]) == 100_000 and elapsed < 30
+
+print("[INFO] robustness tests passed")
@@ -0,0 +1,107 @@
+# test_scheduler.py
+
+# Drives the scheduler with a fake clock: bar-close alignment, holidays and early closes, sub-cycle
+# jobs, overrun handling, and main.py's fast stop check against the fake Alpaca server.
+
+import datetime as dt
+from scheduler import Scheduler, MarketCalendar, nyse_holidays, nyse_early_closes, ET
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += dt.timedelta(seconds=seconds)
+
+def at(*args):
+    return ET.localize(dt.datetime(*args))
+
+# --- Calendar ---
+assert nyse_holidays(2025) == {dt.date(2025, m, d) for m, d in
+                               [(1, 1), (1, 20), (2, 17), (4, 18), (5, 26), (6, 19), (7, 4), (9, 1), (11, 27), (12, 25)]}
+assert nyse_early_closes(2025) == {dt.date(2025, 7, 3), dt.date(2025, 11, 28), dt.date(2025, 12, 24)}
+assert dt.date(2026, 7, 3) in nyse_holidays(2026)           # July 4th on a Saturday
+assert dt.date(2026, 7, 2) not in nyse_early_closes(2026)
+assert dt.date(2021, 12, 31) not in nyse_holidays(2022)     # New Year's on a Saturday is not observed
+assert dt.date(2027, 6, 18) in nyse_holidays(2027)          # Juneteenth on a Saturday
+calendar = MarketCalendar()
+assert calendar.is_open(at(2025, 7, 3, 12, 59)) and not calendar.is_open(at(2025, 7, 3, 13, 0))
+assert not calendar.is_open(at(2025, 7, 4, 11, 0))
+
+# --- Bar-close job across an early close, a holiday and a weekend ---
+clock = FakeClock(at(2025, 7, 3, 8, 0))
+scheduler = Scheduler(clock=clock, sleep=clock.sleep, calendar=calendar)
+bars, stops, beats, mornings = [], [], [], []
+scheduler.at_bar_close(bars.append, start=dt.time(9, 30), end=dt.time(15, 30), name="bar_close")
+scheduler.every(30, stops.append, start=dt.time(9, 30), end=dt.time(15, 30), name="stops")
+scheduler.every(60, beats.append, market_hours=False, name="heartbeat")
+scheduler.daily(dt.time(8, 0), mornings.append, name="watchlist")
+
+def until(stop_at):
+    while True:
+        pending = min(job.next_time for job in scheduler.jobs)
+        if pending > stop_at:
+            break
+        if pending > clock():
+            clock.sleep((pending - clock()).total_seconds())
+        scheduler.run_pending()
+
+until(at(2025, 7, 7, 9, 45))
+# Thursday: 09:35:05 ... 13:00:05 (early close), nothing on Friday July 4th or the weekend
+thursday = [t for t in bars if t.date() == dt.date(2025, 7, 3)]
+assert thursday[0] == at(2025, 7, 3, 9, 35, 5) and thursday[-1] == at(2025, 7, 3, 13, 0, 5)
+assert len(thursday) == 42
+assert [t.date() for t in bars if t.date() != dt.date(2025, 7, 3)] == [dt.date(2025, 7, 7)] * 2
+assert all(t.second == 5 and t.minute % 5 == 0 for t in bars)
+assert len([t for t in stops if t.date() == dt.date(2025, 7, 3)]) == 7 * 60   # 09:30:30 ... 13:00:00
+assert stops[0] == at(2025, 7, 3, 9, 30, 30) and stops[-1] == at(2025, 7, 7, 9, 45)
+assert not any(t.date() == dt.date(2025, 7, 4) for t in stops)
+assert any(t.date() == dt.date(2025, 7, 4) for t in beats)     # Heartbeat keeps running on holidays
+assert [t.date() for t in mornings] == [dt.date(2025, 7, 7)]   # 08:00 of the next trading day
+print(f"[OK] {len(bars)} bar closes, {len(stops)} stop checks, {len(beats)} heartbeats")
+
+# --- Overrun: a 12-minute job skips the boundaries it missed instead of running them late ---
+clock = FakeClock(at(2025, 7, 7, 10, 0))
+scheduler = Scheduler(clock=clock, sleep=clock.sleep, calendar=calendar)
+runs = []
+
+def slow(now):
+    runs.append(now)
+    if len(runs) == 1:
+        clock.sleep(12 * 60)
+
+job = scheduler.at_bar_close(slow)
+scheduler.run(max_runs=3)
+# Runs 10:00:05 until 10:12:05; 10:05:05 and 10:10:05 are dropped
+assert runs == [at(2025, 7, 7, 10, 0, 5), at(2025, 7, 7, 10, 15, 5), at(2025, 7, 7, 10, 20, 5)]
+assert job.skipped == 1
+
+# --- Failing job does not stop the loop ---
+clock = FakeClock(at(2025, 7, 7, 10, 0))
+scheduler = Scheduler(clock=clock, sleep=clock.sleep, calendar=calendar)
+scheduler.at_bar_close(lambda now: 1 / 0, name="broken")
+scheduler.run(max_runs=2)
+assert scheduler.jobs[0].runs == 2
+
+# --- main.check_stops closes a tracked position that hit its stop between bar closes ---
+from alpaca.trading.client import TradingClient
+from broker_async import AsyncBroker
+from fake_alpaca_server import FakeAlpacaServer
+from position_journal import PositionJournal
+import main
+
+with FakeAlpacaServer(price=95.0) as server:
+    broker = AsyncBroker(TradingClient("key", "secret", paper=True, url_override=server.url))
+    server.positions = {"AAA": 10.0, "BBB": 5.0}
+    main.position_tracker.update({"AAA": {"entry_price": 100.0, "direction": 1},    # 95 <= 100 - 1.5 * 2
+                                  "BBB": {"entry_price": 96.0, "direction": 1}})    # still inside its levels
+    main.log_trade = lambda *args: None
+    main.journal = PositionJournal(":memory:")
+    main.check_stops(broker, {"AAA": 2.0, "BBB": 2.0})
+    assert server.positions == {"BBB": 5.0}
+    assert list(main.position_tracker) == ["BBB"]
+
+print("[INFO] scheduler tests passed")
@@ -0,0 +1,63 @@
+# test_signal_engine.py
+
+# Checks that the array-backed state machine in generate_signal matches the
+# bar-by-bar reference loop exactly, on hand-made and random data.
+
+import numpy as np
+import pandas as pd
+from signal_generator import generate_signal, generate_signal_positions, generate_signal_loop
+
+def random_frame(n, seed, with_nans=False, integer_prices=False):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    vwap = close + rng.normal(0, 0.4, n)
+    sma = close + rng.normal(0, 0.4, n)
+    if integer_prices:
+        # Integer prices produce lots of exact ties (<=, >=) between the three lines
+        close, vwap, sma = np.round(close), np.round(vwap), np.round(sma)
+    if with_nans:
+        sma[:19] = np.nan
+        vwap[rng.integers(0, n, n // 50)] = np.nan
+    index = pd.date_range("2025-06-02 09:30", periods=n, freq="5min")
+    return pd.DataFrame({"close": close, "vwap": vwap, "sma_20": sma}, index=index)
+
+def check(df, label):
+    expected = generate_signal_loop(df, return_position=True)
+    signal = generate_signal(df)
+    both = generate_signal_positions(df)
+
+    assert signal.name == "signal"
+    assert signal.dtype == expected["signal"].dtype
+    assert signal.index.equals(expected.index)
+    assert np.array_equal(signal.to_numpy(), expected["signal"].to_numpy()), label
+    assert np.array_equal(both["position"].to_numpy(), expected["position"].to_numpy()), label
+    print(f"[OK] {label}: {len(df)} bars, {(signal != 0).sum()} entries")
+
+# Sample data from test_signal_gen.py
+data = {
+    "close":   [100, 102, 101, 98, 97, 99, 100],
+    "vwap":    [101, 101, 101, 100, 99, 100, 101],
+    "sma_20":  [99, 99, 99, 99, 99, 99, 99]
+}
+index = pd.date_range("2025-06-02 09:30", periods=7, freq="5min")
+check(pd.DataFrame(data, index=index), "sample")
+
+# Degenerate lengths
+check(random_frame(0, 0), "empty")
+check(random_frame(1, 0), "single bar")
+check(random_frame(2, 0), "two bars")
+
+# Random walks, with ties and NaN warm-up periods
+for seed in range(20):
+    check(random_frame(780, seed), f"random seed={seed}")
+    check(random_frame(780, seed, with_nans=True), f"random+nan seed={seed}")
+    check(random_frame(780, seed, integer_prices=True), f"integer seed={seed}")
+
+# Event log matches the transitions and is collected without per-bar printing
+df = random_frame(780, 42)
+events = []
+generate_signal(df, events=events)
+positions = generate_signal_loop(df, return_position=True)["position"]
+transitions = (positions != positions.shift(fill_value=0)).sum()
+assert len(events) == transitions
+print(f"[OK] event log: {len(events)} events")
@@ -0,0 +1,38 @@
+# test_simulator.py
+
+# Replays a year of synthetic 5-minute bars for 25 symbols through the live decision logic.
+
+import time
+import numpy as np
+from simulator import replay, hourly_trend_sma
+from synthetic_market import make_bars
+
+# Hourly trend SMA against an explicit resample of the visible hourly bars
+df = make_bars(["TEST"], 15)["TEST"]
+sma = hourly_trend_sma(df, window=50, sessions=10)
+for i in range(0, len(df), 37):
+    now = df.index[i]
+    visible = df.iloc[:i + 1]
+    first_day = sorted(set(visible.index.date))[-10:][0]
+    visible = visible[visible.index.date >= first_day]
+    hourly = visible["close"].resample("60min", offset="30min").last().dropna()
+    expected = hourly.rolling(50).mean().iloc[-1]
+    assert np.isclose(sma[i], expected, equal_nan=True), (now, sma[i], expected)
+print("[OK] hourly trend SMA matches a resample of the visible hourly bars")
+
+panel = make_bars(25, 252)
+bars = sum(len(df) for df in panel.values())
+
+# With the live settings (5 days of hourly bars) the 50-bar trend SMA never fills, so nothing trades
+start = time.perf_counter()
+result = replay(panel)
+elapsed = time.perf_counter() - start
+print(f"[OK] live settings: {bars} bars in {elapsed:.2f} s, {len(result['fills'])} fills")
+
+start = time.perf_counter()
+result = replay(panel, hourly_sessions=10)
+elapsed = time.perf_counter() - start
+fills = result["fills"]
+print(f"[OK] 10 days of hourly bars: {bars} bars in {elapsed:.2f} s, {len(fills)} fills, "
+      f"final equity ${result['equity'].iloc[-1]:,.2f}")
+print(fills["type"].value_counts())
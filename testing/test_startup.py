@@ -0,0 +1,68 @@
+# test_startup.py
+
+# Checks that the bot's entry points import quickly and without side effects: no Alpaca credentials,
+# no client objects, no alpaca-py / yfinance until they are used, and no files written. Each import runs
+# in a fresh interpreter (best of 3), against a time budget.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import services
+
+BUDGETS = {"monitor": 0.25, "main": 1.0, "atr_watchlist": 1.0}   # Seconds, import only
+HEAVY = ("alpaca", "yfinance", "lxml", "requests")
+
+probe = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+workdir = tempfile.mkdtemp()
+env = {k: v for k, v in os.environ.items() if not k.startswith("APCA_")}
+env["PYTHONPATH"] = os.pathsep.join(os.path.abspath(p) for p in sys.path if p)
+for module, budget in BUDGETS.items():
+    runs = []
+    for _ in range(3):
+        out = subprocess.run([sys.executable, "-c", probe.format(module=module, heavy=HEAVY)], env=env,
+                             cwd=workdir, capture_output=True, text=True)
+        assert out.returncode == 0, out.stderr
+        elapsed, _, loaded = out.stdout.strip().splitlines()[-1].partition(" ")
+        runs.append(float(elapsed))
+        assert not loaded, f"{module} imported {loaded}"
+    print(f"[INFO] import {module}: {min(runs) * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    assert min(runs) < budget, module
+assert os.listdir(workdir) == [], os.listdir(workdir)   # No trade log, journal or state files
+
+# Clients are built on first use, once, and a missing credential says so
+saved = {k: os.environ.pop(k) for k in ("APCA_API_KEY_ID", "APCA_API_SECRET_KEY") if k in os.environ}
+import broker_alpaca
+services.reset()
+try:
+    broker_alpaca.get_account_info()
+except RuntimeError as e:
+    assert "APCA_API_KEY_ID" in str(e)
+else:
+    raise AssertionError("expected a missing-credentials error")
+assert not services.is_built("trading_client")
+
+os.environ.update(APCA_API_KEY_ID="key", APCA_API_SECRET_KEY="secret")
+start = time.perf_counter()
+client = broker_alpaca.trading_client
+print(f"[INFO] TradingClient built on first use in {(time.perf_counter() - start) * 1000:.0f} ms")
+assert services.get("trading_client") is client and broker_alpaca.get_trading_client() is client
+assert services.get("async_broker").client is client
+
+fake = object()
+services.provide("trading_client", fake)
+assert broker_alpaca.trading_client is fake
+services.reset()
+for k in ("APCA_API_KEY_ID", "APCA_API_SECRET_KEY"):
+    os.environ.pop(k)
+os.environ.update(saved)
+
+print("[INFO] startup tests passed")
@@ -0,0 +1,114 @@
+# test_stream.py
+
+# Checks that 5-minute bars aggregated from a 1-minute replay match a plain resample, that the signal
+# computed on every bar close matches generate_signal on the full history, and measures the ingestion
+# throughput of ReplayServer -> TcpFeed over many symbols.
+
+import asyncio
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from indicators import calculate_vwap, calculate_intraday_sma
+from signal_generator import generate_signal
+from stream import BarAggregator, StreamBars, ReplayServer, TcpFeed, frames_to_messages, write_recording
+from synthetic_market import make_bars
+
+def replay(frames, seconds, on_close=None, speed=0.0):
+    stream_bars = StreamBars(on_close=on_close)
+    aggregator = BarAggregator(stream_bars.on_bar)
+    with ReplayServer(frames_to_messages(frames, seconds), speed=speed) as server:
+        feed = TcpFeed(aggregator, server.host, server.port)
+        asyncio.run(feed.run())
+    return stream_bars, feed
+
+# 1-minute replay -> 5-minute bars equal to a resample of the same data
+minute = make_bars(["TEST"], 3, bars_per_session=390, interval="1min", seed=1)["TEST"]
+expected = minute.resample("5min").agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+expected = expected.dropna()
+
+closes = {}
+stream_bars, feed = replay({"TEST": minute}, 60, on_close=lambda symbol, df: closes.__setitem__(df.index[-1], df))
+got = stream_bars.bars("TEST")
+assert feed.received == len(minute)
+assert len(got) == len(expected), (len(got), len(expected))
+assert (got.index == expected.index).all()
+for col in ("open", "high", "low", "close", "volume"):
+    assert np.allclose(got[col].astype(float), expected[col].astype(float)), col
+
+# The signal at every bar close equals generate_signal on the full frame
+full = expected.copy()
+full["vwap"] = calculate_vwap(full)
+full["sma_20"] = calculate_intraday_sma(full, window=20)
+full_signal = generate_signal(full)
+assert len(closes) == len(expected)
+for timestamp, df in closes.items():
+    assert np.isclose(df["vwap"].iloc[-1], full.loc[timestamp, "vwap"])
+    assert np.isclose(df["sma_20"].iloc[-1], full.loc[timestamp, "sma_20"], equal_nan=True)
+    assert df["signal"].iloc[-1] == full_signal.loc[timestamp], timestamp
+
+# Bars are closed by the update that completes them, a later bucket, or flush(); late updates are dropped
+closed = []
+aggregator = BarAggregator(lambda symbol, bar: closed.append(bar))
+t0 = pd.Timestamp("2025-03-03 09:30", tz="America/New_York")
+aggregator.update_trade("A", t0 + pd.Timedelta(seconds=10), 10.0, 100)
+aggregator.update_trade("A", t0 + pd.Timedelta(seconds=70), 11.0, 50)
+assert closed == []
+aggregator.update_trade("A", t0 + pd.Timedelta(minutes=5, seconds=1), 12.0, 10)
+assert len(closed) == 1 and closed[0]["high"] == 11.0 and closed[0]["volume"] == 150
+aggregator.update_trade("A", t0 + pd.Timedelta(minutes=4), 9.0, 10)   # Late, bar already closed
+assert len(closed) == 1
+assert aggregator.flush(t0 + pd.Timedelta(minutes=9)) == 0
+assert aggregator.flush(t0 + pd.Timedelta(minutes=10)) == 1 and closed[-1]["close"] == 12.0
+aggregator.update_trade("A", t0 - pd.Timedelta(minutes=1), 9.0, 10)   # Pre-market, ignored
+assert aggregator.flush() == 0
+
+# Seeded history is extended by streamed bars and trimmed to the session limit
+seed_bars = expected[expected.index < expected.index[-10]]
+stream_bars = StreamBars(sessions=2)
+stream_bars.seed("TEST", seed_bars)
+aggregator = BarAggregator(stream_bars.on_bar)
+for row in minute[minute.index >= expected.index[-10]].itertuples():
+    aggregator.update_bar("TEST", row.Index, row.open, row.high, row.low, row.close, row.volume)
+assert stream_bars.is_seeded("TEST")
+assert stream_bars.bars("TEST").index.equals(expected.index[expected.index.normalize() >= expected.index.normalize().unique()[-2]])
+assert stream_bars._indicators == {}   # No callback, no indicator work
+
+# A callback attached mid-stream starts its indicators from the history and the bars not yet read
+stream_bars = StreamBars()
+stream_bars.seed("TEST", seed_bars)
+late = {}
+aggregator = BarAggregator(stream_bars.on_bar)
+for i, row in enumerate(minute[minute.index >= expected.index[-10]].itertuples()):
+    if i == 20:
+        stream_bars.on_close = lambda symbol, df: late.__setitem__(df.index[-1], df)
+    aggregator.update_bar("TEST", row.Index, row.open, row.high, row.low, row.close, row.volume)
+assert len(late) == 6
+for timestamp, df in late.items():
+    assert np.isclose(df["vwap"].iloc[-1], full.loc[timestamp, "vwap"])
+    assert np.isclose(df["sma_20"].iloc[-1], full.loc[timestamp, "sma_20"])
+
+# Recordings round-trip through a file
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "session.ndjson")
+    write_recording(path, frames_to_messages({"TEST": expected}, 300))
+    assert len(ReplayServer.from_file(path).messages) == len(expected)
+
+# Throughput over many symbols at full speed
+frames = make_bars(100, 1, bars_per_session=390, interval="1min")
+start = time.perf_counter()
+stream_bars, feed = replay(frames, 60)
+elapsed = time.perf_counter() - start
+assert feed.received == 100 * 390 and stream_bars.bars_closed == 100 * 78
+print(f"[INFO] {feed.received} messages, {stream_bars.bars_closed} bars closed in {elapsed:.2f}s "
+      f"({feed.received / elapsed:,.0f} msg/s)")
+
+# Paced replay: 10 minutes of market time at 600x takes about one second
+short = {"TEST": minute.iloc[:11]}
+start = time.perf_counter()
+replay(short, 60, speed=600)
+elapsed = time.perf_counter() - start
+assert 0.9 < elapsed < 3, elapsed
+
+print("[INFO] test_stream passed")
@@ -0,0 +1,48 @@
+# test_synthetic_market.py
+
+# Checks that the synthetic bars are deterministic and well-formed, and that a tiny benchmark run is
+# written to JSON and compared against a saved run.
+
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from synthetic_market import make_bars, make_daily_panel, BARS_PER_SESSION
+from bars import session_ids
+import bench_suite
+
+frames = make_bars(symbols=3, sessions=4, seed=7)
+again = make_bars(symbols=3, sessions=4, seed=7)
+assert list(frames) == ["S000", "S001", "S002"]
+assert all(frames[s].equals(again[s]) for s in frames)
+assert not frames["S000"].equals(make_bars(symbols=3, sessions=4, seed=8)["S000"])
+
+df = frames["S001"]
+assert len(df) == 4 * BARS_PER_SESSION and str(df.index.tz) == "America/New_York"
+assert df.index.is_monotonic_increasing and len(np.unique(session_ids(df.index))) == 4
+assert (df.index.strftime("%H:%M")[:BARS_PER_SESSION] == pd.date_range("09:30", "15:55", freq="5min").strftime("%H:%M")).all()
+assert (df["high"] >= df[["open", "close"]].max(axis=1)).all() and (df["low"] <= df[["open", "close"]].min(axis=1)).all()
+assert (df["low"] > 0).all() and (df["volume"] > 0).all()
+assert (df["open"].to_numpy()[1:] == df["close"].to_numpy()[:-1]).all()
+
+panel = make_daily_panel(symbols=20, sessions=30, missing=5)
+assert list(panel.columns.get_level_values(0).unique()) == ["High", "Low", "Close"] and panel.shape == (30, 60)
+assert panel["Close"].isna().to_numpy().sum() <= 5 and panel["High"].notna().all().all()
+
+# A tiny benchmark run, saved and compared with itself slowed down
+tmp = tempfile.mkdtemp()
+results = bench_suite.run([(2, 2)], list(bench_suite.BENCHMARKS), repeats=1)
+path = bench_suite.save(results, os.path.join(tmp, "run.json"))
+with open(path) as f:
+    saved = json.load(f)
+assert {r["benchmark"] for r in saved["results"]} == set(bench_suite.BENCHMARKS)
+assert saved["commit"] and saved["environment"]["numpy"] == np.__version__
+for r in saved["results"]:
+    r["median_s"] /= 10
+with open(path, "w") as f:
+    json.dump(saved, f)
+assert len(bench_suite.compare(results, path)) == len(results)
+assert bench_suite.parse_sizes("1x1,500x504") == [(1, 1), (500, 504)]
+
+print("[INFO] synthetic market tests passed")
@@ -0,0 +1,122 @@
+# test_trade_log.py
+
+# Checks the buffered trade log: background writes into daily partitions, fills / round-trip / daily PnL
+# queries against a straightforward per-trade loop, the CSV import, and the load time of months of trades.
+
+import csv
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from portfolio import analyze_trades
+from trade_log import TradeLog
+
+tmp = tempfile.mkdtemp()
+rng = np.random.default_rng(3)
+
+# Three months of synthetic live trading: each symbol alternates flat -> long/short -> flat, sometimes flipping
+sessions = pd.bdate_range("2025-01-02", "2025-03-31")
+symbols = ["AAPL", "MSFT", "NVDA", "TSLA", "AMD"]
+fills = []
+for day in sessions:
+    for symbol in symbols:
+        position = 0
+        times = pd.date_range(f"{day.date()} 09:45", periods=10, freq="30min", tz="America/New_York")
+        for t in times:
+            price = round(float(rng.uniform(50, 500)), 2)
+            if position == 0:
+                qty = int(rng.integers(1, 50))
+                side = "buy" if rng.random() < 0.6 else "sell"
+                position = qty if side == "buy" else -qty
+                fills.append((t, symbol, side, qty, price, "entry"))
+            elif rng.random() < 0.2:   # Flip: close and open the other way in one order
+                qty = abs(position) + int(rng.integers(1, 20))
+                side = "sell" if position > 0 else "buy"
+                fills.append((t, symbol, side, qty, price, "exit"))
+                position = position - qty if side == "sell" else position + qty
+            else:
+                side = "sell" if position > 0 else "buy"
+                fills.append((t, symbol, side, abs(position), price, "exit"))
+                position = 0
+        if position:
+            t = times[-1] + pd.Timedelta(minutes=5)
+            fills.append((t, symbol, "sell" if position > 0 else "buy", abs(position), 100.0, "exit"))
+
+log = TradeLog(os.path.join(tmp, "log"), flush_seconds=0.05)
+start = time.perf_counter()
+for t, symbol, side, qty, price, kind in fills:
+    log.log(symbol, side, qty, price, kind, 1.0, timestamp=t)
+log_time = time.perf_counter() - start
+time.sleep(0.3)   # The background writer flushes without being asked
+assert log.written == len(fills)
+log.close()
+assert log.dates() == [d.strftime("%Y-%m-%d") for d in sessions]
+print(f"[INFO] Logged {len(fills)} fills in {log_time * 1000:.0f} ms ({log_time / len(fills) * 1e6:.1f} us per fill)")
+
+# Reference round trips from a per-fill loop
+expected = []
+open_trades = {}
+for t, symbol, side, qty, price, kind in fills:
+    signed = qty if side == "buy" else -qty
+    current = open_trades.get(symbol)
+    if current is None:
+        open_trades[symbol] = (t, price, signed)
+        continue
+    entry_time, entry_price, position = current
+    new_position = position + signed
+    direction = np.sign(position)
+    expected.append({"symbol": symbol, "exit_time": t, "pnl": (price - entry_price) * direction * abs(position)})
+    open_trades.pop(symbol)
+    if new_position != 0:
+        open_trades[symbol] = (t, price, new_position)
+
+start = time.perf_counter()
+trades = log.round_trips()
+load_time = time.perf_counter() - start
+assert len(trades["pnl"]) == len(expected)
+got = pd.DataFrame({"symbol": trades["symbol"], "exit_time": trades["exit_time"], "pnl": trades["pnl"]})
+want = pd.DataFrame(expected).sort_values(["symbol", "exit_time"], kind="stable").reset_index(drop=True)
+assert (got["symbol"] == want["symbol"]).all()
+assert np.allclose(got["pnl"], want["pnl"])
+print(f"[INFO] {len(sessions)} sessions, {len(expected)} round trips loaded in {load_time * 1000:.0f} ms")
+
+stats = analyze_trades(trades=trades)
+assert stats["num_trades"] == len(expected) and np.isclose(stats["total_pnl"], round(want["pnl"].sum(), 2))
+assert set(stats["per_symbol"].index) == set(symbols)
+
+# Queries by symbol and date range only read what they need
+march = log.fills(symbol="NVDA", start="2025-03-01", end="2025-03-31")
+assert (march["symbol"] == "NVDA").all() and march.index.min() >= pd.Timestamp("2025-03-01", tz="America/New_York")
+assert set(march["side"]) <= {"buy", "sell"}
+daily = log.daily_pnl()
+want_daily = want.groupby(want["exit_time"].dt.tz_localize(None).dt.normalize())["pnl"].sum()
+assert np.allclose(daily.to_numpy(), want_daily.to_numpy()) and (daily.index == want_daily.index).all()
+assert np.isclose(log.daily_pnl(start="2025-02-03", end="2025-02-03", symbol="AMD").sum(),
+                  want[(want["symbol"] == "AMD") & (want["exit_time"].dt.date == pd.Timestamp("2025-02-03").date())]["pnl"].sum())
+
+# Partial exits and scale-ins are priced at average cost
+for name, sequence, pnl, entry_price, exit_price in [
+        ("partial", [("buy", 10, 100.0), ("sell", 4, 130.0), ("sell", 6, 90.0)], 60.0, 100.0, 106.0),
+        ("scale_in", [("buy", 5, 100.0), ("buy", 5, 110.0), ("sell", 10, 120.0)], 150.0, 105.0, 120.0)]:
+    scaled = TradeLog(os.path.join(tmp, name))
+    opened = pd.Timestamp("2025-04-01 10:00", tz="America/New_York")
+    for i, (side, qty, price) in enumerate(sequence):
+        scaled.log("MSFT", side, qty, price, "entry", 1.0, timestamp=opened + pd.Timedelta(minutes=i))
+    scaled.close()
+    trip = scaled.round_trips()
+    assert len(trip["pnl"]) == 1 and np.isclose(trip["pnl"][0], pnl), (name, trip["pnl"])
+    assert trip["qty"][0] == 10 and np.isclose(trip["entry_price"][0], entry_price) and np.isclose(trip["exit_price"][0], exit_price)
+
+# Old trade_log.csv files can be imported
+csv_path = os.path.join(tmp, "trade_log.csv")
+with open(csv_path, "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["timestamp", "symbol", "side", "qty", "price", "type", "ATR"])
+    writer.writerow(["2025-04-01 10:00:00-04:00", "AAPL", "buy", 10, 100.0, "entry", 2.0])
+    writer.writerow(["2025-04-01 11:00:00-04:00", "AAPL", "sell", 10, 103.0, "take_profit", 2.0])
+imported = TradeLog(os.path.join(tmp, "imported"))
+assert imported.import_csv(csv_path) == 2
+assert imported.daily_pnl().to_dict() == {pd.Timestamp("2025-04-01"): 30.0}
+
+print("[INFO] trade log tests passed")
@@ -0,0 +1,124 @@
+# test_universe.py
+
+# Checks the local S&P 500 universe with a fake scraper: the file is only refreshed when stale, diffs are
+# recorded as versioned changes, point-in-time membership matches a replay of the history, a failed
+# refresh keeps the stored file, and lookups take microseconds.
+
+import datetime as dt
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import atr_watchlist
+import universe as universe_module
+from universe import Universe, merge_changes
+
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, "sp500.json")
+rng = np.random.default_rng(5)
+
+# Five years of synthetic index changes on top of an initial membership
+initial = {f"S{i:03d}" for i in range(500)}
+members, history, spare = set(initial), [], iter(f"N{i:03d}" for i in range(1000))
+for date in pd.bdate_range("2020-01-02", "2024-12-31", freq="21B"):
+    removed = sorted(rng.choice(sorted(members), int(rng.integers(1, 4)), replace=False))
+    added = [next(spare) for _ in removed]
+    members = (members - set(removed)) | set(added)
+    history.append({"date": date.strftime("%Y-%m-%d"), "added": added, "removed": removed})
+
+calls = []
+scraped = {"members": sorted(members), "changes": history, "error": None}
+
+def fake_fetch():
+    calls.append(1)
+    if scraped["error"]:
+        raise scraped["error"]
+    return list(scraped["members"]), list(scraped["changes"])
+
+def replay(date):
+    current = set(initial)
+    for change in history:
+        if change["date"] <= date:
+            current = (current - set(change["removed"])) | set(change["added"])
+    return current
+
+t0 = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=30)
+universe = Universe(path, fetch=fake_fetch)
+assert universe.refresh(now=t0)["version"] == 1 and len(calls) == 1
+for date in ["2019-06-01", "2020-01-02", "2021-07-15", "2023-03-01", "2024-12-31"]:
+    assert universe.members_set(date) == replay(date), date
+assert universe.members_set() == members and universe.is_member("s001", "2019-01-01") == ("S001" in initial)
+assert set(universe.ever_members("2022-01-01", "2022-12-31")) == set().union(
+    *(replay(d.strftime("%Y-%m-%d")) for d in pd.bdate_range("2022-01-01", "2022-12-31")))
+
+# Fresh file: no scrape, also not from a new process
+assert universe.refresh(now=t0 + dt.timedelta(days=3))["added"] == [] and len(calls) == 1
+reloaded = Universe(path, fetch=fake_fetch)
+assert not reloaded.is_stale(now=t0 + dt.timedelta(days=3)) and reloaded.version == 1
+assert reloaded.members_set("2021-07-15") == replay("2021-07-15")
+
+# Stale file: scrape again, apply the diff; a change missing from Wikipedia's table is recorded on the refresh date
+t1 = t0 + dt.timedelta(days=10)
+scraped["members"] = sorted((members - {"S100", "S101"}) | {"ZNEW", "BRK-B"})
+effective, refreshed = (t0 + dt.timedelta(days=4)).date().isoformat(), t1.date().isoformat()
+scraped["changes"] = history + [{"date": effective, "added": ["ZNEW"], "removed": ["S100"]}]
+result = universe.refresh(now=t1)
+assert result == {"version": 2, "added": ["BRK-B", "ZNEW"], "removed": ["S100", "S101"]} and len(calls) == 2
+assert universe.history("S101") == [{"date": refreshed, "added": ["BRK-B"], "removed": ["S101"]}]
+assert universe.history("ZNEW")[0]["date"] == effective
+day_before = lambda date: (dt.date.fromisoformat(date) - dt.timedelta(days=1)).isoformat()
+assert universe.is_member("S100", day_before(effective)) and not universe.is_member("S100", effective)
+assert universe.is_member("S101", day_before(refreshed)) and universe.is_member("BRK.B", refreshed)
+assert universe.members_set("2021-07-15") == replay("2021-07-15")   # Older history unchanged
+with open(path) as f:
+    saved = json.load(f)
+assert saved["version"] == 2 and saved["members"] == scraped["members"]
+
+# Nothing changed: a new check, same version
+assert universe.refresh(force=True)["version"] == 2 and not universe.is_stale()
+
+# Offline: the stale file keeps being used, and the failure is not retried on every lookup
+scraped["error"] = ConnectionError("offline")
+offline = Universe(path, fetch=fake_fetch, max_age_days=0)
+before = len(calls)
+assert offline.members() == scraped["members"] and offline.members() == scraped["members"]
+assert len(calls) == before + 1
+try:
+    Universe(os.path.join(tmp, "missing.json"), fetch=fake_fetch).members()
+except RuntimeError:
+    pass
+else:
+    raise AssertionError("expected an error without any constituents file")
+
+# Backtest mask
+dates = pd.bdate_range("2024-06-03", "2024-12-31")
+tickers = sorted(universe.ever_members("2024-06-03", "2024-12-31"))
+mask = universe.membership_mask(tickers, dates)
+assert mask.shape == (len(dates), len(tickers))
+for i in range(0, len(dates), 17):
+    assert set(np.array(tickers)[mask[i]]) == replay(dates[i].strftime("%Y-%m-%d"))
+assert merge_changes([{"date": "2020-01-01", "added": ["A"]}], [{"date": "2020-01-01", "removed": ["B"]}]) == \
+    [{"date": "2020-01-01", "added": ["A"], "removed": ["B"]}]
+
+# Lookup speed, and atr_watchlist reads the local file
+scraped["error"] = None
+n = 10_000
+start = time.perf_counter()
+for _ in range(n):
+    universe.members()
+current_us = (time.perf_counter() - start) / n * 1e6
+start = time.perf_counter()
+for i in range(n):
+    universe.members_set("2022-05-17")
+pit_us = (time.perf_counter() - start) / n * 1e6
+print(f"[INFO] Current members: {current_us:.1f} us, point-in-time set: {pit_us:.1f} us per lookup")
+assert current_us < 1000 and pit_us < 100
+
+universe_module._universe = universe
+assert atr_watchlist.get_sp500_tickers() == scraped["members"]
+assert atr_watchlist.get_sp500_tickers("2021-07-15") == sorted(replay("2021-07-15"))
+universe_module._universe = None
+
+print("[INFO] universe tests passed")
@@ -0,0 +1,106 @@
+# test_walk_forward.py
+
+# Checks the walk-forward optimizer against backtest_batch on the same train / test slices, that worker
+# processes give the same result as the in-process run, that checkpoints resume only the missing windows,
+# that shared memory is released, and times the run for 1 and all cores.
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from synthetic_market import make_bars
+from backtester import backtest_batch, daily_atr_from_intraday, expand_param_grid
+from walk_forward import walk_forward, make_windows, TRAIN_COLUMNS
+
+GRID = {"sma_window": [10, 20], "stop_mult": [1.0, 2.0], "target_mult": [2.0, 3.0], "volume_mult": [0]}
+
+def make_panel(symbols, sessions, seed=0):
+    panel = make_bars(symbols, sessions, seed=seed)
+    for df in panel.values():
+        df["ATR"] = daily_atr_from_intraday(df)   # Full-history ATR, so the sliced backtests see the same values
+    return panel
+
+def slice_panel(panel, start, end):
+    out = {}
+    for symbol, df in panel.items():
+        dates = df.index.strftime("%Y-%m-%d")
+        out[symbol] = df[(dates >= start) & (dates <= end)]
+    return out
+
+shm_before = set(glob.glob("/dev/shm/psm_*"))
+panel = make_panel(6, 70, seed=1)
+result = walk_forward(panel, GRID, train_sessions=30, test_sessions=10, processes=1)
+windows = result["windows"]
+assert len(windows) == 4 and result["computed"] == 4
+assert list(windows["test_start"]) == [d.strftime("%Y-%m-%d") for d in pd.bdate_range(end="2025-06-10", periods=70)[30::10][:4]]
+
+# Every window against a plain backtest_batch of its train slice (choice) and test slice (OOS PnL)
+configs = expand_param_grid(GRID)
+params = list(configs[0])
+calendar = sorted({d for df in panel.values() for d in df.index.strftime("%Y-%m-%d")})
+for _, row in windows.iterrows():
+    train_end = calendar[calendar.index(row["test_start"]) - 1]
+    train = backtest_batch(slice_panel(panel, row["train_start"], train_end), GRID, processes=1)
+    totals = train.groupby(params, sort=False)["total_pnl"].sum()
+    best = max(range(len(configs)), key=lambda k: (totals[tuple(configs[k].values())], -k))
+    assert {p: row[p] for p in params} == configs[best], row["window"]
+    assert np.isclose(row["train_objective"], totals.max())
+    test = backtest_batch(slice_panel(panel, row["test_start"], row["test_end"]), {p: [row[p]] for p in params},
+                          processes=1)
+    assert row["test_trades"] == test["num_trades"].sum() and np.isclose(row["test_pnl"], test["total_pnl"].sum())
+
+trades = result["trades"]
+assert len(trades) == windows["test_trades"].sum() and result["stats"]["num_trades"] == len(trades)
+assert np.isclose(result["stats"]["total_pnl"], round(windows["test_pnl"].sum(), 2))
+assert all(row["test_start"] <= str(t["entry_time"].date()) <= row["test_end"]
+           for t in trades for _, row in windows[windows["window"] == t["window"]].iterrows())
+
+# Worker processes, shared memory: same answer
+parallel = walk_forward(panel, GRID, train_sessions=30, test_sessions=10, processes=2)
+pd.testing.assert_frame_equal(parallel["windows"], windows)
+assert [t["pnl"] for t in parallel["trades"]] == [t["pnl"] for t in trades]
+
+# Checkpoint and resume
+folder = tempfile.mkdtemp()
+first = walk_forward(panel, GRID, train_sessions=30, test_sessions=10, processes=2, checkpoint_dir=folder)
+assert first["computed"] == 4
+again = walk_forward(panel, GRID, train_sessions=30, test_sessions=10, processes=2, checkpoint_dir=folder)
+assert again["computed"] == 0
+pd.testing.assert_frame_equal(again["windows"], windows)
+for k in (1, 3):
+    os.remove(os.path.join(folder, f"window_{k:04d}.json"))
+resumed = walk_forward(panel, GRID, train_sessions=30, test_sessions=10, processes=1, checkpoint_dir=folder)
+assert resumed["computed"] == 2
+pd.testing.assert_frame_equal(resumed["windows"], windows)
+assert [t["pnl"] for t in resumed["trades"]] == [t["pnl"] for t in trades]
+try:
+    walk_forward(panel, {**GRID, "sma_window": [15]}, train_sessions=30, test_sessions=10, checkpoint_dir=folder)
+except ValueError:
+    pass
+else:
+    raise AssertionError("a checkpoint of another run must not be reused")
+shutil.rmtree(folder)
+
+# Windows
+assert make_windows(np.arange(10), 4, 2) == [{"train_start": 0, "test_start": 4, "test_end": 6},
+                                            {"train_start": 2, "test_start": 6, "test_end": 8},
+                                            {"train_start": 4, "test_start": 8, "test_end": 10}]
+assert [w["train_start"] for w in make_windows(np.arange(10), 4, 2, anchored=True)] == [0, 0, 0]
+assert len(TRAIN_COLUMNS) == 7
+
+# Scaling
+big = make_panel(40, 120, seed=2)
+big_grid = {"sma_window": [10, 20, 30], "stop_mult": [1.0, 1.5, 2.0], "target_mult": [2.0, 3.0], "volume_mult": [0, 1.5]}
+timings = {}
+for processes in sorted({1, os.cpu_count() or 1}):
+    start = time.perf_counter()
+    walk_forward(big, big_grid, train_sessions=40, test_sessions=20, processes=processes)
+    timings[processes] = time.perf_counter() - start
+print("[INFO] 40 symbols x 120 sessions, 36 configs, 4 windows: " +
+      ", ".join(f"{p} process(es) {t:.2f} s" for p, t in timings.items()))
+
+assert set(glob.glob("/dev/shm/psm_*")) == shm_before   # Shared memory released
+print("[INFO] walk-forward tests passed")